@@ -418,8 +418,8 @@ class AdminDatabase:
                 self.conn.rollback()
             return False
 
-    def get_message_queue(self):
-        """Получить все сообщения из очереди"""
+    def get_message_queue(self, limit: int = 500):
+        """Получить последние сообщения из очереди (по индексу created_at, без чтения всей истории)"""
         try:
             if not self.conn:
                 self.connect()
@@ -431,7 +431,9 @@ class AdminDatabase:
                         id, user_id, message, keyboard, sent, created_at, sent_at
                     FROM message_queue
                     ORDER BY created_at DESC
-                    """
+                    LIMIT %s
+                    """,
+                    (limit,),
                 )
                 rows = cursor.fetchall()
                 result = [dict(row) for row in rows]
@@ -441,6 +443,19 @@ class AdminDatabase:
             logger.error(f"❌ Ошибка получения сообщений из очереди: {e}")
             return []
 
+    def get_pending_message_count(self) -> int:
+        """Количество неотправленных сообщений (частичный индекс по sent = FALSE)"""
+        try:
+            if not self.conn:
+                self.connect()
+
+            with self.conn.cursor(cursor_factory=RealDictCursor) as cursor:
+                cursor.execute("SELECT COUNT(*) AS count FROM message_queue WHERE sent = FALSE")
+                return cursor.fetchone()["count"]
+        except Exception as e:
+            logger.error(f"❌ Ошибка подсчета неотправленных сообщений: {e}")
+            return 0
+
     def get_users_by_telegram_id(self):
         """Получить пользователей с telegram_id для выбора"""
         try:
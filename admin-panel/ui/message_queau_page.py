@@ -34,8 +34,9 @@ def show_message_queue_table():
             st.info("💡 Убедитесь, что Docker контейнеры запущены и база данных доступна")
             return
 
-    # Получаем сообщения из очереди
+    # Получаем последние сообщения из очереди
     messages_data = db.get_message_queue()
+    pending_total = db.get_pending_message_count()
 
     if not messages_data:
         st.warning("📭 Сообщений в очереди не найдено")
@@ -62,15 +63,14 @@ def show_message_queue_table():
 
     with col1:
         total_count = len(df)
-        st.metric("📨 Всего сообщений", total_count)
+        st.metric("📨 Последних сообщений", total_count)
 
     with col2:
         sent_count = len(df[df["✅ Отправлено"] == True])
         st.metric("📤 Отправлено", sent_count)
 
     with col3:
-        pending_count = len(df[df["✅ Отправлено"] == False])
-        st.metric("⏳ В очереди", pending_count)
+        st.metric("⏳ В очереди", pending_total)
 
     with col4:
         unique_users = len(df["👤 User ID"].unique())
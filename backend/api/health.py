@@ -3,6 +3,7 @@ from loguru import logger
 from typing import Dict, Any
 
 from services.app_database import app_database_service
+from services.db_pool import db_pool
 
 router = APIRouter()
 
@@ -27,6 +28,9 @@ async def detailed_health_check() -> Dict[str, Any]:
         health_info["components"]["app_database"] = {"status": "unhealthy", "error": str(e)}
         health_info["status"] = "degraded"
 
+    # Загрузка общего пула соединений
+    health_info["components"]["db_pool"] = db_pool.metrics()
+
     return health_info
 
 
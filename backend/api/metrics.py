@@ -0,0 +1,10 @@
+from fastapi import APIRouter, Response
+from prometheus_client import CONTENT_TYPE_LATEST, generate_latest
+
+router = APIRouter()
+
+
+@router.get("")
+async def metrics() -> Response:
+    """Метрики в формате Prometheus (в том числе время этапов подбора пар)"""
+    return Response(content=generate_latest(), media_type=CONTENT_TYPE_LATEST)
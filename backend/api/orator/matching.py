@@ -2,7 +2,7 @@ from fastapi import APIRouter, Depends, HTTPException, status
 from loguru import logger
 from datetime import datetime
 
-from models.orator import MatchRequest, MatchResponse
+from models.orator import MatchRequest, MatchResponse, MatchNextRequest
 from services.security import security_service
 from services.matching_service import matching_service
 
@@ -18,10 +18,28 @@ async def find_candidates(
         # Преобразуем строку даты в объект date
         week_start_date = datetime.strptime(match_request.week_start_date, "%Y-%m-%d").date()
 
-        candidates = await matching_service.find_candidates(
-            user_id=current_user_id, week_start=week_start_date, limit=match_request.limit
+        result = await matching_service.find_candidates_page(
+            user_id=current_user_id, week_start=week_start_date, limit=match_request.limit, page=match_request.page
         )
-        return MatchResponse(candidates=candidates)
+        return MatchResponse(candidates=result.candidates, next_cursor=result.next_cursor)
     except Exception as e:
         logger.error(f"Find candidates error: {e}")
         raise HTTPException(status_code=status.HTTP_500_INTERNAL_SERVER_ERROR, detail="Failed to find candidates")
+
+
+@router.post("/next", response_model=MatchResponse)
+async def next_candidates(
+    next_request: MatchNextRequest, current_user_id: str = Depends(security_service.get_current_user_id)
+):
+    """Следующая страница кандидатов по курсору из /find (без повторного подбора)"""
+    try:
+        result = await matching_service.next_candidates(current_user_id, next_request.cursor, next_request.limit)
+    except Exception as e:
+        logger.error(f"Next candidates error: {e}")
+        raise HTTPException(status_code=status.HTTP_500_INTERNAL_SERVER_ERROR, detail="Failed to get next candidates")
+
+    if result is None:
+        # Курсор истек или не принадлежит пользователю — нужен новый поиск через /find
+        raise HTTPException(status_code=status.HTTP_410_GONE, detail="Cursor expired")
+    return MatchResponse(candidates=result.candidates, next_cursor=result.next_cursor)
+
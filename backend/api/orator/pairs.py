@@ -3,7 +3,7 @@ from fastapi import APIRouter, Depends, HTTPException, status
 from loguru import logger
 from typing import List
 
-from models.orator import UserPairResponse
+from models.orator import UserPairResponse, PairCreationStatus
 from services.security import security_service
 from services.orator_database import orator_db
 from urllib.parse import quote
@@ -16,6 +16,89 @@ def escape_html(text: str) -> str:
     return text.replace("&", "&amp;").replace("<", "&lt;").replace(">", "&gt;")
 
 
+def pair_profiles(user_pair: dict) -> tuple:
+    """Профили текущего пользователя и партнера из строки пары (username, telegram_id, first_name)"""
+    user_profile = {
+        "username": user_pair["user_username"],
+        "telegram_id": user_pair["user_telegram_id"],
+        "first_name": user_pair["user_first_name"],
+    }
+    partner_profile = {
+        "username": user_pair["partner_username"],
+        "telegram_id": user_pair["partner_telegram_id"],
+        "first_name": user_pair["partner_first_name"],
+    }
+    return user_profile, partner_profile
+
+
+def user_link(profile: dict) -> str:
+    """Ссылка на пользователя: @username или tg://user по telegram_id"""
+    if profile["username"] is None or profile["username"] == "":
+        return f'<a href="tg://user?id={profile["telegram_id"]}">{escape_html(profile["first_name"])}</a>'
+    return f"@{profile['username']}"
+
+
+def pair_created_messages(user_pair: dict) -> List[MessageQueue]:
+    """Сообщение кандидату о новой паре с кнопками подтверждения/отмены"""
+    user_profile, partner_profile = pair_profiles(user_pair)
+
+    # Создаем клавиатуру с кнопками подтверждения/отмены
+    keyboard = {
+        "inline_keyboard": [
+            [
+                {"text": "✅ Подтвердить", "callback_data": f"pair_confirm_{user_pair['id']}"},
+                {"text": "❌ Отменить", "callback_data": f"pair_cancel_{user_pair['id']}"},
+            ]
+        ]
+    }
+
+    return [
+        MessageQueue(
+            user_id=partner_profile["telegram_id"],
+            message=f"Вы были добавлены в пару с кандидатом {user_profile['first_name']}",
+            keyboard=keyboard,
+        )
+    ]
+
+
+def pair_confirmed_messages(user_pair: dict) -> List[MessageQueue]:
+    """Сообщение о подтверждении партнеру и сообщение с кнопкой написать в телеграм пользователю"""
+    user_profile, partner_profile = pair_profiles(user_pair)
+
+    message_text = "Привет! Я от @AlexOratorBot"
+    start_dialog_message = quote(message_text)
+
+    if partner_profile["username"] is None or partner_profile["username"] == "":
+        url = f"tg://user?id={partner_profile['telegram_id']}&text={start_dialog_message}"
+    else:
+        url = f"https://t.me/{partner_profile['username']}?text={start_dialog_message}"
+    keyboard = {"inline_keyboard": [[{"text": "✉️ Написать в Telegram", "url": url}]]}
+
+    return [
+        MessageQueue(
+            user_id=partner_profile["telegram_id"],
+            message=f"Пара с {user_profile['first_name']} {user_link(user_profile)} подтверждена. Начинайте тренировку!",
+        ),
+        MessageQueue(
+            user_id=user_profile["telegram_id"],
+            message=f"Вы подтвердили пару с {partner_profile['first_name']} {user_link(partner_profile)}. "
+            "Начинайте тренировку!",
+            keyboard=keyboard,
+        ),
+    ]
+
+
+def pair_cancelled_messages(user_pair: dict) -> List[MessageQueue]:
+    """Сообщение партнеру об отмене пары"""
+    user_profile, partner_profile = pair_profiles(user_pair)
+    return [
+        MessageQueue(
+            user_id=partner_profile["telegram_id"],
+            message=f"Пара с {user_profile['first_name']} отменена. Попробуйте найти другую пару.",
+        )
+    ]
+
+
 @router.post("/create", response_model=UserPairResponse)
 async def create_pair(
     pair_data: dict, current_user_id: str = Depends(security_service.get_current_user_id)  # {"candidate_id": "uuid"}
@@ -31,33 +114,20 @@ async def create_pair(
         if not registration:
             raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail="No active registration found")
 
-        user_pair = await orator_db.create_user_pair(
-            user1_id=current_user_id, user2_id=candidate_id, registration_id=registration["id"]
-        )
-
-        # Добавляем сообщение в очередь с кнопками
-        user_profile = await orator_db.get_user_profile(current_user_id)
-        partner_profile = await orator_db.get_user_profile(candidate_id)
-
-        # Создаем клавиатуру с кнопками подтверждения/отмены
-        keyboard = {
-            "inline_keyboard": [
-                [
-                    {"text": "✅ Подтвердить", "callback_data": f"pair_confirm_{user_pair['id']}"},
-                    {"text": "❌ Отменить", "callback_data": f"pair_cancel_{user_pair['id']}"},
-                ]
-            ]
-        }
-
-        message_queue = MessageQueue(
-            user_id=partner_profile["telegram_id"],
-            message=f"Вы были добавлены в пару с кандидатом {user_profile['first_name']}",
-            keyboard=keyboard,
+        # Сообщение кандидату пишется в очередь в одной транзакции с парой
+        result = await orator_db.create_user_pair(
+            user1_id=current_user_id,
+            user2_id=candidate_id,
+            registration_id=registration["id"],
+            messages=pair_created_messages,
         )
-        await orator_db.add_message(message_queue)
-
-        if not user_pair:
-            raise HTTPException(status_code=status.HTTP_500_INTERNAL_SERVER_ERROR, detail="Failed to create pair")
+        if result.status == PairCreationStatus.CAPACITY_REACHED:
+            raise HTTPException(status_code=status.HTTP_409_CONFLICT, detail="Pair limit reached")
+        if result.status == PairCreationStatus.ALREADY_PAIRED:
+            raise HTTPException(status_code=status.HTTP_409_CONFLICT, detail="Pair already exists")
+        if result.status == PairCreationStatus.NOT_REGISTERED:
+            raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail="No active registration found")
+        user_pair = result.pair
 
         return UserPairResponse.from_user_pair(user_pair)
     except HTTPException:
@@ -71,67 +141,13 @@ async def create_pair(
 async def confirm_pair(pair_id: str, current_user_id: str = Depends(security_service.get_current_user_id)):
     """Подтвердить пару"""
     try:
-        user_pair = await orator_db.confirm_user_pair(pair_id, True, current_user_id)
+        # Сообщения обоим участникам пишутся в очередь в одной транзакции с подтверждением
+        user_pair = await orator_db.confirm_user_pair(
+            pair_id, True, current_user_id, messages=pair_confirmed_messages
+        )
         if not user_pair:
             raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Pair not found")
 
-        # Добавляем сообщение о подтверждении партнеру в очередь
-        user_profile = await orator_db.get_user_profile(current_user_id)
-        partner_profile = await orator_db.get_user_profile(user_pair["partner_id"])
-
-        if user_profile["username"] is None or user_profile["username"] == "":
-            user_link = (
-                f'<a href="tg://user?id={user_profile["telegram_id"]}">{escape_html(user_profile["first_name"])}</a>'
-            )
-        else:
-            user_link = f"@{user_profile['username']}"
-
-        message_queue = MessageQueue(
-            user_id=partner_profile["telegram_id"],
-            message=f"Пара с {user_profile['first_name']} {user_link} подтверждена. Начинайте тренировку!",
-        )
-        await orator_db.add_message(message_queue)
-
-        # Добавить сообщение с ником и кнопкой написать в телеграм
-
-        message_text = "Привет! Я от @AlexOratorBot"
-        start_dialog_message = quote(message_text)
-
-        if partner_profile["username"] is None or partner_profile["username"] == "":
-            keyboard = {
-                "inline_keyboard": [
-                    [
-                        {
-                            "text": "✉️ Написать в Telegram",
-                            "url": f"tg://user?id={partner_profile['telegram_id']}&text={start_dialog_message}",
-                        },
-                    ]
-                ]
-            }
-        else:
-            keyboard = {
-                "inline_keyboard": [
-                    [
-                        {
-                            "text": "✉️ Написать в Telegram",
-                            "url": f"https://t.me/{partner_profile['username']}?text={start_dialog_message}",
-                        },
-                    ]
-                ]
-            }
-
-        if partner_profile["username"] is None or partner_profile["username"] == "":
-            user_link = f'<a href="tg://user?id={partner_profile["telegram_id"]}">{escape_html(partner_profile["first_name"])}</a>'
-        else:
-            user_link = f"@{partner_profile['username']}"
-
-        message_queue = MessageQueue(
-            user_id=user_profile["telegram_id"],
-            message=f"Вы подтвердили пару с {partner_profile['first_name']} {user_link}. Начинайте тренировку!",
-            keyboard=keyboard,
-        )
-        await orator_db.add_message(message_queue)
-
         return UserPairResponse.from_user_pair(user_pair)
     except HTTPException:
         raise
@@ -160,23 +176,13 @@ async def get_user_pairs(current_user_id: str = Depends(security_service.get_cur
 async def cancel_pair(pair_id: str, current_user_id: str = Depends(security_service.get_current_user_id)):
     """Отменить пару"""
     try:
-        user_pair = await orator_db.cancel_user_pair(pair_id, current_user_id)
+        # Сообщение партнеру пишется в очередь, только если пара отменена этим запросом
+        user_pair = await orator_db.cancel_user_pair(pair_id, current_user_id, messages=pair_cancelled_messages)
         if not user_pair:
             raise HTTPException(
                 status_code=status.HTTP_404_NOT_FOUND, detail="Pair not found or you don't have permission to cancel it"
             )
 
-        # Добавляем сообщение в очередь только если пара была действительно отменена (не была отменена ранее)
-        # Проверяем, что cancelled_at не NULL (пара была только что отменена)
-        if user_pair.get("cancelled_at") is not None:
-            user_profile = await orator_db.get_user_profile(current_user_id)
-            partner_profile = await orator_db.get_user_profile(user_pair["partner_id"])
-            message_queue = MessageQueue(
-                user_id=partner_profile["telegram_id"],
-                message=f"Пара с {user_profile['first_name']} отменена. Попробуйте найти другую пару.",
-            )
-            await orator_db.add_message(message_queue)
-
         return UserPairResponse.from_user_pair(user_pair)
     except HTTPException:
         raise
@@ -2,7 +2,7 @@ from fastapi import APIRouter, Depends, HTTPException, status
 from loguru import logger
 from typing import Optional
 
-from models.orator import WeekRegistrationCreate, WeekRegistrationResponse, WeekInfo
+from models.orator import WeekRegistrationCreate, WeekRegistrationResponse, WeekInfo, RegistrationCreationStatus
 from services.security import security_service
 from services.orator_database import orator_db
 
@@ -15,18 +15,11 @@ async def register_for_week(
 ):
     """Зарегистрироваться на неделю"""
     try:
-        # Проверяем, может ли пользователь регистрироваться
-        can_register = await orator_db.can_user_register_again(current_user_id)
-        if not can_register:
-            raise HTTPException(
-                status_code=status.HTTP_400_BAD_REQUEST,
-                detail="Cannot register again. Please provide feedback for previous sessions first.",
-            )
-
         # Получаем информацию о неделе на основе типа
         week_info = await orator_db.get_week_info(registration.week_type.value)
 
-        week_registration = await orator_db.create_week_registration(
+        # Проверка права на повторную регистрацию, регистрация и темы — один запрос
+        result = await orator_db.create_week_registration(
             user_id=current_user_id,
             week_start=week_info["week_start_date"],
             week_end=week_info["week_end_date"],
@@ -34,10 +27,12 @@ async def register_for_week(
             selected_topics=registration.selected_topics,
         )
 
-        if not week_registration:
+        if result.status == RegistrationCreationStatus.FEEDBACK_REQUIRED:
             raise HTTPException(
-                status_code=status.HTTP_500_INTERNAL_SERVER_ERROR, detail="Failed to create registration"
+                status_code=status.HTTP_400_BAD_REQUEST,
+                detail="Cannot register again. Please provide feedback for previous sessions first.",
             )
+        week_registration = result.registration
 
         return WeekRegistrationResponse.from_week_registration(week_registration)
     except HTTPException:
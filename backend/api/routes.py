@@ -1,5 +1,5 @@
 from fastapi import APIRouter
-from api import auth, health, user_settings, channel_subscribers
+from api import auth, health, metrics, user_settings, channel_subscribers
 from api.orator import router as orator_router
 
 router = APIRouter()
@@ -7,6 +7,7 @@ router = APIRouter()
 # Подключение всех роутеров
 router.include_router(auth.router, prefix="/auth", tags=["Authentication"])
 router.include_router(health.router, prefix="/health", tags=["Health"])
+router.include_router(metrics.router, prefix="/metrics", tags=["Metrics"])
 router.include_router(user_settings.router, prefix="/settings", tags=["User Settings"])
 router.include_router(channel_subscribers.router, prefix="/channels", tags=["Channel Subscribers"])
 
@@ -0,0 +1,193 @@
+"""
+Бенчмарк подбора кандидатов на синтетической нагрузке.
+
+Запускает MatchingService.find_candidates и get_candidate_stats поверх
+in-memory хранилища и печатает p50/p99 задержки, пиковые аллокации на вызов,
+количество запросов к хранилищу на вызов и максимальную задержку event loop
+(насколько опаздывает параллельная задача, просыпающаяся каждую миллисекунду).
+
+Режимы:
+    direct — каждый вызов читает кандидатов из хранилища (без пула и кэша)
+    pool   — кандидаты из in-memory пула недели
+    cached — пул и кэш ранжированных кандидатов
+    suggestions — пул и предрасчитанные кандидаты (время предрасчета недели печатается отдельно)
+    parallel — пул и скоринг шардами в пуле процессов для любого размера недели
+
+Запуск из каталога backend:
+    python -m benchmarks.matching --sizes 1000 10000 100000 --modes direct pool cached
+"""
+
+import argparse
+import asyncio
+import random
+import time
+import tracemalloc
+from datetime import date, timedelta
+from typing import List, Dict, Any, Callable, Awaitable
+
+from loguru import logger
+
+from benchmarks.repository import InMemoryOratorRepository
+from benchmarks.synthetic import generate_dataset
+from services.candidate_cache import CandidateResultCache
+from services.candidate_pool import WeekCandidatePool
+from services.match_suggestions import MatchSuggestionService
+from services.parallel_scoring import ParallelScorer
+from services.matching_service import MatchingService
+from services.topic_dictionary import topic_dictionary
+
+MODES = ("direct", "pool", "cached", "suggestions", "parallel")
+HEARTBEAT_SECONDS = 0.001
+# В настройках пул процессов выключен (MATCHING_PARALLEL_WORKERS=0), режим parallel включает его сам
+PARALLEL_WORKERS = 2
+
+
+def percentile(values: List[float], q: float) -> float:
+    """Перцентиль по методу ближайшего ранга"""
+    ordered = sorted(values)
+    rank = max(int(round(q / 100 * len(ordered) + 0.5)) - 1, 0)
+    return ordered[min(rank, len(ordered) - 1)]
+
+
+def build_service(repository: InMemoryOratorRepository, mode: str) -> MatchingService:
+    candidate_pool = WeekCandidatePool(repository) if mode != "direct" else None
+    result_cache = CandidateResultCache() if mode == "cached" else None
+    suggestions = MatchSuggestionService(candidate_pool) if mode == "suggestions" else None
+    parallel_scorer = ParallelScorer(workers=PARALLEL_WORKERS, min_candidates=0) if mode == "parallel" else None
+    return MatchingService(repository, candidate_pool, result_cache, suggestions, parallel_scorer=parallel_scorer)
+
+
+async def heartbeat(stalls: List[float]):
+    """Просыпаться каждую миллисекунду и записывать опоздание в мс"""
+    while True:
+        started = time.perf_counter()
+        await asyncio.sleep(HEARTBEAT_SECONDS)
+        stalls.append((time.perf_counter() - started - HEARTBEAT_SECONDS) * 1000)
+
+
+async def measure(
+    repository: InMemoryOratorRepository,
+    call: Callable[[Any], Awaitable[Any]],
+    arguments: List[Any],
+    allocation_samples: int,
+    reset: Callable[[], None] = None,
+) -> Dict[str, float]:
+    """Замерить задержку, запросы и пиковые аллокации для серии вызовов"""
+    repository.reset_queries()
+    latencies = []
+    stalls: List[float] = []
+    heartbeat_task = asyncio.create_task(heartbeat(stalls))
+    await asyncio.sleep(0)
+    try:
+        for argument in arguments:
+            started = time.perf_counter()
+            await call(argument)
+            latencies.append((time.perf_counter() - started) * 1000)
+            # Даем heartbeat проснуться между вызовами
+            await asyncio.sleep(HEARTBEAT_SECONDS)
+    finally:
+        heartbeat_task.cancel()
+    queries = repository.query_count / len(arguments)
+
+    # tracemalloc сильно замедляет вызовы, поэтому аллокации меряются отдельным проходом;
+    # reset сбрасывает кэши, чтобы второй проход не обслуживался результатами первого
+    if reset is not None:
+        reset()
+    peaks = []
+    tracemalloc.start()
+    try:
+        for argument in arguments[:allocation_samples]:
+            tracemalloc.reset_peak()
+            baseline = tracemalloc.get_traced_memory()[0]
+            await call(argument)
+            peaks.append(tracemalloc.get_traced_memory()[1] - baseline)
+    finally:
+        tracemalloc.stop()
+
+    return {
+        "p50_ms": percentile(latencies, 50),
+        "p99_ms": percentile(latencies, 99),
+        "peak_kib": max(peaks) / 1024 if peaks else 0.0,
+        "queries": queries,
+        "stall_ms": max(stalls) if stalls else 0.0,
+    }
+
+
+async def run_size(size: int, modes: List[str], requests: int, allocation_samples: int, seed: int) -> List[Dict[str, Any]]:
+    today = date.today()
+    week_start = today - timedelta(days=today.weekday())
+    dataset = generate_dataset(size, seed, week_start)
+    active_users = [
+        registration["user_id"] for registration in dataset.week_registrations if registration["status"] == "active"
+    ]
+    users = random.Random(seed).choices(active_users, k=requests)
+
+    results = []
+    for mode in modes:
+        repository = InMemoryOratorRepository(dataset)
+        await topic_dictionary.refresh(repository)
+        service = build_service(repository, mode)
+        # Прогрев: загрузка настроек, пула недели и кодирование признаков
+        await service.find_candidates(users[0], week_start)
+        await service.get_candidate_stats(week_start)
+        if service.suggestions is not None:
+            started = time.perf_counter()
+            await service.suggestions.refresh_week(week_start)
+            print(f"{size} registrations: suggestions precomputed in {time.perf_counter() - started:.2f}s")
+
+        find = await measure(
+            repository,
+            lambda user_id: service.find_candidates(user_id, week_start),
+            users,
+            allocation_samples,
+            service.result_cache.clear if service.result_cache is not None else None,
+        )
+        results.append({"size": size, "mode": mode, "call": "find_candidates", **find})
+        if service.parallel_scorer is not None:
+            service.parallel_scorer.shutdown()
+
+    repository = InMemoryOratorRepository(dataset)
+    service = build_service(repository, "direct")
+    stats = await measure(
+        repository, lambda _: service.get_candidate_stats(week_start), [None] * requests, allocation_samples
+    )
+    results.append({"size": size, "mode": "direct", "call": "get_candidate_stats", **stats})
+    return results
+
+
+def print_results(results: List[Dict[str, Any]]):
+    header = (
+        f"{'registrations':>13} {'mode':>11} {'call':>20} {'p50 ms':>9} {'p99 ms':>9} {'peak KiB':>10} "
+        f"{'queries':>8} {'stall ms':>9}"
+    )
+    print(header)
+    print("-" * len(header))
+    for row in results:
+        print(
+            f"{row['size']:>13} {row['mode']:>11} {row['call']:>20} {row['p50_ms']:>9.2f} {row['p99_ms']:>9.2f} "
+            f"{row['peak_kib']:>10.1f} {row['queries']:>8.2f} {row['stall_ms']:>9.2f}"
+        )
+
+
+async def run(sizes: List[int], modes: List[str], requests: int, allocation_samples: int, seed: int):
+    logger.disable("services")
+    results = []
+    for size in sizes:
+        results.extend(await run_size(size, modes, requests, allocation_samples, seed))
+    print_results(results)
+    return results
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--sizes", type=int, nargs="+", default=[1000, 10000, 100000])
+    parser.add_argument("--modes", nargs="+", choices=MODES, default=list(MODES))
+    parser.add_argument("--requests", type=int, default=50)
+    parser.add_argument("--allocation-samples", type=int, default=5)
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args()
+    asyncio.run(run(args.sizes, args.modes, args.requests, args.allocation_samples, args.seed))
+
+
+if __name__ == "__main__":
+    main()
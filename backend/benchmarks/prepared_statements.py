@@ -0,0 +1,127 @@
+"""
+Бенчмарк горячих запросов OratorDatabaseService: текст запроса против prepared statements.
+
+Нужна живая база (APP_DATABASE_URL или --dsn) со схемой приложения. Горячие запросы
+реестра orator_statements выполняются параллельно из --concurrency корутин через
+пул из --pool-size соединений в трех режимах:
+
+    text     — текст запроса без кэша statements asyncpg: разбор и планирование на каждый вызов
+    cached   — текст запроса с LRU-кэшем statements asyncpg (поведение до реестра)
+    registry — запросы из StatementRegistry, подготовленные в init-колбэке пула
+
+Печатает пропускную способность и p50/p99 задержки на запрос. Параметры запросов
+берутся из существующих регистраций (или случайные UUID, если данных нет).
+
+Запуск из каталога backend:
+    python -m benchmarks.prepared_statements --requests 20000 --concurrency 32
+"""
+
+import argparse
+import asyncio
+import random
+import time
+from datetime import date
+from typing import List, Dict, Tuple
+from uuid import uuid4
+
+import asyncpg
+
+from benchmarks.matching import percentile
+from config.settings import settings
+from services.orator_database import (
+    orator_statements,
+    CURRENT_REGISTRATION,
+    WEEK_REGISTRATION,
+    USER_TOPICS,
+    USER_PROFILE,
+    USER_PAIRS,
+    BOT_CONTENT,
+    ACTIVE_SETTINGS,
+)
+
+MODES = ("text", "cached", "registry")
+
+
+async def load_arguments(conn: asyncpg.Connection, samples: int) -> List[Tuple[str, tuple]]:
+    """Вызовы горячих запросов с параметрами из существующих регистраций"""
+    rows = await conn.fetch(
+        "SELECT id, user_id, week_start_date FROM week_registrations ORDER BY random() LIMIT $1", samples
+    )
+    if not rows:
+        rows = [{"id": uuid4(), "user_id": uuid4(), "week_start_date": date.today()} for _ in range(samples)]
+    calls = []
+    for row in rows:
+        calls += [
+            (CURRENT_REGISTRATION, (row["user_id"],)),
+            (WEEK_REGISTRATION, (row["user_id"], row["week_start_date"])),
+            (USER_TOPICS, (row["id"],)),
+            (USER_PROFILE, (row["user_id"],)),
+            (USER_PAIRS, (row["user_id"], row["week_start_date"])),
+            (BOT_CONTENT, ("welcome_message", "ru")),
+            (ACTIVE_SETTINGS, ()),
+        ]
+    return calls
+
+
+async def run_mode(dsn: str, mode: str, calls, requests: int, concurrency: int, pool_size: int, seed: int):
+    init = orator_statements.prepare_connection if mode == "registry" else None
+    pool = await asyncpg.create_pool(
+        dsn,
+        min_size=pool_size,
+        max_size=pool_size,
+        statement_cache_size=0 if mode == "text" else settings.db_pool_statement_cache_size,
+        init=init,
+    )
+    rng = random.Random(seed)
+    order = [rng.choice(calls) for _ in range(requests)]
+    latencies: Dict[str, List[float]] = {}
+
+    async def worker(offset: int):
+        for name, args in order[offset::concurrency]:
+            async with pool.acquire() as conn:
+                started = time.perf_counter()
+                if mode == "registry":
+                    await orator_statements.fetch(conn, name, *args)
+                else:
+                    await conn.fetch(orator_statements.query(name), *args)
+                latencies.setdefault(name, []).append((time.perf_counter() - started) * 1000)
+
+    try:
+        started = time.perf_counter()
+        await asyncio.gather(*(worker(offset) for offset in range(concurrency)))
+        elapsed = time.perf_counter() - started
+    finally:
+        await pool.close()
+    return elapsed, latencies
+
+
+async def run(dsn: str, modes: List[str], requests: int, concurrency: int, pool_size: int, seed: int):
+    conn = await asyncpg.connect(dsn)
+    try:
+        calls = await load_arguments(conn, 100)
+    finally:
+        await conn.close()
+
+    print(f"{'mode':<10} {'query':<22} {'p50 ms':>8} {'p99 ms':>8} {'calls':>7}")
+    for mode in modes:
+        elapsed, latencies = await run_mode(dsn, mode, calls, requests, concurrency, pool_size, seed)
+        for name in sorted(latencies):
+            values = latencies[name]
+            print(f"{mode:<10} {name:<22} {percentile(values, 50):8.3f} {percentile(values, 99):8.3f} {len(values):7d}")
+        print(f"{mode:<10} {'throughput':<22} {requests / elapsed:8.0f} req/s\n")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--dsn", default=settings.app_database_url)
+    parser.add_argument("--modes", nargs="+", choices=MODES, default=list(MODES))
+    parser.add_argument("--requests", type=int, default=20000)
+    parser.add_argument("--concurrency", type=int, default=32)
+    parser.add_argument("--pool-size", type=int, default=settings.db_pool_max_size)
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args()
+    asyncio.run(run(args.dsn, args.modes, args.requests, args.concurrency, args.pool_size, args.seed))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,173 @@
+"""
+In-memory замена OratorDatabaseService для бенчмарков.
+
+Реализует методы чтения, которые использует подбор пар, поверх строк
+SyntheticDataset и считает обращения к каждому методу как запросы к базе.
+Индексы строятся один раз, как индексы в Postgres, а сами выборки повторяют SQL.
+"""
+
+from collections import Counter
+from datetime import date
+from typing import List, Dict, Any, Optional
+from uuid import UUID
+
+from benchmarks.synthetic import SyntheticDataset
+from services.matching_metrics import count_round_trip
+from services.settings_cache import SettingsCache
+
+OPEN_PAIR_STATUSES = ("pending", "confirmed")
+
+
+class InMemoryOratorRepository:
+    """Хранилище таблиц подбора пар в памяти со счетчиком запросов"""
+
+    def __init__(self, dataset: SyntheticDataset, settings: Dict[str, str] = None, settings_ttl_seconds: int = 60):
+        self.dataset = dataset
+        self.settings = dict(settings or {"max_candidates_per_request": "3", "max_pairs_per_user": "3"})
+        self.settings_cache = SettingsCache(self._load_active_settings, settings_ttl_seconds)
+        self.queries: Counter = Counter()
+
+        self.users = {str(user["id"]): user for user in dataset.users}
+        self.registrations = {str(registration["id"]): registration for registration in dataset.week_registrations}
+        self.registrations_by_week: Dict[date, List[Dict[str, Any]]] = {}
+        self.registrations_by_user: Dict[tuple, List[Dict[str, Any]]] = {}
+        for registration in dataset.week_registrations:
+            self.registrations_by_week.setdefault(registration["week_start_date"], []).append(registration)
+            key = (str(registration["user_id"]), registration["week_start_date"])
+            self.registrations_by_user.setdefault(key, []).append(registration)
+        self.topics_by_registration: Dict[str, List[str]] = {}
+        for topic in dataset.user_topics:
+            self.topics_by_registration.setdefault(str(topic["week_registration_id"]), []).append(topic["topic_path"])
+
+    @property
+    def query_count(self) -> int:
+        return sum(self.queries.values())
+
+    def reset_queries(self):
+        self.queries.clear()
+
+    def _week_pairs(self, week_start: date) -> List[Dict[str, Any]]:
+        return [
+            pair
+            for pair in self.dataset.user_pairs
+            if self.registrations[str(pair["week_registration_id"])]["week_start_date"] == week_start
+        ]
+
+    @staticmethod
+    def _name(user: Dict[str, Any]) -> str:
+        return f"{user['first_name'] or ''} {user['last_name'] or ''}".strip()
+
+    # Настройки
+    async def _load_active_settings(self) -> Dict[str, str]:
+        self.queries["orator_settings"] += 1
+        count_round_trip()
+        return dict(self.settings)
+
+    async def get_setting(self, key: str, default_value: str = None) -> Optional[str]:
+        return await self.settings_cache.get(key, default_value)
+
+    async def get_setting_int(self, key: str, default_value: int = 0) -> int:
+        return await self.settings_cache.get_int(key, default_value)
+
+    async def get_setting_bool(self, key: str, default_value: bool = False) -> bool:
+        return await self.settings_cache.get_bool(key, default_value)
+
+    # Подбор пар
+    async def get_all_topics(self) -> List[Dict[str, Any]]:
+        self.queries["get_all_topics"] += 1
+        count_round_trip()
+        return [{"topic_id": topic["topic_id"], "name": topic["name"]} for topic in self.dataset.topics]
+
+    async def get_matching_user_info(self, user_id: UUID, week_start: date) -> Optional[Dict[str, Any]]:
+        self.queries["get_matching_user_info"] += 1
+        count_round_trip()
+        user = self.users.get(str(user_id))
+        if user is None:
+            return None
+        registrations = self.registrations_by_user.get((str(user_id), week_start))
+        if not registrations:
+            return None
+        registration = max(registrations, key=lambda registration: registration["status"] == "active")
+        return {
+            "user_id": user_id,
+            "telegram_id": user["telegram_id"],
+            "name": self._name(user),
+            "gender": user["gender"],
+            "total_sessions": user["total_sessions"],
+            "preferred_time_msk": registration["preferred_time_msk"],
+            "preferred_minute_msk": registration["preferred_minute_msk"],
+            "topics": list(self.topics_by_registration.get(str(registration["id"]), [])),
+            "registration_id": registration["id"],
+            "is_active": user["is_active"],
+            "status": registration["status"],
+        }
+
+    async def get_week_candidates(
+        self, week_start: date, exclude_user_id: UUID = None, max_pairs_per_user: int = None
+    ) -> List[Dict[str, Any]]:
+        self.queries["get_week_candidates"] += 1
+        count_round_trip()
+        pair_counts = Counter()
+        excluded = set()
+        for pair in self._week_pairs(week_start):
+            if pair["status"] not in OPEN_PAIR_STATUSES:
+                continue
+            user1_id, user2_id = str(pair["user1_id"]), str(pair["user2_id"])
+            pair_counts[user1_id] += 1
+            pair_counts[user2_id] += 1
+            if exclude_user_id is not None:
+                if user1_id == str(exclude_user_id):
+                    excluded.add(user2_id)
+                elif user2_id == str(exclude_user_id):
+                    excluded.add(user1_id)
+        if exclude_user_id is not None:
+            excluded.add(str(exclude_user_id))
+
+        candidates = []
+        for registration in self.registrations_by_week.get(week_start, []):
+            user_id = str(registration["user_id"])
+            user = self.users[user_id]
+            if registration["status"] != "active" or not user["is_active"] or user_id in excluded:
+                continue
+            if max_pairs_per_user is not None and pair_counts[user_id] >= max_pairs_per_user:
+                continue
+            candidates.append(
+                {
+                    "user_id": user["id"],
+                    "telegram_id": user["telegram_id"],
+                    "name": self._name(user),
+                    "gender": user["gender"],
+                    "total_sessions": user["total_sessions"],
+                    "preferred_time_msk": registration["preferred_time_msk"],
+                    "preferred_minute_msk": registration["preferred_minute_msk"],
+                    "topics": list(self.topics_by_registration.get(str(registration["id"]), [])),
+                    "registration_id": registration["id"],
+                    "open_pairs": pair_counts[user_id],
+                }
+            )
+        return candidates
+
+    async def get_week_open_pairs(self, week_start: date) -> List[Dict[str, Any]]:
+        self.queries["get_week_open_pairs"] += 1
+        count_round_trip()
+        return [
+            {"id": pair["id"], "user1_id": pair["user1_id"], "user2_id": pair["user2_id"]}
+            for pair in self._week_pairs(week_start)
+            if pair["status"] in OPEN_PAIR_STATUSES
+        ]
+
+    async def get_confirmed_pair_history(self) -> List[tuple]:
+        self.queries["get_confirmed_pair_history"] += 1
+        return [(pair["user1_id"], pair["user2_id"]) for pair in self.dataset.user_pairs if pair["status"] == "confirmed"]
+
+    async def get_week_pair_stats(self, week_start: date) -> Dict[str, int]:
+        self.queries["get_week_pair_stats"] += 1
+        count_round_trip()
+        pairs = self._week_pairs(week_start)
+        return {
+            "total_registrations": sum(
+                1 for registration in self.registrations_by_week.get(week_start, []) if registration["status"] == "active"
+            ),
+            "total_pairs": len(pairs),
+            "confirmed_pairs": sum(1 for pair in pairs if pair["status"] == "confirmed"),
+        }
@@ -0,0 +1,127 @@
+"""
+Генератор синтетических данных для бенчмарков подбора пар.
+
+Строки повторяют таблицы users, week_registrations, user_topics и user_pairs,
+темы берутся из реального дерева тем texts/topics.json.
+"""
+
+import json
+import os
+import random
+from datetime import date, timedelta
+from typing import List, Dict, Any, NamedTuple
+from uuid import UUID
+
+TOPICS_FILE = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "texts", "topics.json")
+
+
+class SyntheticDataset(NamedTuple):
+    """Строки таблиц для одной недели"""
+
+    week_start: date
+    topics: List[Dict[str, Any]]
+    users: List[Dict[str, Any]]
+    week_registrations: List[Dict[str, Any]]
+    user_topics: List[Dict[str, Any]]
+    user_pairs: List[Dict[str, Any]]
+
+
+def load_topic_tree(path: str = TOPICS_FILE) -> List[Dict[str, Any]]:
+    """Плоский список тем дерева (topic_id, name, level)"""
+    with open(path, encoding="utf-8") as file:
+        tree = json.load(file)
+
+    topics = []
+
+    def walk(nodes: List[Dict[str, Any]], level: int):
+        for node in nodes:
+            topics.append({"topic_id": node["topic_id"], "name": node["name"], "level": level})
+            walk(node.get("children", []), level + 1)
+
+    walk(tree, 0)
+    return topics
+
+
+def _uuid(rng: random.Random) -> UUID:
+    return UUID(int=rng.getrandbits(128), version=4)
+
+
+def generate_dataset(
+    registrations: int,
+    seed: int = 0,
+    week_start: date = date(2024, 1, 15),
+    pair_ratio: float = 0.3,
+    confirmed_ratio: float = 0.5,
+) -> SyntheticDataset:
+    """Сгенерировать пользователей, регистрации, темы и пары на неделю.
+
+    Бот сохраняет в user_topics topic_id выбранной темы (уровень или задание),
+    поэтому здесь темы тоже хранятся как topic_id. Около 5% регистраций отменены,
+    pair_ratio * registrations пар создается между активными регистрациями.
+    """
+    rng = random.Random(seed)
+    topics = load_topic_tree()
+    selectable = [topic["topic_id"] for topic in topics if topic["level"] > 0]
+    # Вечернее время популярнее, как и в реальных регистрациях
+    hours = list(range(7, 24))
+    hour_weights = [1 if hour < 18 else 3 for hour in hours]
+
+    users = []
+    week_registrations = []
+    user_topics = []
+    for index in range(registrations):
+        user_id = _uuid(rng)
+        users.append(
+            {
+                "id": user_id,
+                "telegram_id": 100000 + index,
+                "username": f"user{index}" if rng.random() < 0.7 else None,
+                "first_name": f"User{index}",
+                "last_name": None if rng.random() < 0.5 else f"Last{index}",
+                "gender": rng.choice(["male", "female", None]),
+                "total_sessions": min(int(rng.expovariate(1 / 4)), 50),
+                "is_active": rng.random() > 0.01,
+            }
+        )
+
+        registration_id = _uuid(rng)
+        hour = rng.choices(hours, hour_weights)[0]
+        minute = rng.choice([0, 30])
+        week_registrations.append(
+            {
+                "id": registration_id,
+                "user_id": user_id,
+                "week_start_date": week_start,
+                "week_end_date": week_start + timedelta(days=6),
+                "preferred_time_msk": f"{hour:02d}:{minute:02d}",
+                "preferred_minute_msk": hour * 60 + minute,
+                "status": "cancelled" if rng.random() < 0.05 else "active",
+            }
+        )
+        for topic_path in rng.sample(selectable, rng.randint(1, 3)):
+            user_topics.append(
+                {
+                    "id": _uuid(rng),
+                    "user_id": user_id,
+                    "week_registration_id": registration_id,
+                    "topic_path": topic_path,
+                }
+            )
+
+    active = [registration for registration in week_registrations if registration["status"] == "active"]
+    user_pairs = []
+    if len(active) >= 2:
+        for _ in range(int(registrations * pair_ratio)):
+            first, second = rng.sample(active, 2)
+            roll = rng.random()
+            user_pairs.append(
+                {
+                    "id": _uuid(rng),
+                    "user1_id": first["user_id"],
+                    "user2_id": second["user_id"],
+                    "week_registration_id": first["id"],
+                    "status": "confirmed" if roll < confirmed_ratio else ("pending" if roll < 0.9 else "cancelled"),
+                }
+            )
+
+    return SyntheticDataset(week_start, topics, users, week_registrations, user_topics, user_pairs)
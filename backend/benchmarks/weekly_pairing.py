@@ -0,0 +1,104 @@
+"""
+Бенчмарк глобального недельного подбора пар на синтетических регистрациях.
+
+Запуск из каталога backend:
+    python -m benchmarks.weekly_pairing --registrations 50000 [--gap-registrations 60]
+
+--gap-registrations дополнительно сравнивает приближенный подбор с точным (blossom)
+на неделях такого размера по --gap-seeds синтетическим наборам. Blossom на чистом
+Python кубический, поэтому размер стоит держать в пределах ~100 регистраций.
+"""
+
+import argparse
+import random
+import sys
+import time
+from typing import List, Dict, Any
+
+import numpy as np
+
+from services.match_scoring import CandidateFeatures
+from services.weekly_pairing import WEIGHT_SCALE, build_candidate_graph, solve_pairing
+
+
+def generate_registrations(count: int, seed: int = 0) -> List[Dict[str, Any]]:
+    """Сгенерировать синтетические регистрации недели"""
+    rng = random.Random(seed)
+    topics = [f"Группа {group} - Уровень {level}" for group in range(8) for level in range(1, 5)]
+    return [
+        {
+            "user_id": index,
+            "gender": rng.choice(["male", "female", None]),
+            "total_sessions": rng.randint(0, 20),
+            "preferred_time_msk": f"{rng.randint(6, 23):02d}:{rng.choice(['00', '15', '30', '45'])}",
+            "topics": rng.sample(topics, rng.randint(1, 4)),
+        }
+        for index in range(count)
+    ]
+
+
+def run(registrations: int, max_pairs_per_user: int, neighbours: int, exact_max_nodes: int, seed: int):
+    candidates = generate_registrations(registrations, seed)
+
+    started = time.perf_counter()
+    features = CandidateFeatures.from_candidates(candidates)
+    encoded = time.perf_counter()
+    capacity = np.full(len(candidates), max_pairs_per_user, dtype=np.int64)
+    graph = build_candidate_graph(features, capacity, neighbours)
+    built = time.perf_counter()
+    plan = solve_pairing(graph, exact_max_nodes)
+    solved = time.perf_counter()
+
+    print(f"registrations:   {registrations}")
+    print(f"edges:           {len(graph.weight)}")
+    print(f"pairs:           {len(plan.pairs)} ({'exact' if plan.exact else 'approximate'})")
+    print(f"mean pair score: {plan.total_weight / WEIGHT_SCALE / max(len(plan.pairs), 1):.4f}")
+    print(f"encode:          {encoded - started:.3f}s")
+    print(f"graph:           {built - encoded:.3f}s")
+    print(f"matching:        {solved - built:.3f}s")
+    print(f"total:           {solved - started:.3f}s")
+
+
+def measure_gap(registrations: int, max_pairs_per_user: int, neighbours: int, seeds: int):
+    """Разрыв приближенного подбора с точным на неделях среднего размера"""
+    gaps = []
+    for seed in range(seeds):
+        candidates = generate_registrations(registrations, seed)
+        features = CandidateFeatures.from_candidates(candidates)
+        capacity = np.full(len(candidates), max_pairs_per_user, dtype=np.int64)
+        graph = build_candidate_graph(features, capacity, neighbours)
+
+        started = time.perf_counter()
+        exact = solve_pairing(graph, exact_max_nodes=sys.maxsize)
+        exact_seconds = time.perf_counter() - started
+        started = time.perf_counter()
+        approximate = solve_pairing(graph, exact_max_nodes=0)
+        approximate_seconds = time.perf_counter() - started
+
+        gap = 1 - approximate.total_weight / exact.total_weight if exact.total_weight else 0.0
+        gaps.append(gap)
+        print(
+            f"gap seed {seed}:      {gap * 100:.2f}% "
+            f"(exact {exact.total_weight / WEIGHT_SCALE:.3f} in {exact_seconds:.2f}s, "
+            f"approximate {approximate.total_weight / WEIGHT_SCALE:.3f} in {approximate_seconds:.3f}s)"
+        )
+    print(f"gap ({registrations} registrations): mean {np.mean(gaps) * 100:.2f}%, max {np.max(gaps) * 100:.2f}%")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--registrations", type=int, default=50000)
+    parser.add_argument("--max-pairs-per-user", type=int, default=3)
+    parser.add_argument("--neighbours", type=int, default=16)
+    parser.add_argument("--exact-max-nodes", type=int, default=1000)
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--gap-registrations", type=int, default=0, help="Размер недели для сравнения с точным")
+    parser.add_argument("--gap-seeds", type=int, default=3)
+    args = parser.parse_args()
+    run(args.registrations, args.max_pairs_per_user, args.neighbours, args.exact_max_nodes, args.seed)
+    if args.gap_registrations:
+        measure_gap(args.gap_registrations, args.max_pairs_per_user, args.neighbours, args.gap_seeds)
+
+
+if __name__ == "__main__":
+    main()
@@ -9,6 +9,13 @@ from config.settings import settings
 from api.routes import router as api_router
 from services.app_database import app_database_service
 from services.orator_database import orator_db
+from services.db_pool import db_pool
+from services.migrations import migration_runner
+from services.candidate_pool import week_candidate_pool
+from services.match_suggestions import match_suggestion_service
+from services.parallel_scoring import parallel_scorer
+from services.pair_history import pair_history_index
+from services.message_queue_retention import message_queue_retention
 
 
 # Настройка логирования
@@ -56,16 +63,44 @@ async def startup_event():
         await app_database_service.connect()
         await orator_db.connect()
 
+        if settings.db_migrate_on_startup:
+            async with db_pool.acquire() as conn:
+                await migration_runner.upgrade(conn)
+
         logger.info("Database connections established")
     except Exception as e:
         logger.error(f"Failed to connect to databases: {e}")
         raise
 
+    # История подтвержденных пар для учета прошлых партнеров при подборе
+    try:
+        await pair_history_index.load(orator_db)
+    except Exception as e:
+        logger.error(f"Failed to load pair history: {e}")
+
+    # Загрузка пула кандидатов для подбора пар
+    try:
+        await week_candidate_pool.start()
+        await match_suggestion_service.start()
+    except Exception as e:
+        logger.error(f"Failed to start week candidate pool: {e}")
+
+    # Партиции очереди сообщений: создание наперед и перенос старых в архив
+    try:
+        await message_queue_retention.start()
+    except Exception as e:
+        logger.error(f"Failed to start message queue retention: {e}")
+
 
 @app.on_event("shutdown")
 async def shutdown_event():
     logger.info("Shutting down CloverdashBot Backend...")
 
+    await message_queue_retention.stop()
+    await match_suggestion_service.stop()
+    await week_candidate_pool.stop()
+    parallel_scorer.shutdown()
+
     # Закрытие подключений к базам данных
     try:
         await app_database_service.disconnect()
@@ -0,0 +1,69 @@
+"""
+Миграции схемы базы (каталог migrations, таблица schema_migrations).
+
+Запуск из каталога backend:
+    python migrate.py upgrade        # применить новые миграции
+    python migrate.py status         # состояние миграций
+    python migrate.py check-plans    # горячие запросы не читают таблицы целиком
+
+check-plans завершается с кодом 1, если план горячего запроса содержит Seq Scan.
+"""
+
+import argparse
+import asyncio
+import sys
+
+import asyncpg
+from loguru import logger
+
+from config.settings import settings
+from services.migrations import migration_runner
+from services.query_plans import check_hot_query_plans
+
+
+async def upgrade(conn: asyncpg.Connection) -> int:
+    """Применить новые миграции"""
+    applied = await migration_runner.upgrade(conn)
+    for migration in applied:
+        logger.info(f"Applied {migration.version:04d}_{migration.name}")
+    logger.success(f"Applied {len(applied)} migrations" if applied else "Schema is up to date")
+    return 0
+
+
+async def status(conn: asyncpg.Connection) -> int:
+    """Вывести состояние миграций"""
+    for migration in await migration_runner.status(conn):
+        logger.info(f"{migration['version']:04d}_{migration['name']}: {migration['state']}")
+    return 0
+
+
+async def check_plans(conn: asyncpg.Connection) -> int:
+    """Проверить планы горячих запросов"""
+    failures = await check_hot_query_plans(conn)
+    for name, relations in failures.items():
+        logger.warning(f"{name}: Seq Scan on {', '.join(relations)}")
+    if failures:
+        logger.error(f"{len(failures)} hot queries fall back to sequential scans")
+        return 1
+    logger.success("All hot queries use indexes")
+    return 0
+
+
+COMMANDS = {"upgrade": upgrade, "status": status, "check-plans": check_plans}
+
+
+async def main(command: str, dsn: str) -> int:
+    """Главная функция"""
+    conn = await asyncpg.connect(dsn)
+    try:
+        return await COMMANDS[command](conn)
+    finally:
+        await conn.close()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("command", choices=list(COMMANDS))
+    parser.add_argument("--dsn", default=settings.app_database_url)
+    args = parser.parse_args()
+    sys.exit(asyncio.run(main(args.command, args.dsn)))
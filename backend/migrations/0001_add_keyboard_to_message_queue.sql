@@ -1,5 +1,5 @@
 -- Миграция: добавление поля keyboard в таблицу message_queue
--- Выполнить: psql -d your_database -f add_keyboard_to_message_queue.sql
+-- Выполнить: python migrate.py upgrade (из каталога backend)
 
 -- Добавляем поле keyboard типа JSONB
 ALTER TABLE message_queue ADD COLUMN IF NOT EXISTS keyboard JSONB DEFAULT '{}';
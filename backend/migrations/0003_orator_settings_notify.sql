@@ -0,0 +1,19 @@
+-- Миграция: уведомление backend об изменении настроек бота
+-- Выполнить: python migrate.py upgrade (из каталога backend)
+--
+-- Backend держит настройки в кэше и слушает канал orator_settings_changed,
+-- поэтому изменения, сделанные в обход API (например, вручную через psql),
+-- применяются сразу, а не по истечении TTL кэша.
+
+CREATE OR REPLACE FUNCTION notify_orator_settings_changed() RETURNS trigger AS $$
+BEGIN
+    PERFORM pg_notify('orator_settings_changed', COALESCE(NEW.key, OLD.key));
+    RETURN NULL;
+END;
+$$ LANGUAGE plpgsql;
+
+DROP TRIGGER IF EXISTS orator_settings_changed ON orator_settings;
+
+CREATE TRIGGER orator_settings_changed
+AFTER INSERT OR UPDATE OR DELETE ON orator_settings
+FOR EACH ROW EXECUTE FUNCTION notify_orator_settings_changed();
@@ -0,0 +1,38 @@
+-- Миграция: время регистрации в минутах от начала дня (МСК)
+-- Выполнить: python migrate.py upgrade (из каталога backend)
+--
+-- Подбор пар сравнивает время числами и читает кандидатов из окна минут по индексу,
+-- не разбирая строки "HH:MM". Триггер заполняет колонку и при записи в обход backend.
+
+ALTER TABLE week_registrations ADD COLUMN IF NOT EXISTS preferred_minute_msk SMALLINT;
+
+CREATE OR REPLACE FUNCTION week_registration_preferred_minute(time_msk TEXT) RETURNS SMALLINT AS $$
+    SELECT CASE
+        WHEN time_msk ~ '^[0-9]{1,2}:[0-9]{2}$'
+        THEN (split_part(time_msk, ':', 1)::int * 60 + split_part(time_msk, ':', 2)::int)::smallint
+    END
+$$ LANGUAGE sql IMMUTABLE;
+
+CREATE OR REPLACE FUNCTION set_week_registration_preferred_minute() RETURNS trigger AS $$
+BEGIN
+    NEW.preferred_minute_msk := week_registration_preferred_minute(NEW.preferred_time_msk);
+    RETURN NEW;
+END;
+$$ LANGUAGE plpgsql;
+
+DROP TRIGGER IF EXISTS week_registrations_preferred_minute ON week_registrations;
+
+CREATE TRIGGER week_registrations_preferred_minute
+BEFORE INSERT OR UPDATE OF preferred_time_msk ON week_registrations
+FOR EACH ROW EXECUTE FUNCTION set_week_registration_preferred_minute();
+
+-- Заполняем минуты для существующих регистраций
+UPDATE week_registrations
+SET preferred_minute_msk = week_registration_preferred_minute(preferred_time_msk)
+WHERE preferred_minute_msk IS NULL
+AND week_registration_preferred_minute(preferred_time_msk) IS NOT NULL;
+
+-- Активные регистрации недели по времени
+CREATE INDEX IF NOT EXISTS idx_week_registrations_week_minute
+ON week_registrations(week_start_date, preferred_minute_msk)
+WHERE status = 'active';
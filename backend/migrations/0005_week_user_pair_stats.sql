@@ -0,0 +1,32 @@
+-- Миграция: счетчики открытых пар пользователей по неделям
+-- Выполнить: python migrate.py upgrade (из каталога backend)
+--
+-- Backend обновляет счетчики в одной транзакции с созданием, отклонением и отменой пары,
+-- поэтому фильтр кандидатов по лимиту пар — сравнение по первичному ключу, а не подсчет
+-- пар недели на каждый запрос. Сверить и пересчитать счетчики: python week_pair_stats.py
+
+CREATE TABLE IF NOT EXISTS week_user_pair_stats (
+    week_start_date DATE NOT NULL,
+    user_id UUID REFERENCES users(id) ON DELETE CASCADE,
+    open_pairs INTEGER NOT NULL DEFAULT 0,
+    updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+    PRIMARY KEY (week_start_date, user_id)
+);
+
+-- Заполняем счетчики по существующим парам (миграция выполняется в одной транзакции)
+LOCK TABLE week_user_pair_stats IN EXCLUSIVE MODE;
+DELETE FROM week_user_pair_stats;
+INSERT INTO week_user_pair_stats (week_start_date, user_id, open_pairs)
+SELECT p.week_start_date, p.user_id, COUNT(*)
+FROM (
+    SELECT wr.week_start_date, up.user1_id AS user_id
+    FROM user_pairs up
+    JOIN week_registrations wr ON up.week_registration_id = wr.id
+    WHERE up.status IN ('pending', 'confirmed')
+    UNION ALL
+    SELECT wr.week_start_date, up.user2_id
+    FROM user_pairs up
+    JOIN week_registrations wr ON up.week_registration_id = wr.id
+    WHERE up.status IN ('pending', 'confirmed')
+) p
+GROUP BY p.week_start_date, p.user_id;
@@ -0,0 +1,71 @@
+-- Миграция: создание пары с проверкой лимита пар в базе
+-- Выполнить: python migrate.py upgrade (из каталога backend)
+--
+-- Функция берет advisory-блокировку на каждого пользователя недели, проверяет
+-- счетчики week_user_pair_stats (см. 0005_week_user_pair_stats.sql) и создает пару
+-- за один вызов. Одновременные нажатия на одного кандидата больше не создают
+-- пар сверх max_pairs_per_user: лишние получают результат capacity_reached.
+
+CREATE OR REPLACE FUNCTION create_user_pair_checked(
+    p_user1_id UUID, p_user2_id UUID, p_registration_id UUID, p_max_pairs INTEGER
+) RETURNS TABLE (result TEXT, pair_id UUID, week_start_date DATE) AS $$
+#variable_conflict use_column
+DECLARE
+    v_week DATE;
+    v_user UUID;
+    v_pair_id UUID;
+BEGIN
+    SELECT wr.week_start_date INTO v_week
+    FROM week_registrations wr
+    WHERE wr.id = p_registration_id AND wr.status = 'active';
+    IF v_week IS NULL THEN
+        RETURN QUERY SELECT 'not_registered'::text, NULL::uuid, NULL::date;
+        RETURN;
+    END IF;
+
+    -- Блокировка на пользователя недели (в порядке user_id, до конца транзакции):
+    -- параллельные создания пар с тем же пользователем проверяют счетчик по очереди
+    FOR v_user IN SELECT DISTINCT u FROM unnest(ARRAY[p_user1_id, p_user2_id]) AS u ORDER BY u LOOP
+        PERFORM pg_advisory_xact_lock(hashtextextended('user_pairs:' || v_week || ':' || v_user, 0));
+    END LOOP;
+
+    IF EXISTS (
+        SELECT 1
+        FROM user_pairs up
+        JOIN week_registrations wr ON up.week_registration_id = wr.id
+        WHERE wr.week_start_date = v_week
+        AND up.status IN ('pending', 'confirmed')
+        AND ((up.user1_id = p_user1_id AND up.user2_id = p_user2_id)
+            OR (up.user1_id = p_user2_id AND up.user2_id = p_user1_id))
+    ) THEN
+        RETURN QUERY SELECT 'already_paired'::text, NULL::uuid, v_week;
+        RETURN;
+    END IF;
+
+    IF EXISTS (
+        SELECT 1
+        FROM week_user_pair_stats ps
+        WHERE ps.week_start_date = v_week
+        AND ps.user_id IN (p_user1_id, p_user2_id)
+        AND ps.open_pairs >= p_max_pairs
+    ) THEN
+        RETURN QUERY SELECT 'capacity_reached'::text, NULL::uuid, v_week;
+        RETURN;
+    END IF;
+
+    INSERT INTO user_pairs (user1_id, user2_id, week_registration_id)
+    VALUES (p_user1_id, p_user2_id, p_registration_id)
+    RETURNING id INTO v_pair_id;
+
+    INSERT INTO week_user_pair_stats (week_start_date, user_id, open_pairs)
+    SELECT v_week, u, 1
+    FROM unnest(ARRAY[p_user1_id, p_user2_id]) AS u
+    ORDER BY u
+    ON CONFLICT (week_start_date, user_id) DO UPDATE
+    SET open_pairs = week_user_pair_stats.open_pairs + 1,
+        updated_at = CURRENT_TIMESTAMP;
+
+    RETURN QUERY SELECT 'created'::text, v_pair_id, v_week;
+END;
+$$ LANGUAGE plpgsql
+;
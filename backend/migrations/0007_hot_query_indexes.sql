@@ -0,0 +1,28 @@
+-- Миграция: индексы под горячие запросы
+-- Выполнить: python migrate.py upgrade (из каталога backend)
+-- migrate: no-transaction
+--
+-- CREATE INDEX CONCURRENTLY не блокирует запись в таблицы, но не работает внутри
+-- транзакции, поэтому миграция выполняется по одному запросу. Если построение
+-- прервалось, Postgres оставляет индекс INVALID: удалите его (DROP INDEX CONCURRENTLY)
+-- и запустите миграцию снова. Проверка планов: python migrate.py check-plans
+
+-- Регистрации недели по статусу (подбор пар, еженедельное распределение)
+CREATE INDEX CONCURRENTLY IF NOT EXISTS idx_week_registrations_week_status
+ON week_registrations(week_start_date, status);
+
+-- Пары регистрации по статусу (открытые пары недели, проверка повторной пары)
+CREATE INDEX CONCURRENTLY IF NOT EXISTS idx_user_pairs_registration_status
+ON user_pairs(week_registration_id, status);
+
+-- Пары, где пользователь — второй участник (user1_id покрывает idx_user_pairs_users)
+CREATE INDEX CONCURRENTLY IF NOT EXISTS idx_user_pairs_user2_id
+ON user_pairs(user2_id);
+
+-- Контент бота по ключу и языку
+CREATE INDEX CONCURRENTLY IF NOT EXISTS idx_bot_content_key_language
+ON bot_content(content_key, language);
+
+-- Неотправленные сообщения в порядке создания (worker/send_worker.py)
+CREATE INDEX CONCURRENTLY IF NOT EXISTS idx_message_queue_sent_created_at
+ON message_queue(sent, created_at);
@@ -0,0 +1,174 @@
+-- Миграция: помесячные партиции message_queue и архив отправленных сообщений
+-- Выполнить: python migrate.py upgrade (из каталога backend)
+--
+-- Очередь секционируется по created_at: каждый месяц — своя партиция
+-- message_queue_YYYY_MM, строки вне созданных месяцев попадают в message_queue_default.
+-- Неотправленные сообщения читаются по частичному индексу (sent = FALSE), поэтому
+-- выборка worker не зависит от объема истории. Фоновая задача backend
+-- (services/message_queue_retention.py) создает партиции наперед и переносит старые
+-- партиции без неотправленных сообщений в message_queue_archive.
+--
+-- Существующая таблица копируется в новую под эксклюзивной блокировкой: на время
+-- миграции запись в очередь ждет.
+
+-- Архив отправленных сообщений (не секционирован, в горячих запросах не участвует)
+CREATE TABLE IF NOT EXISTS message_queue_archive (
+    id UUID PRIMARY KEY,
+    user_id VARCHAR(100) NOT NULL,
+    message TEXT NOT NULL,
+    keyboard JSONB,
+    created_at TIMESTAMP NOT NULL,
+    sent_at TIMESTAMP,
+    archived_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+);
+
+CREATE INDEX IF NOT EXISTS idx_message_queue_archive_user_created
+ON message_queue_archive(user_id, created_at);
+
+-- Несекционированная очередь переименовывается и копируется ниже
+DO $$
+BEGIN
+    IF (SELECT relkind FROM pg_class WHERE oid = to_regclass('message_queue')) = 'r' THEN
+        LOCK TABLE message_queue IN ACCESS EXCLUSIVE MODE;
+        ALTER TABLE message_queue RENAME TO message_queue_unpartitioned;
+        ALTER TABLE message_queue_unpartitioned RENAME CONSTRAINT message_queue_pkey TO message_queue_unpartitioned_pkey;
+    END IF;
+END $$;
+
+-- Индекс (sent, created_at) из 0007 заменяет частичный индекс неотправленных ниже
+DROP INDEX IF EXISTS idx_message_queue_sent_created_at;
+
+CREATE TABLE IF NOT EXISTS message_queue (
+    id UUID NOT NULL DEFAULT gen_random_uuid(),
+    user_id VARCHAR(100) NOT NULL,
+    message TEXT NOT NULL,
+    keyboard JSONB DEFAULT '{}',
+    sent BOOLEAN DEFAULT FALSE,
+    created_at TIMESTAMP NOT NULL DEFAULT CURRENT_TIMESTAMP,
+    sent_at TIMESTAMP,
+    PRIMARY KEY (id, created_at)
+) PARTITION BY RANGE (created_at);
+
+CREATE TABLE IF NOT EXISTS message_queue_default PARTITION OF message_queue DEFAULT;
+
+-- Неотправленные сообщения в порядке создания (worker/send_worker.py)
+CREATE INDEX IF NOT EXISTS idx_message_queue_unsent ON message_queue(created_at) WHERE sent = FALSE;
+-- Последние сообщения (админка)
+CREATE INDEX IF NOT EXISTS idx_message_queue_created_at ON message_queue(created_at);
+
+-- Создать партиции p_months месяцев начиная с месяца p_from; строки этих месяцев
+-- из message_queue_default переносятся в новую партицию. Возвращает число созданных.
+CREATE OR REPLACE FUNCTION message_queue_ensure_partitions(p_from DATE, p_months INTEGER) RETURNS INTEGER AS $$
+DECLARE
+    v_month DATE := date_trunc('month', p_from)::date;
+    v_next DATE;
+    v_name TEXT;
+    v_created INTEGER := 0;
+BEGIN
+    FOR i IN 1..p_months LOOP
+        v_next := (v_month + interval '1 month')::date;
+        v_name := 'message_queue_' || to_char(v_month, 'YYYY_MM');
+        IF to_regclass(v_name) IS NULL THEN
+            EXECUTE format('CREATE TABLE %I (LIKE message_queue INCLUDING DEFAULTS INCLUDING CONSTRAINTS)', v_name);
+            EXECUTE format(
+                'WITH moved AS (DELETE FROM message_queue_default WHERE created_at >= %L AND created_at < %L RETURNING *) '
+                'INSERT INTO %I SELECT * FROM moved',
+                v_month, v_next, v_name
+            );
+            EXECUTE format(
+                'ALTER TABLE message_queue ATTACH PARTITION %I FOR VALUES FROM (%L) TO (%L)', v_name, v_month, v_next
+            );
+            v_created := v_created + 1;
+        END IF;
+        v_month := v_next;
+    END LOOP;
+    RETURN v_created;
+END;
+$$ LANGUAGE plpgsql;
+
+-- Отсоединить самую старую партицию, закончившуюся раньше чем p_keep_months полных
+-- месяцев назад, если в ней нет неотправленных сообщений. Возвращает имя или NULL.
+-- Одна партиция за вызов: блокировка очереди держится только до конца транзакции вызова.
+CREATE OR REPLACE FUNCTION message_queue_detach_old_partition(p_keep_months INTEGER) RETURNS TEXT AS $$
+DECLARE
+    v_cutoff DATE := (date_trunc('month', CURRENT_DATE) - make_interval(months => p_keep_months))::date;
+    v_name TEXT;
+    v_unsent BOOLEAN;
+BEGIN
+    FOR v_name IN
+        SELECT c.relname
+        FROM pg_inherits i
+        JOIN pg_class c ON c.oid = i.inhrelid
+        WHERE i.inhparent = 'message_queue'::regclass
+        AND c.relname ~ '^message_queue_[0-9]{4}_[0-9]{2}$'
+        AND to_date(right(c.relname, 7), 'YYYY_MM') < v_cutoff
+        ORDER BY c.relname
+    LOOP
+        EXECUTE format('SELECT EXISTS (SELECT 1 FROM %I WHERE sent = FALSE)', v_name) INTO v_unsent;
+        IF NOT v_unsent THEN
+            -- Повторная проверка под блокировкой: worker мог не успеть отметить отправку
+            LOCK TABLE message_queue IN ACCESS EXCLUSIVE MODE;
+            EXECUTE format('SELECT EXISTS (SELECT 1 FROM %I WHERE sent = FALSE)', v_name) INTO v_unsent;
+        END IF;
+        IF v_unsent THEN
+            RAISE NOTICE 'Partition % has unsent messages, keeping it', v_name;
+            CONTINUE;
+        END IF;
+        EXECUTE format('ALTER TABLE message_queue DETACH PARTITION %I', v_name);
+        RETURN v_name;
+    END LOOP;
+    RETURN NULL;
+END;
+$$ LANGUAGE plpgsql;
+
+-- Перенести отсоединенные партиции в message_queue_archive и удалить их.
+-- Возвращает число перенесенных партиций.
+CREATE OR REPLACE FUNCTION message_queue_archive_detached() RETURNS INTEGER AS $$
+DECLARE
+    v_name TEXT;
+    v_archived INTEGER := 0;
+BEGIN
+    FOR v_name IN
+        SELECT c.relname
+        FROM pg_class c
+        JOIN pg_namespace n ON n.oid = c.relnamespace
+        WHERE n.nspname = current_schema()
+        AND c.relkind = 'r'
+        AND NOT c.relispartition
+        AND c.relname ~ '^message_queue_[0-9]{4}_[0-9]{2}$'
+        ORDER BY c.relname
+    LOOP
+        EXECUTE format(
+            'INSERT INTO message_queue_archive (id, user_id, message, keyboard, created_at, sent_at) '
+            'SELECT id, user_id, message, keyboard, created_at, sent_at FROM %I ON CONFLICT (id) DO NOTHING',
+            v_name
+        );
+        EXECUTE format('DROP TABLE %I', v_name);
+        v_archived := v_archived + 1;
+    END LOOP;
+    RETURN v_archived;
+END;
+$$ LANGUAGE plpgsql;
+
+-- Переносим сообщения из несекционированной таблицы
+DO $$
+DECLARE
+    v_first DATE;
+BEGIN
+    IF to_regclass('message_queue_unpartitioned') IS NOT NULL THEN
+        SELECT date_trunc('month', COALESCE(MIN(created_at), CURRENT_TIMESTAMP))::date INTO v_first
+        FROM message_queue_unpartitioned;
+        -- Месяцы от самого старого сообщения до текущего и еще два вперед
+        PERFORM message_queue_ensure_partitions(
+            v_first,
+            ((date_part('year', CURRENT_DATE) - date_part('year', v_first)) * 12
+             + date_part('month', CURRENT_DATE) - date_part('month', v_first))::int + 3
+        );
+        INSERT INTO message_queue (id, user_id, message, keyboard, sent, created_at, sent_at)
+        SELECT id, user_id, message, keyboard, COALESCE(sent, FALSE), COALESCE(created_at, CURRENT_TIMESTAMP), sent_at
+        FROM message_queue_unpartitioned;
+        DROP TABLE message_queue_unpartitioned;
+    ELSE
+        PERFORM message_queue_ensure_partitions(CURRENT_DATE, 3);
+    END IF;
+END $$;
@@ -0,0 +1,66 @@
+-- Миграция: уведомление backend об изменении регистраций и пар
+-- Выполнить: python migrate.py upgrade (из каталога backend)
+--
+-- Пул кандидатов недели, кэш ранжирований и индекс истории пар живут в памяти каждого
+-- процесса backend. Процесс, изменивший регистрацию или пару, обновляет их сразу, а
+-- остальные (другие воркеры uvicorn, python weekly_pairing.py) узнают об изменении из
+-- канала orator_matching_changed. Payload — JSON с таблицей, неделей, участниками и статусом.
+
+CREATE OR REPLACE FUNCTION notify_orator_registration_changed() RETURNS trigger AS $$
+DECLARE
+    registration week_registrations%ROWTYPE;
+BEGIN
+    IF TG_OP = 'DELETE' THEN
+        registration := OLD;
+    ELSE
+        registration := NEW;
+    END IF;
+    PERFORM pg_notify(
+        'orator_matching_changed',
+        json_build_object(
+            'table', 'week_registrations',
+            'id', registration.id,
+            'user_id', registration.user_id,
+            'week_start_date', registration.week_start_date,
+            'status', CASE WHEN TG_OP = 'DELETE' THEN 'deleted' ELSE registration.status END
+        )::text
+    );
+    RETURN NULL;
+END;
+$$ LANGUAGE plpgsql;
+
+CREATE OR REPLACE FUNCTION notify_orator_pair_changed() RETURNS trigger AS $$
+DECLARE
+    pair user_pairs%ROWTYPE;
+BEGIN
+    IF TG_OP = 'DELETE' THEN
+        pair := OLD;
+    ELSE
+        pair := NEW;
+    END IF;
+    PERFORM pg_notify(
+        'orator_matching_changed',
+        json_build_object(
+            'table', 'user_pairs',
+            'id', pair.id,
+            'user1_id', pair.user1_id,
+            'user2_id', pair.user2_id,
+            'week_start_date', (SELECT week_start_date FROM week_registrations WHERE id = pair.week_registration_id),
+            'status', CASE WHEN TG_OP = 'DELETE' THEN 'deleted' ELSE pair.status END
+        )::text
+    );
+    RETURN NULL;
+END;
+$$ LANGUAGE plpgsql;
+
+DROP TRIGGER IF EXISTS orator_registration_changed ON week_registrations;
+
+CREATE TRIGGER orator_registration_changed
+AFTER INSERT OR UPDATE OF status OR DELETE ON week_registrations
+FOR EACH ROW EXECUTE FUNCTION notify_orator_registration_changed();
+
+DROP TRIGGER IF EXISTS orator_pair_changed ON user_pairs;
+
+CREATE TRIGGER orator_pair_changed
+AFTER INSERT OR UPDATE OF status OR DELETE ON user_pairs
+FOR EACH ROW EXECUTE FUNCTION notify_orator_pair_changed();
@@ -4,7 +4,15 @@
 from .base import BaseEntity, BaseResponse, PaginationParams, PaginatedResponse
 
 # Enums
-from .enums import Gender, WeekType, RegistrationStatus, PairStatus, FeedbackRating
+from .enums import (
+    Gender,
+    WeekType,
+    RegistrationStatus,
+    RegistrationCreationStatus,
+    PairStatus,
+    PairCreationStatus,
+    FeedbackRating,
+)
 
 # User models
 from .users import UserProfile, UserProfileUpdate, UserStats, User, UserResponse, TokenResponse
@@ -27,7 +35,12 @@ from .feedback import SessionFeedback, SessionFeedbackCreate, SessionFeedbackRes
 from .content import BotContent, BotContentCreate, BotContentUpdate
 
 # Matching models
-from .matching import CandidateInfo, MatchRequest, MatchResponse
+from .matching import (
+    CandidateInfo,
+    MatchRequest,
+    MatchResponse,
+    MatchNextRequest,
+)
 
 # Settings models
 from .settings import OratorSettings, OratorSettingsUpdate, OratorSettingKeys
@@ -31,6 +31,22 @@ class PairStatus(str, Enum):
     CANCELLED = "cancelled"
 
 
+class PairCreationStatus(str, Enum):
+    """Результат создания пары"""
+
+    CREATED = "created"
+    CAPACITY_REACHED = "capacity_reached"
+    ALREADY_PAIRED = "already_paired"
+    NOT_REGISTERED = "not_registered"
+
+
+class RegistrationCreationStatus(str, Enum):
+    """Результат регистрации на неделю"""
+
+    CREATED = "created"
+    FEEDBACK_REQUIRED = "feedback_required"
+
+
 class FeedbackRating(int, Enum):
     """Рейтинг обратной связи"""
 
@@ -1,8 +1,13 @@
-from pydantic import BaseModel
+from pydantic import BaseModel, Field
 from typing import List, Optional
 
 from .enums import Gender
 
+# Границы пагинации подбора: размер страницы и номер страницы ограничены,
+# чтобы один запрос не мог заставить ранжировать всю неделю
+MAX_MATCH_LIMIT = 50
+MAX_MATCH_PAGE = 100
+
 
 class CandidateInfo(BaseModel):
     """Информация о кандидате для подбора пары"""
@@ -20,10 +25,23 @@ class MatchRequest(BaseModel):
     """Запрос на подбор пары"""
 
     week_start_date: str
-    limit: int = 3
+    limit: int = Field(3, ge=1, le=MAX_MATCH_LIMIT)
+    # Номер страницы выдачи: следующие страницы берутся из сохраненного ранжирования
+    page: int = Field(0, ge=0, le=MAX_MATCH_PAGE)
 
 
 class MatchResponse(BaseModel):
     """Ответ с кандидатами для подбора"""
 
     candidates: List[CandidateInfo]
+    # Курсор следующей страницы для /matching/next (None — кандидаты закончились)
+    next_cursor: Optional[str] = None
+
+
+class MatchNextRequest(BaseModel):
+    """Запрос следующей страницы кандидатов по курсору"""
+
+    cursor: str
+    # По умолчанию — limit исходного поиска
+    limit: Optional[int] = Field(None, ge=1, le=MAX_MATCH_LIMIT)
+
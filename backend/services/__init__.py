@@ -7,7 +7,11 @@ from .user_service import UserService
 
 # Orator bot services
 from .orator_database import OratorDatabaseService, orator_db
+from .topic_dictionary import TopicDictionary, topic_dictionary
+from .candidate_pool import WeekCandidatePool, week_candidate_pool
+from .candidate_cache import CandidateResultCache, candidate_result_cache
 from .matching_service import MatchingService, matching_service
+from .weekly_pairing import WeeklyPairingService, weekly_pairing_service
 
 # Service instances
 from .app_database import app_database_service
@@ -1,22 +1,20 @@
-import asyncpg
 from typing import Optional, List
 from loguru import logger
 from datetime import datetime
 
-from config.settings import settings
+from services.db_pool import DatabasePool, db_pool
 from models.orator import User
 from models.user_settings import UserSettings
 
 
 class AppDatabaseService:
     def __init__(self):
-        self.database_url = settings.app_database_url
-        self.pool: Optional[asyncpg.Pool] = None
+        self.pool: Optional[DatabasePool] = None
 
     async def connect(self):
         """Подключение к базе данных"""
         try:
-            self.pool = await asyncpg.create_pool(self.database_url)
+            self.pool = await db_pool.open()
             await self._create_tables()
             logger.info("Connected to application database")
         except Exception as e:
@@ -0,0 +1,125 @@
+"""
+Кэш ранжированных кандидатов по (пользователь, неделя).
+
+Повторные нажатия "🔄 Попробовать снова" и следующие страницы выдачи
+обслуживаются из сохраненного ранжирования без повторного скоринга.
+Записи живут недолго и сбрасываются событиями OratorDatabaseService, если
+меняется регистрация или пары самого пользователя или любого кандидата из списка.
+"""
+
+import time
+from datetime import date
+from typing import List, Dict, Any, Optional, Tuple, Set, NamedTuple
+from uuid import UUID
+
+from loguru import logger
+
+from config.settings import settings
+from services.orator_database import orator_db
+
+
+CacheKey = Tuple[str, date]
+Ranking = List[Tuple[float, Dict[str, Any]]]
+
+
+class CachedRanking(NamedTuple):
+    """Ранжирование кандидатов, сохраненное для пользователя"""
+
+    created_at: float
+    max_pairs_per_user: int
+    # Сколько кандидатов запрашивалось; если их меньше, в ranking попали все кандидаты недели
+    size: int
+    ranking: Ranking
+
+
+class CandidateResultCache:
+    """Кэш ранжированных списков кандидатов с инвалидацией по событиям"""
+
+    def __init__(self, ttl_seconds: int = None, max_entries: int = None):
+        self.ttl_seconds = ttl_seconds if ttl_seconds is not None else settings.candidate_cache_ttl_seconds
+        self.max_entries = max_entries or settings.candidate_cache_max_entries
+        self._entries: Dict[CacheKey, CachedRanking] = {}
+        # (user_id кандидата, неделя) -> ключи записей, в которых он есть
+        self._listed_in: Dict[CacheKey, Set[CacheKey]] = {}
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    def get(self, user_id: UUID, week_start: date, max_pairs_per_user: int, size: int) -> Optional[Ranking]:
+        """Ранжирование из кэша, если оно свежее и содержит не меньше size кандидатов"""
+        key = (str(user_id), week_start)
+        entry = self._entries.get(key)
+        if entry is None:
+            return None
+        if time.monotonic() - entry.created_at >= self.ttl_seconds or entry.max_pairs_per_user != max_pairs_per_user:
+            self._drop(key)
+            return None
+        if size > entry.size and len(entry.ranking) >= entry.size:
+            # Ранжирование обрезано, а запрошено больше кандидатов
+            return None
+        return entry.ranking
+
+    def put(self, user_id: UUID, week_start: date, max_pairs_per_user: int, size: int, ranking: Ranking):
+        """Сохранить ранжирование пользователя"""
+        key = (str(user_id), week_start)
+        self._drop(key)
+        while len(self._entries) >= self.max_entries:
+            # Вытесняем самую старую запись
+            self._drop(next(iter(self._entries)))
+
+        self._entries[key] = CachedRanking(time.monotonic(), max_pairs_per_user, size, ranking)
+        for _, candidate in ranking:
+            self._listed_in.setdefault((str(candidate["user_id"]), week_start), set()).add(key)
+
+    def _drop(self, key: CacheKey):
+        entry = self._entries.pop(key, None)
+        if entry is None:
+            return
+        week_start = key[1]
+        for _, candidate in entry.ranking:
+            listed_key = (str(candidate["user_id"]), week_start)
+            keys = self._listed_in.get(listed_key)
+            if keys is not None:
+                keys.discard(key)
+                if not keys:
+                    del self._listed_in[listed_key]
+
+    def invalidate_user(self, user_id: UUID, week_start: date):
+        """Сбросить запись пользователя и все записи, где он указан кандидатом"""
+        key = (str(user_id), week_start)
+        self._drop(key)
+        for listed_key in list(self._listed_in.get(key, ())):
+            self._drop(listed_key)
+
+    def clear(self):
+        self._entries.clear()
+        self._listed_in.clear()
+
+    # События OratorDatabaseService
+    async def on_registration_created(self, registration: Dict[str, Any]):
+        self.invalidate_user(registration["user_id"], registration["week_start_date"])
+
+    async def on_registration_cancelled(self, user_id: UUID, week_start: date):
+        self.invalidate_user(user_id, week_start)
+
+    async def _on_pair_changed(self, pair: Dict[str, Any]):
+        for user_id in (pair["user1_id"], pair["user2_id"]):
+            self.invalidate_user(user_id, pair["week_start_date"])
+        logger.debug(f"Candidate cache invalidated for pair {pair['id']}")
+
+    async def on_pair_created(self, pair: Dict[str, Any]):
+        await self._on_pair_changed(pair)
+
+    async def on_pair_confirmed(self, pair: Dict[str, Any]):
+        await self._on_pair_changed(pair)
+
+    async def on_pair_cancelled(self, pair: Dict[str, Any]):
+        await self._on_pair_changed(pair)
+
+    async def on_changes_missed(self, db):
+        self.clear()
+
+
+# Создаем экземпляр кэша и подписываем его на изменения в базе
+candidate_result_cache = CandidateResultCache()
+orator_db.add_listener(candidate_result_cache)
@@ -0,0 +1,125 @@
+"""
+Курсоры постраничного просмотра кандидатов.
+
+find_candidates фиксирует порядок показа кандидатов (ранжирование с уже примененной
+случайностью) и выдает курсор. Следующие страницы берутся из этого порядка по смещению:
+без повторного скоринга и без перемешивания между страницами.
+
+Курсор самодостаточный: это JWT (подпись settings.secret_key) с пользователем, неделей,
+параметрами поиска, смещением и id следующего кандидата. Порядок показа кэшируется в
+памяти процесса, выдавшего курсор; другой воркер восстанавливает его из того же
+ранжирования (предрасчет или кэш) и того же seed случайности. Курсор привязан к
+пользователю и живет candidate_cursor_ttl_seconds.
+"""
+
+import secrets
+import time
+from datetime import date, datetime, timedelta
+from typing import List, Dict, Any, Optional, Tuple, NamedTuple
+from uuid import UUID
+
+from jose import JWTError, jwt
+
+from config.settings import settings
+
+
+Ranking = List[Tuple[float, Dict[str, Any]]]
+
+
+class BrowseCursor(NamedTuple):
+    """Параметры поиска и позиция в порядке показа"""
+
+    token: str
+    user_id: str
+    week_start: date
+    max_pairs_per_user: int
+    limit: int
+    # Размер ранжирования, из которого строился порядок показа
+    size: int
+    offset: int = 0
+    # Кандидат на позиции offset: по нему выравнивается восстановленный порядок
+    next_user_id: Optional[str] = None
+
+
+class CandidateCursorStore:
+    """Подпись курсоров и кэш порядков показа, зафиксированных в этом процессе"""
+
+    algorithm = "HS256"
+
+    def __init__(self, ttl_seconds: int = None, max_entries: int = None, secret_key: str = None):
+        self.ttl_seconds = ttl_seconds if ttl_seconds is not None else settings.candidate_cursor_ttl_seconds
+        self.max_entries = max_entries or settings.candidate_cursor_max_entries
+        self.secret_key = secret_key or settings.secret_key
+        # token -> (время создания, порядок показа)
+        self._entries: Dict[str, Tuple[float, Ranking]] = {}
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    def encode(self, cursor: BrowseCursor) -> str:
+        claims = {
+            "k": cursor.token,
+            "u": cursor.user_id,
+            "w": cursor.week_start.isoformat(),
+            "m": cursor.max_pairs_per_user,
+            "l": cursor.limit,
+            "s": cursor.size,
+            "o": cursor.offset,
+            "n": cursor.next_user_id,
+            "exp": datetime.utcnow() + timedelta(seconds=self.ttl_seconds),
+        }
+        return jwt.encode(claims, self.secret_key, algorithm=self.algorithm)
+
+    def decode(self, value: str, user_id: UUID) -> Optional[BrowseCursor]:
+        """Курсор или None, если он поврежден, истек или принадлежит другому пользователю"""
+        try:
+            claims = jwt.decode(value, self.secret_key, algorithms=[self.algorithm])
+            cursor = BrowseCursor(
+                claims["k"],
+                claims["u"],
+                date.fromisoformat(claims["w"]),
+                int(claims["m"]),
+                int(claims["l"]),
+                int(claims["s"]),
+                int(claims["o"]),
+                claims.get("n"),
+            )
+        except (JWTError, KeyError, TypeError, ValueError):
+            return None
+        if cursor.user_id != str(user_id):
+            return None
+        return cursor
+
+    def create(
+        self, user_id: UUID, week_start: date, max_pairs_per_user: int, limit: int, size: int, ranking: Ranking
+    ) -> BrowseCursor:
+        """Сохранить порядок показа и вернуть курсор на его начало"""
+        cursor = BrowseCursor(secrets.token_urlsafe(12), str(user_id), week_start, max_pairs_per_user, limit, size)
+        self.put(cursor, ranking)
+        return cursor
+
+    def put(self, cursor: BrowseCursor, ranking: Ranking):
+        """Сохранить порядок показа курсора (в том числе восстановленный в другом процессе)"""
+        self._entries.pop(cursor.token, None)
+        while len(self._entries) >= self.max_entries:
+            # Вытесняем самую старую запись
+            del self._entries[next(iter(self._entries))]
+        self._entries[cursor.token] = (time.monotonic(), ranking)
+
+    def get(self, cursor: BrowseCursor) -> Optional[Ranking]:
+        """Порядок показа курсора, если он есть в памяти этого процесса и не истек"""
+        entry = self._entries.get(cursor.token)
+        if entry is None:
+            return None
+        created_at, ranking = entry
+        if time.monotonic() - created_at >= self.ttl_seconds:
+            del self._entries[cursor.token]
+            return None
+        return ranking
+
+    def clear(self):
+        self._entries.clear()
+
+
+# Создаем экземпляр хранилища курсоров
+candidate_cursor_store = CandidateCursorStore()
@@ -0,0 +1,343 @@
+"""
+In-memory пул кандидатов для подбора пар по неделям
+"""
+
+import asyncio
+import time
+from collections.abc import Sequence
+from datetime import date, timedelta
+from typing import List, Dict, Any, Optional, Tuple
+from uuid import UUID
+
+import numpy as np
+from loguru import logger
+
+from config.settings import settings
+from services.orator_database import OratorDatabaseService, orator_db
+from services.match_scoring import CandidateFeatures, ScoringBatch
+from services.pair_history import PairHistoryIndex, pair_history_index
+from services.topic_dictionary import topic_dictionary
+
+
+class SelectedRows(Sequence):
+    """Кандидаты выбранных строк снимка без копирования списка (строится за O(1))"""
+
+    def __init__(self, rows: List[Dict[str, Any]], indices: np.ndarray):
+        self._rows = rows
+        self._indices = indices
+
+    def __len__(self) -> int:
+        return len(self._indices)
+
+    def __getitem__(self, position):
+        if isinstance(position, slice):
+            return [self._rows[index] for index in self._indices[position].tolist()]
+        return self._rows[int(self._indices[position])]
+
+
+class WeekCandidates:
+    """Снимок активных регистраций и открытых пар одной недели"""
+
+    def __init__(self, week_start: date, pair_history: Optional[PairHistoryIndex] = None):
+        self.week_start = week_start
+        # Индекс истории пар, которым кодируются id кандидатов в признаках
+        self.pair_history = pair_history
+        # user_id -> кандидат (регистрация, профиль и темы)
+        self.candidates: Dict[str, Dict[str, Any]] = {}
+        # pair_id -> (user1_id, user2_id) для пар в статусе pending/confirmed
+        self.open_pairs: Dict[str, Tuple[str, str]] = {}
+        # user_id -> количество открытых пар
+        self.pair_counts: Dict[str, int] = {}
+        # user_id -> {partner_id: количество открытых пар с партнером}
+        self.partners: Dict[str, Dict[str, int]] = {}
+        self.loaded_at = time.monotonic()
+        # Растет при каждом изменении состава кандидатов
+        self.version = 0
+        # Закодированные признаки кандидатов, строятся лениво при первом скоринге
+        self._rows: Optional[List[Dict[str, Any]]] = None
+        self._features: Optional[CandidateFeatures] = None
+        # user_id -> строка features и счетчики открытых пар по строкам для фильтра без обхода кандидатов
+        self._row_index: Dict[str, int] = {}
+        self._row_pair_counts: Optional[np.ndarray] = None
+
+    def upsert_candidate(self, candidate: Dict[str, Any]):
+        """Добавить или заменить регистрацию пользователя"""
+        self.candidates[str(candidate["user_id"])] = candidate
+        self._features = None
+        self.version += 1
+
+    def remove_candidate(self, user_id: str):
+        """Убрать регистрацию пользователя"""
+        if self.candidates.pop(user_id, None) is not None:
+            self._features = None
+            self.version += 1
+
+    def open_pair(self, pair_id: str, user1_id: str, user2_id: str):
+        """Учесть открытую пару (идемпотентно по pair_id)"""
+        if pair_id in self.open_pairs:
+            return
+        self.open_pairs[pair_id] = (user1_id, user2_id)
+        for user_id, partner_id in ((user1_id, user2_id), (user2_id, user1_id)):
+            self.pair_counts[user_id] = self.pair_counts.get(user_id, 0) + 1
+            self._shift_row_pair_count(user_id, 1)
+            partners = self.partners.setdefault(user_id, {})
+            partners[partner_id] = partners.get(partner_id, 0) + 1
+
+    def close_pair(self, pair_id: str):
+        """Убрать пару из открытых (идемпотентно по pair_id)"""
+        users = self.open_pairs.pop(pair_id, None)
+        if users is None:
+            return
+        user1_id, user2_id = users
+        for user_id, partner_id in ((user1_id, user2_id), (user2_id, user1_id)):
+            self.pair_counts[user_id] -= 1
+            self._shift_row_pair_count(user_id, -1)
+            if self.pair_counts[user_id] <= 0:
+                del self.pair_counts[user_id]
+            partners = self.partners[user_id]
+            partners[partner_id] -= 1
+            if partners[partner_id] <= 0:
+                del partners[partner_id]
+            if not partners:
+                del self.partners[user_id]
+
+    def _shift_row_pair_count(self, user_id: str, delta: int):
+        if self._features is None:
+            return
+        row = self._row_index.get(user_id)
+        if row is not None:
+            self._row_pair_counts[row] += delta
+
+    def is_available(self, candidate_id: str, for_user_id: str, max_pairs_per_user: int) -> bool:
+        """Регистрация кандидата активна, у него есть свободные пары и нет открытой пары с for_user_id"""
+        return (
+            candidate_id in self.candidates
+            and candidate_id not in self.partners.get(for_user_id, {})
+            and self.pair_counts.get(candidate_id, 0) < max_pairs_per_user
+        )
+
+    def _select(self, rows: List[Dict[str, Any]], exclude_user_id: str, max_pairs_per_user: int) -> List[int]:
+        excluded_partners = self.partners.get(exclude_user_id, {}) if exclude_user_id else {}
+        selected = []
+        for index, candidate in enumerate(rows):
+            user_id = str(candidate["user_id"])
+            if user_id == exclude_user_id or user_id in excluded_partners:
+                continue
+            open_pairs = self.pair_counts.get(user_id, 0)
+            if max_pairs_per_user is not None and open_pairs >= max_pairs_per_user:
+                continue
+            candidate["open_pairs"] = open_pairs
+            selected.append(index)
+        return selected
+
+    def get_candidates(self, exclude_user_id: str = None, max_pairs_per_user: int = None) -> List[Dict[str, Any]]:
+        """Кандидаты недели с теми же фильтрами, что и в OratorDatabaseService.get_week_candidates"""
+        rows = list(self.candidates.values())
+        return [rows[index] for index in self._select(rows, exclude_user_id, max_pairs_per_user)]
+
+    def get_scoring_batch(self, exclude_user_id: str = None, max_pairs_per_user: int = None) -> ScoringBatch:
+        """Кандидаты недели вместе с закодированными признаками для пакетного скоринга"""
+        if self._features is None:
+            self._rows = list(self.candidates.values())
+            self._features = CandidateFeatures.from_candidates(self._rows, history=self.pair_history)
+            self._row_index = {str(candidate["user_id"]): row for row, candidate in enumerate(self._rows)}
+            self._row_pair_counts = np.array(
+                [self.pair_counts.get(user_id, 0) for user_id in self._row_index], dtype=np.int64
+            )
+
+        # Фильтр — сравнение счетчиков по строкам и исключение строк пользователя и его партнеров.
+        # open_pairs в словарях кандидатов здесь не обновляется: скоринг его не использует
+        if max_pairs_per_user is None:
+            mask = np.ones(len(self._rows), dtype=bool)
+        else:
+            mask = self._row_pair_counts < max_pairs_per_user
+        if exclude_user_id:
+            for user_id in (exclude_user_id, *self.partners.get(exclude_user_id, {})):
+                row = self._row_index.get(user_id)
+                if row is not None:
+                    mask[row] = False
+        selected = np.flatnonzero(mask)
+        return ScoringBatch(SelectedRows(self._rows, selected), self._features, selected)
+
+
+class WeekCandidatePool:
+    """Пул кандидатов текущей и следующей недели.
+
+    Снимок загружается из базы один раз, затем обновляется инкрементально по событиям
+    OratorDatabaseService (регистрации и пары) и периодически пересинхронизируется, чтобы
+    подхватить изменения, сделанные в обход backend (например, из админки).
+    """
+
+    def __init__(
+        self, db: OratorDatabaseService, resync_seconds: int = None, pair_history: Optional[PairHistoryIndex] = None
+    ):
+        self.db = db
+        self.pair_history = pair_history
+        self.resync_seconds = resync_seconds or settings.candidate_pool_resync_seconds
+        self._weeks: Dict[date, WeekCandidates] = {}
+        self._load_locks: Dict[date, asyncio.Lock] = {}
+        # Журналы событий, пришедших во время перезагрузки недели
+        self._journals: Dict[date, List[Tuple[str, tuple]]] = {}
+        self._resync_task: Optional[asyncio.Task] = None
+
+    # Жизненный цикл
+    async def start(self):
+        """Загрузить текущую и следующую недели и запустить периодическую пересинхронизацию"""
+        if self._resync_task is None:
+            self._resync_task = asyncio.create_task(self._resync_loop())
+        await self._refresh_topics()
+        for week_start in self._tracked_weeks():
+            await self.reload_week(week_start)
+        logger.info(f"Week candidate pool started for weeks {sorted(self._weeks)}")
+
+    async def stop(self):
+        """Остановить периодическую пересинхронизацию"""
+        if self._resync_task:
+            self._resync_task.cancel()
+            try:
+                await self._resync_task
+            except asyncio.CancelledError:
+                pass
+            self._resync_task = None
+
+    async def _resync_loop(self):
+        while True:
+            await asyncio.sleep(self.resync_seconds)
+            try:
+                await self.resync()
+            except Exception as e:
+                logger.error(f"Week candidate pool resync failed: {e}")
+
+    async def resync(self):
+        """Полностью перезагрузить отслеживаемые недели и забыть прошедшие"""
+        await self._refresh_topics()
+        for week_start in list(self._weeks):
+            if self._is_past(week_start):
+                del self._weeks[week_start]
+                self._load_locks.pop(week_start, None)
+        for week_start in sorted(set(self._tracked_weeks()) | set(self._weeks)):
+            await self.reload_week(week_start)
+
+    async def _refresh_topics(self):
+        # Темы, которых нет в словаре, все равно получат id при кодировании,
+        # поэтому ошибка загрузки словаря не мешает подбору
+        try:
+            await topic_dictionary.refresh(self.db)
+        except Exception as e:
+            logger.error(f"Error refreshing topic dictionary: {e}")
+
+    def _current_week(self) -> date:
+        today = date.today()
+        return today - timedelta(days=today.weekday())
+
+    def _tracked_weeks(self) -> List[date]:
+        current_week = self._current_week()
+        return [current_week, current_week + timedelta(days=7)]
+
+    def _is_past(self, week_start: date) -> bool:
+        return week_start < self._current_week()
+
+    # Загрузка
+    async def _load_week(self, week_start: date) -> WeekCandidates:
+        week = WeekCandidates(week_start, self.pair_history)
+        for candidate in await self.db.get_week_candidates(week_start):
+            week.upsert_candidate(candidate)
+        for pair in await self.db.get_week_open_pairs(week_start):
+            week.open_pair(str(pair["id"]), str(pair["user1_id"]), str(pair["user2_id"]))
+        return week
+
+    async def reload_week(self, week_start: date) -> WeekCandidates:
+        """Перезагрузить неделю из базы, не теряя событий, пришедших во время загрузки"""
+        lock = self._load_locks.setdefault(week_start, asyncio.Lock())
+        async with lock:
+            self._journals[week_start] = []
+            try:
+                week = await self._load_week(week_start)
+                # События идемпотентны, поэтому повторное применение безопасно
+                for event, args in self._journals[week_start]:
+                    getattr(week, event)(*args)
+            finally:
+                del self._journals[week_start]
+            # Прошедшие недели не кэшируем
+            if not self._is_past(week_start):
+                self._weeks[week_start] = week
+            return week
+
+    async def get_week(self, week_start: date) -> WeekCandidates:
+        """Получить снимок недели, загрузив его при первом обращении"""
+        week = self._weeks.get(week_start)
+        if week is not None:
+            return week
+
+        lock = self._load_locks.setdefault(week_start, asyncio.Lock())
+        if lock.locked():
+            # Неделя уже загружается другим запросом — дожидаемся его
+            async with lock:
+                pass
+            week = self._weeks.get(week_start)
+            if week is not None:
+                return week
+        return await self.reload_week(week_start)
+
+    # Чтение
+    async def get_user_info(self, user_id: UUID, week_start: date) -> Optional[Dict[str, Any]]:
+        """Данные активной регистрации пользователя на неделю"""
+        week = await self.get_week(week_start)
+        return week.candidates.get(str(user_id))
+
+    async def get_candidates(
+        self, week_start: date, exclude_user_id: UUID = None, max_pairs_per_user: int = None
+    ) -> List[Dict[str, Any]]:
+        """Кандидаты недели без обращения к базе"""
+        week = await self.get_week(week_start)
+        return week.get_candidates(str(exclude_user_id) if exclude_user_id else None, max_pairs_per_user)
+
+    async def get_scoring_batch(
+        self, week_start: date, exclude_user_id: UUID = None, max_pairs_per_user: int = None
+    ) -> ScoringBatch:
+        """Кандидаты недели с признаками, закодированными один раз на снимок"""
+        week = await self.get_week(week_start)
+        return week.get_scoring_batch(str(exclude_user_id) if exclude_user_id else None, max_pairs_per_user)
+
+    # Инкрементальные обновления
+    def _apply(self, week_start: date, event: str, *args):
+        week = self._weeks.get(week_start)
+        if week is not None:
+            getattr(week, event)(*args)
+        journal = self._journals.get(week_start)
+        if journal is not None:
+            journal.append((event, args))
+
+    def _is_tracked(self, week_start: date) -> bool:
+        return week_start in self._weeks or week_start in self._journals
+
+    async def on_registration_created(self, registration: Dict[str, Any]):
+        week_start = registration["week_start_date"]
+        if not self._is_tracked(week_start):
+            return
+        week = self._weeks.get(week_start)
+        current = week.candidates.get(str(registration["user_id"])) if week is not None else None
+        if current is not None and str(current["registration_id"]) == str(registration["id"]):
+            # Та же регистрация уже в пуле (событие пришло повторно через уведомление базы)
+            return
+        # Профиль пользователя нужен для скоринга, поэтому догружаем его одним запросом
+        candidate = await self.db.get_matching_user_info(registration["user_id"], week_start)
+        if candidate and candidate["is_active"] and candidate["status"] == "active":
+            self._apply(week_start, "upsert_candidate", candidate)
+
+    async def on_registration_cancelled(self, user_id: UUID, week_start: date):
+        self._apply(week_start, "remove_candidate", str(user_id))
+
+    async def on_pair_created(self, pair: Dict[str, Any]):
+        self._apply(pair["week_start_date"], "open_pair", str(pair["id"]), str(pair["user1_id"]), str(pair["user2_id"]))
+
+    async def on_pair_cancelled(self, pair: Dict[str, Any]):
+        self._apply(pair["week_start_date"], "close_pair", str(pair["id"]))
+
+    async def on_changes_missed(self, db: OratorDatabaseService):
+        await self.resync()
+
+
+# Создаем экземпляр пула и подписываем его на изменения в базе
+week_candidate_pool = WeekCandidatePool(orator_db, pair_history=pair_history_index)
+orator_db.add_listener(week_candidate_pool)
@@ -0,0 +1,145 @@
+"""
+Уведомления Postgres (LISTEN/NOTIFY) на выделенном соединении.
+
+Соединение открывается через asyncpg.connect вне общего пула, поэтому не занимает
+соединение, нужное запросам. Если оно обрывается (termination listener asyncpg или
+неудачная периодическая проверка), слушатель переподключается и вызывает колбэки
+on_reconnect подписчиков: уведомления, пришедшие без соединения, потеряны, и
+подписчики сбрасывают свои кэши.
+"""
+
+import asyncio
+from typing import List, Dict, Optional, Callable, Awaitable
+
+import asyncpg
+from loguru import logger
+
+from config.settings import settings
+
+
+NotificationHandler = Callable[[str], None]
+
+
+class DatabaseNotificationListener:
+    """LISTEN на нескольких каналах через одно выделенное соединение с переподключением"""
+
+    def __init__(
+        self,
+        database_url: str = None,
+        check_seconds: float = None,
+        connect: Callable[[], Awaitable[asyncpg.Connection]] = None,
+    ):
+        self.database_url = database_url or settings.app_database_url
+        self.check_seconds = check_seconds or settings.db_listen_check_seconds
+        self._connect_fn = connect or self._open_connection
+        # channel -> обработчики payload
+        self._handlers: Dict[str, List[NotificationHandler]] = {}
+        self._reconnect_handlers: List[Callable[[], None]] = []
+        self._conn: Optional[asyncpg.Connection] = None
+        # Были периоды без соединения — уведомления могли потеряться
+        self._missed = False
+        self._lost = asyncio.Event()
+        self._task: Optional[asyncio.Task] = None
+
+    def subscribe(self, channel: str, handler: NotificationHandler, on_reconnect: Callable[[], None] = None):
+        """Подписаться на канал (до start); on_reconnect вызывается после каждого переподключения"""
+        self._handlers.setdefault(channel, []).append(handler)
+        if on_reconnect is not None:
+            self._reconnect_handlers.append(on_reconnect)
+
+    @property
+    def connected(self) -> bool:
+        return self._conn is not None and not self._conn.is_closed()
+
+    # Жизненный цикл
+    async def start(self):
+        """Подключиться и запустить проверку соединения (ошибка подключения не мешает старту)"""
+        if self._task is not None or not self._handlers:
+            return
+        await self._ensure_connected()
+        self._task = asyncio.create_task(self._supervise())
+
+    async def stop(self):
+        """Остановить проверку и закрыть соединение"""
+        if self._task:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+        await self._drop_connection()
+
+    async def _open_connection(self) -> asyncpg.Connection:
+        return await asyncpg.connect(self.database_url, server_settings=settings.db_pool_server_settings)
+
+    async def _ensure_connected(self):
+        if self.connected:
+            return
+        conn = None
+        try:
+            conn = await self._connect_fn()
+            for channel in self._handlers:
+                await conn.add_listener(channel, self._dispatch)
+            conn.add_termination_listener(self._on_terminated)
+        except Exception as e:
+            # Пока соединения нет, кэши обновляются только по TTL
+            logger.error(f"Failed to listen for database notifications: {e}")
+            self._missed = True
+            if conn is not None:
+                conn.terminate()
+            return
+
+        self._conn = conn
+        logger.info(f"Listening for database notifications on {', '.join(self._handlers)}")
+        if self._missed:
+            self._missed = False
+            for handler in self._reconnect_handlers:
+                try:
+                    handler()
+                except Exception as e:
+                    logger.error(f"Reconnect handler failed: {e}")
+
+    async def _drop_connection(self):
+        conn, self._conn = self._conn, None
+        if conn is None:
+            return
+        try:
+            conn.remove_termination_listener(self._on_terminated)
+            await conn.close(timeout=5)
+        except Exception as e:
+            logger.error(f"Failed to close notification connection: {e}")
+
+    async def _supervise(self):
+        while True:
+            try:
+                await asyncio.wait_for(self._lost.wait(), self.check_seconds)
+            except asyncio.TimeoutError:
+                pass
+            self._lost.clear()
+            if self.connected:
+                try:
+                    # Обрыв без FIN (например, сетевой) termination listener не замечает
+                    await self._conn.fetchval("SELECT 1", timeout=self.check_seconds)
+                    continue
+                except Exception as e:
+                    logger.warning(f"Notification connection check failed: {e}")
+            else:
+                logger.warning("Notification connection lost, reconnecting")
+            self._missed = True
+            await self._drop_connection()
+            await self._ensure_connected()
+
+    def _on_terminated(self, connection: asyncpg.Connection):
+        self._lost.set()
+
+    def _dispatch(self, connection: asyncpg.Connection, pid: int, channel: str, payload: str):
+        for handler in self._handlers.get(channel, ()):
+            try:
+                handler(payload)
+            except Exception as e:
+                logger.error(f"Notification handler for {channel} failed: {e}")
+
+
+# Создаем общий слушатель уведомлений (запускается в OratorDatabaseService.connect)
+db_notifications = DatabaseNotificationListener()
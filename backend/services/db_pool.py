@@ -0,0 +1,158 @@
+"""
+Общий пул соединений asyncpg для app_database_service и orator_db.
+
+Оба сервиса работают с одной базой (app_database_url), поэтому держат один пул:
+размер, время жизни простаивающих соединений, кэш prepared statements, таймаут
+команд и серверные настройки задаются в config/settings.py (db_pool_*). Пул
+открывается первым сервисом и закрывается последним (счетчик пользователей).
+
+acquire() замеряет ожидание свободного соединения: время пишется в гистограмму
+Prometheus, а текущая загрузка пула (занято, свободно, ожидающих) отдается в
+/api/v1/health/info через metrics().
+"""
+
+import asyncio
+import time
+from typing import List, Dict, Any, Optional, Callable, Awaitable
+
+import asyncpg
+from loguru import logger
+from prometheus_client import Histogram
+
+from config.settings import settings
+
+ACQUIRE_SECONDS = Histogram(
+    "orator_db_pool_acquire_seconds",
+    "Время ожидания соединения из пула базы",
+    buckets=(0.0001, 0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0),
+)
+
+
+class _AcquireContext:
+    """Замер ожидания соединения; поддерживает и async with, и await, как в asyncpg"""
+
+    def __init__(self, owner: "DatabasePool", timeout: Optional[float]):
+        self.owner = owner
+        self.timeout = timeout
+        self.connection: Optional[asyncpg.Connection] = None
+
+    async def _acquire(self) -> asyncpg.Connection:
+        owner = self.owner
+        if owner.pool is None:
+            raise RuntimeError("Database pool is not open")
+        owner.waiters += 1
+        started = time.perf_counter()
+        try:
+            return await owner.pool.acquire(timeout=self.timeout)
+        finally:
+            owner.waiters -= 1
+            owner._observe_acquire(time.perf_counter() - started)
+
+    def __await__(self):
+        return self._acquire().__await__()
+
+    async def __aenter__(self) -> asyncpg.Connection:
+        self.connection = await self._acquire()
+        return self.connection
+
+    async def __aexit__(self, exc_type, exc, tb):
+        connection, self.connection = self.connection, None
+        await self.owner.pool.release(connection)
+
+
+class DatabasePool:
+    """Пул соединений asyncpg, общий для сервисов приложения"""
+
+    def __init__(self, database_url: str = None):
+        self.database_url = database_url or settings.app_database_url
+        self.pool: Optional[asyncpg.Pool] = None
+        self._users = 0
+        self._lock = asyncio.Lock()
+        # Колбэки, которые выполняются для каждого нового соединения пула
+        self._connection_inits: List[Callable[[asyncpg.Connection], Awaitable[None]]] = []
+        # Текущее количество корутин, ждущих соединения
+        self.waiters = 0
+        self.acquire_count = 0
+        self.acquire_seconds_total = 0.0
+        self.acquire_seconds_max = 0.0
+
+    def add_connection_init(self, callback: Callable[[asyncpg.Connection], Awaitable[None]]):
+        """Выполнять callback(conn) для каждого нового соединения (повторная регистрация игнорируется)"""
+        if callback not in self._connection_inits:
+            self._connection_inits.append(callback)
+
+    async def _init_connection(self, conn: asyncpg.Connection):
+        for callback in self._connection_inits:
+            await callback(conn)
+
+    async def open(self) -> "DatabasePool":
+        """Открыть пул (или подключиться к уже открытому)"""
+        async with self._lock:
+            if self.pool is None:
+                self.pool = await asyncpg.create_pool(
+                    self.database_url,
+                    min_size=settings.db_pool_min_size,
+                    max_size=settings.db_pool_max_size,
+                    max_inactive_connection_lifetime=settings.db_pool_max_inactive_connection_lifetime,
+                    statement_cache_size=settings.db_pool_statement_cache_size,
+                    command_timeout=settings.db_pool_command_timeout,
+                    server_settings=settings.db_pool_server_settings,
+                    init=self._init_connection,
+                )
+                logger.info(
+                    f"Database pool opened: {settings.db_pool_min_size}-{settings.db_pool_max_size} connections"
+                )
+            self._users += 1
+            return self
+
+    async def close(self):
+        """Отключиться от пула; последний пользователь закрывает соединения"""
+        async with self._lock:
+            if self.pool is None:
+                return
+            self._users = max(self._users - 1, 0)
+            if self._users == 0:
+                await self.pool.close()
+                self.pool = None
+                logger.info("Database pool closed")
+
+    def acquire(self, timeout: float = None) -> _AcquireContext:
+        """Взять соединение из пула: async with pool.acquire() as conn или conn = await pool.acquire()"""
+        return _AcquireContext(self, timeout)
+
+    async def release(self, connection: asyncpg.Connection):
+        """Вернуть соединение, полученное через await acquire()"""
+        await self.pool.release(connection)
+
+    def _observe_acquire(self, seconds: float):
+        self.acquire_count += 1
+        self.acquire_seconds_total += seconds
+        self.acquire_seconds_max = max(self.acquire_seconds_max, seconds)
+        ACQUIRE_SECONDS.observe(seconds)
+
+    def metrics(self) -> Dict[str, Any]:
+        """Текущая загрузка пула и статистика ожидания соединений"""
+        info: Dict[str, Any] = {
+            "open": self.pool is not None,
+            "waiters": self.waiters,
+            "acquire_count": self.acquire_count,
+            "acquire_avg_ms": (
+                round(self.acquire_seconds_total / self.acquire_count * 1000, 3) if self.acquire_count else 0.0
+            ),
+            "acquire_max_ms": round(self.acquire_seconds_max * 1000, 3),
+        }
+        if self.pool is not None:
+            size = self.pool.get_size()
+            idle = self.pool.get_idle_size()
+            info.update(
+                size=size,
+                idle=idle,
+                in_use=size - idle,
+                min_size=self.pool.get_min_size(),
+                max_size=self.pool.get_max_size(),
+            )
+        return info
+
+
+# Создаем общий экземпляр пула
+db_pool = DatabasePool()
@@ -0,0 +1,488 @@
+"""
+Пакетный (векторизованный) расчет score совместимости кандидатов.
+
+Формулы повторяют скалярную реализацию MatchingService._calculate_match_score
+операция в операцию, поэтому результаты совпадают с точностью до бита.
+"""
+
+import heapq
+from functools import lru_cache
+from operator import itemgetter
+from typing import List, Dict, Any, Optional, Sequence, Tuple, NamedTuple
+
+import numpy as np
+
+from config.settings import settings
+from services.matching_metrics import MatchingTrace
+from services.pair_history import PairHistoryIndex, pair_history_index
+from services.topic_dictionary import (
+    TopicDictionary,
+    topic_dictionary,
+    mask_to_words,
+    masks_to_words,
+    popcount_rows,
+)
+
+
+def parse_time_minutes(time_str: Any) -> Optional[int]:
+    """Перевести время "HH:MM" в минуты от начала дня (None, если время не разбирается)"""
+    try:
+        hours, minutes = map(int, time_str.split(":"))
+        return hours * 60 + minutes
+    except Exception:
+        return None
+
+
+def candidate_minutes(candidate: Dict[str, Any]) -> Optional[int]:
+    """Время регистрации в минутах: из preferred_minute_msk, если оно есть, иначе разбором строки"""
+    minutes = candidate.get("preferred_minute_msk")
+    if minutes is not None:
+        return int(minutes)
+    return parse_time_minutes(candidate["preferred_time_msk"])
+
+
+# Пороги разницы во времени (в минутах) и score времени внутри порога
+TIME_TIERS = ((30, 1.0), (120, 0.7), (240, 0.4))
+# Score времени за порогами и при неразбираемом времени
+FAR_TIME_SCORE = 0.1
+NEUTRAL_TIME_SCORE = 0.5
+
+
+def _gender_key(gender: Any) -> Any:
+    # Enum и строка с тем же значением должны давать один код
+    return getattr(gender, "value", gender)
+
+
+class CandidateFeatures:
+    """Признаки кандидатов, закодированные в массивы для пакетного скоринга.
+
+    Темы и родительские группы хранятся как битовые маски по id из TopicDictionary,
+    разбитые на 64-битные слова, пользователи — компактными id из PairHistoryIndex.
+    """
+
+    def __init__(
+        self,
+        minutes: np.ndarray,
+        time_valid: np.ndarray,
+        total_sessions: np.ndarray,
+        genders: np.ndarray,
+        topic_counts: np.ndarray,
+        topic_words: np.ndarray,
+        group_words: np.ndarray,
+        group_counts: np.ndarray,
+        history_ids: np.ndarray,
+        gender_index: Dict[Any, int],
+        dictionary: TopicDictionary,
+        history: Optional[PairHistoryIndex] = None,
+    ):
+        self.minutes = minutes
+        self.time_valid = time_valid
+        self.total_sessions = total_sessions
+        self.genders = genders
+        self.topic_counts = topic_counts
+        self.topic_words = topic_words
+        self.group_words = group_words
+        self.group_counts = group_counts
+        self.history_ids = history_ids
+        self.gender_index = gender_index
+        self.dictionary = dictionary
+        # Индекс, выдавший history_ids (у признаков из общей памяти воркера — None)
+        self.history = history
+        self._time_index: Optional["TimeIndex"] = None
+
+    def __len__(self) -> int:
+        return len(self.minutes)
+
+    def __getstate__(self) -> Dict[str, Any]:
+        # Индекс истории пар не передается в другие процессы: прошлые партнеры
+        # считаются в процессе API и передаются отдельно
+        state = self.__dict__.copy()
+        state["history"] = None
+        return state
+
+    @property
+    def time_index(self) -> "TimeIndex":
+        """Индекс строк по времени, строится при первом обращении"""
+        if self._time_index is None:
+            self._time_index = TimeIndex(self)
+        return self._time_index
+
+    def subset(self, rows: np.ndarray) -> "CandidateFeatures":
+        """Признаки только для строк rows (в их порядке)"""
+        return CandidateFeatures(
+            self.minutes[rows],
+            self.time_valid[rows],
+            self.total_sessions[rows],
+            self.genders[rows],
+            self.topic_counts[rows],
+            self.topic_words[rows],
+            self.group_words[rows],
+            self.group_counts[rows],
+            self.history_ids[rows],
+            self.gender_index,
+            self.dictionary,
+            self.history,
+        )
+
+    @classmethod
+    def from_candidates(
+        cls, candidates: Sequence[Dict[str, Any]], dictionary: TopicDictionary = None, history: PairHistoryIndex = None
+    ) -> "CandidateFeatures":
+        """Закодировать список кандидатов"""
+        dictionary = dictionary or topic_dictionary
+        history = history if history is not None else pair_history_index
+        n = len(candidates)
+        gender_index: Dict[Any, int] = {}
+
+        minutes = np.zeros(n, dtype=np.int64)
+        time_valid = np.zeros(n, dtype=bool)
+        total_sessions = np.zeros(n, dtype=np.int64)
+        genders = np.zeros(n, dtype=np.int64)
+        topic_counts = np.zeros(n, dtype=np.int64)
+        history_ids = np.full(n, -1, dtype=np.int32)
+        topic_masks: List[int] = []
+        group_masks: List[int] = []
+
+        for row, candidate in enumerate(candidates):
+            parsed = candidate_minutes(candidate)
+            if parsed is not None:
+                minutes[row] = parsed
+                time_valid[row] = True
+            total_sessions[row] = candidate["total_sessions"]
+            if candidate.get("user_id") is not None:
+                history_ids[row] = history.user_key(candidate["user_id"])
+
+            gender = candidate.get("gender")
+            if gender:
+                genders[row] = gender_index.setdefault(_gender_key(gender), len(gender_index) + 1)
+
+            topics = candidate["topics"]
+            topic_counts[row] = len(topics)
+            masks = dictionary.encode(topics)
+            topic_masks.append(masks.topics)
+            group_masks.append(masks.groups)
+
+        group_words = masks_to_words(group_masks, _word_count(dictionary.group_count))
+        return cls(
+            minutes,
+            time_valid,
+            total_sessions,
+            genders,
+            topic_counts,
+            masks_to_words(topic_masks, _word_count(dictionary.topic_count)),
+            group_words,
+            popcount_rows(group_words),
+            history_ids,
+            gender_index,
+            dictionary,
+            history,
+        )
+
+
+def _word_count(bits: int) -> int:
+    return (bits + 63) // 64
+
+
+def _time_component(time_diff: np.ndarray, valid: np.ndarray) -> np.ndarray:
+    scores = np.select(
+        [time_diff <= limit for limit, _ in TIME_TIERS], [score for _, score in TIME_TIERS], default=FAR_TIME_SCORE
+    )
+    # Нейтральный score, если время не разбирается
+    return np.where(valid, scores, NEUTRAL_TIME_SCORE)
+
+
+def _topic_component(
+    common_topics: np.ndarray,
+    parent_matches: np.ndarray,
+    user_counts: np.ndarray,
+    candidate_counts: np.ndarray,
+    user_group_counts: np.ndarray,
+    candidate_group_counts: np.ndarray,
+) -> np.ndarray:
+    max_count = np.maximum(candidate_counts, user_counts)
+    with np.errstate(divide="ignore", invalid="ignore"):
+        exact_match_score = np.where(max_count > 0, common_topics / max_count, 0.0)
+        max_unique_groups = np.maximum(candidate_group_counts, user_group_counts)
+        parent_match_score = np.where(parent_matches > 0, parent_matches / max_unique_groups, 0.0)
+
+    total_score = (exact_match_score * 0.7) + (parent_match_score * 0.3)
+    all_match = (common_topics == user_counts) & (candidate_counts == user_counts)
+    parent_only = (common_topics == 0) & (parent_matches > 0)
+    total_score = np.where(all_match, total_score + 0.2, np.where(parent_only, total_score + 0.1, total_score))
+
+    return np.where((candidate_counts > 0) & (user_counts > 0), np.minimum(total_score, 1.0), 0.0)
+
+
+def _experience_component(experience_diff: np.ndarray) -> np.ndarray:
+    return np.select([experience_diff <= 2, experience_diff <= 5, experience_diff <= 10], [1.0, 0.8, 0.6], default=0.3)
+
+
+def _bonus_component(
+    different_gender: np.ndarray, candidate_sessions: np.ndarray, candidate_topic_counts: np.ndarray
+) -> np.ndarray:
+    # Бонус за разный пол (если указан у обоих), за активность и за разнообразие тем
+    bonus = np.where(different_gender, 0.1, 0.0)
+    bonus = bonus + np.where(candidate_sessions > 5, 0.05, 0.0)
+    bonus = bonus + np.where(candidate_topic_counts > 1, 0.05, 0.0)
+    return np.minimum(bonus, 0.2)
+
+
+def _total(time: np.ndarray, topic: np.ndarray, experience: np.ndarray, bonus: np.ndarray) -> np.ndarray:
+    score = time * 0.4
+    score += topic * 0.3
+    score += experience * 0.2
+    score += bonus * 0.1
+    return np.minimum(score, 1.0)
+
+
+def time_scores(user_minutes: Optional[int], features: CandidateFeatures) -> np.ndarray:
+    """Совместимость по времени для всех кандидатов"""
+    if user_minutes is None:
+        return np.full(len(features), 0.5)
+    return _time_component(np.abs(features.minutes - user_minutes), features.time_valid)
+
+
+def topic_scores(user_topics: List[str], features: CandidateFeatures) -> np.ndarray:
+    """Совпадение тем с учетом иерархии для всех кандидатов"""
+    if not user_topics:
+        return np.zeros(len(features))
+
+    user_masks = features.dictionary.encode(user_topics)
+    user_topic_words = mask_to_words(user_masks.topics, features.topic_words.shape[1])
+    user_group_words = mask_to_words(user_masks.groups, features.group_words.shape[1])
+
+    return _topic_component(
+        popcount_rows(features.topic_words & user_topic_words),
+        popcount_rows(features.group_words & user_group_words),
+        len(user_topics),
+        features.topic_counts,
+        user_masks.groups.bit_count(),
+        features.group_counts,
+    )
+
+
+def experience_scores(user_sessions: int, features: CandidateFeatures) -> np.ndarray:
+    """Совместимость по опыту для всех кандидатов"""
+    return _experience_component(np.abs(features.total_sessions - user_sessions))
+
+
+def bonus_scores(user_gender: Any, features: CandidateFeatures) -> np.ndarray:
+    """Дополнительные факторы совместимости для всех кандидатов"""
+    if user_gender:
+        user_code = features.gender_index.get(_gender_key(user_gender), -1)
+        different_gender = (features.genders > 0) & (features.genders != user_code)
+    else:
+        different_gender = np.zeros(len(features), dtype=bool)
+    return _bonus_component(different_gender, features.total_sessions, features.topic_counts)
+
+
+def past_partner_keys(
+    history: Optional[PairHistoryIndex], user_id: Any, features: CandidateFeatures
+) -> Optional[np.ndarray]:
+    """Прошлые партнеры пользователя по индексу history в id, которыми закодированы features.
+
+    Компактные id только добавляются, поэтому id кандидатов из features остаются верными,
+    а партнеры берутся из индекса на момент запроса. Если features закодированы другим
+    индексом, партнеры переводятся в его id через user_id.
+    """
+    if history is None:
+        return None
+    if features.history is None or features.history is history:
+        return history.partners(user_id)
+    return features.history.find_keys(history.partner_ids(user_id))
+
+
+def apply_novelty(scores: np.ndarray, features: CandidateFeatures, past_partners: Optional[np.ndarray]) -> np.ndarray:
+    """Понизить score прошлых партнеров пользователя (past_partners — компактные id из PairHistoryIndex).
+
+    Коэффициент не больше 1, поэтому верхние оценки score в top_candidates остаются верными.
+    """
+    if past_partners is None or len(past_partners) == 0 or len(features) == 0:
+        return scores
+    # Табличный isin: одна проверка по таблице на кандидата
+    repeated = np.isin(features.history_ids, past_partners, kind="table")
+    return np.where(repeated, scores * settings.pair_history_repeat_factor, scores)
+
+
+def score_candidates(
+    user_info: Dict[str, Any], features: CandidateFeatures, past_partners: Optional[np.ndarray] = None
+) -> np.ndarray:
+    """Рассчитать score совместимости пользователя со всеми кандидатами сразу"""
+    if len(features) == 0:
+        return np.zeros(0)
+
+    scores = _total(
+        time_scores(candidate_minutes(user_info), features),
+        topic_scores(user_info["topics"], features),
+        experience_scores(user_info["total_sessions"], features),
+        bonus_scores(user_info.get("gender"), features),
+    )
+    return apply_novelty(scores, features, past_partners)
+
+
+def score_pairs(features: CandidateFeatures, users: np.ndarray, candidates: np.ndarray) -> np.ndarray:
+    """Score пользователя users[k] для кандидата candidates[k] (оба — строки одних features).
+
+    Score несимметричен: бонусы за активность и разнообразие тем считаются по кандидату.
+    """
+    if len(users) == 0:
+        return np.zeros(0)
+
+    time = _time_component(
+        np.abs(features.minutes[users] - features.minutes[candidates]),
+        features.time_valid[users] & features.time_valid[candidates],
+    )
+    topic = _topic_component(
+        popcount_rows(features.topic_words[users] & features.topic_words[candidates]),
+        popcount_rows(features.group_words[users] & features.group_words[candidates]),
+        features.topic_counts[users],
+        features.topic_counts[candidates],
+        features.group_counts[users],
+        features.group_counts[candidates],
+    )
+    experience = _experience_component(np.abs(features.total_sessions[users] - features.total_sessions[candidates]))
+    user_genders = features.genders[users]
+    candidate_genders = features.genders[candidates]
+    bonus = _bonus_component(
+        (user_genders > 0) & (candidate_genders > 0) & (user_genders != candidate_genders),
+        features.total_sessions[candidates],
+        features.topic_counts[candidates],
+    )
+    return _total(time, topic, experience, bonus)
+
+
+class ScoringBatch(NamedTuple):
+    """Кандидаты и их признаки для одного запроса подбора"""
+
+    candidates: List[Dict[str, Any]]
+    features: CandidateFeatures
+    # Строки features, соответствующие candidates (None — все строки по порядку)
+    indices: Optional[np.ndarray] = None
+
+    @classmethod
+    def from_candidates(cls, candidates: List[Dict[str, Any]], history: PairHistoryIndex = None) -> "ScoringBatch":
+        return cls(candidates, CandidateFeatures.from_candidates(candidates, history=history))
+
+
+def score_batch(
+    user_info: Dict[str, Any], batch: ScoringBatch, past_partners: Optional[np.ndarray] = None
+) -> np.ndarray:
+    """Score для кандидатов батча в порядке batch.candidates"""
+    scores = score_candidates(user_info, batch.features, past_partners)
+    return scores if batch.indices is None else scores[batch.indices]
+
+
+class TimeIndex:
+    """Индекс кандидатов по времени: строки features, отсортированные по минутам.
+
+    Кандидаты с одинаковым score времени образуют не больше двух непрерывных
+    диапазонов отсортированного массива, поэтому группы находятся бинарным поиском.
+    """
+
+    def __init__(self, features: CandidateFeatures):
+        valid_rows = np.flatnonzero(features.time_valid)
+        self.rows = valid_rows[np.argsort(features.minutes[valid_rows], kind="stable")]
+        self.minutes = features.minutes[self.rows]
+        self.invalid_rows = np.flatnonzero(~features.time_valid)
+
+    def tiers(self, user_minutes: int) -> List[Tuple[float, np.ndarray]]:
+        """Строки кандидатов, сгруппированные по score времени, в порядке убывания score"""
+        groups = []
+        inner_start = inner_end = None
+        for limit, score in TIME_TIERS:
+            start = int(np.searchsorted(self.minutes, user_minutes - limit, side="left"))
+            end = int(np.searchsorted(self.minutes, user_minutes + limit, side="right"))
+            if inner_start is None:
+                rows = self.rows[start:end]
+            else:
+                rows = np.concatenate((self.rows[start:inner_start], self.rows[inner_end:end]))
+            groups.append((score, rows))
+            inner_start, inner_end = start, end
+
+        groups.append((FAR_TIME_SCORE, np.concatenate((self.rows[:inner_start], self.rows[inner_end:]))))
+        groups.append((NEUTRAL_TIME_SCORE, self.invalid_rows))
+        return sorted(groups, key=lambda group: -group[0])
+
+
+@lru_cache(maxsize=None)
+def _score_upper_bound(time_score: float, topic_score: float = 1.0) -> float:
+    # Максимум остальных компонент: опыт — 1.0, бонус ограничен 0.2, темы — не больше topic_score
+    return float(_total(np.array([time_score]), np.array([topic_score]), np.array([1.0]), np.array([0.2]))[0])
+
+
+def _scoring_groups(
+    user_info: Dict[str, Any], features: CandidateFeatures, user_minutes: int
+) -> List[Tuple[float, np.ndarray]]:
+    """Группы TimeIndex, разделенные по общим темам, с верхней оценкой score, по убыванию оценки.
+
+    Кандидат без общих с пользователем тем и родительских групп получает score тем 0,
+    поэтому его оценка ниже оценки кандидатов того же времени с общими темами.
+    """
+    user_masks = features.dictionary.encode(user_info["topics"])
+    user_topic_words = mask_to_words(user_masks.topics, features.topic_words.shape[1])
+    user_group_words = mask_to_words(user_masks.groups, features.group_words.shape[1])
+
+    common = (features.topic_words & user_topic_words).any(axis=1) | (features.group_words & user_group_words).any(axis=1)
+
+    groups = []
+    for time_score, rows in features.time_index.tiers(user_minutes):
+        groups.append((_score_upper_bound(time_score), rows[common[rows]]))
+        groups.append((_score_upper_bound(time_score, topic_score=0.0), rows[~common[rows]]))
+    return sorted(groups, key=lambda group: -group[0])
+
+
+def top_candidates(
+    user_info: Dict[str, Any],
+    batch: ScoringBatch,
+    size: int,
+    trace: Optional[MatchingTrace] = None,
+    past_partners: Optional[np.ndarray] = None,
+) -> List[Tuple[float, int]]:
+    """Топ size кандидатов батча: пары (score, позиция в batch.candidates) по убыванию score.
+
+    Результат совпадает с heapq.nlargest по score_batch. Кандидаты скорятся группами
+    по TimeIndex и наличию общих тем (_scoring_groups) в порядке убывания верхней оценки
+    score, и обход останавливается, как только size-й лучший score строго больше оценки
+    оставшихся групп.
+    Если передан trace, в нем учитывается количество отскоренных кандидатов,
+    past_partners — прошлые партнеры пользователя для apply_novelty.
+    """
+    user_minutes = candidate_minutes(user_info)
+    if user_minutes is None or size <= 0:
+        scores = score_batch(user_info, batch, past_partners).tolist()
+        if trace is not None:
+            trace.count("candidates_scored", len(scores))
+        return heapq.nlargest(size, zip(scores, range(len(scores))), key=itemgetter(0))
+
+    features = batch.features
+    if batch.indices is None:
+        positions = np.arange(len(features))
+    else:
+        positions = np.full(len(features), -1, dtype=np.int64)
+        positions[batch.indices] = np.arange(len(batch.indices))
+
+    found_scores: List[np.ndarray] = []
+    found_positions: List[np.ndarray] = []
+    found = 0
+    groups = _scoring_groups(user_info, features, user_minutes)
+    for number, (_, rows) in enumerate(groups):
+        rows = rows[positions[rows] >= 0]
+        if len(rows):
+            found_scores.append(score_candidates(user_info, features.subset(rows), past_partners))
+            found_positions.append(positions[rows])
+            found += len(rows)
+
+        if found >= size and number + 1 < len(groups):
+            kth_score = np.partition(np.concatenate(found_scores), found - size)[found - size]
+            if kth_score > groups[number + 1][0]:
+                break
+
+    if trace is not None:
+        trace.count("candidates_scored", found)
+    if not found:
+        return []
+    scores = np.concatenate(found_scores)
+    positions = np.concatenate(found_positions)
+    # При равных score порядок такой же, как при полном проходе — по позиции кандидата
+    order = np.argsort(positions, kind="stable")
+    return heapq.nlargest(size, zip(scores[order].tolist(), positions[order].tolist()), key=itemgetter(0))
@@ -0,0 +1,313 @@
+"""
+Предрасчитанные списки кандидатов для всех активных регистраций недели.
+
+Фоновая задача периодически (и сразу после закрытия регистрации на неделю)
+ранжирует кандидатов для каждого участника по снимку WeekCandidatePool и хранит
+результат компактно: для каждого пользователя — строки кандидатов и их score.
+find_candidates отдает список из снимка, перепроверяя только актуальное состояние:
+регистрация кандидата активна, у него есть свободные пары и с пользователем еще нет
+открытой пары. Кандидаты, зарегистрировавшиеся после расчета снимка, скорятся при
+запросе и вливаются в список, поэтому до пересчета они не пропадают из выдачи.
+
+Расчет недели занимает секунды на десятках тысяч регистраций, поэтому выполняется
+в отдельном процессе (spawn): воркер uvicorn в это время обслуживает запросы.
+"""
+
+import asyncio
+import multiprocessing
+import time
+from operator import itemgetter
+from concurrent.futures import ProcessPoolExecutor
+from datetime import date, datetime, timedelta
+from typing import List, Dict, Any, Optional, Tuple
+
+import numpy as np
+from loguru import logger
+
+from config.settings import settings
+from services.candidate_pool import WeekCandidates, WeekCandidatePool, week_candidate_pool
+from services.match_scoring import (
+    CandidateFeatures,
+    ScoringBatch,
+    past_partner_keys,
+    score_candidates,
+    top_candidates,
+)
+from services.pair_history import PairHistoryIndex, pair_history_index
+
+
+class SuggestionSnapshot:
+    """Топ кандидатов каждого участника недели на момент расчета"""
+
+    def __init__(
+        self,
+        week_start: date,
+        max_pairs_per_user: int,
+        rows: List[Dict[str, Any]],
+        top_rows: np.ndarray,
+        top_scores: np.ndarray,
+    ):
+        self.week_start = week_start
+        self.max_pairs_per_user = max_pairs_per_user
+        self.built_at = datetime.now()
+        self.rows = rows
+        self.user_ids = [str(row["user_id"]) for row in rows]
+        self.user_rows = {user_id: index for index, user_id in enumerate(self.user_ids)}
+        # top_rows[i] — строки кандидатов пользователя i по убыванию score, -1 — пустые места
+        self.top_rows = top_rows
+        self.top_scores = top_scores
+        # Кандидаты пула, которых нет в снимке, и их признаки (пересчитываются при изменении недели)
+        self._newcomers_week: Optional[WeekCandidates] = None
+        self._newcomers_version = -1
+        self._newcomers: List[Dict[str, Any]] = []
+        self._newcomer_features: Optional[CandidateFeatures] = None
+
+    @property
+    def size(self) -> int:
+        return self.top_rows.shape[1]
+
+    def __len__(self) -> int:
+        return len(self.rows)
+
+    def newcomers(
+        self, week: WeekCandidates, pair_history: Optional[PairHistoryIndex]
+    ) -> Tuple[List[Dict[str, Any]], Optional[CandidateFeatures]]:
+        """Кандидаты недели, зарегистрировавшиеся после расчета снимка, и их признаки"""
+        if self._newcomers_week is not week or self._newcomers_version != week.version:
+            self._newcomers = [
+                candidate for user_id, candidate in week.candidates.items() if user_id not in self.user_rows
+            ]
+            self._newcomer_features = (
+                CandidateFeatures.from_candidates(self._newcomers, history=pair_history) if self._newcomers else None
+            )
+            self._newcomers_week = week
+            self._newcomers_version = week.version
+        return self._newcomers, self._newcomer_features
+
+
+def build_suggestions(
+    week_start: date,
+    rows: List[Dict[str, Any]],
+    features: CandidateFeatures,
+    pair_counts: Dict[str, int],
+    partners: Dict[str, Dict[str, int]],
+    max_pairs_per_user: int,
+    size: int,
+    past_partners: Optional[Dict[str, np.ndarray]] = None,
+) -> SuggestionSnapshot:
+    """Ранжировать кандидатов для каждого участника недели.
+
+    Фильтры те же, что в WeekCandidates.get_scoring_batch: сам пользователь, его партнеры
+    по открытым парам и кандидаты без свободных пар исключаются. Выполняется в отдельном
+    процессе или потоке, поэтому pair_counts и partners должны быть копиями состояния пула.
+    past_partners — прошлые партнеры участников (id из индекса, которым закодированы features);
+    в процесс передаются только они, а не весь индекс истории пар.
+    Кандидаты ранжируются через top_candidates: группы TimeIndex без общих тем с
+    пользователем отсекаются по верхней оценке score, поэтому отскоривается лишь
+    небольшая часть недели.
+    """
+    user_ids = [str(row["user_id"]) for row in rows]
+    user_rows = {user_id: index for index, user_id in enumerate(user_ids)}
+    counts = np.array([pair_counts.get(user_id, 0) for user_id in user_ids], dtype=np.int64)
+    eligible = counts < max_pairs_per_user
+
+    top_rows = np.full((len(rows), size), -1, dtype=np.int32)
+    top_scores = np.zeros((len(rows), size), dtype=np.float64)
+    for index, user_info in enumerate(rows):
+        mask = eligible.copy()
+        mask[index] = False
+        for partner_id in partners.get(user_ids[index], {}):
+            partner_row = user_rows.get(partner_id)
+            if partner_row is not None:
+                mask[partner_row] = False
+        indices = np.flatnonzero(mask)
+
+        # Словари кандидатов не нужны: позиции батча переводятся в строки через indices
+        user_partners = past_partners.get(user_ids[index]) if past_partners is not None else None
+        top = top_candidates(user_info, ScoringBatch([], features, indices), size, past_partners=user_partners)
+        if top:
+            scores, positions = zip(*top)
+            top_rows[index, : len(top)] = indices[list(positions)]
+            top_scores[index, : len(top)] = scores
+
+    return SuggestionSnapshot(week_start, max_pairs_per_user, rows, top_rows, top_scores)
+
+
+class MatchSuggestionService:
+    """Фоновый расчет и выдача предрасчитанных кандидатов"""
+
+    def __init__(
+        self,
+        pool: WeekCandidatePool,
+        refresh_seconds: int = None,
+        size: int = None,
+        pair_history: Optional[PairHistoryIndex] = None,
+        separate_process: bool = None,
+    ):
+        self.pool = pool
+        self.pair_history = pair_history
+        self.refresh_seconds = refresh_seconds or settings.match_suggestions_refresh_seconds
+        self.size = size or settings.match_suggestions_size
+        self.separate_process = (
+            separate_process if separate_process is not None else settings.match_suggestions_separate_process
+        )
+        self._snapshots: Dict[date, SuggestionSnapshot] = {}
+        self._refresh_task: Optional[asyncio.Task] = None
+        self._executor: Optional[ProcessPoolExecutor] = None
+
+    # Жизненный цикл
+    async def start(self):
+        """Запустить фоновый расчет (первый расчет — сразу, не блокируя старт)"""
+        if self._refresh_task is None:
+            self._refresh_task = asyncio.create_task(self._refresh_loop())
+
+    async def stop(self):
+        if self._refresh_task:
+            self._refresh_task.cancel()
+            try:
+                await self._refresh_task
+            except asyncio.CancelledError:
+                pass
+            self._refresh_task = None
+        if self._executor is not None:
+            self._executor.shutdown(wait=True, cancel_futures=True)
+            self._executor = None
+
+    def _get_executor(self) -> ProcessPoolExecutor:
+        if self._executor is None:
+            # spawn: процесс не наследует event loop, соединения с базой и потоки родителя
+            self._executor = ProcessPoolExecutor(1, mp_context=multiprocessing.get_context("spawn"))
+        return self._executor
+
+    async def _refresh_loop(self):
+        while True:
+            try:
+                await self.refresh_due_weeks()
+            except Exception as e:
+                logger.error(f"Match suggestions refresh failed: {e}")
+            # Проверяем чаще, чем пересчитываем, чтобы не пропустить закрытие регистрации
+            await asyncio.sleep(min(self.refresh_seconds, 60))
+
+    async def _registration_deadline(self, week_start: date) -> datetime:
+        hours = await self.pool.db.get_setting_int("registration_deadline_hours", 24)
+        return datetime.combine(week_start, datetime.min.time()) - timedelta(hours=hours)
+
+    async def _is_due(self, week_start: date) -> bool:
+        snapshot = self._snapshots.get(week_start)
+        if snapshot is None:
+            return True
+        if datetime.now() - snapshot.built_at >= timedelta(seconds=self.refresh_seconds):
+            return True
+        # После закрытия регистрации состав недели стабилен — пересчитываем один раз сразу
+        deadline = await self._registration_deadline(week_start)
+        return snapshot.built_at < deadline <= datetime.now()
+
+    async def refresh_due_weeks(self):
+        """Пересчитать недели, для которых снимок устарел или закрылась регистрация"""
+        tracked = self.pool._tracked_weeks()
+        for week_start in list(self._snapshots):
+            if week_start not in tracked:
+                del self._snapshots[week_start]
+        for week_start in tracked:
+            if await self._is_due(week_start):
+                await self.refresh_week(week_start)
+
+    async def refresh_week(self, week_start: date) -> SuggestionSnapshot:
+        """Пересчитать предложения на неделю по текущему снимку пула"""
+        max_pairs_per_user = await self.pool.db.get_setting_int("max_pairs_per_user", 3)
+        week = await self.pool.get_week(week_start)
+        # Берем согласованную копию состояния в event loop, расчет — в отдельном процессе или потоке
+        batch = week.get_scoring_batch()
+        rows = list(batch.candidates)
+        features = batch.features
+        # Индекс по времени строится лениво — строим его здесь, а не параллельно в потоке
+        features.time_index
+        pair_counts = dict(week.pair_counts)
+        partners = {user_id: dict(user_partners) for user_id, user_partners in week.partners.items()}
+        past_partners = self._past_partners(rows, features)
+
+        arguments = (week_start, rows, features, pair_counts, partners, max_pairs_per_user, self.size, past_partners)
+        started = time.perf_counter()
+        if self.separate_process:
+            loop = asyncio.get_running_loop()
+            snapshot = await loop.run_in_executor(self._get_executor(), build_suggestions, *arguments)
+        else:
+            snapshot = await asyncio.to_thread(build_suggestions, *arguments)
+        self._snapshots[week_start] = snapshot
+        logger.info(
+            f"Match suggestions for {week_start}: {len(snapshot)} registrations "
+            f"in {time.perf_counter() - started:.2f}s"
+        )
+        return snapshot
+
+    def _past_partners(
+        self, rows: List[Dict[str, Any]], features: CandidateFeatures
+    ) -> Optional[Dict[str, np.ndarray]]:
+        """Прошлые партнеры участников недели (только непустые)"""
+        if self.pair_history is None:
+            return None
+        past_partners = {}
+        for row in rows:
+            user_id = str(row["user_id"])
+            keys = past_partner_keys(self.pair_history, user_id, features)
+            if len(keys):
+                past_partners[user_id] = keys
+        return past_partners
+
+    # Выдача
+    async def get(
+        self, user_id: Any, week_start: date, max_pairs_per_user: int, size: int
+    ) -> Optional[List[Tuple[float, Dict[str, Any]]]]:
+        """Предрасчитанные кандидаты пользователя с проверкой свободных пар на текущий момент.
+
+        Кандидаты, зарегистрировавшиеся после расчета снимка, скорятся для пользователя
+        сейчас и вливаются в список по score. None — снимка нет или после проверки осталось
+        меньше size кандидатов из обрезанного списка; тогда кандидаты ранжируются как обычно.
+        """
+        snapshot = self._snapshots.get(week_start)
+        if snapshot is None or snapshot.max_pairs_per_user != max_pairs_per_user:
+            return None
+        user_row = snapshot.user_rows.get(str(user_id))
+        if user_row is None:
+            return None
+
+        try:
+            week = await self.pool.get_week(week_start)
+        except Exception as e:
+            logger.error(f"Error checking match suggestions for user {user_id}: {e}")
+            return None
+        if str(user_id) not in week.candidates:
+            return None
+
+        ranking = []
+        for row, score in zip(snapshot.top_rows[user_row].tolist(), snapshot.top_scores[user_row].tolist()):
+            if row < 0:
+                break
+            candidate_id = snapshot.user_ids[row]
+            if week.is_available(candidate_id, str(user_id), max_pairs_per_user):
+                ranking.append((score, week.candidates[candidate_id]))
+
+        truncated = snapshot.top_rows[user_row, -1] >= 0
+        newcomers, features = snapshot.newcomers(week, self.pair_history)
+        if newcomers:
+            user_info = week.candidates[str(user_id)]
+            past_partners = past_partner_keys(self.pair_history, user_id, features)
+            scores = score_candidates(user_info, features, past_partners).tolist()
+            fresh = [
+                (score, candidate)
+                for score, candidate in zip(scores, newcomers)
+                if week.is_available(str(candidate["user_id"]), str(user_id), max_pairs_per_user)
+            ]
+            if truncated:
+                # Ниже последнего score снимка могут быть кандидаты, обрезанные при расчете
+                fresh = [entry for entry in fresh if entry[0] >= snapshot.top_scores[user_row, -1]]
+            # Сортировка устойчива: при равном score кандидаты снимка остаются выше
+            ranking = sorted(ranking + fresh, key=itemgetter(0), reverse=True)
+
+        if len(ranking) < size and truncated:
+            return None
+        return ranking
+
+
+# Создаем экземпляр сервиса поверх общего пула кандидатов
+match_suggestion_service = MatchSuggestionService(week_candidate_pool, pair_history=pair_history_index)
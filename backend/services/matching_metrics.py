@@ -0,0 +1,121 @@
+"""
+Метрики подбора пар: время по этапам и счетчики одного вызова.
+
+MatchingTrace собирает тайминги этапов и счетчики (загружено кандидатов,
+отскорено кандидатов, обращений к базе) и по завершении вызова пишет их в
+гистограммы Prometheus. Медленные вызовы дополнительно логируются целиком.
+Обращения к базе считаются через contextvar, поэтому их учитывают и
+OratorDatabaseService, и пул кандидатов без явной передачи trace.
+"""
+
+import json
+import time
+from contextlib import contextmanager
+from contextvars import ContextVar
+from typing import Dict, Optional
+
+from loguru import logger
+from prometheus_client import Histogram
+
+from config.settings import settings
+
+STAGE_SECONDS = Histogram(
+    "orator_matching_stage_seconds",
+    "Время этапа подбора пар",
+    ["call", "stage"],
+    buckets=(0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0),
+)
+CALL_SECONDS = Histogram(
+    "orator_matching_call_seconds",
+    "Полное время вызова подбора пар",
+    ["call"],
+    buckets=(0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0),
+)
+CALL_ITEMS = Histogram(
+    "orator_matching_call_items",
+    "Счетчики вызова подбора пар: кандидаты и обращения к базе",
+    ["call", "kind"],
+    buckets=(0, 1, 2, 5, 10, 25, 50, 100, 250, 500, 1000, 2500, 5000, 10000, 25000, 50000, 100000),
+)
+
+# Счетчики, которые пишутся в гистограмму для каждого вызова, даже нулевые
+TRACE_COUNTS = ("candidates_loaded", "candidates_scored", "db_round_trips")
+
+_current_trace: ContextVar[Optional["MatchingTrace"]] = ContextVar("matching_trace", default=None)
+
+
+class MatchingTrace:
+    """Тайминги этапов и счетчики одного вызова подбора"""
+
+    def __init__(self, call: str, slow_call_ms: int = None, log_slow_calls: bool = None):
+        self.call = call
+        self.slow_call_ms = slow_call_ms if slow_call_ms is not None else settings.matching_slow_call_ms
+        self.log_slow_calls = log_slow_calls if log_slow_calls is not None else settings.matching_log_slow_calls
+        self.stages: Dict[str, float] = {}
+        self.counts: Dict[str, int] = {name: 0 for name in TRACE_COUNTS}
+        self.fields: Dict[str, str] = {}
+        self.total_seconds: Optional[float] = None
+        self._started = time.perf_counter()
+        self._token = None
+
+    def __enter__(self) -> "MatchingTrace":
+        self._token = _current_trace.set(self)
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        _current_trace.reset(self._token)
+        self.finish()
+        return False
+
+    @contextmanager
+    def stage(self, name: str):
+        """Замерить этап; повторные замеры одного этапа суммируются"""
+        started = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.stages[name] = self.stages.get(name, 0.0) + time.perf_counter() - started
+
+    def count(self, name: str, value: int = 1):
+        self.counts[name] = self.counts.get(name, 0) + value
+
+    def annotate(self, **fields):
+        """Добавить поля в лог медленного вызова (пользователь, неделя и т.п.)"""
+        self.fields.update({key: str(value) for key, value in fields.items()})
+
+    def to_dict(self) -> Dict[str, object]:
+        return {
+            "call": self.call,
+            "total_ms": round((self.total_seconds or 0.0) * 1000, 3),
+            "stages_ms": {name: round(seconds * 1000, 3) for name, seconds in self.stages.items()},
+            "counts": dict(self.counts),
+            **self.fields,
+        }
+
+    def finish(self):
+        """Записать метрики вызова и залогировать его, если он медленный"""
+        self.total_seconds = time.perf_counter() - self._started
+        try:
+            CALL_SECONDS.labels(self.call).observe(self.total_seconds)
+            for name, seconds in self.stages.items():
+                STAGE_SECONDS.labels(self.call, name).observe(seconds)
+            for name, value in self.counts.items():
+                CALL_ITEMS.labels(self.call, name).observe(value)
+        except Exception as e:
+            logger.error(f"Failed to record matching metrics: {e}")
+
+        if self.log_slow_calls and self.total_seconds * 1000 >= self.slow_call_ms:
+            trace = self.to_dict()
+            logger.bind(matching_trace=trace).warning(f"Slow {self.call} call: {json.dumps(trace, ensure_ascii=False)}")
+
+
+def current_trace() -> Optional[MatchingTrace]:
+    """Trace текущего вызова подбора (None вне подбора)"""
+    return _current_trace.get()
+
+
+def count_round_trip(value: int = 1):
+    """Учесть обращение к базе в trace текущего вызова, если он есть"""
+    trace = _current_trace.get()
+    if trace is not None:
+        trace.count("db_round_trips", value)
@@ -1,98 +1,311 @@
+import heapq
 import random
-from typing import List, Dict, Any, Optional
+from operator import itemgetter
+from typing import List, Dict, Any, Optional, Tuple, NamedTuple
 from datetime import datetime, date, timedelta
 from uuid import UUID
 from loguru import logger
 
 from models.orator import CandidateInfo, Gender
 from services.orator_database import OratorDatabaseService
+from config.settings import settings
+from services.candidate_pool import WeekCandidatePool
+from services.candidate_cache import CandidateResultCache
+from services.candidate_cursors import BrowseCursor, CandidateCursorStore, Ranking
+from services.match_scoring import ScoringBatch, past_partner_keys, top_candidates
+from services.match_suggestions import MatchSuggestionService
+from services.pair_history import PairHistoryIndex
+from services.parallel_scoring import ParallelScorer
+from services.matching_metrics import MatchingTrace
+from services.topic_dictionary import topic_dictionary
+
+
+class CandidatePage(NamedTuple):
+    """Страница выдачи кандидатов и курсор следующей страницы (None — кандидаты закончились)"""
+
+    candidates: List[CandidateInfo]
+    next_cursor: Optional[str] = None
 
 
 class MatchingService:
-    def __init__(self, orator_db: OratorDatabaseService):
+    def __init__(
+        self,
+        orator_db: OratorDatabaseService,
+        candidate_pool: Optional[WeekCandidatePool] = None,
+        result_cache: Optional[CandidateResultCache] = None,
+        suggestions: Optional[MatchSuggestionService] = None,
+        cursor_store: Optional[CandidateCursorStore] = None,
+        parallel_scorer: Optional[ParallelScorer] = None,
+        pair_history: Optional[PairHistoryIndex] = None,
+    ):
         self.orator_db = orator_db
+        # Если пул не передан, кандидаты загружаются из базы на каждый запрос
+        self.candidate_pool = candidate_pool
+        # Если кэш не передан, ранжирование считается заново на каждый запрос
+        self.result_cache = result_cache
+        # Если предрасчет не передан, кандидаты всегда ранжируются при запросе
+        self.suggestions = suggestions
+        # Если хранилище курсоров не передано, следующие страницы запрашиваются через page
+        self.cursor_store = cursor_store
+        # Если пул процессов не передан, скоринг всегда идет в event loop
+        self.parallel_scorer = parallel_scorer
+        # Если индекс истории пар не передан, прошлые партнеры не учитываются
+        self.pair_history = pair_history
 
     async def find_candidates(
-        self, user_id: UUID, week_start: date, limit: int = None, max_pairs_per_user: int = None
+        self, user_id: UUID, week_start: date, limit: int = None, max_pairs_per_user: int = None, page: int = 0
     ) -> List[CandidateInfo]:
-        """Найти кандидатов для подбора пары"""
-        try:
-            # Получаем настройки, если не переданы
+        """Найти кандидатов для подбора пары (page — номер страницы выдачи, начиная с 0)"""
+        result = await self.find_candidates_page(user_id, week_start, limit, max_pairs_per_user, page)
+        return result.candidates
+
+    async def find_candidates_page(
+        self, user_id: UUID, week_start: date, limit: int = None, max_pairs_per_user: int = None, page: int = 0
+    ) -> CandidatePage:
+        """Найти кандидатов и зафиксировать порядок показа для курсора следующих страниц"""
+        with MatchingTrace("find_candidates") as trace:
+            trace.annotate(user_id=user_id, week_start=week_start, page=page)
+            try:
+                return await self._find_candidates(trace, user_id, week_start, limit, max_pairs_per_user, page)
+            except Exception as e:
+                logger.error(f"Error finding candidates for user {user_id}: {e}")
+                return CandidatePage([])
+
+    async def _find_candidates(
+        self,
+        trace: MatchingTrace,
+        user_id: UUID,
+        week_start: date,
+        limit: Optional[int],
+        max_pairs_per_user: Optional[int],
+        page: int,
+    ) -> CandidatePage:
+        # Получаем настройки, если не переданы
+        with trace.stage("settings"):
             if limit is None:
                 limit = await self.orator_db.get_setting_int("max_candidates_per_request", 3)
             if max_pairs_per_user is None:
                 max_pairs_per_user = await self.orator_db.get_setting_int("max_pairs_per_user", 3)
 
-            # Получаем информацию о пользователе
-            user_info = await self._get_user_info(user_id, week_start)
-            if not user_info:
-                return []
-
-            # Получаем всех активных пользователей на эту неделю
-            all_candidates = await self._get_active_candidates(
-                week_start, exclude_user_id=user_id, max_pairs_per_user=max_pairs_per_user
+        # Для страницы page нужно (page + 2) * limit лучших кандидатов
+        size = max((page + 2) * limit, settings.candidate_cache_size)
+        ranking = await self._ranking(trace, user_id, week_start, max_pairs_per_user, size)
+        if ranking is None:
+            return CandidatePage([])
+
+        if not ranking:
+            logger.info(f"No candidates found for user {user_id} on week {week_start}")
+            return CandidatePage([])
+
+        # Добавляем элемент случайности для топ кандидатов
+        with trace.stage("selection"):
+            # Для курсора порядок показа строится по всему ранжированию, иначе — до страницы page
+            order = self._browse_order(
+                ranking, limit, self._browse_rng(user_id, week_start), None if self.cursor_store is not None else page + 1
             )
+            selected = [ranking[position] for position in order[page * limit : (page + 1) * limit]]
+
+            next_cursor = None
+            if self.cursor_store is not None:
+                ordered = [ranking[position] for position in order]
+                cursor = self.cursor_store.create(user_id, week_start, max_pairs_per_user, limit, size, ordered)
+                next_cursor = self._encode_cursor(cursor, ordered, (page + 1) * limit)
+
+        # Объекты ответа создаем только для итоговых кандидатов
+        with trace.stage("serialization"):
+            selected_candidates = [self._candidate_info(score, candidate) for score, candidate in selected]
+
+        logger.info(f"Found {len(selected_candidates)} candidates for user {user_id}")
+        return CandidatePage(selected_candidates, next_cursor)
+
+    async def next_candidates(self, user_id: UUID, cursor: str, limit: int = None) -> Optional[CandidatePage]:
+        """Следующая страница кандидатов по курсору из find_candidates_page.
+
+        Кандидаты берутся из порядка показа, зафиксированного при поиске, без повторного скоринга.
+        Если курсор выдал другой процесс, порядок восстанавливается из того же ранжирования и seed.
+        Если есть пул недели, пропускаются кандидаты, у которых закончились свободные пары или с которыми
+        у пользователя уже есть пара. None — курсор поврежден, истек или принадлежит другому пользователю.
+        """
+        if self.cursor_store is None:
+            return None
+        browse = self.cursor_store.decode(cursor, user_id)
+        if browse is None:
+            return None
 
-            if not all_candidates:
-                logger.info(f"No candidates found for user {user_id} on week {week_start}")
-                return []
-
-            logger.info(f"Found {len(all_candidates)} initial candidates for user {user_id}")
-
-            # Рассчитываем score для каждого кандидата
-            scored_candidates = []
-            for candidate in all_candidates:
-                score = await self._calculate_match_score(user_info, candidate)
-                candidate_info = CandidateInfo(
-                    user_id=str(candidate["user_id"]),
-                    name=candidate["name"],
-                    gender=candidate.get("gender"),
-                    total_sessions=candidate["total_sessions"],
-                    preferred_time_msk=candidate["preferred_time_msk"],
-                    selected_topics=candidate["topics"],
-                    match_score=score,
-                )
-                scored_candidates.append(candidate_info)
-
-            # Сортируем по score и возвращаем топ кандидатов
-            scored_candidates.sort(key=lambda x: x.match_score, reverse=True)
+        with MatchingTrace("next_candidates") as trace:
+            trace.annotate(user_id=user_id, week_start=browse.week_start, offset=browse.offset)
+            try:
+                limit = limit or browse.limit
+                ordered = self.cursor_store.get(browse)
+                if ordered is None:
+                    trace.annotate(source="rebuilt")
+                    ordered = await self._rebuild_order(trace, browse)
+                    if ordered is None:
+                        return CandidatePage([])
+
+                week = None
+                if self.candidate_pool:
+                    with trace.stage("candidates"):
+                        week = await self.candidate_pool.get_week(browse.week_start)
+
+                with trace.stage("selection"):
+                    selected = []
+                    position = self._cursor_position(browse, ordered)
+                    while position < len(ordered) and len(selected) < limit:
+                        score, candidate = ordered[position]
+                        position += 1
+                        if week is None or week.is_available(
+                            str(candidate["user_id"]), str(user_id), browse.max_pairs_per_user
+                        ):
+                            selected.append((score, candidate))
+                    next_cursor = self._encode_cursor(browse, ordered, position)
+
+                with trace.stage("serialization"):
+                    return CandidatePage(
+                        [self._candidate_info(score, candidate) for score, candidate in selected], next_cursor
+                    )
+            except Exception as e:
+                logger.error(f"Error getting next candidates for user {user_id}: {e}")
+                return CandidatePage([])
+
+    async def _ranking(
+        self, trace: MatchingTrace, user_id: UUID, week_start: date, max_pairs_per_user: int, size: int
+    ) -> Optional[List[Tuple[float, Dict[str, Any]]]]:
+        """Топ size кандидатов: из предрасчета, кэша или скорингом (None — у пользователя нет регистрации)"""
+        ranking = None
+        if self.suggestions is not None:
+            # Предрасчитанный список: перепроверяется только наличие свободных пар
+            with trace.stage("suggestions"):
+                ranking = await self.suggestions.get(user_id, week_start, max_pairs_per_user, size)
+            if ranking is not None:
+                trace.annotate(source="suggestions")
+        if ranking is None and self.result_cache is not None:
+            with trace.stage("cache"):
+                ranking = self.result_cache.get(user_id, week_start, max_pairs_per_user, size)
+        if ranking is None:
+            ranking = await self._rank_candidates(user_id, week_start, max_pairs_per_user, size, trace)
+            if ranking is not None and self.result_cache is not None:
+                self.result_cache.put(user_id, week_start, max_pairs_per_user, size, ranking)
+        return ranking
+
+    async def _rebuild_order(self, trace: MatchingTrace, browse: BrowseCursor) -> Optional[Ranking]:
+        """Порядок показа курсора, выданного другим процессом: то же ранжирование и тот же seed"""
+        ranking = await self._ranking(trace, browse.user_id, browse.week_start, browse.max_pairs_per_user, browse.size)
+        if ranking is None:
+            return None
+        with trace.stage("selection"):
+            order = self._browse_order(ranking, browse.limit, self._browse_rng(browse.user_id, browse.week_start))
+            ordered = [ranking[position] for position in order]
+        # Следующие страницы в этом процессе берутся из памяти
+        self.cursor_store.put(browse, ordered)
+        return ordered
+
+    @staticmethod
+    def _browse_rng(user_id: UUID, week_start: date) -> random.Random:
+        return random.Random(f"{user_id}:{week_start}")
+
+    @staticmethod
+    def _cursor_position(browse: BrowseCursor, ordered: Ranking) -> int:
+        """Смещение курсора в порядке показа.
+
+        Если после восстановления ранжирование изменилось (новые регистрации, занятые пары),
+        продолжаем с кандидата, который стоял на этой позиции при выдаче курсора.
+        """
+        position = browse.offset
+        if browse.next_user_id is None:
+            return position
+        if position < len(ordered) and str(ordered[position][1]["user_id"]) == browse.next_user_id:
+            return position
+        for index, (_, candidate) in enumerate(ordered):
+            if str(candidate["user_id"]) == browse.next_user_id:
+                return index
+        return position
+
+    def _encode_cursor(self, browse: BrowseCursor, ordered: Ranking, position: int) -> Optional[str]:
+        """Курсор на позицию position (None — кандидаты закончились)"""
+        if position >= len(ordered):
+            return None
+        return self.cursor_store.encode(
+            browse._replace(offset=position, next_user_id=str(ordered[position][1]["user_id"]))
+        )
 
-            # Добавляем элемент случайности для топ кандидатов
-            top_candidates = scored_candidates[: min(limit * 2, len(scored_candidates))]
-            selected_candidates = self._add_randomness(top_candidates, limit)
+    @staticmethod
+    def _candidate_info(score: float, candidate: Dict[str, Any]) -> CandidateInfo:
+        return CandidateInfo(
+            user_id=str(candidate["user_id"]),
+            name=candidate["name"],
+            gender=candidate.get("gender"),
+            total_sessions=candidate["total_sessions"],
+            preferred_time_msk=candidate["preferred_time_msk"],
+            selected_topics=candidate["topics"],
+            match_score=score,
+        )
 
-            logger.info(f"Found {len(selected_candidates)} candidates for user {user_id}")
-            return selected_candidates
+    async def _rank_candidates(
+        self, user_id: UUID, week_start: date, max_pairs_per_user: int, size: int, trace: MatchingTrace
+    ) -> Optional[List[Tuple[float, Dict[str, Any]]]]:
+        """Топ size кандидатов по score (None, если у пользователя нет регистрации)"""
+        # Получаем информацию о пользователе
+        with trace.stage("user_info"):
+            user_info = await self._get_user_info(user_id, week_start)
+        if not user_info:
+            return None
 
-        except Exception as e:
-            logger.error(f"Error finding candidates for user {user_id}: {e}")
+        # Получаем всех активных пользователей на эту неделю
+        with trace.stage("candidates"):
+            batch = await self._get_scoring_batch(
+                week_start, exclude_user_id=user_id, max_pairs_per_user=max_pairs_per_user
+            )
+        all_candidates = batch.candidates
+        trace.count("candidates_loaded", len(all_candidates))
+        if not all_candidates:
             return []
 
+        logger.info(f"Found {len(all_candidates)} initial candidates for user {user_id}")
+
+        # Скорим кандидатов группами по времени, пока оставшиеся не могут попасть в топ size
+        with trace.stage("scoring"):
+            # Прошлые партнеры из индекса в памяти, без запросов к user_pairs
+            past_partners = past_partner_keys(self.pair_history, user_id, batch.features)
+            if self.parallel_scorer is not None and self.parallel_scorer.should_use(batch):
+                # Большая неделя: скоринг шардами в пуле процессов, event loop свободен
+                top = await self.parallel_scorer.top_candidates(user_info, batch, size, trace, past_partners)
+            else:
+                top = top_candidates(user_info, batch, size, trace, past_partners)
+        return [(score, all_candidates[index]) for score, index in top]
+
+    def _browse_order(
+        self, ranking: List[Tuple[float, Dict[str, Any]]], limit: int, rng: random.Random, pages: int = None
+    ) -> List[int]:
+        """Порядок показа кандидатов: позиции в ranking, страница за страницей.
+
+        Каждая страница выбирается из limit * 2 лучших еще не показанных кандидатов,
+        поэтому страницы не пересекаются, а нулевая совпадает с обычной выдачей.
+        pages ограничивает количество страниц (None — пока не закончатся кандидаты).
+        """
+        remaining = list(range(len(ranking)))
+        order: List[int] = []
+        while remaining and (pages is None or len(order) < pages * limit):
+            window = [(ranking[position][0], position) for position in remaining[: limit * 2]]
+            selected = [position for _, position in self._add_randomness(window, limit, rng)]
+            if not selected:
+                # Пустой раунд (например, limit = 0) больше ничего не выберет
+                break
+            order.extend(selected)
+            shown = set(selected)
+            remaining = [position for position in remaining if position not in shown]
+        return order
+
     async def _get_user_info(self, user_id: UUID, week_start: date) -> Optional[Dict[str, Any]]:
         """Получить информацию о пользователе для матчинга"""
         try:
-            # Получаем профиль пользователя
-            profile = await self.orator_db.get_user_profile(user_id)
-            if not profile:
-                return None
-
-            # Получаем регистрацию на неделю
-            registration = await self.orator_db.get_user_week_registration(user_id, week_start)
-            if not registration:
-                return None
+            if self.candidate_pool:
+                user_info = await self.candidate_pool.get_user_info(user_id, week_start)
+                if user_info:
+                    return user_info
 
-            # Получаем выбранные темы
-            topics = await self.orator_db.get_user_topics(registration["id"])
-
-            return {
-                "user_id": user_id,
-                "name": f"{profile.get('first_name', '')} {profile.get('last_name', '')}".strip(),
-                "gender": profile.get("gender"),
-                "total_sessions": profile.get("total_sessions", 0),
-                "preferred_time_msk": registration["preferred_time_msk"],
-                "topics": topics,
-                "registration_id": registration["id"],
-            }
+            # Профиль, регистрация и темы загружаются одним запросом
+            return await self.orator_db.get_matching_user_info(user_id, week_start)
 
         except Exception as e:
             logger.error(f"Error getting user info for {user_id}: {e}")
@@ -103,72 +316,45 @@ class MatchingService:
     ) -> List[Dict[str, Any]]:
         """Получить всех активных кандидатов на неделю"""
         try:
-            async with self.orator_db.pool.acquire() as conn:
-                # Получаем пользователей с активными регистрациями, исключая тех, у кого уже max_pairs_per_user+ пар
-                # И исключая тех, с кем уже есть пара в статусе pending или confirmed
-                rows = await conn.fetch(
-                    """
-                    SELECT 
-                        u.id as user_id,
-                        u.first_name, u.last_name, u.gender,
-                        u.total_sessions,
-                        wr.preferred_time_msk,
-                        wr.id as registration_id
-                    FROM users u
-                    JOIN week_registrations wr ON u.id = wr.user_id
-                    WHERE wr.week_start_date = $1 
-                    AND wr.status = 'active'
-                    AND u.id != $2
-                    AND u.is_active = TRUE
-                    AND (
-                        SELECT COUNT(*)
-                        FROM user_pairs up2
-                        JOIN week_registrations wr2 ON up2.week_registration_id = wr2.id
-                        WHERE (up2.user1_id = u.id OR up2.user2_id = u.id)
-                        AND wr2.week_start_date = $1
-                        AND up2.status IN ('pending', 'confirmed')
-                    ) < $3
-                    AND NOT EXISTS (
-                        SELECT 1
-                        FROM user_pairs up3
-                        JOIN week_registrations wr3 ON up3.week_registration_id = wr3.id
-                        WHERE wr3.week_start_date = $1
-                        AND up3.status IN ('pending', 'confirmed')
-                        AND (
-                            (up3.user1_id = $2 AND up3.user2_id = u.id)
-                            OR (up3.user1_id = u.id AND up3.user2_id = $2)
-                        )
-                    )
-                    """,
-                    week_start,
-                    exclude_user_id,
-                    max_pairs_per_user,
+            if self.candidate_pool:
+                return await self.candidate_pool.get_candidates(
+                    week_start, exclude_user_id=exclude_user_id, max_pairs_per_user=max_pairs_per_user
                 )
 
-                candidates = []
-                for row in rows:
-                    # Получаем темы для каждого кандидата
-                    topics = await self.orator_db.get_user_topics(row["registration_id"])
-
-                    candidate = {
-                        "user_id": row["user_id"],
-                        "name": f"{row['first_name'] or ''} {row['last_name'] or ''}".strip(),
-                        "gender": row["gender"],
-                        "total_sessions": row["total_sessions"],
-                        "preferred_time_msk": row["preferred_time_msk"],
-                        "topics": topics,
-                        "registration_id": row["registration_id"],
-                    }
-                    candidates.append(candidate)
-
-                return candidates
+            # Кандидаты, их темы и счетчики пар загружаются одним запросом,
+            # без отдельного запроса тем на каждого кандидата
+            return await self.orator_db.get_week_candidates(
+                week_start, exclude_user_id=exclude_user_id, max_pairs_per_user=max_pairs_per_user
+            )
 
         except Exception as e:
             logger.error(f"Error getting active candidates: {e}")
             return []
 
+    async def _get_scoring_batch(
+        self, week_start: date, exclude_user_id: UUID, max_pairs_per_user: int = 3
+    ) -> ScoringBatch:
+        """Получить кандидатов недели вместе с признаками для пакетного скоринга"""
+        if self.candidate_pool:
+            try:
+                return await self.candidate_pool.get_scoring_batch(
+                    week_start, exclude_user_id=exclude_user_id, max_pairs_per_user=max_pairs_per_user
+                )
+            except Exception as e:
+                logger.error(f"Error getting scoring batch from candidate pool: {e}")
+                return ScoringBatch.from_candidates([])
+
+        candidates = await self._get_active_candidates(
+            week_start, exclude_user_id=exclude_user_id, max_pairs_per_user=max_pairs_per_user
+        )
+        return ScoringBatch.from_candidates(candidates, self.pair_history)
+
     async def _calculate_match_score(self, user_info: Dict[str, Any], candidate: Dict[str, Any]) -> float:
-        """Рассчитать score совместимости между пользователями"""
+        """Рассчитать score совместимости между пользователями.
+
+        Скалярная эталонная реализация: в find_candidates используется пакетный
+        services.match_scoring.score_batch, результаты которого совпадают с этой функцией.
+        """
         score = 0.0
 
         # 1. Временное совпадение (вес: 0.4)
@@ -229,38 +415,36 @@ class MatchingService:
         if not topics1 or not topics2:
             return 0.0
 
+        # Темы и родительские группы в виде битовых масок
+        masks1 = topic_dictionary.encode(topics1)
+        masks2 = topic_dictionary.encode(topics2)
+
         # Находим точное пересечение тем
-        common_topics = set(topics1) & set(topics2)
+        common_topics = (masks1.topics & masks2.topics).bit_count()
 
         # Находим совпадения по родительским группам
-        parent_matches = self._find_parent_topic_matches(topics1, topics2)
+        parent_matches = (masks1.groups & masks2.groups).bit_count()
 
         # Рассчитываем общий score
-        exact_match_score = (
-            len(common_topics) / max(len(topics1), len(topics2)) if max(len(topics1), len(topics2)) > 0 else 0.0
-        )
+        exact_match_score = common_topics / max(len(topics1), len(topics2))
 
         # Улучшенный расчет score по родительским группам
         # Учитываем не только количество совпадений, но и их качество
         parent_match_score = 0.0
         if parent_matches > 0:
             # Нормализуем по количеству уникальных групп
-            unique_groups1 = len(set(self._extract_parent_group(t) for t in topics1 if self._extract_parent_group(t)))
-            unique_groups2 = len(set(self._extract_parent_group(t) for t in topics2 if self._extract_parent_group(t)))
-            max_unique_groups = max(unique_groups1, unique_groups2)
-
-            if max_unique_groups > 0:
-                parent_match_score = parent_matches / max_unique_groups
+            max_unique_groups = max(masks1.groups.bit_count(), masks2.groups.bit_count())
+            parent_match_score = parent_matches / max_unique_groups
 
         # Взвешенная сумма: точные совпадения важнее родительских
         total_score = (exact_match_score * 0.7) + (parent_match_score * 0.3)
 
         # Бонус за точное совпадение всех тем
-        if len(common_topics) == len(topics1) == len(topics2):
+        if common_topics == len(topics1) == len(topics2):
             total_score += 0.2
 
         # Бонус за совпадение по родительским группам (если нет точных совпадений)
-        elif len(common_topics) == 0 and parent_matches > 0:
+        elif common_topics == 0 and parent_matches > 0:
             total_score += 0.1
 
         return min(total_score, 1.0)
@@ -270,38 +454,7 @@ class MatchingService:
         if not topics1 or not topics2:
             return 0
 
-        # Извлекаем родительские группы из тем
-        parent_groups1 = set()
-        parent_groups2 = set()
-
-        for topic in topics1:
-            parent = self._extract_parent_group(topic)
-            if parent:
-                parent_groups1.add(parent)
-
-        for topic in topics2:
-            parent = self._extract_parent_group(topic)
-            if parent:
-                parent_groups2.add(parent)
-
-        # Находим пересечение родительских групп
-        common_parents = parent_groups1 & parent_groups2
-
-        return len(common_parents)
-
-    def _extract_parent_group(self, topic_path: str) -> Optional[str]:
-        """Извлечь родительскую группу из пути темы"""
-        if not topic_path:
-            return None
-
-        # Разбиваем путь по разделителям
-        parts = topic_path.split(" - ")
-
-        # Возвращаем первую часть как родительскую группу
-        if len(parts) >= 1:
-            return parts[0].strip()
-
-        return None
+        return (topic_dictionary.encode(topics1).groups & topic_dictionary.encode(topics2).groups).bit_count()
 
     def _calculate_experience_compatibility(self, sessions1: int, sessions2: int) -> float:
         """Рассчитать совместимость по опыту"""
@@ -336,64 +489,37 @@ class MatchingService:
 
         return min(bonus, 0.2)  # Ограничиваем бонус
 
-    def _add_randomness(self, candidates: List[CandidateInfo], limit: int) -> List[CandidateInfo]:
-        """Добавить элемент случайности в выбор кандидатов"""
+    def _add_randomness(
+        self, candidates: List[Tuple[float, Any]], limit: int, rng: random.Random
+    ) -> List[Tuple[float, Any]]:
+        """Добавить элемент случайности в выбор кандидатов.
+
+        candidates — пары (score, кандидат), отсортированные по убыванию score.
+        Случайность берется из rng, чтобы для одного пользователя и недели выдача была стабильной.
+        """
         if len(candidates) <= limit:
             return candidates
 
         # Берем топ кандидатов, но добавляем случайность
         top_candidates = candidates[: limit * 2]
 
-        # Сортируем по score, но с небольшим элементом случайности
-        def random_score(candidate: CandidateInfo) -> float:
-            # Добавляем случайность ±10% к score
-            random_factor = random.uniform(0.9, 1.1)
-            return candidate.match_score * random_factor
-
-        # Сортируем с учетом случайности
-        randomized_candidates = sorted(top_candidates, key=random_score, reverse=True)
-
-        return randomized_candidates[:limit]
+        # Добавляем случайность ±10% к score и выбираем лучших с учетом случайности
+        randomized = [(score * rng.uniform(0.9, 1.1), position) for position, (score, _) in enumerate(top_candidates)]
+        return [top_candidates[position] for _, position in heapq.nlargest(limit, randomized, key=itemgetter(0))]
 
     async def get_candidate_stats(self, week_start: date) -> Dict[str, Any]:
         """Получить статистику по кандидатам на неделю"""
         try:
-            async with self.orator_db.pool.acquire() as conn:
-                # Общее количество активных регистраций
-                total_registrations = await conn.fetchval(
-                    """
-                    SELECT COUNT(*) FROM week_registrations
-                    WHERE week_start_date = $1 AND status = 'active'
-                    """,
-                    week_start,
-                )
-
-                # Количество созданных пар
-                total_pairs = await conn.fetchval(
-                    """
-                    SELECT COUNT(*) FROM user_pairs up
-                    JOIN week_registrations wr ON up.week_registration_id = wr.id
-                    WHERE wr.week_start_date = $1
-                    """,
-                    week_start,
-                )
+            stats = await self.orator_db.get_week_pair_stats(week_start)
+            total_pairs = stats["total_pairs"]
+            confirmed_pairs = stats["confirmed_pairs"]
 
-                # Количество подтвержденных пар
-                confirmed_pairs = await conn.fetchval(
-                    """
-                    SELECT COUNT(*) FROM user_pairs up
-                    JOIN week_registrations wr ON up.week_registration_id = wr.id
-                    WHERE wr.week_start_date = $1 AND up.status = 'confirmed'
-                    """,
-                    week_start,
-                )
-
-                return {
-                    "total_registrations": total_registrations,
-                    "total_pairs": total_pairs,
-                    "confirmed_pairs": confirmed_pairs,
-                    "confirmation_rate": (confirmed_pairs / total_pairs * 100) if total_pairs > 0 else 0,
-                }
+            return {
+                "total_registrations": stats["total_registrations"],
+                "total_pairs": total_pairs,
+                "confirmed_pairs": confirmed_pairs,
+                "confirmation_rate": (confirmed_pairs / total_pairs * 100) if total_pairs > 0 else 0,
+            }
 
         except Exception as e:
             logger.error(f"Error getting candidate stats: {e}")
@@ -440,5 +566,19 @@ class MatchingService:
 
 # Создаем экземпляр сервиса
 from .orator_database import orator_db
-
-matching_service = MatchingService(orator_db)
+from .candidate_pool import week_candidate_pool
+from .candidate_cache import candidate_result_cache
+from .match_suggestions import match_suggestion_service
+from .candidate_cursors import candidate_cursor_store
+from .parallel_scoring import parallel_scorer
+from .pair_history import pair_history_index
+
+matching_service = MatchingService(
+    orator_db,
+    week_candidate_pool,
+    candidate_result_cache,
+    match_suggestion_service,
+    candidate_cursor_store,
+    parallel_scorer,
+    pair_history_index,
+)
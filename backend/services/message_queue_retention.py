@@ -0,0 +1,85 @@
+"""
+Обслуживание помесячных партиций message_queue.
+
+Фоновая задача периодически создает партиции очереди наперед (чтобы новые сообщения
+не попадали в message_queue_default) и переносит в message_queue_archive партиции
+старше message_queue_keep_months полных месяцев, в которых все сообщения отправлены.
+Горячая часть очереди остается небольшой независимо от объема истории.
+
+Задача не запускается, пока в базе нет функций партиций (миграция
+0008_message_queue_partitions.sql не применена). Из нескольких процессов backend
+проход выполняет один — тот, кто получил advisory-блокировку.
+"""
+
+import asyncio
+from typing import List, Optional
+
+from loguru import logger
+
+from config.settings import settings
+from services.orator_database import OratorDatabaseService, orator_db
+
+
+class MessageQueueRetention:
+    """Создание и архивация партиций очереди сообщений"""
+
+    def __init__(
+        self,
+        db: OratorDatabaseService,
+        interval_seconds: int = None,
+        keep_months: int = None,
+        partitions_ahead: int = None,
+    ):
+        self.db = db
+        self.interval_seconds = interval_seconds or settings.message_queue_retention_interval_seconds
+        self.keep_months = keep_months if keep_months is not None else settings.message_queue_keep_months
+        self.partitions_ahead = (
+            partitions_ahead if partitions_ahead is not None else settings.message_queue_partitions_ahead
+        )
+        self._task: Optional[asyncio.Task] = None
+
+    # Жизненный цикл
+    async def start(self):
+        """Запустить фоновое обслуживание (первый проход — сразу, не блокируя старт)"""
+        if self._task is not None:
+            return
+        if not await self.db.message_queue_partitioned():
+            logger.warning("message_queue is not partitioned yet (run python migrate.py upgrade), retention disabled")
+            return
+        self._task = asyncio.create_task(self._loop())
+
+    async def stop(self):
+        if self._task:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+
+    async def _loop(self):
+        while True:
+            try:
+                await self.run_once()
+            except Exception as e:
+                logger.error(f"Message queue retention failed: {e}")
+            await asyncio.sleep(self.interval_seconds)
+
+    async def run_once(self) -> Optional[List[str]]:
+        """Создать партиции наперед и перенести старые в архив.
+
+        Возвращает перенесенные партиции или None, если проход выполняет другой процесс.
+        """
+        result = await self.db.maintain_message_queue_partitions(self.partitions_ahead, self.keep_months)
+        if result is None:
+            logger.debug("Message queue retention is running in another process, skipping")
+            return None
+        if result["created"]:
+            logger.info(f"Created {result['created']} message queue partitions")
+        if result["archived"]:
+            logger.info(f"Archived message queue partitions: {', '.join(result['archived'])}")
+        return result["archived"]
+
+
+# Создаем экземпляр сервиса
+message_queue_retention = MessageQueueRetention(orator_db)
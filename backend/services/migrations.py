@@ -0,0 +1,146 @@
+"""
+Версионные миграции схемы из каталога backend/migrations.
+
+Файл миграции называется NNNN_описание.sql, версия — числовой префикс. Примененные
+версии записываются в таблицу schema_migrations вместе с контрольной суммой файла;
+upgrade() применяет по порядку только новые версии. Миграции должны быть
+идемпотентными (IF NOT EXISTS, CREATE OR REPLACE): база, созданная из
+deployment/init-orator-app-db.sql, проходит их все при первом запуске.
+
+Каждая миграция выполняется в своей транзакции вместе с записью в schema_migrations.
+Миграции с пометкой "-- migrate: no-transaction" (CREATE INDEX CONCURRENTLY)
+выполняются по одному запросу вне транзакции, версия записывается после последнего.
+Одновременные запуски (несколько экземпляров backend) сериализуются advisory-блокировкой.
+"""
+
+import hashlib
+import re
+from pathlib import Path
+from typing import List, Dict, NamedTuple
+
+import asyncpg
+from loguru import logger
+
+MIGRATIONS_DIR = Path(__file__).resolve().parent.parent / "migrations"
+NO_TRANSACTION_MARKER = "-- migrate: no-transaction"
+# Ключ advisory-блокировки запуска миграций
+MIGRATIONS_LOCK_KEY = 7_240_001
+
+_FILE_NAME = re.compile(r"^(\d+)_(\w+)\.sql$")
+
+
+class Migration(NamedTuple):
+    """Файл миграции"""
+
+    version: int
+    name: str
+    sql: str
+    checksum: str
+    transactional: bool
+
+
+def load_migrations(directory: Path = MIGRATIONS_DIR) -> List[Migration]:
+    """Прочитать миграции каталога в порядке версий"""
+    migrations: Dict[int, Migration] = {}
+    for path in sorted(directory.glob("*.sql")):
+        match = _FILE_NAME.match(path.name)
+        if not match:
+            logger.warning(f"Skipping migration file without version prefix: {path.name}")
+            continue
+        version = int(match.group(1))
+        if version in migrations:
+            raise ValueError(f"Duplicate migration version {version}: {path.name}")
+        sql = path.read_text(encoding="utf-8")
+        migrations[version] = Migration(
+            version=version,
+            name=match.group(2),
+            sql=sql,
+            checksum=hashlib.sha256(sql.encode("utf-8")).hexdigest(),
+            transactional=NO_TRANSACTION_MARKER not in sql,
+        )
+    return [migrations[version] for version in sorted(migrations)]
+
+
+def split_statements(sql: str) -> List[str]:
+    """Разбить миграцию без транзакции на запросы (только простые запросы без $$-блоков)"""
+    lines = [line for line in sql.splitlines() if not line.strip().startswith("--")]
+    return [statement.strip() for statement in "\n".join(lines).split(";") if statement.strip()]
+
+
+class MigrationRunner:
+    """Применение миграций и учет версий в schema_migrations"""
+
+    def __init__(self, directory: Path = MIGRATIONS_DIR):
+        self.directory = directory
+
+    async def _ensure_table(self, conn: asyncpg.Connection):
+        await conn.execute(
+            """
+            CREATE TABLE IF NOT EXISTS schema_migrations (
+                version INTEGER PRIMARY KEY,
+                name VARCHAR(200) NOT NULL,
+                checksum VARCHAR(64) NOT NULL,
+                applied_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+            )
+            """
+        )
+
+    async def applied(self, conn: asyncpg.Connection) -> Dict[int, str]:
+        """Примененные версии и их контрольные суммы"""
+        await self._ensure_table(conn)
+        rows = await conn.fetch("SELECT version, checksum FROM schema_migrations")
+        return {row["version"]: row["checksum"] for row in rows}
+
+    async def status(self, conn: asyncpg.Connection) -> List[Dict[str, object]]:
+        """Состояние каждой миграции: applied, pending или changed (файл изменен после применения)"""
+        applied = await self.applied(conn)
+        result = []
+        for migration in load_migrations(self.directory):
+            if migration.version not in applied:
+                state = "pending"
+            elif applied[migration.version] != migration.checksum:
+                state = "changed"
+            else:
+                state = "applied"
+            result.append({"version": migration.version, "name": migration.name, "state": state})
+        return result
+
+    async def upgrade(self, conn: asyncpg.Connection) -> List[Migration]:
+        """Применить новые миграции; возвращает примененные"""
+        await conn.execute("SELECT pg_advisory_lock($1)", MIGRATIONS_LOCK_KEY)
+        try:
+            applied = await self.applied(conn)
+            done = []
+            for migration in load_migrations(self.directory):
+                if migration.version in applied:
+                    if applied[migration.version] != migration.checksum:
+                        logger.warning(
+                            f"Migration {migration.version}_{migration.name} changed after it was applied"
+                        )
+                    continue
+                await self._apply(conn, migration)
+                done.append(migration)
+            return done
+        finally:
+            await conn.execute("SELECT pg_advisory_unlock($1)", MIGRATIONS_LOCK_KEY)
+
+    async def _apply(self, conn: asyncpg.Connection, migration: Migration):
+        logger.info(f"Applying migration {migration.version}_{migration.name}")
+        record = (
+            "INSERT INTO schema_migrations (version, name, checksum) VALUES ($1, $2, $3)",
+            migration.version,
+            migration.name,
+            migration.checksum,
+        )
+        if migration.transactional:
+            async with conn.transaction():
+                await conn.execute(migration.sql)
+                await conn.execute(*record)
+        else:
+            for statement in split_statements(migration.sql):
+                await conn.execute(statement)
+            await conn.execute(*record)
+
+
+# Создаем глобальный экземпляр
+migration_runner = MigrationRunner()
@@ -1,11 +1,17 @@
-import asyncpg
-from typing import Optional, List, Dict, Any
+import asyncio
+import json
+from typing import Optional, List, Dict, Any, Tuple, NamedTuple, Callable, Set
 from models.orator.message_queue import MessageQueue
 from loguru import logger
 from datetime import datetime, date, timedelta
 from uuid import UUID
 
 from config.settings import settings
+from services.db_pool import DatabasePool, db_pool
+from services.prepared_statements import StatementRegistry
+from services.settings_cache import SettingsCache
+from services.db_notifications import DatabaseNotificationListener, db_notifications
+from services.matching_metrics import count_round_trip
 from models.orator import (
     UserProfile,
     WeekRegistration,
@@ -15,20 +21,206 @@ from models.orator import (
     BotContent,
     RegistrationStatus,
     PairStatus,
+    PairCreationStatus,
+    RegistrationCreationStatus,
     FeedbackRating,
     Gender,
 )
 
 
+# Горячие запросы: готовятся один раз на каждом соединении пула и вызываются по имени
+orator_statements = StatementRegistry()
+CURRENT_REGISTRATION = orator_statements.register(
+    "current_registration",
+    """
+    SELECT * FROM week_registrations
+    WHERE user_id = $1 AND status = 'active' AND week_end_date >= CURRENT_DATE
+    ORDER BY week_start_date DESC
+    LIMIT 1
+    """,
+)
+WEEK_REGISTRATION = orator_statements.register(
+    "week_registration",
+    """
+    SELECT * FROM week_registrations
+    WHERE user_id = $1 AND week_start_date = $2
+    """,
+)
+USER_TOPICS = orator_statements.register(
+    "user_topics",
+    """
+    SELECT topic_path FROM user_topics
+    WHERE week_registration_id = $1
+    """,
+)
+USER_PROFILE = orator_statements.register(
+    "user_profile",
+    """
+    SELECT 
+        u.telegram_id, u.username, u.first_name, u.last_name,
+        u.gender, u.created_at as registration_date,
+        u.total_sessions, u.feedback_count, u.is_active
+    FROM users u
+    WHERE u.id = $1
+    """,
+)
+USER_PAIRS = orator_statements.register(
+    "user_pairs",
+    """
+    SELECT 
+        up.id, up.status, up.created_at, up.confirmed_at, up.cancelled_at,
+        CASE 
+            WHEN up.user1_id = $1 THEN up.user2_id
+            ELSE up.user1_id
+        END as partner_id,
+        CASE 
+            WHEN up.user1_id = $1 THEN COALESCE(u2.username, '')
+            ELSE COALESCE(u1.username, '')
+        END as partner_username,
+        CASE 
+            WHEN up.user1_id = $1 THEN COALESCE(u2.telegram_id, '')
+            ELSE COALESCE(u1.telegram_id, '')
+        END as partner_telegram_id,
+        CASE 
+            WHEN up.user1_id = $1 THEN u2.first_name || ' ' || COALESCE(u2.last_name, '')
+            ELSE u1.first_name || ' ' || COALESCE(u1.last_name, '')
+        END as partner_name,
+        wr.week_start_date, wr.week_end_date,
+        CASE 
+            WHEN up.user1_id = $1 THEN TRUE
+            ELSE FALSE
+        END as is_initiator
+    FROM user_pairs up
+    JOIN week_registrations wr ON up.week_registration_id = wr.id
+    JOIN users u1 ON up.user1_id = u1.id
+    JOIN users u2 ON up.user2_id = u2.id
+    WHERE (up.user1_id = $1 OR up.user2_id = $1) 
+    AND wr.week_start_date = $2
+    AND up.status != 'cancelled'
+    ORDER BY up.created_at DESC
+    """,
+)
+BOT_CONTENT = orator_statements.register(
+    "bot_content",
+    """
+    SELECT content_text FROM bot_content
+    WHERE content_key = $1 AND language = $2 AND is_active = TRUE
+    """,
+)
+ACTIVE_SETTINGS = orator_statements.register(
+    "active_settings",
+    """
+    SELECT key, value FROM orator_settings
+    WHERE is_active = TRUE
+    """,
+)
+
+
+class PairCreationResult(NamedTuple):
+    """Результат create_user_pair: статус и созданная пара (только для CREATED)"""
+
+    status: PairCreationStatus
+    pair: Optional[Dict[str, Any]] = None
+
+
+# Сообщения о переходе пары: строятся по строке пары и пишутся в очередь в той же транзакции
+PairMessages = Callable[[Dict[str, Any]], List[MessageQueue]]
+
+# Ключ advisory-блокировки обслуживания партиций message_queue (один процесс за раз)
+MESSAGE_QUEUE_RETENTION_LOCK_KEY = 7_240_002
+
+# Канал уведомлений об изменении регистраций и пар (migrations/0009_matching_changes_notify.sql)
+MATCHING_CHANNEL = "orator_matching_changed"
+# Статусы пары, при которых она считается открытой
+OPEN_PAIR_STATUSES = ("pending", "confirmed")
+
+
+class RegistrationCreationResult(NamedTuple):
+    """Результат create_week_registration: статус и регистрация (только для CREATED)"""
+
+    status: RegistrationCreationStatus
+    registration: Optional[Dict[str, Any]] = None
+
+
 class OratorDatabaseService:
     def __init__(self):
-        self.database_url = settings.app_database_url
-        self.pool: Optional[asyncpg.Pool] = None
+        self.pool: Optional[DatabasePool] = None
+        self._listeners: List[Any] = []
+        # Задачи обработки уведомлений из базы (храним ссылки до завершения)
+        self._change_tasks: Set[asyncio.Task] = set()
+        self.settings_cache = SettingsCache(self._load_active_settings, settings.orator_settings_ttl_seconds)
+        db_pool.add_connection_init(orator_statements.prepare_connection)
+
+    def add_listener(self, listener: Any):
+        """Подписать объект на изменения регистраций и пар.
+
+        Слушатель может реализовать любые из методов on_registration_created,
+        on_registration_cancelled, on_pair_created, on_pair_confirmed и on_pair_cancelled,
+        а также on_changes_missed(db) — изменения могли быть пропущены (обрыв соединения
+        LISTEN), состояние нужно перезагрузить. События приходят и от изменений в этом
+        процессе, и повторно через уведомления базы, поэтому обработчики идемпотентны.
+        """
+        self._listeners.append(listener)
+
+    def listen_for_changes(self, notifications: DatabaseNotificationListener):
+        """Получать изменения регистраций и пар из других процессов через LISTEN/NOTIFY"""
+        notifications.subscribe(MATCHING_CHANNEL, self._on_change_notification, on_reconnect=self._on_changes_missed)
+
+    def _on_change_notification(self, payload: str):
+        self._spawn(self._apply_change(json.loads(payload)))
+
+    def _on_changes_missed(self):
+        logger.warning("Matching change notifications may have been missed, reloading listeners")
+        self._spawn(self._notify("on_changes_missed", self))
+
+    def _spawn(self, coroutine):
+        task = asyncio.create_task(coroutine)
+        self._change_tasks.add(task)
+        task.add_done_callback(self._change_tasks.discard)
+
+    async def _apply_change(self, change: Dict[str, Any]):
+        """Передать слушателям изменение из уведомления базы как событие OratorDatabaseService"""
+        if change.get("week_start_date") is None:
+            return
+        week_start = date.fromisoformat(change["week_start_date"])
+        status = change["status"]
+        if change["table"] == "week_registrations":
+            if status == RegistrationStatus.ACTIVE.value:
+                registration = {"id": change["id"], "user_id": change["user_id"], "week_start_date": week_start}
+                await self._notify("on_registration_created", registration)
+            else:
+                await self._notify("on_registration_cancelled", change["user_id"], week_start)
+        elif change["table"] == "user_pairs":
+            pair = {
+                "id": change["id"],
+                "user1_id": change["user1_id"],
+                "user2_id": change["user2_id"],
+                "week_start_date": week_start,
+                "status": status,
+            }
+            if status in OPEN_PAIR_STATUSES:
+                await self._notify("on_pair_created", pair)
+                if status == PairStatus.CONFIRMED.value:
+                    await self._notify("on_pair_confirmed", pair)
+            else:
+                await self._notify("on_pair_cancelled", pair)
+
+    async def _notify(self, event: str, *args):
+        """Уведомить слушателей об изменении данных"""
+        for listener in self._listeners:
+            handler = getattr(listener, event, None)
+            if handler is None:
+                continue
+            try:
+                await handler(*args)
+            except Exception as e:
+                logger.error(f"Listener {type(listener).__name__} failed on {event}: {e}")
 
     async def connect(self):
         """Подключение к базе данных"""
         try:
-            self.pool = await asyncpg.create_pool(self.database_url)
+            self.pool = await db_pool.open()
+            await db_notifications.start()
             # Временно отключаем создание таблиц для отладки
             # await self._create_orator_tables()
             logger.info("Connected to orator database")
@@ -39,6 +231,7 @@ class OratorDatabaseService:
     async def disconnect(self):
         """Отключение от базы данных"""
         if self.pool:
+            await db_notifications.stop()
             await self.pool.close()
             logger.info("Disconnected from orator database")
 
@@ -97,6 +290,53 @@ class OratorDatabaseService:
             """
             )
 
+            # Время регистрации в минутах от начала дня (МСК): подбор сравнивает время
+            # числами и выбирает кандидатов по диапазону минут, не разбирая строки "HH:MM"
+            await conn.execute(
+                """
+                ALTER TABLE week_registrations ADD COLUMN IF NOT EXISTS
+                preferred_minute_msk SMALLINT
+                """
+            )
+            await conn.execute(
+                """
+                CREATE OR REPLACE FUNCTION week_registration_preferred_minute(time_msk TEXT) RETURNS SMALLINT AS $$
+                    SELECT CASE
+                        WHEN time_msk ~ '^[0-9]{1,2}:[0-9]{2}$'
+                        THEN (split_part(time_msk, ':', 1)::int * 60 + split_part(time_msk, ':', 2)::int)::smallint
+                    END
+                $$ LANGUAGE sql IMMUTABLE
+                """
+            )
+            await conn.execute(
+                """
+                CREATE OR REPLACE FUNCTION set_week_registration_preferred_minute() RETURNS trigger AS $$
+                BEGIN
+                    NEW.preferred_minute_msk := week_registration_preferred_minute(NEW.preferred_time_msk);
+                    RETURN NEW;
+                END;
+                $$ LANGUAGE plpgsql
+                """
+            )
+            # Триггер заполняет минуты и при записи в обход backend (например, из админки)
+            await conn.execute("DROP TRIGGER IF EXISTS week_registrations_preferred_minute ON week_registrations")
+            await conn.execute(
+                """
+                CREATE TRIGGER week_registrations_preferred_minute
+                BEFORE INSERT OR UPDATE OF preferred_time_msk ON week_registrations
+                FOR EACH ROW EXECUTE FUNCTION set_week_registration_preferred_minute()
+                """
+            )
+            # Заполняем минуты для регистраций, созданных до появления колонки
+            await conn.execute(
+                """
+                UPDATE week_registrations
+                SET preferred_minute_msk = week_registration_preferred_minute(preferred_time_msk)
+                WHERE preferred_minute_msk IS NULL
+                AND week_registration_preferred_minute(preferred_time_msk) IS NOT NULL
+                """
+            )
+
             # Таблица выбранных тем пользователей
             await conn.execute(
                 """
@@ -127,6 +367,87 @@ class OratorDatabaseService:
             """
             )
 
+            # Счетчики открытых (pending и confirmed) пар пользователя на неделю,
+            # обновляются в одной транзакции с изменением пары
+            await conn.execute(
+                """
+                CREATE TABLE IF NOT EXISTS week_user_pair_stats (
+                    week_start_date DATE NOT NULL,
+                    user_id UUID REFERENCES users(id) ON DELETE CASCADE,
+                    open_pairs INTEGER NOT NULL DEFAULT 0,
+                    updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+                    PRIMARY KEY (week_start_date, user_id)
+                )
+            """
+            )
+            # Создание пары с проверкой лимита пар одним вызовом (см. create_user_pair)
+            await conn.execute(
+                """
+                CREATE OR REPLACE FUNCTION create_user_pair_checked(
+                    p_user1_id UUID, p_user2_id UUID, p_registration_id UUID, p_max_pairs INTEGER
+                ) RETURNS TABLE (result TEXT, pair_id UUID, week_start_date DATE) AS $$
+                #variable_conflict use_column
+                DECLARE
+                    v_week DATE;
+                    v_user UUID;
+                    v_pair_id UUID;
+                BEGIN
+                    SELECT wr.week_start_date INTO v_week
+                    FROM week_registrations wr
+                    WHERE wr.id = p_registration_id AND wr.status = 'active';
+                    IF v_week IS NULL THEN
+                        RETURN QUERY SELECT 'not_registered'::text, NULL::uuid, NULL::date;
+                        RETURN;
+                    END IF;
+
+                    -- Блокировка на пользователя недели (в порядке user_id, до конца транзакции):
+                    -- параллельные создания пар с тем же пользователем проверяют счетчик по очереди
+                    FOR v_user IN SELECT DISTINCT u FROM unnest(ARRAY[p_user1_id, p_user2_id]) AS u ORDER BY u LOOP
+                        PERFORM pg_advisory_xact_lock(hashtextextended('user_pairs:' || v_week || ':' || v_user, 0));
+                    END LOOP;
+
+                    IF EXISTS (
+                        SELECT 1
+                        FROM user_pairs up
+                        JOIN week_registrations wr ON up.week_registration_id = wr.id
+                        WHERE wr.week_start_date = v_week
+                        AND up.status IN ('pending', 'confirmed')
+                        AND ((up.user1_id = p_user1_id AND up.user2_id = p_user2_id)
+                            OR (up.user1_id = p_user2_id AND up.user2_id = p_user1_id))
+                    ) THEN
+                        RETURN QUERY SELECT 'already_paired'::text, NULL::uuid, v_week;
+                        RETURN;
+                    END IF;
+
+                    IF EXISTS (
+                        SELECT 1
+                        FROM week_user_pair_stats ps
+                        WHERE ps.week_start_date = v_week
+                        AND ps.user_id IN (p_user1_id, p_user2_id)
+                        AND ps.open_pairs >= p_max_pairs
+                    ) THEN
+                        RETURN QUERY SELECT 'capacity_reached'::text, NULL::uuid, v_week;
+                        RETURN;
+                    END IF;
+
+                    INSERT INTO user_pairs (user1_id, user2_id, week_registration_id)
+                    VALUES (p_user1_id, p_user2_id, p_registration_id)
+                    RETURNING id INTO v_pair_id;
+
+                    INSERT INTO week_user_pair_stats (week_start_date, user_id, open_pairs)
+                    SELECT v_week, u, 1
+                    FROM unnest(ARRAY[p_user1_id, p_user2_id]) AS u
+                    ORDER BY u
+                    ON CONFLICT (week_start_date, user_id) DO UPDATE
+                    SET open_pairs = week_user_pair_stats.open_pairs + 1,
+                        updated_at = CURRENT_TIMESTAMP;
+
+                    RETURN QUERY SELECT 'created'::text, v_pair_id, v_week;
+                END;
+                $$ LANGUAGE plpgsql
+                """
+            )
+
             # Таблица обратной связи
             await conn.execute(
                 """
@@ -194,14 +515,33 @@ class OratorDatabaseService:
             await conn.execute(
                 "CREATE INDEX IF NOT EXISTS idx_week_registrations_week_dates ON week_registrations(week_start_date, week_end_date)"
             )
+            # Активные регистрации недели по времени: кандидаты в окне минут читаются диапазоном индекса
+            await conn.execute(
+                """
+                CREATE INDEX IF NOT EXISTS idx_week_registrations_week_minute
+                ON week_registrations(week_start_date, preferred_minute_msk)
+                WHERE status = 'active'
+                """
+            )
             await conn.execute(
                 "CREATE INDEX IF NOT EXISTS idx_user_topics_registration_id ON user_topics(week_registration_id)"
             )
             await conn.execute("CREATE INDEX IF NOT EXISTS idx_user_pairs_users ON user_pairs(user1_id, user2_id)")
             await conn.execute("CREATE INDEX IF NOT EXISTS idx_user_pairs_status ON user_pairs(status)")
             await conn.execute("CREATE INDEX IF NOT EXISTS idx_session_feedback_pair_id ON session_feedback(pair_id)")
+            # Индексы горячих запросов (migrations/0007_hot_query_indexes.sql)
+            await conn.execute(
+                "CREATE INDEX IF NOT EXISTS idx_week_registrations_week_status ON week_registrations(week_start_date, status)"
+            )
+            await conn.execute(
+                "CREATE INDEX IF NOT EXISTS idx_user_pairs_registration_status ON user_pairs(week_registration_id, status)"
+            )
+            await conn.execute("CREATE INDEX IF NOT EXISTS idx_user_pairs_user2_id ON user_pairs(user2_id)")
+            await conn.execute(
+                "CREATE INDEX IF NOT EXISTS idx_bot_content_key_language ON bot_content(content_key, language)"
+            )
 
-            # Таблица очереди сообщений
+            # Таблица очереди сообщений (партиции и архив — миграция 0008_message_queue_partitions.sql)
             await conn.execute(
                 """
                 CREATE TABLE IF NOT EXISTS message_queue (
@@ -215,6 +555,9 @@ class OratorDatabaseService:
                 )
             """
             )
+            await conn.execute(
+                "CREATE INDEX IF NOT EXISTS idx_message_queue_sent_created_at ON message_queue(sent, created_at)"
+            )
 
             # Инициализация базового контента
             # await self._initialize_bot_content(conn)
@@ -442,17 +785,7 @@ class OratorDatabaseService:
     async def get_user_profile(self, user_id: UUID) -> Optional[Dict[str, Any]]:
         """Получить профиль пользователя"""
         async with self.pool.acquire() as conn:
-            row = await conn.fetchrow(
-                """
-                SELECT 
-                    u.telegram_id, u.username, u.first_name, u.last_name,
-                    u.gender, u.created_at as registration_date,
-                    u.total_sessions, u.feedback_count, u.is_active
-                FROM users u
-                WHERE u.id = $1
-                """,
-                user_id,
-            )
+            row = await orator_statements.fetchrow(conn, USER_PROFILE, user_id)
             return dict(row) if row else None
 
     async def update_user_profile(self, user_id: UUID, profile_data: Dict[str, Any]) -> Optional[Dict[str, Any]]:
@@ -514,74 +847,80 @@ class OratorDatabaseService:
     # Методы для работы с недельными регистрациями
     async def create_week_registration(
         self, user_id: UUID, week_start: date, week_end: date, preferred_time: str, selected_topics: List[str] = None
-    ) -> UUID:
-        """Создать регистрацию на неделю"""
+    ) -> RegistrationCreationResult:
+        """Создать регистрацию на неделю вместе с темами одним запросом.
+
+        Запрос проверяет, может ли пользователь зарегистрироваться снова (те же условия,
+        что в can_user_register_again), вставляет регистрацию и темы и возвращает
+        вставленную строку. Все выполняется одним атомарным запросом.
+        """
+        topics = list(selected_topics or [])
         async with self.pool.acquire() as conn:
-            # Создаем регистрацию
-            registration_id = await conn.fetchval(
+            row = await conn.fetchrow(
                 """
-                INSERT INTO week_registrations 
-                (user_id, week_start_date, week_end_date, preferred_time_msk)
-                VALUES ($1, $2, $3, $4)
-                RETURNING id
+                WITH eligibility AS (
+                    SELECT
+                        NOT EXISTS (
+                            SELECT 1 FROM week_registrations
+                            WHERE user_id = $1 AND created_at < CURRENT_DATE
+                        )
+                        OR COALESCE(
+                            (SELECT feedback_count >= total_sessions FROM users WHERE id = $1), FALSE
+                        ) as eligible
+                ),
+                registration AS (
+                    INSERT INTO week_registrations
+                    (user_id, week_start_date, week_end_date, preferred_time_msk)
+                    SELECT $1, $2, $3, $4
+                    FROM eligibility
+                    WHERE eligible
+                    RETURNING *
+                ),
+                topics AS (
+                    INSERT INTO user_topics (user_id, week_registration_id, topic_path)
+                    SELECT r.user_id, r.id, t.topic_path
+                    FROM registration r
+                    CROSS JOIN unnest($5::text[]) AS t(topic_path)
+                )
+                SELECT e.eligible, r.*
+                FROM eligibility e
+                LEFT JOIN registration r ON TRUE
                 """,
                 user_id,
                 week_start,
                 week_end,
                 preferred_time,
+                topics,
             )
 
-            # Добавляем выбранные темы, если они есть
-            if selected_topics:
-                await self.add_user_topics(user_id, registration_id, selected_topics)
+        if not row["eligible"]:
+            return RegistrationCreationResult(RegistrationCreationStatus.FEEDBACK_REQUIRED)
 
-            # Возвращаем созданную регистрацию
-            row = await conn.fetchrow(
-                """
-                SELECT * FROM week_registrations WHERE id = $1
-                """,
-                registration_id,
-            )
-            registration = dict(row) if row else None
-
-            if registration and selected_topics:
-                registration["selected_topics"] = selected_topics
-
-            return registration
+        registration = dict(row)
+        del registration["eligible"]
+        if topics:
+            registration["selected_topics"] = topics
+        await self._notify("on_registration_created", registration)
+        return RegistrationCreationResult(RegistrationCreationStatus.CREATED, registration)
 
     async def get_user_week_registration(self, user_id: UUID, week_start: date = None) -> Optional[Dict[str, Any]]:
         """Получить регистрацию пользователя на неделю"""
         async with self.pool.acquire() as conn:
             if week_start is None:
                 # Получаем текущую активную регистрацию
-                row = await conn.fetchrow(
-                    """
-                    SELECT * FROM week_registrations
-                    WHERE user_id = $1 AND status = 'active' AND week_end_date >= CURRENT_DATE
-                    ORDER BY week_start_date DESC
-                    LIMIT 1
-                    """,
-                    user_id,
-                )
+                row = await orator_statements.fetchrow(conn, CURRENT_REGISTRATION, user_id)
             else:
                 # Получаем регистрацию на конкретную неделю
-                row = await conn.fetchrow(
-                    """
-                    SELECT * FROM week_registrations
-                    WHERE user_id = $1 AND week_start_date = $2
-                    """,
-                    user_id,
-                    week_start,
-                )
+                row = await orator_statements.fetchrow(conn, WEEK_REGISTRATION, user_id, week_start)
 
             if not row:
                 return None
 
             registration = dict(row)
 
-            # Получаем выбранные темы
-            topics = await self.get_user_topics(registration["id"])
-            registration["selected_topics"] = topics
+            # Получаем выбранные темы на том же соединении
+            rows = await orator_statements.fetch(conn, USER_TOPICS, registration["id"])
+            registration["selected_topics"] = [row["topic_path"] for row in rows]
 
             return registration
 
@@ -597,167 +936,447 @@ class OratorDatabaseService:
                 user_id,
                 week_start,
             )
-            return result != "UPDATE 0"
+
+        if result == "UPDATE 0":
+            return False
+
+        await self._notify("on_registration_cancelled", user_id, week_start)
+        return True
 
     # Методы для работы с темами
     async def add_user_topics(self, user_id: UUID, registration_id: UUID, topics: List[str]) -> bool:
         """Добавить выбранные темы пользователя"""
         async with self.pool.acquire() as conn:
-            for topic in topics:
+            await self._insert_user_topics(conn, user_id, registration_id, topics)
+            return True
+
+    async def _insert_user_topics(self, conn, user_id: UUID, registration_id: UUID, topics: List[str]):
+        """Вставить темы одним запросом (массив тем разворачивается через unnest)"""
+        await conn.execute(
+            """
+            INSERT INTO user_topics (user_id, week_registration_id, topic_path)
+            SELECT $1, $2, t.topic_path
+            FROM unnest($3::text[]) AS t(topic_path)
+            """,
+            user_id,
+            registration_id,
+            list(topics),
+        )
+
+    async def update_user_topics(self, registration_id: UUID, topics: List[str], diff: bool = False) -> bool:
+        """Обновить выбранные темы пользователя одним запросом.
+
+        По умолчанию темы регистрации заменяются целиком. С diff=True удаляются только
+        темы, которых нет в новом списке, и добавляются только отсутствующие, поэтому
+        неизмененные строки (и их created_at) не трогаются.
+        """
+        async with self.pool.acquire() as conn:
+            if not diff:
                 await conn.execute(
                     """
+                    WITH removed AS (
+                        DELETE FROM user_topics
+                        WHERE week_registration_id = $1
+                    )
                     INSERT INTO user_topics (user_id, week_registration_id, topic_path)
-                    VALUES ($1, $2, $3)
+                    SELECT wr.user_id, wr.id, t.topic_path
+                    FROM week_registrations wr
+                    CROSS JOIN unnest($2::text[]) AS t(topic_path)
+                    WHERE wr.id = $1
                     """,
-                    user_id,
                     registration_id,
-                    topic,
+                    list(topics),
                 )
-            return True
+                return True
 
-    async def update_user_topics(self, registration_id: UUID, topics: List[str]) -> bool:
-        """Обновить выбранные темы пользователя"""
-        async with self.pool.acquire() as conn:
-            # Удаляем старые темы
-            await conn.execute(
+            row = await conn.fetchrow(
                 """
-                DELETE FROM user_topics
-                WHERE week_registration_id = $1
+                WITH removed AS (
+                    DELETE FROM user_topics
+                    WHERE week_registration_id = $1 AND topic_path <> ALL($2::text[])
+                    RETURNING 1
+                ),
+                added AS (
+                    INSERT INTO user_topics (user_id, week_registration_id, topic_path)
+                    SELECT wr.user_id, wr.id, t.topic_path
+                    FROM week_registrations wr
+                    CROSS JOIN (SELECT DISTINCT unnest($2::text[]) AS topic_path) t
+                    WHERE wr.id = $1
+                    AND NOT EXISTS (
+                        SELECT 1 FROM user_topics ut
+                        WHERE ut.week_registration_id = $1 AND ut.topic_path = t.topic_path
+                    )
+                    RETURNING 1
+                )
+                SELECT (SELECT COUNT(*) FROM added) as added, (SELECT COUNT(*) FROM removed) as removed
                 """,
                 registration_id,
+                list(topics),
             )
-
-            # Добавляем новые темы
-            for topic in topics:
-                await conn.execute(
-                    """
-                    INSERT INTO user_topics (user_id, week_registration_id, topic_path)
-                    SELECT user_id, $1, $2
-                    FROM week_registrations
-                    WHERE id = $1
-                    """,
-                    registration_id,
-                    topic,
-                )
+            logger.info(f"Topics of registration {registration_id} updated: +{row['added']} -{row['removed']}")
             return True
 
     async def get_user_topics(self, registration_id: UUID) -> List[str]:
         """Получить темы пользователя для регистрации"""
         async with self.pool.acquire() as conn:
-            rows = await conn.fetch(
-                """
-                SELECT topic_path FROM user_topics
-                WHERE week_registration_id = $1
-                """,
-                registration_id,
-            )
+            rows = await orator_statements.fetch(conn, USER_TOPICS, registration_id)
             return [row["topic_path"] for row in rows]
 
-    # Методы для работы с парами
-    async def create_user_pair(self, user1_id: UUID, user2_id: UUID, registration_id: UUID) -> Optional[Dict[str, Any]]:
-        """Создать пару пользователей"""
+    # Методы для подбора пар
+    async def get_matching_user_info(self, user_id: UUID, week_start: date) -> Optional[Dict[str, Any]]:
+        """Получить профиль, регистрацию и темы пользователя для матчинга одним запросом"""
+        count_round_trip()
         async with self.pool.acquire() as conn:
-            pair_id = await conn.fetchval(
-                """
-                INSERT INTO user_pairs (user1_id, user2_id, week_registration_id)
-                VALUES ($1, $2, $3)
-                RETURNING id
-                """,
-                user1_id,
-                user2_id,
-                registration_id,
-            )
-
-            # Возвращаем полную информацию о созданной паре
             row = await conn.fetchrow(
                 """
-                SELECT 
-                    up.id, up.status, up.created_at, up.confirmed_at, up.cancelled_at,
-                    up.user1_id, up.user2_id,
-                    up.user2_id as partner_id,
-                    COALESCE(u2.username, '') as partner_username,
-                    u2.telegram_id as partner_telegram_id,
-                    u2.first_name || ' ' || COALESCE(u2.last_name, '') as partner_name,
-                    wr.week_start_date, wr.week_end_date,
-                    TRUE as is_initiator
-                FROM user_pairs up
-                JOIN week_registrations wr ON up.week_registration_id = wr.id
-                JOIN users u1 ON up.user1_id = u1.id
-                JOIN users u2 ON up.user2_id = u2.id
-                WHERE up.id = $1
+                SELECT
+                    u.telegram_id, u.first_name, u.last_name, u.gender, u.is_active,
+                    COALESCE(u.total_sessions, 0) as total_sessions,
+                    wr.id as registration_id, wr.status,
+                    wr.preferred_time_msk, wr.preferred_minute_msk,
+                    COALESCE(
+                        (SELECT array_agg(ut.topic_path::text) FROM user_topics ut WHERE ut.week_registration_id = wr.id),
+                        '{}'::text[]
+                    ) as topics
+                FROM users u
+                JOIN week_registrations wr ON wr.user_id = u.id
+                WHERE u.id = $1 AND wr.week_start_date = $2
+                ORDER BY (wr.status = 'active') DESC, wr.created_at DESC
+                LIMIT 1
                 """,
-                pair_id,
+                user_id,
+                week_start,
             )
-            return dict(row) if row else None
+            if not row:
+                return None
+
+            return {
+                "user_id": user_id,
+                "telegram_id": row["telegram_id"],
+                "name": f"{row['first_name'] or ''} {row['last_name'] or ''}".strip(),
+                "gender": row["gender"],
+                "total_sessions": row["total_sessions"],
+                "preferred_time_msk": row["preferred_time_msk"],
+                "preferred_minute_msk": row["preferred_minute_msk"],
+                "topics": list(row["topics"]),
+                "registration_id": row["registration_id"],
+                "is_active": row["is_active"],
+                "status": row["status"],
+            }
 
-    async def confirm_user_pair(self, pair_id: UUID, confirmed: bool, user_id: UUID = None) -> Optional[Dict[str, Any]]:
-        """Подтвердить или отклонить пару"""
+    async def get_week_candidates(
+        self, week_start: date, exclude_user_id: UUID = None, max_pairs_per_user: int = None
+    ) -> List[Dict[str, Any]]:
+        """Получить активных кандидатов недели вместе с темами и количеством открытых пар одним запросом.
+
+        Если передан exclude_user_id, исключаются сам пользователь и те, с кем у него уже есть
+        пара в статусе pending или confirmed. Если передан max_pairs_per_user, исключаются
+        пользователи, у которых открытых пар уже не меньше лимита.
+        """
+        count_round_trip()
         async with self.pool.acquire() as conn:
-            # Сначала проверяем, существует ли пара
-            pair_exists = await conn.fetchval(
+            rows = await conn.fetch(
                 """
-                SELECT id FROM user_pairs WHERE id = $1
+                WITH partners AS (
+                    SELECT CASE WHEN up.user1_id = $2::uuid THEN up.user2_id ELSE up.user1_id END as user_id
+                    FROM user_pairs up
+                    JOIN week_registrations wr ON up.week_registration_id = wr.id
+                    WHERE $2::uuid IS NOT NULL
+                    AND (up.user1_id = $2::uuid OR up.user2_id = $2::uuid)
+                    AND wr.week_start_date = $1
+                    AND up.status IN ('pending', 'confirmed')
+                )
+                SELECT
+                    u.id as user_id, u.telegram_id,
+                    u.first_name, u.last_name, u.gender,
+                    COALESCE(u.total_sessions, 0) as total_sessions,
+                    wr.preferred_time_msk, wr.preferred_minute_msk,
+                    wr.id as registration_id,
+                    COALESCE(ps.open_pairs, 0) as open_pairs,
+                    COALESCE(t.topics, '{}'::text[]) as topics
+                FROM week_registrations wr
+                JOIN users u ON u.id = wr.user_id
+                LEFT JOIN week_user_pair_stats ps ON ps.week_start_date = $1 AND ps.user_id = u.id
+                LEFT JOIN LATERAL (
+                    SELECT array_agg(ut.topic_path::text) as topics
+                    FROM user_topics ut
+                    WHERE ut.week_registration_id = wr.id
+                ) t ON TRUE
+                WHERE wr.week_start_date = $1
+                AND wr.status = 'active'
+                AND u.is_active = TRUE
+                AND ($2::uuid IS NULL OR u.id != $2::uuid)
+                AND ($3::int IS NULL OR COALESCE(ps.open_pairs, 0) < $3::int)
+                AND NOT EXISTS (SELECT 1 FROM partners p WHERE p.user_id = u.id)
                 """,
-                pair_id,
+                week_start,
+                exclude_user_id,
+                max_pairs_per_user,
             )
 
-            if not pair_exists:
-                return None
+            return [
+                {
+                    "user_id": row["user_id"],
+                    "telegram_id": row["telegram_id"],
+                    "name": f"{row['first_name'] or ''} {row['last_name'] or ''}".strip(),
+                    "gender": row["gender"],
+                    "total_sessions": row["total_sessions"],
+                    "preferred_time_msk": row["preferred_time_msk"],
+                    "preferred_minute_msk": row["preferred_minute_msk"],
+                    "topics": list(row["topics"]),
+                    "registration_id": row["registration_id"],
+                    "open_pairs": row["open_pairs"],
+                }
+                for row in rows
+            ]
 
-            # Проверяем текущий статус пары
-            current_status = await conn.fetchval(
-                """
-                SELECT status FROM user_pairs WHERE id = $1
-                """,
-                pair_id,
-            )
+    # Методы для работы с парами
+    async def _shift_open_pairs(self, conn, week_start: date, user_ids: List[UUID], delta: int):
+        """Изменить счетчики открытых пар пользователей недели на delta за каждое упоминание.
+
+        Вызывается в транзакции, которая меняет пары; строки блокируются в порядке user_id,
+        чтобы параллельные транзакции не блокировали друг друга крест-накрест.
+        """
+        await conn.execute(
+            """
+            INSERT INTO week_user_pair_stats (week_start_date, user_id, open_pairs)
+            SELECT $1, u.user_id, COUNT(*) * $3::int
+            FROM unnest($2::uuid[]) AS u(user_id)
+            GROUP BY u.user_id
+            ORDER BY u.user_id
+            ON CONFLICT (week_start_date, user_id) DO UPDATE
+            SET open_pairs = week_user_pair_stats.open_pairs + EXCLUDED.open_pairs,
+                updated_at = CURRENT_TIMESTAMP
+            """,
+            week_start,
+            user_ids,
+            delta,
+        )
+
+    async def create_user_pair(
+        self,
+        user1_id: UUID,
+        user2_id: UUID,
+        registration_id: UUID,
+        max_pairs_per_user: int = None,
+        messages: PairMessages = None,
+    ) -> PairCreationResult:
+        """Создать пару пользователей, если у обоих не исчерпан лимит пар на неделю.
+
+        Проверка и вставка выполняются одним вызовом функции create_user_pair_checked под
+        advisory-блокировками пользователей, поэтому одновременные запросы к одному кандидату
+        не создают пар сверх лимита. messages строит сообщения о новой паре; они пишутся
+        в очередь в той же транзакции, что и пара.
+        """
+        if max_pairs_per_user is None:
+            max_pairs_per_user = await self.get_setting_int("max_pairs_per_user", 3)
+
+        async with self.pool.acquire() as conn:
+            async with conn.transaction():
+                created = await conn.fetchrow(
+                    "SELECT result, pair_id, week_start_date FROM create_user_pair_checked($1, $2, $3, $4)",
+                    user1_id,
+                    user2_id,
+                    registration_id,
+                    max_pairs_per_user,
+                )
+                status = PairCreationStatus(created["result"])
+                if status != PairCreationStatus.CREATED:
+                    logger.info(f"Pair {user1_id} - {user2_id} not created: {status.value}")
+                    return PairCreationResult(status)
 
-            # Если пара уже подтверждена и мы пытаемся подтвердить её снова
-            if confirmed and current_status == "confirmed":
-                # Возвращаем информацию о паре без обновления
+                # Полная информация о созданной паре, инициатор — user1
                 row = await conn.fetchrow(
                     """
                     SELECT 
                         up.id, up.status, up.created_at, up.confirmed_at, up.cancelled_at,
                         up.user1_id, up.user2_id,
-                        CASE 
-                            WHEN up.user1_id = $2 THEN up.user2_id
-                            ELSE up.user1_id
-                        END as partner_id,
-                        CASE 
-                            WHEN up.user1_id = $2 THEN COALESCE(u2.username, '')
-                            ELSE COALESCE(u1.username, '')
-                        END as partner_username,
-                        CASE 
-                            WHEN up.user1_id = $2 THEN u2.telegram_id
-                            ELSE u1.telegram_id
-                        END as partner_telegram_id,
-                        CASE 
-                            WHEN up.user1_id = $2 THEN u2.first_name || ' ' || COALESCE(u2.last_name, '')
-                            ELSE u1.first_name || ' ' || COALESCE(u1.last_name, '')
-                        END as partner_name,
+                        up.user2_id as partner_id,
+                        COALESCE(u2.username, '') as partner_username,
+                        u2.telegram_id as partner_telegram_id,
+                        u2.first_name || ' ' || COALESCE(u2.last_name, '') as partner_name,
+                        u2.first_name as partner_first_name,
+                        COALESCE(u1.username, '') as user_username,
+                        u1.telegram_id as user_telegram_id,
+                        u1.first_name as user_first_name,
                         wr.week_start_date, wr.week_end_date,
-                        CASE 
-                            WHEN up.user1_id = $2 THEN TRUE
-                            ELSE FALSE
-                        END as is_initiator
+                        TRUE as is_initiator
                     FROM user_pairs up
                     JOIN week_registrations wr ON up.week_registration_id = wr.id
                     JOIN users u1 ON up.user1_id = u1.id
                     JOIN users u2 ON up.user2_id = u2.id
                     WHERE up.id = $1
                     """,
-                    pair_id,
-                    user_id,
+                    created["pair_id"],
                 )
-                return dict(row) if row else None
+                user_pair = dict(row)
+                if messages is not None:
+                    await self._insert_messages(conn, messages(user_pair))
+
+        await self._notify("on_pair_created", user_pair)
+        return PairCreationResult(status, user_pair)
+
+    async def _insert_messages(self, conn, messages: List[MessageQueue]):
+        """Записать сообщения в очередь одним запросом (в транзакции вызывающего)"""
+        if not messages:
+            return
+        await conn.execute(
+            """
+            INSERT INTO message_queue (user_id, message, keyboard, sent)
+            SELECT m.user_id, m.message, m.keyboard::jsonb, FALSE
+            FROM unnest($1::text[], $2::text[], $3::text[]) AS m(user_id, message, keyboard)
+            """,
+            [message.user_id for message in messages],
+            [message.message for message in messages],
+            [json.dumps(message.keyboard) if message.keyboard else None for message in messages],
+        )
+
+    async def create_pairs_with_messages(
+        self,
+        week_start: date,
+        pairs: List[Dict[str, Any]],
+        messages: List[Tuple[UUID, MessageQueue]],
+        max_pairs_per_user: int = None,
+    ) -> List[Dict[str, Any]]:
+        """Создать пары и сообщения о них в одной транзакции.
+
+        pairs — словари с id, user1_id, user2_id и registration_id; messages — пары (id пары, сообщение).
+        Лимит пар проверяется заново под теми же advisory-блокировками пользователей, что и в
+        create_user_pair_checked: пары, созданные после расчета плана, не дают превысить
+        max_pairs_per_user. Пара пропускается, если лимит исчерпан или у пользователей уже есть
+        открытая пара на эту неделю; сообщения пропущенных пар не создаются.
+        """
+        if max_pairs_per_user is None:
+            max_pairs_per_user = await self.get_setting_int("max_pairs_per_user", 3)
+
+        user_ids = [pair["user1_id"] for pair in pairs] + [pair["user2_id"] for pair in pairs]
+        async with self.pool.acquire() as conn:
+            async with conn.transaction():
+                # Блокировки в порядке user_id, как в create_user_pair_checked
+                await conn.execute(
+                    """
+                    SELECT pg_advisory_xact_lock(hashtextextended('user_pairs:' || $1::date || ':' || u.user_id, 0))
+                    FROM (SELECT DISTINCT user_id FROM unnest($2::uuid[]) AS user_id ORDER BY user_id) u
+                    """,
+                    week_start,
+                    user_ids,
+                )
+                stats = await conn.fetch(
+                    """
+                    SELECT user_id, open_pairs FROM week_user_pair_stats
+                    WHERE week_start_date = $1 AND user_id = ANY($2::uuid[])
+                    """,
+                    week_start,
+                    user_ids,
+                )
+                open_pairs = {str(row["user_id"]): row["open_pairs"] for row in stats}
+                accepted = []
+                for pair in pairs:
+                    users = (str(pair["user1_id"]), str(pair["user2_id"]))
+                    if any(open_pairs.get(user, 0) >= max_pairs_per_user for user in users):
+                        logger.info(f"Pair {users[0]} - {users[1]} not created: capacity_reached")
+                        continue
+                    accepted.append(pair)
+                    for user in users:
+                        open_pairs[user] = open_pairs.get(user, 0) + 1
 
-            # Если пара уже отменена и мы пытаемся отменить её снова
-            if not confirmed and current_status == "cancelled":
-                # Возвращаем информацию о паре без обновления
-                row = await conn.fetchrow(
+                rows = await conn.fetch(
                     """
+                    INSERT INTO user_pairs (id, user1_id, user2_id, week_registration_id)
+                    SELECT p.id, p.user1_id, p.user2_id, p.registration_id
+                    FROM unnest($1::uuid[], $2::uuid[], $3::uuid[], $4::uuid[])
+                        AS p(id, user1_id, user2_id, registration_id)
+                    WHERE NOT EXISTS (
+                        SELECT 1
+                        FROM user_pairs up
+                        JOIN week_registrations wr ON up.week_registration_id = wr.id
+                        WHERE wr.week_start_date = $5
+                        AND up.status IN ('pending', 'confirmed')
+                        AND (
+                            (up.user1_id = p.user1_id AND up.user2_id = p.user2_id)
+                            OR (up.user1_id = p.user2_id AND up.user2_id = p.user1_id)
+                        )
+                    )
+                    RETURNING id, user1_id, user2_id, status
+                    """,
+                    [pair["id"] for pair in accepted],
+                    [pair["user1_id"] for pair in accepted],
+                    [pair["user2_id"] for pair in accepted],
+                    [pair["registration_id"] for pair in accepted],
+                    week_start,
+                )
+                created_ids = [row["id"] for row in rows]
+                if rows:
+                    user_ids = [row["user1_id"] for row in rows] + [row["user2_id"] for row in rows]
+                    await self._shift_open_pairs(conn, week_start, user_ids, 1)
+
+                if messages and created_ids:
+                    await conn.execute(
+                        """
+                        INSERT INTO message_queue (user_id, message, keyboard, sent)
+                        SELECT m.user_id, m.message, m.keyboard::jsonb, FALSE
+                        FROM unnest($1::uuid[], $2::text[], $3::text[], $4::text[])
+                            AS m(pair_id, user_id, message, keyboard)
+                        WHERE m.pair_id = ANY($5::uuid[])
+                        """,
+                        [pair_id for pair_id, _ in messages],
+                        [message.user_id for _, message in messages],
+                        [message.message for _, message in messages],
+                        [json.dumps(message.keyboard) if message.keyboard else None for _, message in messages],
+                        created_ids,
+                    )
+
+        created = [dict(row, week_start_date=week_start) for row in rows]
+        for user_pair in created:
+            await self._notify("on_pair_created", user_pair)
+        return created
+
+    async def _transition_user_pair(
+        self,
+        pair_id: UUID,
+        user_id: UUID,
+        assignments: str,
+        from_statuses: Tuple[str, ...],
+        release: bool,
+        messages: PairMessages = None,
+    ) -> Optional[Dict[str, Any]]:
+        """Перевести пару в новый статус одним запросом.
+
+        UPDATE срабатывает, только если статус пары входит в from_statuses; release уменьшает
+        счетчики открытых пар обоих пользователей в том же запросе. Возвращается пара с данными
+        партнера и текущего пользователя (changed — был ли статус изменен этим вызовом);
+        None, если пары нет. Сообщения messages пишутся в очередь в той же транзакции,
+        только если статус изменен.
+        """
+        statuses = ", ".join(f"'{status}'" for status in from_statuses)
+        counters = (
+            """,
+                counters AS (
+                    INSERT INTO week_user_pair_stats (week_start_date, user_id, open_pairs)
+                    SELECT wr.week_start_date, u.user_id, -1
+                    FROM updated up
+                    JOIN week_registrations wr ON wr.id = up.week_registration_id
+                    CROSS JOIN LATERAL unnest(ARRAY[up.user1_id, up.user2_id]) AS u(user_id)
+                    ORDER BY u.user_id
+                    ON CONFLICT (week_start_date, user_id) DO UPDATE
+                    SET open_pairs = week_user_pair_stats.open_pairs + EXCLUDED.open_pairs,
+                        updated_at = CURRENT_TIMESTAMP
+                )"""
+            if release
+            else ""
+        )
+        async with self.pool.acquire() as conn:
+            async with conn.transaction():
+                row = await conn.fetchrow(
+                    f"""
+                    WITH updated AS (
+                        UPDATE user_pairs
+                        SET {assignments}
+                        WHERE id = $1 AND status IN ({statuses})
+                        RETURNING *
+                    ){counters}
                     SELECT 
+                        EXISTS (SELECT 1 FROM updated) as changed,
                         up.id, up.status, up.created_at, up.confirmed_at, up.cancelled_at,
                         up.user1_id, up.user2_id,
                         CASE 
@@ -776,228 +1395,213 @@ class OratorDatabaseService:
                             WHEN up.user1_id = $2 THEN u2.first_name || ' ' || COALESCE(u2.last_name, '')
                             ELSE u1.first_name || ' ' || COALESCE(u1.last_name, '')
                         END as partner_name,
+                        CASE WHEN up.user1_id = $2 THEN u2.first_name ELSE u1.first_name END as partner_first_name,
+                        CASE WHEN up.user1_id = $2 THEN COALESCE(u1.username, '') ELSE COALESCE(u2.username, '') END
+                            as user_username,
+                        CASE WHEN up.user1_id = $2 THEN u1.telegram_id ELSE u2.telegram_id END as user_telegram_id,
+                        CASE WHEN up.user1_id = $2 THEN u1.first_name ELSE u2.first_name END as user_first_name,
                         wr.week_start_date, wr.week_end_date,
                         CASE 
                             WHEN up.user1_id = $2 THEN TRUE
                             ELSE FALSE
                         END as is_initiator
-                    FROM user_pairs up
+                    FROM (
+                        SELECT * FROM updated
+                        UNION ALL
+                        SELECT * FROM user_pairs WHERE id = $1 AND NOT EXISTS (SELECT 1 FROM updated)
+                    ) up
                     JOIN week_registrations wr ON up.week_registration_id = wr.id
                     JOIN users u1 ON up.user1_id = u1.id
                     JOIN users u2 ON up.user2_id = u2.id
-                    WHERE up.id = $1
                     """,
                     pair_id,
                     user_id,
                 )
-                return dict(row) if row else None
+                if row is None:
+                    return None
+                user_pair = dict(row)
+                if user_pair["changed"] and messages is not None:
+                    await self._insert_messages(conn, messages(user_pair))
+        return user_pair
+
+    async def confirm_user_pair(
+        self, pair_id: UUID, confirmed: bool, user_id: UUID = None, messages: PairMessages = None
+    ) -> Optional[Dict[str, Any]]:
+        """Подтвердить или отклонить пару.
+
+        Переход из pending выполняется одним UPDATE ... RETURNING вместе с данными пользователей.
+        Повторное подтверждение подтвержденной (или отклонение отмененной) пары возвращает ее
+        без изменений и без сообщений; None — пары нет или ее статус не допускает перехода.
+        """
+        if confirmed:
+            user_pair = await self._transition_user_pair(
+                pair_id, user_id, "status = 'confirmed', confirmed_at = CURRENT_TIMESTAMP", ("pending",), False, messages
+            )
+        else:
+            # Отклоненная пара перестает быть открытой
+            user_pair = await self._transition_user_pair(
+                pair_id, user_id, "status = 'cancelled', cancelled_at = CURRENT_TIMESTAMP", ("pending",), True, messages
+            )
+        if user_pair is None:
+            return None
 
-            # Обновляем статус только если пара в статусе pending
-            if confirmed:
-                result = await conn.execute(
-                    """
-                    UPDATE user_pairs 
-                    SET status = 'confirmed', confirmed_at = CURRENT_TIMESTAMP
-                    WHERE id = $1 AND status = 'pending'
-                    """,
-                    pair_id,
-                )
-            else:
-                result = await conn.execute(
-                    """
-                    UPDATE user_pairs 
-                    SET status = 'cancelled', cancelled_at = CURRENT_TIMESTAMP
-                    WHERE id = $1 AND status = 'pending'
-                    """,
-                    pair_id,
-                )
+        if not user_pair["changed"]:
+            already = PairStatus.CONFIRMED if confirmed else PairStatus.CANCELLED
+            return user_pair if user_pair["status"] == already.value else None
 
-            if result == "UPDATE 0":
-                return None
+        await self._notify("on_pair_confirmed" if confirmed else "on_pair_cancelled", user_pair)
+        return user_pair
 
-            # Возвращаем обновленную пару
-            row = await conn.fetchrow(
+    async def cancel_user_pair(
+        self, pair_id: UUID, user_id: UUID, messages: PairMessages = None
+    ) -> Optional[Dict[str, Any]]:
+        """Отменить пару (уже отмененная пара возвращается без изменений, changed=False)"""
+        user_pair = await self._transition_user_pair(
+            pair_id,
+            user_id,
+            "status = 'cancelled', cancelled_at = CURRENT_TIMESTAMP",
+            ("pending", "confirmed"),
+            True,
+            messages,
+        )
+        if user_pair is None:
+            return None
+
+        if not user_pair["changed"]:
+            return user_pair if user_pair["status"] == PairStatus.CANCELLED.value else None
+
+        await self._notify("on_pair_cancelled", user_pair)
+        return user_pair
+
+    async def get_week_open_pairs(self, week_start: date) -> List[Dict[str, Any]]:
+        """Получить открытые (pending и confirmed) пары недели"""
+        count_round_trip()
+        async with self.pool.acquire() as conn:
+            rows = await conn.fetch(
                 """
-                SELECT 
-                    up.id, up.status, up.created_at, up.confirmed_at, up.cancelled_at,
-                    up.user1_id, up.user2_id,
-                    CASE 
-                        WHEN up.user1_id = $2 THEN up.user2_id
-                        ELSE up.user1_id
-                    END as partner_id,
-                    CASE 
-                        WHEN up.user1_id = $2 THEN COALESCE(u2.username, '')
-                        ELSE COALESCE(u1.username, '')
-                    END as partner_username,
-                    CASE 
-                        WHEN up.user1_id = $2 THEN u2.telegram_id
-                        ELSE u1.telegram_id
-                    END as partner_telegram_id,
-                    CASE 
-                        WHEN up.user1_id = $2 THEN u2.first_name || ' ' || COALESCE(u2.last_name, '')
-                        ELSE u1.first_name || ' ' || COALESCE(u1.last_name, '')
-                    END as partner_name,
-                    wr.week_start_date, wr.week_end_date,
-                    CASE 
-                        WHEN up.user1_id = $2 THEN TRUE
-                        ELSE FALSE
-                    END as is_initiator
+                SELECT up.id, up.user1_id, up.user2_id
                 FROM user_pairs up
                 JOIN week_registrations wr ON up.week_registration_id = wr.id
-                JOIN users u1 ON up.user1_id = u1.id
-                JOIN users u2 ON up.user2_id = u2.id
-                WHERE up.id = $1
+                WHERE wr.week_start_date = $1
+                AND up.status IN ('pending', 'confirmed')
                 """,
-                pair_id,
-                user_id,
+                week_start,
             )
-            return dict(row) if row else None
+            return [dict(row) for row in rows]
 
-    async def cancel_user_pair(self, pair_id: UUID, user_id: UUID) -> Optional[Dict[str, Any]]:
-        """Отменить пару"""
+    async def get_confirmed_pair_history(self) -> List[Tuple[UUID, UUID]]:
+        """Получить все подтвержденные пары как (user1_id, user2_id) для индекса истории пар"""
         async with self.pool.acquire() as conn:
-            # Сначала проверяем, существует ли пара
-            pair_exists = await conn.fetchval(
+            rows = await conn.fetch(
+                """
+                SELECT user1_id, user2_id
+                FROM user_pairs
+                WHERE status = 'confirmed'
                 """
-                SELECT id FROM user_pairs WHERE id = $1
-                """,
-                pair_id,
             )
+            return [(row["user1_id"], row["user2_id"]) for row in rows]
 
-            if not pair_exists:
-                return None
-
-            # Проверяем текущий статус пары
-            current_status = await conn.fetchval(
+    async def get_week_pair_stats(self, week_start: date) -> Dict[str, int]:
+        """Получить количество регистраций, пар и подтвержденных пар недели одним запросом"""
+        async with self.pool.acquire() as conn:
+            row = await conn.fetchrow(
                 """
-                SELECT status FROM user_pairs WHERE id = $1
+                SELECT
+                    (
+                        SELECT COUNT(*) FROM week_registrations
+                        WHERE week_start_date = $1 AND status = 'active'
+                    ) as total_registrations,
+                    COUNT(up.id) as total_pairs,
+                    COUNT(up.id) FILTER (WHERE up.status = 'confirmed') as confirmed_pairs
+                FROM user_pairs up
+                JOIN week_registrations wr ON up.week_registration_id = wr.id
+                WHERE wr.week_start_date = $1
                 """,
-                pair_id,
+                week_start,
             )
+            return dict(row)
 
-            # Если пара уже отменена, возвращаем её информацию
-            if current_status == "cancelled":
-                # Возвращаем информацию о паре без обновления
-                row = await conn.fetchrow(
+    async def rebuild_week_user_pair_stats(self, week_start: date = None) -> int:
+        """Пересчитать счетчики открытых пар из user_pairs (для недели или для всех недель).
+
+        Таблица счетчиков блокируется на время пересчета: изменения пар, начатые раньше,
+        успевают зафиксироваться, а начатые позже применят свои изменения поверх пересчета.
+        Возвращает количество записанных счетчиков.
+        """
+        async with self.pool.acquire() as conn:
+            async with conn.transaction():
+                await conn.execute("LOCK TABLE week_user_pair_stats IN EXCLUSIVE MODE")
+                await conn.execute(
+                    "DELETE FROM week_user_pair_stats WHERE $1::date IS NULL OR week_start_date = $1::date",
+                    week_start,
+                )
+                result = await conn.execute(
                     """
-                    SELECT 
-                        up.id, up.status, up.created_at, up.confirmed_at, up.cancelled_at,
-                        up.user1_id, up.user2_id,
-                        CASE 
-                            WHEN up.user1_id = $2 THEN up.user2_id
-                            ELSE up.user1_id
-                        END as partner_id,
-                        CASE 
-                            WHEN up.user1_id = $2 THEN u2.username
-                            ELSE u1.username
-                        END as partner_username,
-                        CASE 
-                            WHEN up.user1_id = $2 THEN u2.first_name || ' ' || COALESCE(u2.last_name, '')
-                            ELSE u1.first_name || ' ' || COALESCE(u1.last_name, '')
-                        END as partner_name,
-                        wr.week_start_date, wr.week_end_date,
-                        CASE 
-                            WHEN up.user1_id = $2 THEN TRUE
-                            ELSE FALSE
-                        END as is_initiator
-                    FROM user_pairs up
-                    JOIN week_registrations wr ON up.week_registration_id = wr.id
-                    JOIN users u1 ON up.user1_id = u1.id
-                    JOIN users u2 ON up.user2_id = u2.id
-                    WHERE up.id = $1
+                    INSERT INTO week_user_pair_stats (week_start_date, user_id, open_pairs)
+                    SELECT p.week_start_date, p.user_id, COUNT(*)
+                    FROM (
+                        SELECT wr.week_start_date, up.user1_id as user_id
+                        FROM user_pairs up
+                        JOIN week_registrations wr ON up.week_registration_id = wr.id
+                        WHERE up.status IN ('pending', 'confirmed')
+                        AND ($1::date IS NULL OR wr.week_start_date = $1::date)
+                        UNION ALL
+                        SELECT wr.week_start_date, up.user2_id
+                        FROM user_pairs up
+                        JOIN week_registrations wr ON up.week_registration_id = wr.id
+                        WHERE up.status IN ('pending', 'confirmed')
+                        AND ($1::date IS NULL OR wr.week_start_date = $1::date)
+                    ) p
+                    GROUP BY p.week_start_date, p.user_id
                     """,
-                    pair_id,
-                    user_id,
+                    week_start,
                 )
-                return dict(row) if row else None
-
-            # Обновляем статус только если пара не отменена
-            result = await conn.execute(
-                """
-                UPDATE user_pairs 
-                SET status = 'cancelled', cancelled_at = CURRENT_TIMESTAMP
-                WHERE id = $1 AND status IN ('pending', 'confirmed')
-                """,
-                pair_id,
-            )
-
-            if result == "UPDATE 0":
-                return None
+        return int(result.split()[-1])
 
-            # Возвращаем обновленную пару с полной информацией
-            row = await conn.fetchrow(
+    async def check_week_user_pair_stats(self, week_start: date = None) -> List[Dict[str, Any]]:
+        """Найти счетчики открытых пар, которые расходятся с user_pairs"""
+        async with self.pool.acquire() as conn:
+            rows = await conn.fetch(
                 """
-                SELECT 
-                    up.id, up.status, up.created_at, up.confirmed_at, up.cancelled_at,
-                    up.user1_id, up.user2_id,
-                    CASE 
-                        WHEN up.user1_id = $2 THEN up.user2_id
-                        ELSE up.user1_id
-                    END as partner_id,
-                    CASE 
-                        WHEN up.user1_id = $2 THEN u2.username
-                        ELSE u1.username
-                    END as partner_username,
-                    CASE 
-                        WHEN up.user1_id = $2 THEN u2.first_name || ' ' || COALESCE(u2.last_name, '')
-                        ELSE u1.first_name || ' ' || COALESCE(u1.last_name, '')
-                    END as partner_name,
-                    wr.week_start_date, wr.week_end_date,
-                    CASE 
-                        WHEN up.user1_id = $2 THEN TRUE
-                        ELSE FALSE
-                    END as is_initiator
-                FROM user_pairs up
-                JOIN week_registrations wr ON up.week_registration_id = wr.id
-                JOIN users u1 ON up.user1_id = u1.id
-                JOIN users u2 ON up.user2_id = u2.id
-                WHERE up.id = $1
+                WITH actual AS (
+                    SELECT p.week_start_date, p.user_id, COUNT(*) as open_pairs
+                    FROM (
+                        SELECT wr.week_start_date, up.user1_id as user_id
+                        FROM user_pairs up
+                        JOIN week_registrations wr ON up.week_registration_id = wr.id
+                        WHERE up.status IN ('pending', 'confirmed')
+                        UNION ALL
+                        SELECT wr.week_start_date, up.user2_id
+                        FROM user_pairs up
+                        JOIN week_registrations wr ON up.week_registration_id = wr.id
+                        WHERE up.status IN ('pending', 'confirmed')
+                    ) p
+                    WHERE $1::date IS NULL OR p.week_start_date = $1::date
+                    GROUP BY p.week_start_date, p.user_id
+                ),
+                stored AS (
+                    SELECT week_start_date, user_id, open_pairs
+                    FROM week_user_pair_stats
+                    WHERE $1::date IS NULL OR week_start_date = $1::date
+                )
+                SELECT
+                    COALESCE(a.week_start_date, s.week_start_date) as week_start_date,
+                    COALESCE(a.user_id, s.user_id) as user_id,
+                    COALESCE(a.open_pairs, 0) as actual_open_pairs,
+                    COALESCE(s.open_pairs, 0) as stored_open_pairs
+                FROM actual a
+                FULL OUTER JOIN stored s ON s.week_start_date = a.week_start_date AND s.user_id = a.user_id
+                WHERE COALESCE(a.open_pairs, 0) != COALESCE(s.open_pairs, 0)
+                ORDER BY 1, 2
                 """,
-                pair_id,
-                user_id,
+                week_start,
             )
-            return dict(row) if row else None
+            return [dict(row) for row in rows]
 
     async def get_user_pairs(self, user_id: UUID, week_start: date) -> List[Dict[str, Any]]:
         """Получить пары пользователя на неделю"""
         async with self.pool.acquire() as conn:
-            rows = await conn.fetch(
-                """
-                SELECT 
-                    up.id, up.status, up.created_at, up.confirmed_at, up.cancelled_at,
-                    CASE 
-                        WHEN up.user1_id = $1 THEN up.user2_id
-                        ELSE up.user1_id
-                    END as partner_id,
-                    CASE 
-                        WHEN up.user1_id = $1 THEN COALESCE(u2.username, '')
-                        ELSE COALESCE(u1.username, '')
-                    END as partner_username,
-                    CASE 
-                        WHEN up.user1_id = $1 THEN COALESCE(u2.telegram_id, '')
-                        ELSE COALESCE(u1.telegram_id, '')
-                    END as partner_telegram_id,
-                    CASE 
-                        WHEN up.user1_id = $1 THEN u2.first_name || ' ' || COALESCE(u2.last_name, '')
-                        ELSE u1.first_name || ' ' || COALESCE(u1.last_name, '')
-                    END as partner_name,
-                    wr.week_start_date, wr.week_end_date,
-                    CASE 
-                        WHEN up.user1_id = $1 THEN TRUE
-                        ELSE FALSE
-                    END as is_initiator
-                FROM user_pairs up
-                JOIN week_registrations wr ON up.week_registration_id = wr.id
-                JOIN users u1 ON up.user1_id = u1.id
-                JOIN users u2 ON up.user2_id = u2.id
-                WHERE (up.user1_id = $1 OR up.user2_id = $1) 
-                AND wr.week_start_date = $2
-                AND up.status != 'cancelled'
-                ORDER BY up.created_at DESC
-                """,
-                user_id,
-                week_start,
-            )
+            rows = await orator_statements.fetch(conn, USER_PAIRS, user_id, week_start)
             return [dict(row) for row in rows]
 
     # Методы для работы с обратной связью
@@ -1123,17 +1727,24 @@ class OratorDatabaseService:
 
             return {"topics": root_topics, "language": "ru"}
 
-    async def get_bot_content(self, content_key: str, language: str = "ru") -> Optional[str]:
-        """Получить контент бота"""
+    async def get_all_topics(self) -> List[Dict[str, Any]]:
+        """Получить плоский список активных тем (для словаря тем подбора)"""
+        count_round_trip()
         async with self.pool.acquire() as conn:
-            row = await conn.fetchrow(
+            rows = await conn.fetch(
+                """
+                SELECT topic_id, name
+                FROM topics
+                WHERE is_active = TRUE
+                ORDER BY level, sort_order
                 """
-                SELECT content_text FROM bot_content
-                WHERE content_key = $1 AND language = $2 AND is_active = TRUE
-                """,
-                content_key,
-                language,
             )
+            return [dict(row) for row in rows]
+
+    async def get_bot_content(self, content_key: str, language: str = "ru") -> Optional[str]:
+        """Получить контент бота"""
+        async with self.pool.acquire() as conn:
+            row = await orator_statements.fetchrow(conn, BOT_CONTENT, content_key, language)
             return row["content_text"] if row else None
 
     async def get_exercises_by_topic(self, topic_id: str, language: str = "ru") -> List[Dict[str, Any]]:
@@ -1435,32 +2046,24 @@ class OratorDatabaseService:
             return user_stats["feedback_count"] >= user_stats["total_sessions"]
 
     # Методы для работы с настройками
-    async def get_setting(self, key: str, default_value: str = None) -> Optional[str]:
-        """Получить значение настройки"""
+    async def _load_active_settings(self) -> Dict[str, str]:
+        """Загрузить все активные настройки одним запросом"""
+        count_round_trip()
         async with self.pool.acquire() as conn:
-            row = await conn.fetchrow(
-                """
-                SELECT value FROM orator_settings
-                WHERE key = $1 AND is_active = TRUE
-                """,
-                key,
-            )
-            return row["value"] if row else default_value
+            rows = await orator_statements.fetch(conn, ACTIVE_SETTINGS)
+            return {row["key"]: row["value"] for row in rows}
+
+    async def get_setting(self, key: str, default_value: str = None) -> Optional[str]:
+        """Получить значение настройки (из кэша настроек)"""
+        return await self.settings_cache.get(key, default_value)
 
     async def get_setting_int(self, key: str, default_value: int = 0) -> int:
         """Получить значение настройки как целое число"""
-        value = await self.get_setting(key)
-        try:
-            return int(value) if value else default_value
-        except (ValueError, TypeError):
-            return default_value
+        return await self.settings_cache.get_int(key, default_value)
 
     async def get_setting_bool(self, key: str, default_value: bool = False) -> bool:
         """Получить значение настройки как булево значение"""
-        value = await self.get_setting(key)
-        if value is None:
-            return default_value
-        return value.lower() in ("true", "1", "yes", "on")
+        return await self.settings_cache.get_bool(key, default_value)
 
     async def update_setting(self, key: str, value: str, description: str = None) -> Optional[Dict[str, Any]]:
         """Обновить настройку"""
@@ -1480,6 +2083,9 @@ class OratorDatabaseService:
                 description,
             )
 
+            # Сбрасываем кэш сразу, не дожидаясь уведомления от базы
+            self.settings_cache.invalidate()
+
             if result == "INSERT 0":
                 return None
 
@@ -1524,6 +2130,51 @@ class OratorDatabaseService:
             )
             return result != "INSERT 0"
 
+    async def message_queue_partitioned(self) -> bool:
+        """Есть ли в базе функции партиций message_queue (миграция 0008_message_queue_partitions.sql)"""
+        async with self.pool.acquire() as conn:
+            return await conn.fetchval("SELECT to_regproc('message_queue_ensure_partitions') IS NOT NULL")
+
+    async def maintain_message_queue_partitions(self, months_ahead: int, keep_months: int) -> Optional[Dict[str, Any]]:
+        """Создать партиции наперед и перенести старые в message_queue_archive.
 
-# Создание экземпляра сервиса
+        Несколько процессов backend (воркеры uvicorn) не обслуживают партиции одновременно:
+        работу выполняет тот, кто получил advisory-блокировку, остальные возвращают None.
+        Иначе — число созданных партиций (created) и имена перенесенных в архив (archived).
+        """
+        async with self.pool.acquire() as conn:
+            if not await conn.fetchval("SELECT pg_try_advisory_lock($1)", MESSAGE_QUEUE_RETENTION_LOCK_KEY):
+                return None
+            try:
+                created = await self._ensure_message_queue_partitions(conn, months_ahead)
+                archived = await self._archive_message_queue_partitions(conn, keep_months)
+            finally:
+                await conn.execute("SELECT pg_advisory_unlock($1)", MESSAGE_QUEUE_RETENTION_LOCK_KEY)
+        return {"created": created, "archived": archived}
+
+    async def _ensure_message_queue_partitions(self, conn, months_ahead: int) -> int:
+        """Создать партиции message_queue на текущий месяц и months_ahead месяцев вперед"""
+        return await conn.fetchval("SELECT message_queue_ensure_partitions(CURRENT_DATE, $1)", months_ahead + 1)
+
+    async def _archive_message_queue_partitions(self, conn, keep_months: int) -> List[str]:
+        """Перенести в message_queue_archive партиции старше keep_months полных месяцев.
+
+        Партиции отсоединяются по одной (каждая — своя короткая транзакция с блокировкой
+        очереди), затем копируются в архив и удаляются. Партиции с неотправленными
+        сообщениями остаются в очереди. Возвращает имена перенесенных партиций.
+        """
+        detached = []
+        while True:
+            name = await conn.fetchval("SELECT message_queue_detach_old_partition($1)", keep_months)
+            if name is None:
+                break
+            detached.append(name)
+        # Отсоединенные, но не перенесенные прошлым запуском партиции тоже попадают в архив
+        await conn.fetchval("SELECT message_queue_archive_detached()")
+        return detached
+
+
+# Создание экземпляра сервиса и подписка его настроек и событий на уведомления базы
 orator_db = OratorDatabaseService()
+orator_db.settings_cache.listen(db_notifications)
+orator_db.listen_for_changes(db_notifications)
@@ -0,0 +1,149 @@
+"""
+Индекс истории подтвержденных пар: с кем пользователь уже занимался.
+
+Пользователи получают компактные целочисленные id (только на добавление, как
+в TopicDictionary), а смежность хранится в CSR-виде: offsets (int64) и
+отсортированный по пользователю массив партнеров (int32). Пары, подтвержденные
+после загрузки, дописываются в небольшие списки по пользователю. Индекс грузится
+одним запросом при старте и обновляется по событию on_pair_confirmed, поэтому
+скоринг узнает прошлых партнеров без запросов к user_pairs.
+"""
+
+import time
+from typing import List, Dict, Any, Iterable, Optional, Set, Tuple
+
+import numpy as np
+from loguru import logger
+
+from services.orator_database import OratorDatabaseService, orator_db
+
+
+class PairHistoryIndex:
+    """Граф подтвержденных пар по компактным id пользователей"""
+
+    def __init__(self):
+        self._user_keys: Dict[str, int] = {}
+        # Компактный id -> user_id
+        self._user_ids: List[str] = []
+        # Партнеры пользователя key — _neighbors[_offsets[key]:_offsets[key + 1]]
+        self._offsets = np.zeros(1, dtype=np.int64)
+        self._neighbors = np.zeros(0, dtype=np.int32)
+        # Пары, подтвержденные после загрузки: key -> компактные id партнеров
+        self._appended: Dict[int, List[int]] = {}
+        # Пары, подтвержденные во время загрузки (применяются поверх загруженного снимка)
+        self._journal: Optional[List[Tuple[Any, Any]]] = None
+        # id пар, дописанных по событиям: подтверждение приходит и из своего процесса,
+        # и через уведомление базы
+        self._confirmed_pair_ids: Set[str] = set()
+        self.loaded = False
+
+    def __len__(self) -> int:
+        return len(self._user_keys)
+
+    @property
+    def pair_count(self) -> int:
+        return (len(self._neighbors) + sum(len(partners) for partners in self._appended.values())) // 2
+
+    def user_key(self, user_id: Any) -> int:
+        """Компактный id пользователя (новый пользователь получает следующий свободный id)"""
+        user_id = str(user_id)
+        key = self._user_keys.get(user_id)
+        if key is None:
+            key = len(self._user_keys)
+            self._user_keys[user_id] = key
+            self._user_ids.append(user_id)
+        return key
+
+    def user_keys(self, user_ids: Iterable[Any]) -> np.ndarray:
+        """Компактные id для списка пользователей"""
+        return np.fromiter((self.user_key(user_id) for user_id in user_ids), dtype=np.int32)
+
+    def find_keys(self, user_ids: Iterable[Any]) -> np.ndarray:
+        """Компактные id уже известных пользователей из списка (новые id не выдаются)"""
+        keys = (self._user_keys.get(str(user_id)) for user_id in user_ids)
+        return np.array([key for key in keys if key is not None], dtype=np.int32)
+
+    def partner_ids(self, user_id: Any) -> List[str]:
+        """user_id прошлых партнеров пользователя (возможны повторы)"""
+        return [self._user_ids[key] for key in self.partners(user_id).tolist()]
+
+    def partners(self, user_id: Any) -> np.ndarray:
+        """Компактные id прошлых партнеров пользователя (возможны повторы)"""
+        key = self._user_keys.get(str(user_id))
+        if key is None:
+            return np.zeros(0, dtype=np.int32)
+        base = self._neighbors[self._offsets[key] : self._offsets[key + 1]] if key + 1 < len(self._offsets) else None
+        appended = self._appended.get(key)
+        if appended is None:
+            return base if base is not None else np.zeros(0, dtype=np.int32)
+        appended = np.array(appended, dtype=np.int32)
+        return appended if base is None else np.concatenate((base, appended))
+
+    def load_edges(self, user1_keys: np.ndarray, user2_keys: np.ndarray):
+        """Перестроить индекс по парам компактных id (ребра в обе стороны)"""
+        sources = np.concatenate((user1_keys, user2_keys)).astype(np.int32, copy=False)
+        targets = np.concatenate((user2_keys, user1_keys)).astype(np.int32, copy=False)
+        order = np.argsort(sources, kind="stable")
+        counts = np.bincount(sources, minlength=len(self._user_keys))
+        offsets = np.zeros(len(counts) + 1, dtype=np.int64)
+        np.cumsum(counts, out=offsets[1:])
+
+        self._offsets = offsets
+        self._neighbors = targets[order]
+        self._appended = {}
+        self.loaded = True
+
+    def load_pairs(self, pairs: Iterable[Tuple[Any, Any]]):
+        """Перестроить индекс по парам (user1_id, user2_id)"""
+        user1_keys: List[int] = []
+        user2_keys: List[int] = []
+        for user1_id, user2_id in pairs:
+            user1_keys.append(self.user_key(user1_id))
+            user2_keys.append(self.user_key(user2_id))
+        self.load_edges(np.array(user1_keys, dtype=np.int32), np.array(user2_keys, dtype=np.int32))
+
+    def add_pair(self, user1_id: Any, user2_id: Any):
+        """Дописать подтвержденную пару"""
+        user1_key = self.user_key(user1_id)
+        user2_key = self.user_key(user2_id)
+        self._appended.setdefault(user1_key, []).append(user2_key)
+        self._appended.setdefault(user2_key, []).append(user1_key)
+
+    def nbytes(self) -> int:
+        """Примерный объем массивов смежности в байтах (без словаря id)"""
+        return self._offsets.nbytes + self._neighbors.nbytes
+
+    async def load(self, db: OratorDatabaseService):
+        """Загрузить историю подтвержденных пар одним запросом"""
+        started = time.perf_counter()
+        self._journal = []
+        try:
+            pairs = await db.get_confirmed_pair_history()
+        finally:
+            journal, self._journal = self._journal, None
+        self.load_pairs(pairs)
+        for user1_id, user2_id in journal:
+            self.add_pair(user1_id, user2_id)
+        logger.info(
+            f"Pair history loaded: {self.pair_count} pairs, {len(self)} users, "
+            f"{self.nbytes() / 1024 / 1024:.1f} MiB in {time.perf_counter() - started:.2f}s"
+        )
+
+    # События OratorDatabaseService
+    async def on_pair_confirmed(self, pair: Dict[str, Any]):
+        pair_id = pair.get("id")
+        if pair_id is not None:
+            if str(pair_id) in self._confirmed_pair_ids:
+                return
+            self._confirmed_pair_ids.add(str(pair_id))
+        self.add_pair(pair["user1_id"], pair["user2_id"])
+        if self._journal is not None:
+            self._journal.append((pair["user1_id"], pair["user2_id"]))
+
+    async def on_changes_missed(self, db: OratorDatabaseService):
+        await self.load(db)
+
+
+# Создаем экземпляр индекса и подписываем его на подтверждения пар
+pair_history_index = PairHistoryIndex()
+orator_db.add_listener(pair_history_index)
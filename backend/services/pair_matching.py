@@ -0,0 +1,516 @@
+"""
+Алгоритмы максимального по весу паросочетания для недельного подбора пар.
+
+Граф задается списком ребер (u, v, weight) с целыми неотрицательными весами и
+емкостями вершин (сколько пар еще может получить пользователь).
+
+- max_weight_matching — точный алгоритм Эдмондса (blossom) для емкости 1,
+  по реализации J. van Rantwijk (O(n^3), только целочисленная арифметика).
+- max_weight_b_matching — точное решение для произвольных емкостей: каждое ребро
+  заменяется гаджетом, после чего задача сводится к обычному паросочетанию.
+- greedy_b_matching — приближенное жадное решение с локальным улучшением для больших
+  графов (не меньше 1/2 оптимума).
+"""
+
+from typing import List, Dict, Tuple, Sequence
+
+import numpy as np
+
+
+Edge = Tuple[int, int, int]
+
+
+def max_weight_matching(edges: Sequence[Edge]) -> List[int]:
+    """Максимальное по весу паросочетание общего графа.
+
+    Возвращает список mate: mate[v] — вершина в паре с v или -1.
+    """
+    if not edges:
+        return []
+
+    nedge = len(edges)
+    nvertex = 1 + max(max(i, j) for i, j, _ in edges)
+    maxweight = max(0, max(wt for _, _, wt in edges))
+
+    # Концы ребер: endpoint[2k] и endpoint[2k + 1] — вершины ребра k
+    endpoint = [edges[p // 2][p % 2] for p in range(2 * nedge)]
+    # neighbend[v] — концы ребер, инцидентных v, на противоположной от v стороне
+    neighbend: List[List[int]] = [[] for _ in range(nvertex)]
+    for k, (i, j, _) in enumerate(edges):
+        neighbend[i].append(2 * k + 1)
+        neighbend[j].append(2 * k)
+
+    # mate[v] — конец ребра паросочетания на стороне партнера (или -1)
+    mate = nvertex * [-1]
+    # Метки верхнеуровневых блоссомов: 0 — нет, 1 — S, 2 — T
+    label = (2 * nvertex) * [0]
+    labelend = (2 * nvertex) * [-1]
+    inblossom = list(range(nvertex))
+    blossomparent = (2 * nvertex) * [-1]
+    blossomchilds: List = (2 * nvertex) * [None]
+    blossombase = list(range(nvertex)) + nvertex * [-1]
+    blossomendps: List = (2 * nvertex) * [None]
+    bestedge = (2 * nvertex) * [-1]
+    blossombestedges: List = (2 * nvertex) * [None]
+    unusedblossoms = list(range(nvertex, 2 * nvertex))
+    # Двойственные переменные (удвоенные, чтобы оставаться в целых числах)
+    dualvar = nvertex * [maxweight] + nvertex * [0]
+    allowedge = nedge * [False]
+    queue: List[int] = []
+
+    def slack(k: int) -> int:
+        i, j, wt = edges[k]
+        return dualvar[i] + dualvar[j] - 2 * wt
+
+    def blossom_leaves(b: int):
+        if b < nvertex:
+            yield b
+        else:
+            for t in blossomchilds[b]:
+                if t < nvertex:
+                    yield t
+                else:
+                    yield from blossom_leaves(t)
+
+    def assign_label(w: int, t: int, p: int):
+        b = inblossom[w]
+        label[w] = label[b] = t
+        labelend[w] = labelend[b] = p
+        bestedge[w] = bestedge[b] = -1
+        if t == 1:
+            queue.extend(blossom_leaves(b))
+        elif t == 2:
+            base = blossombase[b]
+            assign_label(endpoint[mate[base]], 1, mate[base] ^ 1)
+
+    def scan_blossom(v: int, w: int) -> int:
+        # Идем назад от v и w по дереву, пока не найдем общий блоссом или два корня
+        path = []
+        base = -1
+        while v != -1 or w != -1:
+            b = inblossom[v]
+            if label[b] & 4:
+                base = blossombase[b]
+                break
+            path.append(b)
+            label[b] = 5
+            if labelend[b] == -1:
+                v = -1
+            else:
+                v = endpoint[labelend[b]]
+                b = inblossom[v]
+                v = endpoint[labelend[b]]
+            if w != -1:
+                v, w = w, v
+        for b in path:
+            label[b] = 1
+        return base
+
+    def add_blossom(base: int, k: int):
+        v, w, _ = edges[k]
+        bb = inblossom[base]
+        bv = inblossom[v]
+        bw = inblossom[w]
+        b = unusedblossoms.pop()
+        blossombase[b] = base
+        blossomparent[b] = -1
+        blossomparent[bb] = b
+        blossomchilds[b] = path = []
+        blossomendps[b] = endps = []
+        while bv != bb:
+            blossomparent[bv] = b
+            path.append(bv)
+            endps.append(labelend[bv])
+            v = endpoint[labelend[bv]]
+            bv = inblossom[v]
+        path.append(bb)
+        path.reverse()
+        endps.reverse()
+        endps.append(2 * k)
+        while bw != bb:
+            blossomparent[bw] = b
+            path.append(bw)
+            endps.append(labelend[bw] ^ 1)
+            w = endpoint[labelend[bw]]
+            bw = inblossom[w]
+        label[b] = 1
+        labelend[b] = labelend[bb]
+        dualvar[b] = 0
+        for v in blossom_leaves(b):
+            if label[inblossom[v]] == 2:
+                # T-вершина становится S-вершиной внутри нового блоссома
+                queue.append(v)
+            inblossom[v] = b
+
+        # Ребра с наименьшим slack от нового блоссома к соседним S-блоссомам
+        bestedgeto = (2 * nvertex) * [-1]
+        for bv in path:
+            if blossombestedges[bv] is None:
+                nblists = [[p // 2 for p in neighbend[v]] for v in blossom_leaves(bv)]
+            else:
+                nblists = [blossombestedges[bv]]
+            for nblist in nblists:
+                for k in nblist:
+                    i, j, _ = edges[k]
+                    if inblossom[j] == b:
+                        i, j = j, i
+                    bj = inblossom[j]
+                    if bj != b and label[bj] == 1 and (bestedgeto[bj] == -1 or slack(k) < slack(bestedgeto[bj])):
+                        bestedgeto[bj] = k
+            blossombestedges[bv] = None
+            bestedge[bv] = -1
+        blossombestedges[b] = [k for k in bestedgeto if k != -1]
+        bestedge[b] = -1
+        for k in blossombestedges[b]:
+            if bestedge[b] == -1 or slack(k) < slack(bestedge[b]):
+                bestedge[b] = k
+
+    def expand_blossom(b: int, endstage: bool):
+        for s in blossomchilds[b]:
+            blossomparent[s] = -1
+            if s < nvertex:
+                inblossom[s] = s
+            elif endstage and dualvar[s] == 0:
+                expand_blossom(s, endstage)
+            else:
+                for v in blossom_leaves(s):
+                    inblossom[v] = s
+
+        if not endstage and label[b] == 2:
+            # Раскрываем T-блоссом посреди стадии: перемечаем подблоссомы на пути
+            # от точки входа до базы
+            entrychild = inblossom[endpoint[labelend[b] ^ 1]]
+            j = blossomchilds[b].index(entrychild)
+            if j & 1:
+                j -= len(blossomchilds[b])
+                jstep = 1
+                endptrick = 0
+            else:
+                jstep = -1
+                endptrick = 1
+            p = labelend[b]
+            while j != 0:
+                label[endpoint[p ^ 1]] = 0
+                label[endpoint[blossomendps[b][j - endptrick] ^ endptrick ^ 1]] = 0
+                assign_label(endpoint[p ^ 1], 2, p)
+                allowedge[blossomendps[b][j - endptrick] // 2] = True
+                j += jstep
+                p = blossomendps[b][j - endptrick] ^ endptrick
+                allowedge[p // 2] = True
+                j += jstep
+            bv = blossomchilds[b][j]
+            label[endpoint[p ^ 1]] = label[bv] = 2
+            labelend[endpoint[p ^ 1]] = labelend[bv] = p
+            bestedge[bv] = -1
+            j += jstep
+            while blossomchilds[b][j] != entrychild:
+                bv = blossomchilds[b][j]
+                if label[bv] == 1:
+                    j += jstep
+                    continue
+                for v in blossom_leaves(bv):
+                    if label[v] != 0:
+                        break
+                if label[v] != 0:
+                    label[v] = 0
+                    label[endpoint[mate[blossombase[bv]]]] = 0
+                    assign_label(v, 2, labelend[v])
+                j += jstep
+
+        label[b] = labelend[b] = -1
+        blossomchilds[b] = blossomendps[b] = None
+        blossombase[b] = -1
+        blossombestedges[b] = None
+        bestedge[b] = -1
+        unusedblossoms.append(b)
+
+    def augment_blossom(b: int, v: int):
+        t = v
+        while blossomparent[t] != b:
+            t = blossomparent[t]
+        if t >= nvertex:
+            augment_blossom(t, v)
+        i = j = blossomchilds[b].index(t)
+        if i & 1:
+            j -= len(blossomchilds[b])
+            jstep = 1
+            endptrick = 0
+        else:
+            jstep = -1
+            endptrick = 1
+        while j != 0:
+            j += jstep
+            t = blossomchilds[b][j]
+            p = blossomendps[b][j - endptrick] ^ endptrick
+            if t >= nvertex:
+                augment_blossom(t, endpoint[p])
+            j += jstep
+            t = blossomchilds[b][j]
+            if t >= nvertex:
+                augment_blossom(t, endpoint[p ^ 1])
+            mate[endpoint[p]] = p ^ 1
+            mate[endpoint[p ^ 1]] = p
+        # Новая база блоссома — первый подблоссом списка
+        blossomchilds[b] = blossomchilds[b][i:] + blossomchilds[b][:i]
+        blossomendps[b] = blossomendps[b][i:] + blossomendps[b][:i]
+        blossombase[b] = blossombase[blossomchilds[b][0]]
+
+    def augment_matching(k: int):
+        v, w, _ = edges[k]
+        for s, p in ((v, 2 * k + 1), (w, 2 * k)):
+            while True:
+                bs = inblossom[s]
+                if bs >= nvertex:
+                    augment_blossom(bs, s)
+                mate[s] = p
+                if labelend[bs] == -1:
+                    break
+                t = endpoint[labelend[bs]]
+                bt = inblossom[t]
+                s = endpoint[labelend[bt]]
+                j = endpoint[labelend[bt] ^ 1]
+                if bt >= nvertex:
+                    augment_blossom(bt, j)
+                mate[j] = labelend[bt]
+                p = labelend[bt] ^ 1
+
+    for _ in range(nvertex):
+        # Начало стадии: снимаем метки и помечаем свободные вершины как S
+        label[:] = (2 * nvertex) * [0]
+        bestedge[:] = (2 * nvertex) * [-1]
+        blossombestedges[nvertex:] = nvertex * [None]
+        allowedge[:] = nedge * [False]
+        queue[:] = []
+        for v in range(nvertex):
+            if mate[v] == -1 and label[inblossom[v]] == 0:
+                assign_label(v, 1, -1)
+
+        augmented = False
+        while True:
+            while queue and not augmented:
+                v = queue.pop()
+                for p in neighbend[v]:
+                    k = p // 2
+                    w = endpoint[p]
+                    if inblossom[v] == inblossom[w]:
+                        continue
+                    if not allowedge[k]:
+                        kslack = slack(k)
+                        if kslack <= 0:
+                            allowedge[k] = True
+                    if allowedge[k]:
+                        if label[inblossom[w]] == 0:
+                            assign_label(w, 2, p ^ 1)
+                        elif label[inblossom[w]] == 1:
+                            base = scan_blossom(v, w)
+                            if base >= 0:
+                                add_blossom(base, k)
+                            else:
+                                augment_matching(k)
+                                augmented = True
+                                break
+                        elif label[w] == 0:
+                            label[w] = 2
+                            labelend[w] = p ^ 1
+                    elif label[inblossom[w]] == 1:
+                        b = inblossom[v]
+                        if bestedge[b] == -1 or kslack < slack(bestedge[b]):
+                            bestedge[b] = k
+                    elif label[w] == 0:
+                        if bestedge[w] == -1 or kslack < slack(bestedge[w]):
+                            bestedge[w] = k
+
+            if augmented:
+                break
+
+            # Увеличивающий путь не найден — меняем двойственные переменные
+            deltatype = 1
+            delta = min(dualvar[:nvertex])
+            deltaedge = deltablossom = -1
+
+            for v in range(nvertex):
+                if label[inblossom[v]] == 0 and bestedge[v] != -1:
+                    d = slack(bestedge[v])
+                    if d < delta:
+                        delta = d
+                        deltatype = 2
+                        deltaedge = bestedge[v]
+
+            for b in range(2 * nvertex):
+                if blossomparent[b] == -1 and label[b] == 1 and bestedge[b] != -1:
+                    d = slack(bestedge[b]) // 2
+                    if d < delta:
+                        delta = d
+                        deltatype = 3
+                        deltaedge = bestedge[b]
+
+            for b in range(nvertex, 2 * nvertex):
+                if blossombase[b] >= 0 and blossomparent[b] == -1 and label[b] == 2 and dualvar[b] < delta:
+                    delta = dualvar[b]
+                    deltatype = 4
+                    deltablossom = b
+
+            for v in range(nvertex):
+                if label[inblossom[v]] == 1:
+                    dualvar[v] -= delta
+                elif label[inblossom[v]] == 2:
+                    dualvar[v] += delta
+            for b in range(nvertex, 2 * nvertex):
+                if blossombase[b] >= 0 and blossomparent[b] == -1:
+                    if label[b] == 1:
+                        dualvar[b] += delta
+                    elif label[b] == 2:
+                        dualvar[b] -= delta
+
+            if deltatype == 1:
+                # Оптимум достигнут
+                break
+            elif deltatype == 2:
+                allowedge[deltaedge] = True
+                i, j, _ = edges[deltaedge]
+                if label[inblossom[i]] == 0:
+                    i, j = j, i
+                queue.append(i)
+            elif deltatype == 3:
+                allowedge[deltaedge] = True
+                i, j, _ = edges[deltaedge]
+                queue.append(i)
+            else:
+                expand_blossom(deltablossom, False)
+
+        if not augmented:
+            break
+
+        # Конец стадии: раскрываем S-блоссомы с нулевой двойственной переменной
+        for b in range(nvertex, 2 * nvertex):
+            if blossomparent[b] == -1 and blossombase[b] >= 0 and label[b] == 1 and dualvar[b] == 0:
+                expand_blossom(b, True)
+
+    return [endpoint[p] if p >= 0 else -1 for p in mate]
+
+
+def max_weight_b_matching(edges: Sequence[Edge], capacity: Sequence[int]) -> List[int]:
+    """Точное максимальное по весу b-паросочетание (вершина v входит не более чем в capacity[v] пар).
+
+    Каждое ребро (u, v, w) заменяется путем u — a — b — v с весами w: выбор ребра дает
+    2w (u-a и b-v), отказ от него — w (a-b). Копии вершины по числу ее емкости соединяются
+    с гаджетами всех ее ребер. Возвращает индексы выбранных ребер.
+    """
+    copies: List[List[int]] = []
+    next_node = 0
+    for cap in capacity:
+        copies.append(list(range(next_node, next_node + cap)))
+        next_node += cap
+
+    gadget_edges: List[Edge] = []
+    gadgets = []
+    for u, v, w in edges:
+        a, b = next_node, next_node + 1
+        next_node += 2
+        gadgets.append((a, b))
+        if w <= 0 or not copies[u] or not copies[v]:
+            continue
+        gadget_edges.extend((copy, a, w) for copy in copies[u])
+        gadget_edges.append((a, b, w))
+        gadget_edges.extend((b, copy, w) for copy in copies[v])
+
+    mate = max_weight_matching(gadget_edges)
+    mate += [-1] * (next_node - len(mate))
+
+    # Ребро выбрано, если обе вершины гаджета сопоставлены копиям концов ребра
+    return [k for k, (a, b) in enumerate(gadgets) if mate[a] not in (-1, b) and mate[b] not in (-1, a)]
+
+
+def greedy_b_matching(
+    n: int, left: np.ndarray, right: np.ndarray, weight: np.ndarray, capacity: np.ndarray, improve_passes: int = 3
+) -> List[int]:
+    """Жадное b-паросочетание с локальным улучшением.
+
+    Ребра берутся в порядке убывания веса (гарантия 1/2 от оптимума), затем
+    несколько проходов ищут улучшающие пути длины 3: ребро (u, x) заменяется
+    на (u, v) и/или (x, y), если у v и y есть свободная емкость и суммарный
+    вес растет. Возвращает индексы выбранных ребер.
+    """
+    order = np.lexsort((np.arange(len(weight)), -weight))
+    order = order[weight[order] > 0]
+    left_list = left.tolist()
+    right_list = right.tolist()
+    weight_list = weight.tolist()
+    free = capacity.astype(np.int64).tolist()
+    chosen = [False] * len(weight_list)
+
+    def fill(edge_order: List[int]):
+        for k in edge_order:
+            u, v = left_list[k], right_list[k]
+            if free[u] > 0 and free[v] > 0 and not chosen[k]:
+                chosen[k] = True
+                free[u] -= 1
+                free[v] -= 1
+
+    fill(order.tolist())
+
+    adjacency: Dict[int, List[Tuple[int, int, int]]] = {}
+
+    def take_best(u: int, exclude: int) -> Tuple[int, int]:
+        # Лучшее невыбранное ребро из u к вершине со свободной емкостью (занимает его)
+        for w, k, v in adjacency.get(u, ()):
+            if chosen[k] or v == exclude or free[v] <= 0:
+                continue
+            chosen[k] = True
+            free[u] -= 1
+            free[v] -= 1
+            return w, k
+        return 0, -1
+
+    def release(k: int):
+        chosen[k] = False
+        free[left_list[k]] += 1
+        free[right_list[k]] += 1
+
+    for _ in range(improve_passes):
+        # Улучшение возможно только через вершины со свободной емкостью, поэтому
+        # список смежности (по убыванию веса) строится только из ребер к ним
+        chosen_mask = np.array(chosen, dtype=bool)[order]
+        has_free = np.array(free, dtype=np.int64) > 0
+        left_free = has_free[left[order]]
+        right_free = has_free[right[order]]
+        adjacency.clear()
+        candidates = ~chosen_mask & (left_free | right_free)
+        for k, u_free, v_free in zip(
+            order[candidates].tolist(), left_free[candidates].tolist(), right_free[candidates].tolist()
+        ):
+            u, v, w = left_list[k], right_list[k], weight_list[k]
+            if v_free:
+                adjacency.setdefault(u, []).append((w, k, v))
+            if u_free:
+                adjacency.setdefault(v, []).append((w, k, u))
+        if not adjacency:
+            break
+
+        touched = np.zeros(n, dtype=bool)
+        touched[list(adjacency)] = True
+        improved = False
+        for k in order[chosen_mask & (touched[left[order]] | touched[right[order]])].tolist():
+            u, x = left_list[k], right_list[k]
+            # Освобождаем (u, x) и пробуем занять лучшие ребра из обоих концов
+            release(k)
+            w_u, k_u = take_best(u, x)
+            w_x, k_x = take_best(x, u)
+            if w_u + w_x > weight_list[k]:
+                improved = True
+                continue
+            # Улучшения нет — откатываем
+            for extension in (k_u, k_x):
+                if extension >= 0:
+                    release(extension)
+            chosen[k] = True
+            free[u] -= 1
+            free[x] -= 1
+        if not improved:
+            break
+
+    # Досыпаем ребра, которые стали доступны после улучшений
+    has_free = np.array(free, dtype=np.int64) > 0
+    fill(order[has_free[left[order]] & has_free[right[order]]].tolist())
+
+    return [k for k in range(len(chosen)) if chosen[k]]
@@ -0,0 +1,241 @@
+"""
+Скоринг больших недель в пуле процессов.
+
+Массивы признаков CandidateFeatures один раз копируются в общий сегмент памяти
+(multiprocessing.shared_memory), воркеры подключаются к нему по имени и считают
+топ кандидатов по своему диапазону батча. Event loop только ждет результаты шардов
+и сливает их в общий топ, поэтому большой вызов find_candidates не блокирует
+остальные запросы воркера uvicorn.
+
+Результат совпадает с top_candidates по всему батчу, включая порядок при равных score:
+каждый шард возвращает свой топ с тем же правилом разрешения равенств (по позиции),
+а слияние идет по позициям в батче.
+"""
+
+import asyncio
+import heapq
+import multiprocessing
+import weakref
+from collections import OrderedDict
+from concurrent.futures import ProcessPoolExecutor
+from multiprocessing.shared_memory import SharedMemory
+from operator import itemgetter
+from typing import List, Dict, Any, Optional, Tuple, NamedTuple
+
+import numpy as np
+from loguru import logger
+
+from config.settings import settings
+from services.match_scoring import CandidateFeatures, ScoringBatch, top_candidates
+from services.matching_metrics import MatchingTrace
+from services.topic_dictionary import TopicDictionary
+
+# Массивы CandidateFeatures, которые передаются воркерам через общую память
+SHARED_FIELDS = (
+    "minutes",
+    "time_valid",
+    "total_sessions",
+    "genders",
+    "topic_counts",
+    "topic_words",
+    "group_words",
+    "group_counts",
+    "history_ids",
+)
+
+
+class SharedFeaturesHandle(NamedTuple):
+    """Описание сегмента общей памяти с признаками (передается воркерам вместо массивов)"""
+
+    name: str
+    # (поле, dtype, shape, смещение в сегменте)
+    layout: Tuple[Tuple[str, str, Tuple[int, ...], int], ...]
+    gender_index: Dict[Any, int]
+
+
+def export_features(features: CandidateFeatures) -> Tuple[SharedMemory, SharedFeaturesHandle]:
+    """Скопировать массивы признаков в новый сегмент общей памяти"""
+    layout = []
+    offset = 0
+    for field in SHARED_FIELDS:
+        array = getattr(features, field)
+        layout.append((field, array.dtype.str, array.shape, offset))
+        # Выравниваем смещения по 8 байт для 64-битных массивов
+        offset += (array.nbytes + 7) // 8 * 8
+
+    shm = SharedMemory(create=True, size=max(offset, 1))
+    for field, dtype, shape, start in layout:
+        view = np.ndarray(shape, dtype=dtype, buffer=shm.buf, offset=start)
+        view[...] = getattr(features, field)
+        del view
+    return shm, SharedFeaturesHandle(shm.name, tuple(layout), dict(features.gender_index))
+
+
+def _release(shm: SharedMemory):
+    try:
+        shm.close()
+        shm.unlink()
+    except FileNotFoundError:
+        pass
+    except Exception as e:
+        logger.error(f"Failed to release shared features {shm.name}: {e}")
+
+
+# Сегменты, подключенные в процессе воркера: имя -> (сегмент, признаки поверх него)
+_attached: "OrderedDict[str, Tuple[SharedMemory, CandidateFeatures]]" = OrderedDict()
+_ATTACHED_MAX = 4
+
+
+def _attach(handle: SharedFeaturesHandle, dictionary: TopicDictionary) -> CandidateFeatures:
+    """Признаки поверх сегмента общей памяти (подключение кэшируется в воркере)"""
+    entry = _attached.get(handle.name)
+    if entry is None:
+        shm = SharedMemory(name=handle.name)
+        arrays = {}
+        for field, dtype, shape, start in handle.layout:
+            array = np.ndarray(shape, dtype=dtype, buffer=shm.buf, offset=start)
+            array.flags.writeable = False
+            arrays[field] = array
+        features = CandidateFeatures(**arrays, gender_index=handle.gender_index, dictionary=dictionary)
+        entry = _attached[handle.name] = (shm, features)
+        while len(_attached) > _ATTACHED_MAX:
+            old_shm, _ = _attached.popitem(last=False)[1]
+            try:
+                old_shm.close()
+            except BufferError:
+                pass
+    else:
+        _attached.move_to_end(handle.name)
+
+    features = entry[1]
+    # Словарь нужен только для кодирования тем пользователя и мог пополниться
+    features.dictionary = dictionary
+    return features
+
+
+def score_shard(
+    handle: SharedFeaturesHandle,
+    dictionary: TopicDictionary,
+    user_info: Dict[str, Any],
+    indices: np.ndarray,
+    size: int,
+    past_partners: Optional[np.ndarray] = None,
+) -> Tuple[List[Tuple[float, int]], int]:
+    """Топ size кандидатов шарда в процессе воркера: (score, позиция в шарде) и число отскоренных"""
+    features = _attach(handle, dictionary)
+    trace = MatchingTrace("score_shard")
+    top = top_candidates(user_info, ScoringBatch([], features, indices), size, trace, past_partners)
+    return top, trace.counts["candidates_scored"]
+
+
+class ParallelScorer:
+    """Пул процессов для скоринга недель с большим количеством кандидатов"""
+
+    def __init__(self, workers: int = None, min_candidates: int = None):
+        # workers — процессов на этот воркер uvicorn; по умолчанию доля бюджета деплоя
+        self.workers = workers if workers is not None else self.workers_per_process(
+            settings.matching_parallel_workers, settings.web_concurrency
+        )
+        self.min_candidates = min_candidates if min_candidates is not None else settings.matching_parallel_min_candidates
+        self._executor: Optional[ProcessPoolExecutor] = None
+        # id(features) -> описание сегмента; сегмент освобождается вместе с признаками
+        self._handles: Dict[int, SharedFeaturesHandle] = {}
+        self._finalizers: List[weakref.finalize] = []
+
+    @staticmethod
+    def workers_per_process(budget: int, web_concurrency: int) -> int:
+        """Доля бюджета процессов деплоя на один воркер uvicorn (0 — пул выключен)"""
+        if budget <= 0:
+            return 0
+        workers = budget // max(web_concurrency, 1)
+        if workers == 0:
+            logger.warning(
+                f"Parallel scoring disabled: {budget} processes are fewer than {web_concurrency} uvicorn workers"
+            )
+        return workers
+
+    def should_use(self, batch: ScoringBatch) -> bool:
+        """Выносить ли скоринг батча в пул процессов"""
+        return self.workers > 0 and len(batch.candidates) >= self.min_candidates
+
+    def _get_executor(self) -> ProcessPoolExecutor:
+        if self._executor is None:
+            # spawn: воркеры не наследуют event loop, соединения с базой и потоки родителя
+            self._executor = ProcessPoolExecutor(self.workers, mp_context=multiprocessing.get_context("spawn"))
+            logger.info(f"Parallel scoring pool started with {self.workers} workers")
+        return self._executor
+
+    def _share(self, features: CandidateFeatures) -> SharedFeaturesHandle:
+        handle = self._handles.get(id(features))
+        if handle is None:
+            self._finalizers = [finalizer for finalizer in self._finalizers if finalizer.alive]
+            shm, handle = export_features(features)
+            key = id(features)
+            self._handles[key] = handle
+            self._finalizers.append(weakref.finalize(features, self._forget, key, shm))
+        return handle
+
+    def _forget(self, key: int, shm: SharedMemory):
+        self._handles.pop(key, None)
+        _release(shm)
+
+    async def top_candidates(
+        self,
+        user_info: Dict[str, Any],
+        batch: ScoringBatch,
+        size: int,
+        trace: Optional[MatchingTrace] = None,
+        past_partners: Optional[np.ndarray] = None,
+    ) -> List[Tuple[float, int]]:
+        """То же, что match_scoring.top_candidates, но шардами в пуле процессов"""
+        features = batch.features
+        indices = batch.indices if batch.indices is not None else np.arange(len(features))
+        if size <= 0 or len(indices) == 0:
+            return []
+
+        handle = self._share(features)
+        # Кодируем темы пользователя здесь, чтобы словарь воркеров уже содержал их id
+        features.dictionary.encode(user_info["topics"])
+        bounds = np.linspace(0, len(indices), min(self.workers, len(indices)) + 1, dtype=np.int64)
+
+        loop = asyncio.get_running_loop()
+        executor = self._get_executor()
+        shards = await asyncio.gather(
+            *(
+                loop.run_in_executor(
+                    executor,
+                    score_shard,
+                    handle,
+                    features.dictionary,
+                    user_info,
+                    indices[start:end],
+                    size,
+                    past_partners,
+                )
+                for start, end in zip(bounds[:-1].tolist(), bounds[1:].tolist())
+            )
+        )
+
+        merged = []
+        scored = 0
+        for start, (top, shard_scored) in zip(bounds[:-1].tolist(), shards):
+            merged.extend((score, start + position) for score, position in top)
+            scored += shard_scored
+        if trace is not None:
+            trace.count("candidates_scored", scored)
+        # При равных score порядок как при полном проходе — по позиции в батче
+        merged.sort(key=itemgetter(1))
+        return heapq.nlargest(size, merged, key=itemgetter(0))
+
+    def shutdown(self):
+        """Остановить воркеры и освободить сегменты общей памяти"""
+        if self._executor is not None:
+            self._executor.shutdown(wait=True, cancel_futures=True)
+            self._executor = None
+        for finalizer in self._finalizers:
+            finalizer()
+        self._finalizers.clear()
+
+
+# Создаем экземпляр (процессы стартуют при первой большой неделе)
+parallel_scorer = ParallelScorer()
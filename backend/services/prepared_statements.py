@@ -0,0 +1,88 @@
+"""
+Реестр prepared statements для самых частых запросов.
+
+Запросы регистрируются по имени один раз при импорте модуля, а готовятся на каждом
+соединении пула в init-колбэке (services/db_pool.py). Вызов по имени использует
+готовый PreparedStatement соединения: Postgres не разбирает и не планирует текст
+запроса заново, а asyncpg не ищет его в LRU-кэше statements.
+
+Соединение определяется по pid серверного процесса (он не меняется, пока
+соединение живо), подготовленные запросы закрытого соединения удаляются.
+Если соединение не прошло через init (например, пул был открыт раньше, чем
+зарегистрирован колбэк), запрос готовится при первом вызове. Соединения без
+get_server_pid (фейки в тестах) выполняют текст запроса напрямую.
+"""
+
+from typing import List, Dict, Any, Optional
+
+import asyncpg
+from asyncpg.prepared_stmt import PreparedStatement
+from loguru import logger
+
+
+class StatementRegistry:
+    """Именованные запросы, подготовленные на каждом соединении пула"""
+
+    def __init__(self):
+        self._queries: Dict[str, str] = {}
+        # pid серверного процесса соединения -> имя запроса -> PreparedStatement
+        self._prepared: Dict[int, Dict[str, PreparedStatement]] = {}
+
+    def register(self, name: str, query: str) -> str:
+        """Зарегистрировать запрос; возвращает имя для вызова"""
+        if name in self._queries and self._queries[name] != query:
+            raise ValueError(f"Statement {name} is already registered with another query")
+        self._queries[name] = query
+        return name
+
+    def query(self, name: str) -> str:
+        return self._queries[name]
+
+    @property
+    def names(self) -> List[str]:
+        return list(self._queries)
+
+    async def prepare_connection(self, conn: asyncpg.Connection):
+        """Подготовить все запросы на новом соединении (init-колбэк пула)"""
+        pid = conn.get_server_pid()
+        prepared = self._prepared.setdefault(pid, {})
+        for name, query in self._queries.items():
+            prepared[name] = await conn.prepare(query)
+        conn.add_termination_listener(self._forget_connection)
+
+    def _forget_connection(self, conn: asyncpg.Connection):
+        self._prepared.pop(conn.get_server_pid(), None)
+
+    async def _statement(self, conn, name: str) -> Optional[PreparedStatement]:
+        get_server_pid = getattr(conn, "get_server_pid", None)
+        if get_server_pid is None:
+            return None
+        prepared = self._prepared.get(get_server_pid())
+        if prepared is None:
+            await self.prepare_connection(conn)
+            prepared = self._prepared[get_server_pid()]
+        statement = prepared.get(name)
+        if statement is None:
+            statement = prepared[name] = await conn.prepare(self._queries[name])
+        return statement
+
+    async def _call(self, conn, name: str, method: str, args: tuple):
+        statement = await self._statement(conn, name)
+        if statement is None:
+            return await getattr(conn, method)(self._queries[name], *args)
+        try:
+            return await getattr(statement, method)(*args)
+        except (asyncpg.exceptions.InvalidCachedStatementError, asyncpg.exceptions.OutdatedSchemaCacheError) as e:
+            # Схема таблиц изменилась после подготовки — готовим запрос заново
+            logger.info(f"Re-preparing statement {name}: {e}")
+            statement = self._prepared[conn.get_server_pid()][name] = await conn.prepare(self._queries[name])
+            return await getattr(statement, method)(*args)
+
+    async def fetch(self, conn, name: str, *args) -> List[asyncpg.Record]:
+        return await self._call(conn, name, "fetch", args)
+
+    async def fetchrow(self, conn, name: str, *args) -> Optional[asyncpg.Record]:
+        return await self._call(conn, name, "fetchrow", args)
+
+    async def fetchval(self, conn, name: str, *args) -> Any:
+        return await self._call(conn, name, "fetchval", args)
@@ -0,0 +1,155 @@
+"""
+Проверка планов горячих запросов: ни один не должен читать таблицу целиком.
+
+Горячие запросы — реестр orator_statements и запросы подбора пар и очереди сообщений
+ниже. Для каждого выполняется EXPLAIN с параметрами из существующих данных при
+enable_seqscan = off: планировщик выбирает Seq Scan, только если подходящего индекса
+нет, поэтому проверка не зависит от объема данных в базе. Запуск:
+python migrate.py check-plans (код 1, если найден Seq Scan).
+"""
+
+import json
+from datetime import date
+from typing import List, Dict, Any, NamedTuple, Tuple
+from uuid import uuid4
+
+import asyncpg
+
+from services.orator_database import (
+    orator_statements,
+    CURRENT_REGISTRATION,
+    WEEK_REGISTRATION,
+    USER_TOPICS,
+    USER_PROFILE,
+    USER_PAIRS,
+    BOT_CONTENT,
+    ACTIVE_SETTINGS,
+)
+
+# Таблицы, которые горячие запросы читают целиком намеренно
+SEQ_SCAN_ALLOWED = {
+    # Все активные настройки загружаются в кэш одним запросом
+    "orator_settings",
+}
+
+
+class HotQuery(NamedTuple):
+    """Запрос и имена параметров из sample_params"""
+
+    name: str
+    query: str
+    params: Tuple[str, ...]
+
+
+# Параметры запросов реестра orator_statements
+STATEMENT_PARAMS: Dict[str, Tuple[str, ...]] = {
+    CURRENT_REGISTRATION: ("user_id",),
+    WEEK_REGISTRATION: ("user_id", "week_start_date"),
+    USER_TOPICS: ("registration_id",),
+    USER_PROFILE: ("user_id",),
+    USER_PAIRS: ("user_id", "week_start_date"),
+    BOT_CONTENT: ("content_key", "language"),
+    ACTIVE_SETTINGS: (),
+}
+
+EXTRA_QUERIES = [
+    HotQuery(
+        "week_active_registrations",
+        """
+        SELECT id, user_id FROM week_registrations
+        WHERE week_start_date = $1 AND status = 'active'
+        """,
+        ("week_start_date",),
+    ),
+    HotQuery(
+        "week_open_pairs",
+        """
+        SELECT up.id, up.user1_id, up.user2_id
+        FROM user_pairs up
+        JOIN week_registrations wr ON up.week_registration_id = wr.id
+        WHERE wr.week_start_date = $1
+        AND up.status IN ('pending', 'confirmed')
+        """,
+        ("week_start_date",),
+    ),
+    HotQuery(
+        "pending_messages",
+        """
+        SELECT id FROM message_queue
+        WHERE sent = FALSE
+        ORDER BY created_at
+        LIMIT $1
+        """,
+        ("limit",),
+    ),
+    HotQuery(
+        "recent_messages",
+        """
+        SELECT id, sent, created_at FROM message_queue
+        ORDER BY created_at DESC
+        LIMIT $1
+        """,
+        ("limit",),
+    ),
+]
+
+
+def hot_queries() -> List[HotQuery]:
+    """Все проверяемые запросы"""
+    missing = [name for name in orator_statements.names if name not in STATEMENT_PARAMS]
+    if missing:
+        raise ValueError(f"No sample parameters for statements: {', '.join(missing)}")
+    registered = [HotQuery(name, orator_statements.query(name), STATEMENT_PARAMS[name]) for name in orator_statements.names]
+    return registered + EXTRA_QUERIES
+
+
+async def sample_params(conn: asyncpg.Connection) -> Dict[str, Any]:
+    """Параметры запросов из существующих данных (или случайные, если таблицы пустые)"""
+    params: Dict[str, Any] = {
+        "user_id": uuid4(),
+        "week_start_date": date.today(),
+        "registration_id": uuid4(),
+        "content_key": "welcome_message",
+        "language": "ru",
+        "limit": 100,
+    }
+    registration = await conn.fetchrow("SELECT id, user_id, week_start_date FROM week_registrations LIMIT 1")
+    if registration:
+        params.update(
+            user_id=registration["user_id"],
+            week_start_date=registration["week_start_date"],
+            registration_id=registration["id"],
+        )
+    content = await conn.fetchrow("SELECT content_key, language FROM bot_content LIMIT 1")
+    if content:
+        params.update(content_key=content["content_key"], language=content["language"])
+    return params
+
+
+def find_seq_scans(plan: Dict[str, Any]) -> List[str]:
+    """Таблицы, которые план читает через Seq Scan"""
+    relations = []
+    if plan.get("Node Type") == "Seq Scan":
+        relations.append(plan["Relation Name"])
+    for child in plan.get("Plans", []):
+        relations += find_seq_scans(child)
+    return relations
+
+
+async def check_hot_query_plans(conn: asyncpg.Connection) -> Dict[str, List[str]]:
+    """Запросы, план которых читает таблицы целиком: имя запроса -> таблицы"""
+    params = await sample_params(conn)
+    failures: Dict[str, List[str]] = {}
+    async with conn.transaction():
+        await conn.execute("SET LOCAL enable_seqscan = off")
+        for hot_query in hot_queries():
+            args = [params[name] for name in hot_query.params]
+            explained = await conn.fetchval(f"EXPLAIN (FORMAT JSON) {hot_query.query}", *args)
+            if isinstance(explained, str):
+                explained = json.loads(explained)
+            relations = [
+                relation for relation in find_seq_scans(explained[0]["Plan"]) if relation not in SEQ_SCAN_ALLOWED
+            ]
+            if relations:
+                failures[hot_query.name] = relations
+    return failures
@@ -0,0 +1,83 @@
+"""
+In-process снимок настроек бота (таблица orator_settings).
+
+Снимок загружается одним запросом и обновляется по истечении TTL или по
+уведомлению Postgres (LISTEN/NOTIFY, см. migrations/0003_orator_settings_notify.sql),
+которое приходит через выделенное соединение services/db_notifications.py.
+"""
+
+import asyncio
+import time
+from typing import Dict, Optional, Callable, Awaitable
+
+from loguru import logger
+
+from services.db_notifications import DatabaseNotificationListener
+
+
+SETTINGS_CHANNEL = "orator_settings_changed"
+
+
+class SettingsCache:
+    """Кэш активных настроек с типизированными геттерами"""
+
+    def __init__(self, loader: Callable[[], Awaitable[Dict[str, str]]], ttl_seconds: int):
+        self.loader = loader
+        self.ttl_seconds = ttl_seconds
+        self._values: Dict[str, str] = {}
+        self._loaded_at: Optional[float] = None
+        # Увеличивается при каждой инвалидации, чтобы не потерять ее во время загрузки
+        self._version = 0
+        self._lock = asyncio.Lock()
+
+    def invalidate(self):
+        """Сбросить снимок — следующее чтение перезагрузит настройки"""
+        self._version += 1
+        self._loaded_at = None
+
+    def _is_fresh(self) -> bool:
+        return self._loaded_at is not None and time.monotonic() - self._loaded_at < self.ttl_seconds
+
+    async def refresh(self):
+        """Перезагрузить снимок настроек из базы"""
+        async with self._lock:
+            # Пока ждали блокировку, снимок мог обновить другой запрос
+            if self._is_fresh():
+                return
+            version = self._version
+            self._values = await self.loader()
+            self._loaded_at = time.monotonic() if version == self._version else None
+
+    async def get(self, key: str, default_value: str = None) -> Optional[str]:
+        """Получить значение настройки"""
+        if not self._is_fresh():
+            await self.refresh()
+        return self._values.get(key, default_value)
+
+    async def get_int(self, key: str, default_value: int = 0) -> int:
+        """Получить значение настройки как целое число"""
+        value = await self.get(key)
+        try:
+            return int(value) if value else default_value
+        except (ValueError, TypeError):
+            return default_value
+
+    async def get_bool(self, key: str, default_value: bool = False) -> bool:
+        """Получить значение настройки как булево значение"""
+        value = await self.get(key)
+        if value is None:
+            return default_value
+        return value.lower() in ("true", "1", "yes", "on")
+
+    # LISTEN/NOTIFY
+    def listen(self, notifications: DatabaseNotificationListener):
+        """Подписаться на уведомления об изменении настроек.
+
+        После переподключения слушателя снимок сбрасывается: изменения, сделанные
+        без соединения, иначе дошли бы только по TTL.
+        """
+        notifications.subscribe(SETTINGS_CHANNEL, self._on_notification, on_reconnect=self.invalidate)
+
+    def _on_notification(self, payload: str):
+        logger.info(f"Setting {payload} changed, invalidating settings cache")
+        self.invalidate()
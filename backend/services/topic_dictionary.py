@@ -0,0 +1,124 @@
+"""
+Словарь тем: перевод путей тем и их родительских групп в небольшие целые id.
+
+Темы регистрации хранятся как битовые маски, поэтому точное совпадение тем и
+совпадение родительских групп считаются как popcount от AND двух масок.
+"""
+
+from typing import List, Dict, Any, Optional, NamedTuple
+from loguru import logger
+
+import numpy as np
+
+
+def extract_parent_group(topic_path: str) -> Optional[str]:
+    """Извлечь родительскую группу из пути темы"""
+    if not topic_path:
+        return None
+
+    # Первая часть пути до разделителя — родительская группа
+    parent = topic_path.split(" - ")[0].strip()
+    return parent or None
+
+
+class TopicMasks(NamedTuple):
+    """Темы одной регистрации в виде битовых масок"""
+
+    topics: int
+    groups: int
+
+
+class TopicDictionary:
+    """Интернирование тем и родительских групп.
+
+    Id выдаются только на добавление и никогда не переиспользуются, поэтому маски,
+    построенные раньше, остаются корректными после обновления словаря.
+    """
+
+    def __init__(self):
+        self._topic_ids: Dict[str, int] = {}
+        self._group_ids: Dict[str, int] = {}
+        # id темы -> id родительской группы (-1, если группы нет)
+        self._topic_groups: List[int] = []
+
+    @property
+    def topic_count(self) -> int:
+        return len(self._topic_ids)
+
+    @property
+    def group_count(self) -> int:
+        return len(self._group_ids)
+
+    def topic_id(self, topic_path: str) -> int:
+        """Id темы (новая тема получает следующий свободный id)"""
+        topic_id = self._topic_ids.get(topic_path)
+        if topic_id is None:
+            topic_id = len(self._topic_ids)
+            self._topic_ids[topic_path] = topic_id
+            parent = extract_parent_group(topic_path)
+            if parent:
+                self._topic_groups.append(self._group_ids.setdefault(parent, len(self._group_ids)))
+            else:
+                self._topic_groups.append(-1)
+        return topic_id
+
+    def encode(self, topics: List[str]) -> TopicMasks:
+        """Закодировать список тем в маски тем и родительских групп"""
+        topic_mask = 0
+        group_mask = 0
+        for topic in topics:
+            topic_id = self.topic_id(topic)
+            topic_mask |= 1 << topic_id
+            group_id = self._topic_groups[topic_id]
+            if group_id >= 0:
+                group_mask |= 1 << group_id
+        return TopicMasks(topic_mask, group_mask)
+
+    def load(self, topics: List[Dict[str, Any]]):
+        """Добавить в словарь темы из таблицы topics (по topic_id и по названию)"""
+        before = self.topic_count
+        for topic in topics:
+            for key in (topic["topic_id"], topic["name"]):
+                if key:
+                    self.topic_id(key)
+        if self.topic_count != before:
+            logger.info(f"Topic dictionary now has {self.topic_count} topics and {self.group_count} groups")
+
+    async def refresh(self, db):
+        """Подгрузить новые темы из базы"""
+        self.load(await db.get_all_topics())
+
+
+_POPCOUNT_TABLE = np.array([bin(i).count("1") for i in range(256)], dtype=np.uint8)
+
+
+def mask_to_words(mask: int, width: int) -> np.ndarray:
+    """Маска в виде массива из width 64-битных слов (старшие биты отбрасываются)"""
+    words = np.zeros(width, dtype=np.uint64)
+    for index in range(width):
+        words[index] = (mask >> (64 * index)) & 0xFFFFFFFFFFFFFFFF
+    return words
+
+
+def masks_to_words(masks: List[int], width: int) -> np.ndarray:
+    """Список масок в матрицу (len(masks), width) из 64-битных слов"""
+    words = np.zeros((len(masks), width), dtype=np.uint64)
+    for row, mask in enumerate(masks):
+        index = 0
+        while mask and index < width:
+            words[row, index] = mask & 0xFFFFFFFFFFFFFFFF
+            mask >>= 64
+            index += 1
+    return words
+
+
+def popcount_rows(words: np.ndarray) -> np.ndarray:
+    """Количество единичных бит в каждой строке матрицы слов"""
+    if words.shape[1] == 0:
+        return np.zeros(words.shape[0], dtype=np.int64)
+    bytes_view = np.ascontiguousarray(words).view(np.uint8)
+    return _POPCOUNT_TABLE[bytes_view].sum(axis=1, dtype=np.int64)
+
+
+# Создаем экземпляр словаря
+topic_dictionary = TopicDictionary()
@@ -0,0 +1,234 @@
+"""
+Глобальный недельный подбор пар.
+
+Вместо подбора "кто первым нажал" берутся все активные регистрации недели,
+строится разреженный граф кандидатов (соседи по времени) и в нем подбираются пары
+с большим суммарным score с учетом лимита max_pairs_per_user.
+
+Это приближенный подбор, а не паросочетание максимального веса. Точный blossom
+на чистом Python применим только к маленьким неделям (WEEKLY_PAIRING_EXACT_MAX_NODES
+вершин сведенного графа — около 25–30 регистраций). На реальных неделях работает жадный
+алгоритм с локальным улучшением: он гарантирует не меньше 1/2 оптимума, а на
+синтетических неделях из 20–100 регистраций уступает blossom на 1–3% суммарного score
+(python -m benchmarks.weekly_pairing --gap-registrations 60).
+"""
+
+from datetime import date
+from typing import List, Dict, Any, Tuple, NamedTuple, Sequence
+from uuid import uuid4
+
+import numpy as np
+from loguru import logger
+
+from config.settings import settings
+from models.orator.message_queue import MessageQueue
+from services.orator_database import OratorDatabaseService
+from services.match_scoring import CandidateFeatures, score_pairs
+from services.pair_matching import max_weight_b_matching, greedy_b_matching
+
+# Score переводится в целые веса с точностью 1e-6, чтобы blossom работал в целых числах
+WEIGHT_SCALE = 1_000_000
+
+
+class CandidateGraph(NamedTuple):
+    """Разреженный граф кандидатов: ребра (left[k], right[k]) с весом weight[k]"""
+
+    left: np.ndarray
+    right: np.ndarray
+    weight: np.ndarray
+    capacity: np.ndarray
+
+
+class PairingPlan(NamedTuple):
+    """Результат подбора: пары (индексы кандидатов) и их веса"""
+
+    pairs: List[Tuple[int, int]]
+    weights: List[int]
+    exact: bool
+
+    @property
+    def total_weight(self) -> int:
+        return sum(self.weights)
+
+
+def build_candidate_graph(
+    features: CandidateFeatures,
+    capacity: np.ndarray,
+    neighbours: int,
+    existing_pairs: Sequence[Tuple[int, int]] = (),
+) -> CandidateGraph:
+    """Построить граф из соседей по времени.
+
+    Время весит в score больше всего, поэтому кандидаты сортируются по времени (при
+    равном времени — по темам) и каждый соединяется с neighbours соседями с каждой
+    стороны. Вес ребра — средний score в обе стороны. Пары, которые уже существуют,
+    и пользователи без свободной емкости в граф не попадают.
+    """
+    active = np.flatnonzero(capacity > 0)
+    topic_key = features.topic_words[active, 0] if features.topic_words.shape[1] else np.zeros(len(active))
+    order = active[np.lexsort((topic_key, features.minutes[active]))]
+
+    left_parts = []
+    right_parts = []
+    for offset in range(1, min(neighbours, len(order) - 1) + 1):
+        left_parts.append(order[:-offset])
+        right_parts.append(order[offset:])
+    if not left_parts:
+        empty = np.zeros(0, dtype=np.int64)
+        return CandidateGraph(empty, empty, empty, capacity)
+
+    left = np.concatenate(left_parts)
+    right = np.concatenate(right_parts)
+
+    if existing_pairs:
+        n = len(features)
+        existing = np.array([min(u, v) * n + max(u, v) for u, v in existing_pairs], dtype=np.int64)
+        keep = ~np.isin(np.minimum(left, right) * n + np.maximum(left, right), existing)
+        left, right = left[keep], right[keep]
+
+    score = (score_pairs(features, left, right) + score_pairs(features, right, left)) / 2
+    weight = np.rint(score * WEIGHT_SCALE).astype(np.int64)
+    return CandidateGraph(left, right, weight, capacity)
+
+
+def solve_pairing(graph: CandidateGraph, exact_max_nodes: int) -> PairingPlan:
+    """Подобрать пары в графе кандидатов.
+
+    Точный blossom используется, пока сведенный граф не больше exact_max_nodes вершин,
+    иначе — приближенный жадный алгоритм с локальным улучшением (переход пишется в лог
+    с предупреждением, а в плане exact = False).
+    """
+    edge_count = len(graph.weight)
+    reduced_nodes = int(graph.capacity.sum()) + 2 * edge_count
+    exact = reduced_nodes <= exact_max_nodes
+    if not exact:
+        logger.warning(
+            f"Pairing graph has {reduced_nodes} reduced nodes (limit {exact_max_nodes}), "
+            "falling back to approximate greedy matching"
+        )
+
+    if exact:
+        edges = list(zip(graph.left.tolist(), graph.right.tolist(), graph.weight.tolist()))
+        selected = max_weight_b_matching(edges, graph.capacity.tolist())
+    else:
+        selected = greedy_b_matching(len(graph.capacity), graph.left, graph.right, graph.weight, graph.capacity)
+
+    return PairingPlan(
+        [(int(graph.left[k]), int(graph.right[k])) for k in selected],
+        [int(graph.weight[k]) for k in selected],
+        exact,
+    )
+
+
+def plan_week_pairs(
+    candidates: List[Dict[str, Any]],
+    open_pairs: List[Dict[str, Any]],
+    max_pairs_per_user: int,
+    neighbours: int = None,
+    exact_max_nodes: int = None,
+) -> PairingPlan:
+    """Спланировать пары недели по кандидатам и уже открытым парам"""
+    neighbours = neighbours or settings.weekly_pairing_neighbours
+    exact_max_nodes = exact_max_nodes if exact_max_nodes is not None else settings.weekly_pairing_exact_max_nodes
+
+    index = {str(candidate["user_id"]): row for row, candidate in enumerate(candidates)}
+    pair_counts = np.zeros(len(candidates), dtype=np.int64)
+    existing_pairs = []
+    for pair in open_pairs:
+        user1 = index.get(str(pair["user1_id"]))
+        user2 = index.get(str(pair["user2_id"]))
+        for user in (user1, user2):
+            if user is not None:
+                pair_counts[user] += 1
+        if user1 is not None and user2 is not None:
+            existing_pairs.append((user1, user2))
+
+    capacity = np.maximum(max_pairs_per_user - pair_counts, 0)
+    features = CandidateFeatures.from_candidates(candidates)
+    graph = build_candidate_graph(features, capacity, neighbours, existing_pairs)
+    return solve_pairing(graph, exact_max_nodes)
+
+
+class WeeklyPairingService:
+    def __init__(self, orator_db: OratorDatabaseService):
+        self.orator_db = orator_db
+
+    async def run_week(self, week_start: date, dry_run: bool = False) -> Dict[str, Any]:
+        """Подобрать пары на неделю для всех активных регистраций и сохранить их"""
+        try:
+            max_pairs_per_user = await self.orator_db.get_setting_int("max_pairs_per_user", 3)
+            # Берем свежие данные из базы, а не из пула: подбор должен видеть всю неделю целиком
+            candidates = await self.orator_db.get_week_candidates(week_start)
+            open_pairs = await self.orator_db.get_week_open_pairs(week_start)
+
+            plan = plan_week_pairs(candidates, open_pairs, max_pairs_per_user)
+            logger.info(
+                f"Weekly pairing for {week_start}: {len(candidates)} registrations, "
+                f"{len(plan.pairs)} pairs proposed ({'exact' if plan.exact else 'approximate'})"
+            )
+
+            created = []
+            if plan.pairs and not dry_run:
+                pairs, messages = self._build_pairs(candidates, plan)
+                created = await self.orator_db.create_pairs_with_messages(
+                    week_start, pairs, messages, max_pairs_per_user
+                )
+
+            return {
+                "week_start_date": week_start.isoformat(),
+                "registrations": len(candidates),
+                "proposed_pairs": len(plan.pairs),
+                "created_pairs": len(created),
+                "total_score": plan.total_weight / WEIGHT_SCALE,
+                "exact": plan.exact,
+                "dry_run": dry_run,
+            }
+
+        except Exception as e:
+            logger.error(f"Error running weekly pairing for {week_start}: {e}")
+            raise
+
+    def _build_pairs(
+        self, candidates: List[Dict[str, Any]], plan: PairingPlan
+    ) -> Tuple[List[Dict[str, Any]], List[Tuple[Any, MessageQueue]]]:
+        """Подготовить строки пар и сообщения обоим участникам"""
+        pairs = []
+        messages = []
+        for user1, user2 in plan.pairs:
+            candidate1, candidate2 = candidates[user1], candidates[user2]
+            pair_id = uuid4()
+            pairs.append(
+                {
+                    "id": pair_id,
+                    "user1_id": candidate1["user_id"],
+                    "user2_id": candidate2["user_id"],
+                    "registration_id": candidate1["registration_id"],
+                }
+            )
+
+            keyboard = {
+                "inline_keyboard": [
+                    [
+                        {"text": "✅ Подтвердить", "callback_data": f"pair_confirm_{pair_id}"},
+                        {"text": "❌ Отменить", "callback_data": f"pair_cancel_{pair_id}"},
+                    ]
+                ]
+            }
+            for candidate, partner in ((candidate1, candidate2), (candidate2, candidate1)):
+                messages.append(
+                    (
+                        pair_id,
+                        MessageQueue(
+                            user_id=str(candidate["telegram_id"]),
+                            message=f"Мы подобрали вам пару на неделю: {partner['name']}",
+                            keyboard=keyboard,
+                        ),
+                    )
+                )
+        return pairs, messages
+
+
+# Создаем экземпляр сервиса
+from .orator_database import orator_db
+
+weekly_pairing_service = WeeklyPairingService(orator_db)
@@ -0,0 +1,202 @@
+import asyncio
+import json
+import pytest
+from datetime import date, timedelta
+from uuid import uuid4
+
+from benchmarks.repository import InMemoryOratorRepository
+from benchmarks.synthetic import generate_dataset
+from services.candidate_cache import CandidateResultCache
+from services.candidate_pool import WeekCandidatePool
+from services.db_notifications import DatabaseNotificationListener
+from services.orator_database import MATCHING_CHANNEL, OratorDatabaseService
+from services.pair_history import PairHistoryIndex
+from tests.test_settings_cache import FakeListenConnection
+from services.matching_service import MatchingService
+from tests.test_matching_service import WEEK_START, make_matching_service
+
+
+def ranking_of(*user_ids):
+    return [(1.0 - index / 10, {"user_id": user_id}) for index, user_id in enumerate(user_ids)]
+
+
+class TestCandidateResultCache:
+    """Тесты кэша ранжированных кандидатов"""
+
+    def setup_method(self):
+        self.cache = CandidateResultCache(ttl_seconds=60, max_entries=3)
+        self.cache.put("a", WEEK_START, 3, 2, ranking_of("b", "c"))
+
+    def test_hit_and_miss_conditions(self):
+        assert self.cache.get("a", WEEK_START, 3, 2) == ranking_of("b", "c")
+        # Другие лимиты пар и другая неделя — промах
+        assert self.cache.get("a", WEEK_START, 2, 2) is None
+        assert self.cache.get("a", date(2024, 1, 22), 3, 2) is None
+
+    def test_truncated_ranking_is_not_enough_for_larger_request(self):
+        assert self.cache.get("a", WEEK_START, 3, 5) is None
+
+        # Если кандидатов меньше запрошенного, в ранжировании уже все кандидаты недели
+        self.cache.put("d", WEEK_START, 3, 5, ranking_of("b"))
+        assert self.cache.get("d", WEEK_START, 3, 10) == ranking_of("b")
+
+    def test_ttl_expiry(self):
+        cache = CandidateResultCache(ttl_seconds=0, max_entries=3)
+        cache.put("a", WEEK_START, 3, 2, ranking_of("b"))
+
+        assert cache.get("a", WEEK_START, 3, 2) is None
+        assert len(cache) == 0
+
+    @pytest.mark.asyncio
+    async def test_events_invalidate_user_and_listed_candidates(self):
+        self.cache.put("x", WEEK_START, 3, 2, ranking_of("y"))
+
+        await self.cache.on_pair_created({"id": "p", "user1_id": "c", "user2_id": "z", "week_start_date": WEEK_START})
+        # c указан в выдаче a, выдача x не затронута
+        assert self.cache.get("a", WEEK_START, 3, 2) is None
+        assert self.cache.get("x", WEEK_START, 3, 2) is not None
+
+        await self.cache.on_registration_cancelled("x", WEEK_START)
+        assert self.cache.get("x", WEEK_START, 3, 2) is None
+        assert self.cache._listed_in == {}
+
+    @pytest.mark.asyncio
+    async def test_registration_invalidates_own_entry(self):
+        await self.cache.on_registration_created({"user_id": "a", "week_start_date": WEEK_START})
+
+        assert self.cache.get("a", WEEK_START, 3, 2) is None
+
+    def test_oldest_entries_are_evicted(self):
+        for user_id in ("b", "c", "d"):
+            self.cache.put(user_id, WEEK_START, 3, 2, ranking_of("e"))
+
+        assert len(self.cache) == 3
+        assert self.cache.get("a", WEEK_START, 3, 2) is None
+
+
+class TestMatchingWithResultCache:
+    """Подбор кандидатов с кэшем ранжирования"""
+
+    def setup_method(self):
+        service, self.pool = make_matching_service(100)
+        self.service = MatchingService(service.orator_db, result_cache=CandidateResultCache(60, 100))
+        self.user_id = uuid4()
+
+    @pytest.mark.asyncio
+    async def test_repeated_requests_are_served_from_cache(self):
+        first = await self.service.find_candidates(self.user_id, WEEK_START, limit=3, max_pairs_per_user=3)
+        round_trips = self.pool.round_trips
+
+        second = await self.service.find_candidates(self.user_id, WEEK_START, limit=3, max_pairs_per_user=3)
+
+        assert self.pool.round_trips == round_trips
+        assert [c.user_id for c in first] == [c.user_id for c in second]
+
+    @pytest.mark.asyncio
+    async def test_pages_do_not_overlap(self):
+        pages = [
+            await self.service.find_candidates(self.user_id, WEEK_START, limit=3, max_pairs_per_user=3, page=page)
+            for page in range(4)
+        ]
+
+        shown = [c.user_id for page in pages for c in page]
+        assert len(shown) == 12
+        assert len(set(shown)) == 12
+        # Первая страница совпадает с выдачей без кэша
+        uncached = MatchingService(self.service.orator_db)
+        assert [c.user_id for c in pages[0]] == [
+            c.user_id for c in await uncached.find_candidates(self.user_id, WEEK_START, limit=3, max_pairs_per_user=3)
+        ]
+
+
+class TestChangesFromOtherProcesses:
+    """Изменения, сделанные другим процессом, приходят через уведомления базы"""
+
+    def setup_method(self):
+        today = date.today()
+        self.week_start = today - timedelta(days=today.weekday())
+        self.dataset = generate_dataset(50, seed=2, week_start=self.week_start)
+        self.repository = InMemoryOratorRepository(self.dataset)
+        self.pool = WeekCandidatePool(self.repository, resync_seconds=60)
+        self.cache = CandidateResultCache(ttl_seconds=60, max_entries=10)
+        self.history = PairHistoryIndex()
+
+        self.db = OratorDatabaseService()
+        # История пар перечитывается через сервис, разославший событие
+        self.db.get_confirmed_pair_history = self.repository.get_confirmed_pair_history
+        for listener in (self.pool, self.cache, self.history):
+            self.db.add_listener(listener)
+        self.connections = []
+
+        async def connect():
+            self.connections.append(FakeListenConnection())
+            return self.connections[-1]
+
+        self.notifications = DatabaseNotificationListener("postgresql://test", check_seconds=60, connect=connect)
+        self.db.listen_for_changes(self.notifications)
+
+    async def deliver(self, **change):
+        change.setdefault("week_start_date", self.week_start.isoformat())
+        self.connections[-1].notify(MATCHING_CHANNEL, json.dumps(change))
+        await asyncio.gather(*self.db._change_tasks)
+
+    @pytest.mark.asyncio
+    async def test_remote_pair_updates_pool_cache_and_history(self):
+        week = await self.pool.get_week(self.week_start)
+        user_id, partner_id, other_id = list(week.candidates)[:3]
+        self.cache.put(other_id, self.week_start, 3, 2, ranking_of(partner_id))
+        await self.notifications.start()
+        try:
+            pair = {"table": "user_pairs", "id": "remote", "user1_id": user_id, "user2_id": partner_id}
+            await self.deliver(status="pending", **pair)
+
+            assert partner_id in week.partners[user_id]
+            assert self.cache.get(other_id, self.week_start, 3, 2) is None
+
+            # Подтверждение, пришедшее повторно, дописывается в историю один раз
+            await self.deliver(status="confirmed", **pair)
+            await self.deliver(status="confirmed", **pair)
+            assert self.history.pair_count == 1
+
+            await self.deliver(status="cancelled", **pair)
+            assert user_id not in week.partners
+        finally:
+            await self.notifications.stop()
+
+    @pytest.mark.asyncio
+    async def test_remote_registration_cancel_and_known_registration(self):
+        week = await self.pool.get_week(self.week_start)
+        user_id = next(iter(week.candidates))
+        registration_id = str(week.candidates[user_id]["registration_id"])
+        await self.notifications.start()
+        try:
+            self.repository.reset_queries()
+            registration = {"table": "week_registrations", "id": registration_id, "user_id": user_id}
+            await self.deliver(status="active", **registration)
+            # Регистрация уже в пуле — профиль повторно не загружается
+            assert self.repository.query_count == 0
+
+            await self.deliver(status="cancelled", **registration)
+            assert user_id not in week.candidates
+        finally:
+            await self.notifications.stop()
+
+    @pytest.mark.asyncio
+    async def test_reconnect_reloads_listeners(self):
+        await self.pool.get_week(self.week_start)
+        self.cache.put("a", self.week_start, 3, 2, ranking_of("b"))
+        await self.notifications.start()
+        try:
+            self.repository.reset_queries()
+            self.connections[0].drop()
+            for _ in range(10):
+                await asyncio.sleep(0)
+            await asyncio.gather(*self.db._change_tasks)
+
+            assert len(self.connections) == 2
+            assert len(self.cache) == 0
+            # Пул перечитал недели, история пар — подтвержденные пары
+            assert self.repository.query_count > 0
+            assert self.history.loaded
+        finally:
+            await self.notifications.stop()
@@ -0,0 +1,175 @@
+import random
+import pytest
+from datetime import date, timedelta
+from uuid import uuid4
+
+from benchmarks.repository import InMemoryOratorRepository
+from benchmarks.synthetic import generate_dataset
+from main import app
+from services.candidate_cursors import CandidateCursorStore
+from services.candidate_pool import WeekCandidatePool
+from services.matching_service import MatchingService
+from services.security import security_service
+from tests.test_matching_service import WEEK_START, make_matching_service
+
+
+class TestCandidateCursorStore:
+    """Тесты хранилища курсоров"""
+
+    def setup_method(self):
+        self.store = CandidateCursorStore(ttl_seconds=60, max_entries=2, secret_key="test")
+
+    def test_cursor_round_trip(self):
+        cursor = self.store.create("a", WEEK_START, 3, 5, 30, [(1.0, {"user_id": "b"})])
+        value = self.store.encode(cursor._replace(offset=5, next_user_id="b"))
+
+        decoded = self.store.decode(value, "a")
+        assert decoded == cursor._replace(offset=5, next_user_id="b")
+        assert self.store.get(decoded) == [(1.0, {"user_id": "b"})]
+
+    def test_invalid_foreign_and_expired_cursors(self):
+        value = self.store.encode(self.store.create("a", WEEK_START, 3, 5, 30, []))
+
+        assert self.store.decode("not a cursor!", "a") is None
+        assert self.store.decode(value, "b") is None
+        # Курсор, подписанный другим ключом, не принимается
+        assert CandidateCursorStore(60, 2, secret_key="other").decode(value, "a") is None
+
+        expired = CandidateCursorStore(ttl_seconds=-1, max_entries=2, secret_key="test")
+        cursor = expired.create("a", WEEK_START, 3, 5, 30, [])
+        assert expired.decode(expired.encode(cursor), "a") is None
+        assert expired.get(cursor) is None
+        assert len(expired) == 0
+
+    def test_oldest_entries_are_evicted(self):
+        first = self.store.create("a", WEEK_START, 3, 5, 30, [])
+        self.store.create("b", WEEK_START, 3, 5, 30, [])
+        self.store.create("c", WEEK_START, 3, 5, 30, [])
+
+        assert len(self.store) == 2
+        assert self.store.get(first) is None
+
+
+class TestCursorBrowsing:
+    """Постраничный просмотр кандидатов по курсору"""
+
+    def setup_method(self):
+        service, self.pool = make_matching_service(40)
+        self.service = MatchingService(service.orator_db, cursor_store=CandidateCursorStore(60, 100))
+        self.user_id = uuid4()
+
+    @pytest.mark.asyncio
+    async def test_pages_match_page_numbers_without_recomputing(self):
+        first = await self.service.find_candidates_page(self.user_id, WEEK_START, limit=3, max_pairs_per_user=3)
+        round_trips = self.pool.round_trips
+
+        pages = [first.candidates]
+        cursor = first.next_cursor
+        while cursor:
+            result = await self.service.next_candidates(self.user_id, cursor)
+            pages.append(result.candidates)
+            cursor = result.next_cursor
+
+        assert self.pool.round_trips == round_trips
+        # Ранжирование ограничено candidate_cache_size, страницы не пересекаются
+        shown = [c.user_id for page in pages for c in page]
+        assert len(shown) == len(set(shown)) == 30
+        # Порядок совпадает с выдачей по номерам страниц
+        paged = MatchingService(self.service.orator_db)
+        for page, candidates in enumerate(pages[:3]):
+            expected = await paged.find_candidates(self.user_id, WEEK_START, limit=3, max_pairs_per_user=3, page=page)
+            assert [c.user_id for c in candidates] == [c.user_id for c in expected]
+
+    @pytest.mark.asyncio
+    async def test_cursor_belongs_to_user(self):
+        first = await self.service.find_candidates_page(self.user_id, WEEK_START, limit=3, max_pairs_per_user=3)
+
+        assert await self.service.next_candidates(uuid4(), first.next_cursor) is None
+        assert await self.service.next_candidates(self.user_id, "broken") is None
+
+    @pytest.mark.asyncio
+    async def test_cursor_works_in_another_process(self):
+        """Курсор, выданный одним воркером, принимается другим: порядок восстанавливается"""
+        first = await self.service.find_candidates_page(self.user_id, WEEK_START, limit=3, max_pairs_per_user=3)
+        local = await self.service.next_candidates(self.user_id, first.next_cursor)
+
+        # Другой воркер: свое хранилище в памяти, общий секрет
+        other = MatchingService(self.service.orator_db, cursor_store=CandidateCursorStore(60, 100))
+        remote = await other.next_candidates(self.user_id, first.next_cursor)
+
+        assert [c.user_id for c in remote.candidates] == [c.user_id for c in local.candidates]
+        # Следующие страницы в другом воркере берутся из восстановленного порядка
+        round_trips = self.pool.round_trips
+        assert (await other.next_candidates(self.user_id, remote.next_cursor)).candidates == (
+            await self.service.next_candidates(self.user_id, local.next_cursor)
+        ).candidates
+        assert self.pool.round_trips == round_trips
+
+    def test_rebuilt_order_is_aligned_to_next_candidate(self):
+        """Если ранжирование сдвинулось, просмотр продолжается с кандидата из курсора"""
+        ordered = [(1.0, {"user_id": str(index)}) for index in range(6)]
+        cursor = self.service.cursor_store.create(self.user_id, WEEK_START, 3, 3, 30, ordered)
+
+        assert self.service._cursor_position(cursor._replace(offset=3, next_user_id="3"), ordered) == 3
+        assert self.service._cursor_position(cursor._replace(offset=3, next_user_id="4"), ordered) == 4
+        assert self.service._cursor_position(cursor._replace(offset=3, next_user_id="gone"), ordered) == 3
+
+    def test_browse_order_stops_on_empty_round(self):
+        ranking = [(1.0, {"user_id": str(i)}) for i in range(5)]
+
+        assert self.service._browse_order(ranking, 0, random.Random(1)) == []
+
+    @pytest.mark.asyncio
+    async def test_unavailable_candidates_are_skipped(self):
+        """С пулом недели пропускаются кандидаты, у которых закончились свободные пары"""
+        today = date.today()
+        week_start = today - timedelta(days=today.weekday())
+        dataset = generate_dataset(200, seed=4, week_start=week_start)
+        repository = InMemoryOratorRepository(dataset)
+        pool = WeekCandidatePool(repository, resync_seconds=60)
+        service = MatchingService(repository, pool, cursor_store=CandidateCursorStore(60, 100))
+        user_id = next(str(user_id) for user_id in (await pool.get_week(week_start)).candidates)
+
+        first = await service.find_candidates_page(user_id, week_start, limit=3, max_pairs_per_user=3)
+        cursor = service.cursor_store.decode(first.next_cursor, user_id)
+        ordered, offset = service.cursor_store.get(cursor), cursor.offset
+        partner_id = str(ordered[offset][1]["user_id"])
+        await pool.on_pair_created({"id": "new", "user1_id": user_id, "user2_id": partner_id, "week_start_date": week_start})
+
+        result = await service.next_candidates(user_id, first.next_cursor)
+
+        assert partner_id not in [c.user_id for c in result.candidates]
+        assert [c.user_id for c in result.candidates] == [
+            str(candidate["user_id"]) for _, candidate in ordered[offset + 1 : offset + 4]
+        ]
+
+
+class TestNextEndpoint:
+    """Тесты POST /orator/matching/next"""
+
+    def test_expired_cursor_returns_gone(self, client):
+        app.dependency_overrides[security_service.get_current_user_id] = lambda: str(uuid4())
+        try:
+            response = client.post("/api/v1/orator/matching/next", json={"cursor": "broken"})
+        finally:
+            app.dependency_overrides.clear()
+
+        assert response.status_code == 410
+
+    @pytest.mark.parametrize(
+        "path, body",
+        [
+            ("/api/v1/orator/matching/find", {"week_start_date": "2024-01-15", "limit": 0}),
+            ("/api/v1/orator/matching/find", {"week_start_date": "2024-01-15", "page": -1}),
+            ("/api/v1/orator/matching/find", {"week_start_date": "2024-01-15", "page": 10**6}),
+            ("/api/v1/orator/matching/next", {"cursor": "broken", "limit": 0}),
+        ],
+    )
+    def test_out_of_range_limit_and_page_are_rejected(self, client, path, body):
+        app.dependency_overrides[security_service.get_current_user_id] = lambda: str(uuid4())
+        try:
+            response = client.post(path, json=body)
+        finally:
+            app.dependency_overrides.clear()
+
+        assert response.status_code == 422
@@ -0,0 +1,103 @@
+import asyncio
+import pytest
+
+from config.settings import settings
+from services import db_pool as db_pool_module
+from services.db_pool import DatabasePool
+
+
+class FakeAsyncpgPool:
+    """Фейковый пул asyncpg с ограниченным количеством соединений"""
+
+    def __init__(self, max_size):
+        self.max_size = max_size
+        self.free = asyncio.Queue()
+        for index in range(max_size):
+            self.free.put_nowait(f"conn-{index}")
+        self.closed = False
+
+    async def acquire(self, timeout=None):
+        return await self.free.get()
+
+    async def release(self, connection):
+        self.free.put_nowait(connection)
+
+    async def close(self):
+        self.closed = True
+
+    def get_size(self):
+        return self.max_size
+
+    def get_idle_size(self):
+        return self.free.qsize()
+
+    def get_min_size(self):
+        return 1
+
+    def get_max_size(self):
+        return self.max_size
+
+
+@pytest.fixture
+def created_pools(monkeypatch):
+    created = []
+
+    async def create_pool(dsn, **kwargs):
+        pool = FakeAsyncpgPool(kwargs["max_size"])
+        created.append((pool, kwargs))
+        return pool
+
+    monkeypatch.setattr(db_pool_module.asyncpg, "create_pool", create_pool)
+    return created
+
+
+class TestDatabasePool:
+    """Тесты общего пула соединений"""
+
+    @pytest.mark.asyncio
+    async def test_pool_is_shared_and_closed_by_last_user(self, created_pools):
+        pool = DatabasePool("postgresql://test")
+
+        assert await pool.open() is pool
+        await pool.open()
+        await pool.close()
+
+        assert len(created_pools) == 1
+        assert not created_pools[0][0].closed
+        await pool.close()
+        assert created_pools[0][0].closed
+        assert pool.pool is None
+
+    @pytest.mark.asyncio
+    async def test_pool_uses_settings(self, created_pools):
+        pool = DatabasePool("postgresql://test")
+        await pool.open()
+
+        kwargs = created_pools[0][1]
+        assert kwargs["max_size"] == settings.db_pool_max_size
+        assert kwargs["statement_cache_size"] == settings.db_pool_statement_cache_size
+        assert kwargs["server_settings"] == settings.db_pool_server_settings
+
+    @pytest.mark.asyncio
+    async def test_metrics_track_usage_and_waiters(self, created_pools, monkeypatch):
+        monkeypatch.setattr(settings, "db_pool_max_size", 1)
+        pool = DatabasePool("postgresql://test")
+        await pool.open()
+
+        async with pool.acquire() as conn:
+            assert conn == "conn-0"
+            waiting = asyncio.ensure_future(pool.acquire())
+            await asyncio.sleep(0)
+            busy = pool.metrics()
+        await pool.release(await waiting)
+
+        assert busy["in_use"] == 1 and busy["idle"] == 0 and busy["waiters"] == 1
+        idle = pool.metrics()
+        assert idle["in_use"] == 0 and idle["waiters"] == 0
+        assert idle["acquire_count"] == 2
+
+    def test_health_info_reports_pool(self, client):
+        response = client.get("/api/v1/health/info")
+
+        assert response.status_code == 200
+        assert "waiters" in response.json()["components"]["db_pool"]
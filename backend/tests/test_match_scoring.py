@@ -0,0 +1,186 @@
+import heapq
+import random
+from operator import itemgetter
+
+import numpy as np
+import pytest
+
+from models.orator import Gender
+from services import match_scoring
+from services.match_scoring import CandidateFeatures, ScoringBatch, score_batch, score_candidates, top_candidates
+from services.topic_dictionary import TopicDictionary, popcount_rows, masks_to_words
+from services.matching_service import MatchingService
+
+
+TOPICS = [
+    "01",
+    "0101",
+    "010101",
+    "02",
+    "0201",
+    "Подача",
+    "Подача - Темы речи уровень 1",
+    "Подача - Темы речи уровень 2",
+    "Эмоции - Уровень 1",
+    "Эмоции - Уровень 2 - Задание 1",
+    " - без группы",
+    "",
+]
+TIMES = ["06:00", "08:30", "09:00", "12:15", "18:00", "19:00", "19:30", "23:59", "00:00", "7:5", "bad", "", None]
+GENDERS = [None, "", "male", "female", "other", Gender.MALE, Gender.FEMALE]
+
+
+def random_participant(rng: random.Random) -> dict:
+    return {
+        "user_id": str(rng.random()),
+        "gender": rng.choice(GENDERS),
+        "total_sessions": rng.randint(0, 20),
+        "preferred_time_msk": rng.choice(TIMES),
+        "topics": [rng.choice(TOPICS) for _ in range(rng.randint(0, 4))],
+    }
+
+
+class TestMatchScoringParity:
+    """Пакетный скоринг совпадает со скалярной реализацией"""
+
+    @pytest.mark.asyncio
+    @pytest.mark.parametrize("seed", range(20))
+    async def test_vectorized_scores_match_scalar(self, seed):
+        rng = random.Random(seed)
+        service = MatchingService(orator_db=None)
+        user_info = random_participant(rng)
+        candidates = [random_participant(rng) for _ in range(300)]
+
+        vectorized = score_candidates(user_info, CandidateFeatures.from_candidates(candidates)).tolist()
+        scalar = [await service._calculate_match_score(user_info, candidate) for candidate in candidates]
+
+        # Точное совпадение, без допуска
+        assert vectorized == scalar
+
+    def test_empty_candidates(self):
+        user_info = {"preferred_time_msk": "19:00", "topics": ["01"], "total_sessions": 0, "gender": None}
+
+        assert len(score_candidates(user_info, CandidateFeatures.from_candidates([]))) == 0
+
+    @pytest.mark.asyncio
+    async def test_parity_with_wide_masks(self):
+        """Маски шире одного 64-битного слова дают те же score"""
+        rng = random.Random(42)
+        service = MatchingService(orator_db=None)
+        dictionary = TopicDictionary()
+        topics = [f"Группа {i % 30} - Тема {i}" for i in range(200)]
+
+        def participant():
+            return dict(random_participant(rng), topics=rng.sample(topics, rng.randint(0, 6)))
+
+        user_info = participant()
+        candidates = [participant() for _ in range(300)]
+        features = CandidateFeatures.from_candidates(candidates, dictionary)
+
+        assert features.topic_words.shape[1] > 1
+        vectorized = score_candidates(user_info, features).tolist()
+        scalar = [await service._calculate_match_score(user_info, candidate) for candidate in candidates]
+        assert vectorized == scalar
+
+
+class TestTopicDictionary:
+    """Тесты словаря тем"""
+
+    def test_ids_are_stable_and_groups_shared(self):
+        dictionary = TopicDictionary()
+        dictionary.load([{"topic_id": "0101", "name": "Подача - Уровень 1"}])
+
+        first = dictionary.encode(["Подача - Уровень 1", "Подача - Уровень 2", "0101"])
+        dictionary.load([{"topic_id": "02", "name": "Эмоции"}])
+
+        assert dictionary.encode(["Подача - Уровень 1"]).topics == 1 << dictionary.topic_id("Подача - Уровень 1")
+        assert first.topics.bit_count() == 3
+        # Обе темы "Подача - ..." попадают в одну группу
+        assert first.groups.bit_count() == 2
+
+    def test_popcount_rows(self):
+        masks = [0, 1, (1 << 64) | 0b1011, (1 << 130) - 1]
+
+        assert popcount_rows(masks_to_words(masks, 3)).tolist() == [0, 1, 4, 130]
+
+
+class TestTopCandidates:
+    """Обход по TimeIndex дает тот же топ, что и полный скоринг"""
+
+    @staticmethod
+    def full_scan(user_info, batch, size):
+        scores = score_batch(user_info, batch).tolist()
+        return heapq.nlargest(size, zip(scores, range(len(scores))), key=itemgetter(0))
+
+    @pytest.mark.parametrize("seed", range(20))
+    @pytest.mark.parametrize("size", [0, 1, 5, 30, 500])
+    def test_matches_full_scan(self, seed, size):
+        rng = random.Random(seed)
+        user_info = random_participant(rng)
+        rows = [random_participant(rng) for _ in range(300)]
+        features = CandidateFeatures.from_candidates(rows)
+        indices = np.array(sorted(rng.sample(range(len(rows)), 200)), dtype=np.int64)
+        batch = ScoringBatch([rows[index] for index in indices], features, indices)
+
+        assert top_candidates(user_info, batch, size) == self.full_scan(user_info, batch, size)
+
+    def test_preferred_minute_used_when_present(self):
+        candidate = {"preferred_time_msk": "bad", "preferred_minute_msk": 19 * 60}
+
+        assert match_scoring.candidate_minutes(candidate) == 19 * 60
+        assert match_scoring.candidate_minutes({"preferred_time_msk": "7:05"}) == 7 * 60 + 5
+
+    def test_far_candidates_are_not_scored(self, monkeypatch):
+        """Кандидаты с далеким временем не скорятся, если ближние гарантированно лучше"""
+        user_info = {"preferred_time_msk": "19:00", "topics": ["01"], "total_sessions": 3, "gender": None}
+        near = [
+            {"preferred_time_msk": "19:00", "topics": ["01"], "total_sessions": 3, "gender": None} for _ in range(10)
+        ]
+        far = [
+            {"preferred_time_msk": "08:00", "topics": ["01"], "total_sessions": 3, "gender": None} for _ in range(90)
+        ]
+        batch = ScoringBatch.from_candidates(near + far)
+        scored = []
+        original = match_scoring.score_candidates
+
+        def counting_score_candidates(user, features, past_partners=None):
+            scored.append(len(features))
+            return original(user, features, past_partners)
+
+        monkeypatch.setattr(match_scoring, "score_candidates", counting_score_candidates)
+
+        top = top_candidates(user_info, batch, 5)
+
+        assert sum(scored) == 10
+        assert [position for _, position in top] == [0, 1, 2, 3, 4]
+
+    def test_candidates_without_common_topics_are_not_scored(self, monkeypatch):
+        """Кандидаты того же времени без общих тем не скорятся, если кандидатов с общими темами хватает"""
+        user_info = {
+            "preferred_time_msk": "19:00",
+            "topics": ["Подача - Темы речи уровень 1"],
+            "total_sessions": 3,
+            "gender": None,
+        }
+        unrelated = [
+            {"preferred_time_msk": "19:00", "topics": ["Эмоции - Уровень 1"], "total_sessions": 3, "gender": None}
+            for _ in range(90)
+        ]
+        related = [
+            {"preferred_time_msk": "19:00", "topics": ["Подача - Темы речи уровень 2"], "total_sessions": 3}
+            for _ in range(10)
+        ]
+        batch = ScoringBatch.from_candidates(unrelated + related)
+        scored = []
+        original = match_scoring.score_candidates
+
+        def counting_score_candidates(user, features, past_partners=None):
+            scored.append(len(features))
+            return original(user, features, past_partners)
+
+        monkeypatch.setattr(match_scoring, "score_candidates", counting_score_candidates)
+
+        top = top_candidates(user_info, batch, 5)
+
+        assert sum(scored) == 10
+        assert [position for _, position in top] == [90, 91, 92, 93, 94]
@@ -0,0 +1,158 @@
+import pytest
+from datetime import date, timedelta
+
+from benchmarks.repository import InMemoryOratorRepository
+from benchmarks.synthetic import generate_dataset
+from services.candidate_pool import WeekCandidatePool
+from services.match_scoring import top_candidates
+from services.match_suggestions import MatchSuggestionService
+from services.matching_service import MatchingService
+
+TODAY = date.today()
+WEEK_START = TODAY - timedelta(days=TODAY.weekday())
+SIZE = 20
+
+
+async def make_suggestions(registrations: int = 200, seed: int = 3, separate_process: bool = False):
+    dataset = generate_dataset(registrations, seed=seed, week_start=WEEK_START)
+    repository = InMemoryOratorRepository(dataset)
+    pool = WeekCandidatePool(repository, resync_seconds=60)
+    suggestions = MatchSuggestionService(pool, refresh_seconds=60, size=SIZE, separate_process=separate_process)
+    await suggestions.refresh_week(WEEK_START)
+    return dataset, repository, pool, suggestions
+
+
+def active_users(dataset) -> list:
+    users = {str(u["id"]): u for u in dataset.users}
+    return [
+        str(r["user_id"])
+        for r in dataset.week_registrations
+        if r["status"] == "active" and users[str(r["user_id"])]["is_active"]
+    ]
+
+
+class TestMatchSuggestions:
+    """Тесты предрасчитанных кандидатов"""
+
+    @pytest.mark.asyncio
+    async def test_snapshot_matches_live_ranking(self):
+        """Без изменений в неделе предрасчет совпадает с ранжированием при запросе"""
+        dataset, _, pool, suggestions = await make_suggestions()
+
+        for user_id in active_users(dataset)[:25]:
+            user_info = await pool.get_user_info(user_id, WEEK_START)
+            batch = await pool.get_scoring_batch(WEEK_START, exclude_user_id=user_id, max_pairs_per_user=3)
+            live = [(score, batch.candidates[index]) for score, index in top_candidates(user_info, batch, SIZE)]
+
+            served = await suggestions.get(user_id, WEEK_START, 3, SIZE)
+
+            assert [(round(s, 9), c["user_id"]) for s, c in served] == [(round(s, 9), c["user_id"]) for s, c in live]
+
+    @pytest.mark.asyncio
+    async def test_registrations_after_build_are_merged(self):
+        """Кандидаты, зарегистрировавшиеся после расчета снимка, сразу попадают в выдачу"""
+        dataset, _, pool, suggestions = await make_suggestions()
+        week = await pool.get_week(WEEK_START)
+        users = active_users(dataset)
+        late = [week.candidates[user_id] for user_id in users[-10:]]
+        for candidate in late:
+            week.remove_candidate(str(candidate["user_id"]))
+        await suggestions.refresh_week(WEEK_START)
+        for candidate in late:
+            week.upsert_candidate(candidate)
+
+        late_ids = {str(candidate["user_id"]) for candidate in late}
+        served_late = set()
+        for user_id in users[:25]:
+            user_info = await pool.get_user_info(user_id, WEEK_START)
+            batch = await pool.get_scoring_batch(WEEK_START, exclude_user_id=user_id, max_pairs_per_user=3)
+            live = [(score, batch.candidates[index]) for score, index in top_candidates(user_info, batch, SIZE)]
+
+            served = await suggestions.get(user_id, WEEK_START, 3, SIZE)
+
+            assert [(round(s, 9), c["user_id"]) for s, c in served[:SIZE]] == [
+                (round(s, 9), c["user_id"]) for s, c in live
+            ]
+            served_late |= {str(c["user_id"]) for _, c in served[:SIZE]} & late_ids
+        assert served_late
+
+    @pytest.mark.asyncio
+    async def test_separate_process_builds_same_snapshot(self):
+        """Расчет в отдельном процессе дает тот же снимок, что и в потоке"""
+        _, _, _, in_thread = await make_suggestions()
+        _, _, _, in_process = await make_suggestions(separate_process=True)
+        try:
+            expected = in_thread._snapshots[WEEK_START]
+            snapshot = in_process._snapshots[WEEK_START]
+
+            assert snapshot.user_ids == expected.user_ids
+            assert (snapshot.top_rows == expected.top_rows).all()
+            assert (snapshot.top_scores == expected.top_scores).all()
+        finally:
+            await in_process.stop()
+        assert in_process._executor is None
+
+    @pytest.mark.asyncio
+    async def test_rechecks_pair_capacity(self):
+        """Кандидаты, у которых закончились свободные пары, и новые партнеры не выдаются"""
+        dataset, _, pool, suggestions = await make_suggestions()
+        user_id = active_users(dataset)[0]
+        served = await suggestions.get(user_id, WEEK_START, 3, 1)
+        partner_id = str(served[0][1]["user_id"])
+        saturated_id = str(served[1][1]["user_id"])
+
+        week = await pool.get_week(WEEK_START)
+        await pool.on_pair_created({"id": "new", "user1_id": user_id, "user2_id": partner_id, "week_start_date": WEEK_START})
+        for index in range(3 - week.pair_counts.get(saturated_id, 0)):
+            await pool.on_pair_created(
+                {"id": f"full-{index}", "user1_id": saturated_id, "user2_id": f"other-{index}", "week_start_date": WEEK_START}
+            )
+
+        served = await suggestions.get(user_id, WEEK_START, 3, 1)
+        served_ids = {str(candidate["user_id"]) for _, candidate in served}
+        assert partner_id not in served_ids
+        assert saturated_id not in served_ids
+
+        # Если после проверки кандидатов не хватает, выдача уходит в обычный подбор
+        assert await suggestions.get(user_id, WEEK_START, 3, SIZE) is None
+
+    @pytest.mark.asyncio
+    async def test_missing_snapshot_falls_back(self):
+        """Без снимка, для новых пользователей и других настроек предрасчет не используется"""
+        dataset, _, _, suggestions = await make_suggestions()
+        user_id = active_users(dataset)[0]
+
+        assert await suggestions.get(user_id, WEEK_START + timedelta(days=7), 3, SIZE) is None
+        assert await suggestions.get("unknown", WEEK_START, 3, SIZE) is None
+        assert await suggestions.get(user_id, WEEK_START, 2, SIZE) is None
+
+    @pytest.mark.asyncio
+    async def test_find_candidates_served_without_scoring(self):
+        """find_candidates отдает предрасчет без загрузки и скоринга кандидатов"""
+        dataset, repository, pool, suggestions = await make_suggestions()
+        user_id = active_users(dataset)[1]
+        live_service = MatchingService(repository, pool)
+        service = MatchingService(repository, pool, suggestions=suggestions)
+
+        expected = await live_service.find_candidates(user_id, WEEK_START, limit=3, max_pairs_per_user=3)
+        repository.reset_queries()
+        candidates = await service.find_candidates(user_id, WEEK_START, limit=3, max_pairs_per_user=3)
+
+        assert [c.user_id for c in candidates] == [c.user_id for c in expected]
+        assert repository.query_count == 0
+
+    @pytest.mark.asyncio
+    async def test_refresh_due_weeks(self):
+        """Пересчитываются только устаревшие снимки"""
+        _, _, pool, suggestions = await make_suggestions()
+        snapshot = suggestions._snapshots[WEEK_START]
+
+        await suggestions.refresh_due_weeks()
+        assert suggestions._snapshots[WEEK_START] is snapshot
+
+        next_week = WEEK_START + timedelta(days=7)
+        await suggestions.refresh_week(next_week)
+        suggestions._snapshots[next_week].built_at -= timedelta(days=7)
+        await suggestions.refresh_due_weeks()
+        assert suggestions._snapshots[WEEK_START] is snapshot
+        assert suggestions._snapshots[next_week].built_at > snapshot.built_at
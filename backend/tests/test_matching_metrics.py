@@ -0,0 +1,88 @@
+import sys
+import pytest
+from uuid import uuid4
+
+from loguru import logger
+from prometheus_client import REGISTRY
+
+from services.matching_metrics import MatchingTrace, count_round_trip
+from services.matching_service import MatchingService
+from tests.test_matching_service import WEEK_START, make_matching_service
+
+
+def sample_count(call: str) -> float:
+    return REGISTRY.get_sample_value("orator_matching_call_seconds_count", {"call": call}) or 0.0
+
+
+class TestMatchingTrace:
+    """Тесты trace этапов подбора"""
+
+    def test_stages_and_counts(self):
+        before = sample_count("test_stages")
+
+        with MatchingTrace("test_stages", log_slow_calls=False) as trace:
+            with trace.stage("scoring"):
+                pass
+            with trace.stage("scoring"):
+                pass
+            count_round_trip()
+            count_round_trip(2)
+            trace.count("candidates_loaded", 10)
+
+        assert set(trace.stages) == {"scoring"}
+        assert trace.counts == {"candidates_loaded": 10, "candidates_scored": 0, "db_round_trips": 3}
+        assert sample_count("test_stages") == before + 1
+
+    def test_round_trips_outside_trace_are_ignored(self):
+        count_round_trip()
+
+    def test_slow_call_is_logged(self):
+        messages = []
+        sink = logger.add(messages.append, level="WARNING")
+        try:
+            with MatchingTrace("test_slow", slow_call_ms=0, log_slow_calls=True) as trace:
+                trace.annotate(user_id="u1")
+            with MatchingTrace("test_fast", slow_call_ms=60_000, log_slow_calls=True):
+                pass
+        finally:
+            logger.remove(sink)
+
+        assert len(messages) == 1
+        assert messages[0].record["extra"]["matching_trace"]["user_id"] == "u1"
+
+
+class TestFindCandidatesMetrics:
+    """find_candidates записывает этапы и счетчики вызова"""
+
+    @pytest.mark.asyncio
+    async def test_find_candidates_trace(self, monkeypatch):
+        matching_module = sys.modules[MatchingService.__module__]
+        traces = []
+
+        class RecordingTrace(MatchingTrace):
+            def __init__(self, call):
+                super().__init__(call, log_slow_calls=False)
+                traces.append(self)
+
+        monkeypatch.setattr(matching_module, "MatchingTrace", RecordingTrace)
+        service, pool = make_matching_service(50)
+
+        candidates = await service.find_candidates(uuid4(), WEEK_START, limit=3, max_pairs_per_user=3)
+
+        trace = traces[0]
+        assert len(candidates) == 3
+        assert {"user_info", "candidates", "scoring", "selection", "serialization"} <= set(trace.stages)
+        assert trace.counts["candidates_loaded"] == 50
+        assert 0 < trace.counts["candidates_scored"] <= 50
+        assert trace.counts["db_round_trips"] == pool.round_trips == 2
+
+
+class TestMetricsEndpoint:
+    def test_metrics_exposed(self, client):
+        with MatchingTrace("test_endpoint", log_slow_calls=False):
+            pass
+
+        response = client.get("/api/v1/metrics")
+
+        assert response.status_code == 200
+        assert 'orator_matching_call_seconds_count{call="test_endpoint"}' in response.text
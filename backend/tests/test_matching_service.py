@@ -0,0 +1,359 @@
+import sys
+import pytest
+from datetime import date, timedelta
+from uuid import uuid4
+
+from benchmarks.repository import InMemoryOratorRepository
+from benchmarks.synthetic import generate_dataset
+from services.candidate_pool import WeekCandidatePool
+from services.matching_service import MatchingService
+from services.orator_database import OratorDatabaseService
+
+
+WEEK_START = date(2024, 1, 15)
+
+
+class CountingConnection:
+    """Фейковое соединение asyncpg, считающее обращения к базе"""
+
+    def __init__(self, pool):
+        self.pool = pool
+
+    async def fetch(self, query, *args):
+        self.pool.round_trips += 1
+        if "FROM week_registrations wr" in query and "open_pairs" in query:
+            return self.pool.candidate_rows
+        return []
+
+    async def fetchrow(self, query, *args):
+        self.pool.round_trips += 1
+        if "FROM users u" in query and "week_registrations" in query:
+            return self.pool.user_row
+        return None
+
+    async def fetchval(self, query, *args):
+        self.pool.round_trips += 1
+        return None
+
+    async def execute(self, query, *args):
+        self.pool.round_trips += 1
+        return "SELECT 1"
+
+
+class CountingAcquire:
+    def __init__(self, pool):
+        self.pool = pool
+
+    async def __aenter__(self):
+        return CountingConnection(self.pool)
+
+    async def __aexit__(self, *exc):
+        return False
+
+
+class CountingPool:
+    """Фейковый пул соединений, считающий round-trip'ы к базе"""
+
+    def __init__(self, user_row, candidate_rows):
+        self.user_row = user_row
+        self.candidate_rows = candidate_rows
+        self.round_trips = 0
+
+    def acquire(self):
+        return CountingAcquire(self)
+
+
+def make_candidate_row(index: int) -> dict:
+    return {
+        "user_id": uuid4(),
+        "telegram_id": 1000 + index,
+        "first_name": f"User{index}",
+        "last_name": None,
+        "gender": "male" if index % 2 else "female",
+        "total_sessions": index % 12,
+        "preferred_time_msk": f"{index % 24:02d}:00",
+        "preferred_minute_msk": (index % 24) * 60,
+        "registration_id": uuid4(),
+        "open_pairs": index % 3,
+        "topics": ["01", "0101"] if index % 3 else ["02"],
+    }
+
+
+def make_matching_service(candidate_count: int) -> tuple:
+    user_row = {
+        "telegram_id": 1,
+        "first_name": "Test",
+        "last_name": "User",
+        "gender": "female",
+        "total_sessions": 3,
+        "registration_id": uuid4(),
+        "preferred_time_msk": "19:00",
+        "preferred_minute_msk": 19 * 60,
+        "topics": ["01", "0101"],
+        "is_active": True,
+        "status": "active",
+    }
+    pool = CountingPool(user_row, [make_candidate_row(i) for i in range(candidate_count)])
+    orator_db = OratorDatabaseService()
+    orator_db.pool = pool
+    return MatchingService(orator_db), pool
+
+
+class TestMatchingRoundTrips:
+    """Регрессионные тесты количества обращений к базе при подборе кандидатов"""
+
+    @pytest.mark.asyncio
+    @pytest.mark.parametrize("candidate_count", [1, 50, 2000])
+    async def test_find_candidates_round_trips_do_not_grow_with_candidates(self, candidate_count):
+        """Количество round-trip'ов не зависит от числа кандидатов"""
+        service, pool = make_matching_service(candidate_count)
+
+        candidates = await service.find_candidates(uuid4(), WEEK_START)
+
+        assert len(candidates) == min(3, candidate_count)
+        # Снимок настроек + пользователь + кандидаты
+        assert pool.round_trips == 3
+
+    @pytest.mark.asyncio
+    async def test_settings_are_not_reloaded_on_hot_path(self):
+        """Повторный подбор не читает настройки из базы"""
+        service, pool = make_matching_service(50)
+        await service.find_candidates(uuid4(), WEEK_START)
+        pool.round_trips = 0
+
+        await service.find_candidates(uuid4(), WEEK_START)
+
+        # Только пользователь и кандидаты
+        assert pool.round_trips == 2
+
+    @pytest.mark.asyncio
+    async def test_find_candidates_with_explicit_settings(self):
+        """Без чтения настроек подбор укладывается в два запроса"""
+        service, pool = make_matching_service(100)
+
+        candidates = await service.find_candidates(uuid4(), WEEK_START, limit=5, max_pairs_per_user=3)
+
+        assert len(candidates) == 5
+        assert pool.round_trips == 2
+
+
+class FakeOratorDb:
+    """In-memory замена OratorDatabaseService для пула кандидатов"""
+
+    def __init__(self, candidates, open_pairs):
+        self.candidates = candidates
+        self.open_pairs = open_pairs
+        self.calls = 0
+
+    async def get_week_candidates(self, week_start):
+        self.calls += 1
+        return [dict(candidate) for candidate in self.candidates]
+
+    async def get_week_open_pairs(self, week_start):
+        self.calls += 1
+        return list(self.open_pairs)
+
+    async def get_matching_user_info(self, user_id, week_start):
+        self.calls += 1
+        for candidate in self.candidates:
+            if str(candidate["user_id"]) == str(user_id):
+                return dict(candidate, is_active=True, status="active")
+        return None
+
+    async def get_all_topics(self):
+        return [{"topic_id": "01", "name": "Подача"}]
+
+
+def make_pool_candidate(user_id: str, time: str = "19:00") -> dict:
+    return {
+        "user_id": user_id,
+        "name": user_id,
+        "gender": None,
+        "total_sessions": 0,
+        "preferred_time_msk": time,
+        "topics": ["01"],
+        "registration_id": f"reg-{user_id}",
+    }
+
+
+class TestWeekCandidatePool:
+    """Тесты in-memory пула кандидатов"""
+
+    def setup_method(self):
+        today = date.today()
+        self.week_start = today - timedelta(days=today.weekday()) + timedelta(days=7)
+        self.db = FakeOratorDb(
+            [make_pool_candidate(user_id) for user_id in ("a", "b", "c", "d")],
+            [{"id": "p1", "user1_id": "a", "user2_id": "b"}, {"id": "p2", "user1_id": "c", "user2_id": "b"}],
+        )
+        self.pool = WeekCandidatePool(self.db, resync_seconds=60)
+
+    @pytest.mark.asyncio
+    async def test_filters_match_database_loader(self):
+        """Фильтры пула совпадают с фильтрами SQL-загрузчика"""
+        candidates = await self.pool.get_candidates(self.week_start, exclude_user_id="a", max_pairs_per_user=2)
+
+        # a исключен сам, b — его партнер, c остается
+        assert [c["user_id"] for c in candidates] == ["c", "d"]
+        assert candidates[0]["open_pairs"] == 1
+
+        candidates = await self.pool.get_candidates(self.week_start, exclude_user_id="d", max_pairs_per_user=2)
+        # у b уже 2 открытые пары
+        assert [c["user_id"] for c in candidates] == ["a", "c"]
+
+    @pytest.mark.asyncio
+    async def test_matching_does_not_hit_database_after_load(self):
+        """После загрузки недели подбор работает без обращений к базе"""
+        await self.pool.get_week(self.week_start)
+        calls = self.db.calls
+
+        for _ in range(10):
+            await self.pool.get_candidates(self.week_start, exclude_user_id="a", max_pairs_per_user=3)
+
+        assert self.db.calls == calls
+
+    @pytest.mark.asyncio
+    async def test_incremental_updates(self):
+        """Регистрации и пары обновляют пул без полной перезагрузки"""
+        await self.pool.get_week(self.week_start)
+
+        await self.pool.on_registration_cancelled("c", self.week_start)
+        await self.pool.on_pair_created({"id": "p3", "user1_id": "a", "user2_id": "d", "week_start_date": self.week_start})
+        candidates = await self.pool.get_candidates(self.week_start, exclude_user_id="a", max_pairs_per_user=3)
+        assert candidates == []
+
+        await self.pool.on_pair_cancelled({"id": "p3", "week_start_date": self.week_start})
+        await self.pool.on_pair_cancelled({"id": "p3", "week_start_date": self.week_start})
+        self.db.candidates.append(make_pool_candidate("e"))
+        await self.pool.on_registration_created({"user_id": "e", "week_start_date": self.week_start})
+
+        candidates = await self.pool.get_candidates(self.week_start, exclude_user_id="a", max_pairs_per_user=3)
+        assert [c["user_id"] for c in candidates] == ["d", "e"]
+        week = await self.pool.get_week(self.week_start)
+        assert week.pair_counts == {"a": 1, "b": 2, "c": 1}
+
+    @pytest.mark.asyncio
+    async def test_scoring_batch_filter_follows_pair_events(self):
+        """Фильтр батча по счетчикам строк совпадает с get_candidates после событий пар"""
+        week = await self.pool.get_week(self.week_start)
+        week.get_scoring_batch("a", 2)
+
+        await self.pool.on_pair_created({"id": "p3", "user1_id": "c", "user2_id": "d", "week_start_date": self.week_start})
+        await self.pool.on_pair_cancelled({"id": "p2", "week_start_date": self.week_start})
+
+        for exclude_user_id in (None, "a", "b", "c", "d"):
+            for max_pairs_per_user in (None, 1, 2):
+                batch = week.get_scoring_batch(exclude_user_id, max_pairs_per_user)
+                expected = week.get_candidates(exclude_user_id, max_pairs_per_user)
+                assert [c["user_id"] for c in batch.candidates] == [c["user_id"] for c in expected]
+
+    @pytest.mark.asyncio
+    async def test_events_during_reload_are_not_lost(self):
+        """События, пришедшие во время перезагрузки, применяются к новому снимку"""
+        await self.pool.get_week(self.week_start)
+        original_load = self.db.get_week_open_pairs
+
+        async def load_with_concurrent_event(week_start):
+            pairs = await original_load(week_start)
+            await self.pool.on_pair_created(
+                {"id": "p4", "user1_id": "c", "user2_id": "d", "week_start_date": self.week_start}
+            )
+            return pairs
+
+        self.db.get_week_open_pairs = load_with_concurrent_event
+        await self.pool.resync()
+
+        week = await self.pool.get_week(self.week_start)
+        assert "p4" in week.open_pairs
+        assert week.pair_counts["d"] == 1
+
+    @pytest.mark.asyncio
+    async def test_find_candidates_from_pool(self):
+        """Подбор через пул возвращает отсортированных по score кандидатов"""
+        service = MatchingService(self.db, self.pool)
+
+        candidates = await service.find_candidates("d", self.week_start, limit=3, max_pairs_per_user=3)
+
+        assert sorted(c.user_id for c in candidates) == ["a", "b", "c"]
+        assert all(0.0 < c.match_score <= 1.0 for c in candidates)
+
+
+class TestFindCandidatesTopK:
+    """Тесты выбора топ кандидатов"""
+
+    @pytest.mark.asyncio
+    async def test_selection_is_stable_per_user_and_week(self):
+        """Случайность зависит только от пользователя и недели"""
+        service, _ = make_matching_service(200)
+        user_id = uuid4()
+
+        first = await service.find_candidates(user_id, WEEK_START, limit=5, max_pairs_per_user=3)
+        second = await service.find_candidates(user_id, WEEK_START, limit=5, max_pairs_per_user=3)
+
+        assert [c.user_id for c in first] == [c.user_id for c in second]
+
+    @pytest.mark.asyncio
+    async def test_response_objects_built_only_for_selected(self, monkeypatch):
+        """Pydantic-объекты создаются только для итоговых кандидатов"""
+        matching_module = sys.modules[MatchingService.__module__]
+        candidate_info = matching_module.CandidateInfo
+        built = []
+
+        def counting_candidate_info(**kwargs):
+            built.append(kwargs["user_id"])
+            return candidate_info(**kwargs)
+
+        monkeypatch.setattr(matching_module, "CandidateInfo", counting_candidate_info)
+        service, pool = make_matching_service(2000)
+
+        candidates = await service.find_candidates(uuid4(), WEEK_START, limit=5, max_pairs_per_user=3)
+
+        assert len(candidates) == 5
+        assert len(built) == 5
+
+    @pytest.mark.asyncio
+    async def test_selected_come_from_top_candidates(self):
+        """Итоговые кандидаты выбираются из топ limit * 2 по score"""
+        service, pool = make_matching_service(300)
+        user_id = uuid4()
+
+        candidates = await service.find_candidates(user_id, WEEK_START, limit=4, max_pairs_per_user=3)
+
+        user_info = await service._get_user_info(user_id, WEEK_START)
+        rows = await service._get_active_candidates(WEEK_START, user_id, 3)
+        scores = sorted([await service._calculate_match_score(user_info, row) for row in rows], reverse=True)
+        assert all(c.match_score >= scores[7] for c in candidates)
+
+
+class TestSyntheticBenchmark:
+    """Тесты in-memory хранилища бенчмарка и статистики кандидатов"""
+
+    @pytest.mark.asyncio
+    async def test_candidate_stats_single_query(self):
+        """Статистика недели собирается одним запросом"""
+        dataset = generate_dataset(200, seed=1, week_start=WEEK_START)
+        repository = InMemoryOratorRepository(dataset)
+        service = MatchingService(repository)
+
+        stats = await service.get_candidate_stats(WEEK_START)
+
+        assert repository.queries == {"get_week_pair_stats": 1}
+        active = [r for r in dataset.week_registrations if r["status"] == "active"]
+        confirmed = [p for p in dataset.user_pairs if p["status"] == "confirmed"]
+        assert stats["total_registrations"] == len(active)
+        assert stats["total_pairs"] == len(dataset.user_pairs)
+        assert stats["confirmed_pairs"] == len(confirmed)
+
+    @pytest.mark.asyncio
+    async def test_find_candidates_on_synthetic_week(self):
+        """find_candidates работает поверх синтетических данных и не предлагает открытые пары"""
+        dataset = generate_dataset(300, seed=2, week_start=WEEK_START)
+        repository = InMemoryOratorRepository(dataset)
+        service = MatchingService(repository)
+        pair = next(p for p in dataset.user_pairs if p["status"] == "pending")
+
+        candidates = await service.find_candidates(pair["user1_id"], WEEK_START)
+
+        assert candidates
+        assert all(str(c.user_id) != str(pair["user2_id"]) for c in candidates)
+        assert generate_dataset(300, seed=2, week_start=WEEK_START) == dataset
@@ -0,0 +1,131 @@
+import pytest
+
+from services.message_queue_retention import MessageQueueRetention
+from services.migrations import load_migrations
+from services.orator_database import OratorDatabaseService
+
+
+class RetentionConnection:
+    """Фейковое соединение: функции партиций отвечают по очереди заданными значениями"""
+
+    def __init__(self, detached, partitioned=True, locked=False):
+        self.detached = list(detached)
+        self.partitioned = partitioned
+        # Блокировку обслуживания держит другой процесс
+        self.locked = locked
+        self.calls = []
+        self.executed = []
+
+    async def execute(self, query, *args):
+        self.executed.append((query, args))
+
+    async def fetchval(self, query, *args):
+        self.calls.append((query, args))
+        if "to_regproc" in query:
+            return self.partitioned
+        if "pg_try_advisory_lock" in query:
+            return not self.locked
+        if "message_queue_detach_old_partition" in query:
+            return self.detached.pop(0) if self.detached else None
+        if "message_queue_archive_detached" in query:
+            return 0
+        if "message_queue_ensure_partitions" in query:
+            return 1
+        raise AssertionError(query)
+
+
+class FakePool:
+    def __init__(self, conn):
+        self.conn = conn
+
+    def acquire(self):
+        return self
+
+    async def __aenter__(self):
+        return self.conn
+
+    async def __aexit__(self, exc_type, exc, tb):
+        return False
+
+
+def make_db(detached=(), **kwargs):
+    conn = RetentionConnection(detached, **kwargs)
+    db = OratorDatabaseService()
+    db.pool = FakePool(conn)
+    return db, conn
+
+
+class TestMessageQueueRetention:
+    """Создание партиций наперед и перенос старых в архив"""
+
+    @pytest.mark.asyncio
+    async def test_archive_detaches_one_partition_per_call(self):
+        db, conn = make_db(["message_queue_2024_01", "message_queue_2024_02"])
+
+        result = await db.maintain_message_queue_partitions(1, 2)
+
+        assert result == {"created": 1, "archived": ["message_queue_2024_01", "message_queue_2024_02"]}
+        queries = [query for query, _ in conn.calls]
+        # Три вызова detach (последний вернул NULL), затем перенос отсоединенных в архив
+        assert sum("detach_old_partition" in query for query in queries) == 3
+        assert "message_queue_archive_detached" in queries[-1]
+        assert conn.calls[2][1] == (2,)
+
+    @pytest.mark.asyncio
+    async def test_archive_still_sweeps_detached_leftovers(self):
+        db, conn = make_db()
+
+        assert (await db.maintain_message_queue_partitions(1, 2))["archived"] == []
+        assert "message_queue_archive_detached" in conn.calls[-1][0]
+
+    @pytest.mark.asyncio
+    async def test_run_once_creates_partitions_ahead(self):
+        db, conn = make_db(["message_queue_2024_01"])
+        retention = MessageQueueRetention(db, interval_seconds=60, keep_months=3, partitions_ahead=2)
+
+        archived = await retention.run_once()
+
+        assert archived == ["message_queue_2024_01"]
+        # Проход — под advisory-блокировкой на одном соединении, блокировка снимается в конце
+        assert "pg_try_advisory_lock" in conn.calls[0][0]
+        # Текущий месяц и два вперед
+        assert conn.calls[1] == ("SELECT message_queue_ensure_partitions(CURRENT_DATE, $1)", (3,))
+        assert conn.calls[2][1] == (3,)
+        assert [query for query, _ in conn.executed] == ["SELECT pg_advisory_unlock($1)"]
+
+    @pytest.mark.asyncio
+    async def test_run_once_skips_when_another_process_holds_lock(self):
+        db, conn = make_db(["message_queue_2024_01"], locked=True)
+        retention = MessageQueueRetention(db, interval_seconds=60)
+
+        assert await retention.run_once() is None
+        assert len(conn.calls) == 1
+        assert conn.executed == []
+
+    @pytest.mark.asyncio
+    async def test_start_skips_without_partition_functions(self):
+        db, conn = make_db(partitioned=False)
+        retention = MessageQueueRetention(db, interval_seconds=3600)
+
+        await retention.start()
+
+        assert retention._task is None
+        assert len(conn.calls) == 1
+
+    @pytest.mark.asyncio
+    async def test_start_and_stop(self):
+        db, conn = make_db()
+        retention = MessageQueueRetention(db, interval_seconds=3600)
+
+        await retention.start()
+        await retention.stop()
+
+        assert retention._task is None
+
+    def test_partition_migration_runs_in_transaction(self):
+        migration = next(migration for migration in load_migrations() if migration.name == "message_queue_partitions")
+
+        # Перенос данных в секционированную таблицу — в одной транзакции с ее созданием
+        assert migration.transactional
+        assert "PARTITION BY RANGE (created_at)" in migration.sql
+        assert "WHERE sent = FALSE" in migration.sql
@@ -0,0 +1,182 @@
+import json
+import pytest
+
+from services.migrations import MigrationRunner, load_migrations, split_statements, MIGRATIONS_DIR
+from services.orator_database import orator_statements
+from services.query_plans import check_hot_query_plans, find_seq_scans, hot_queries, STATEMENT_PARAMS
+
+
+class FakeTransaction:
+    def __init__(self, conn):
+        self.conn = conn
+
+    async def __aenter__(self):
+        self.conn.log.append("BEGIN")
+        return self
+
+    async def __aexit__(self, exc_type, exc, tb):
+        self.conn.log.append("ROLLBACK" if exc_type else "COMMIT")
+        return False
+
+
+class MigrationConnection:
+    """Фейковое соединение: хранит schema_migrations и журнал выполненных запросов"""
+
+    def __init__(self, applied=None):
+        self.applied = dict(applied or {})
+        self.log = []
+        self.fail_on = None
+
+    def transaction(self):
+        return FakeTransaction(self)
+
+    async def execute(self, query, *args):
+        if query.startswith("INSERT INTO schema_migrations"):
+            self.applied[args[0]] = args[2]
+        if self.fail_on and self.fail_on in query:
+            raise RuntimeError("migration failed")
+        self.log.append(query.strip().splitlines()[0] if query.strip() else query)
+
+    async def fetch(self, query, *args):
+        return [{"version": version, "checksum": checksum} for version, checksum in self.applied.items()]
+
+
+@pytest.fixture
+def migrations_dir(tmp_path):
+    (tmp_path / "0001_create_things.sql").write_text("CREATE TABLE things (id INT);\nINSERT INTO things VALUES (1);\n")
+    (tmp_path / "0002_things_index.sql").write_text(
+        "-- migrate: no-transaction\n"
+        "-- индекс без блокировки записи\n"
+        "CREATE INDEX CONCURRENTLY IF NOT EXISTS idx_things ON things(id);\n"
+        "CREATE INDEX CONCURRENTLY IF NOT EXISTS idx_things_2 ON things(id);\n"
+    )
+    (tmp_path / "notes.sql").write_text("SELECT 1;")
+    return tmp_path
+
+
+class TestMigrationRunner:
+    """Применение версионных миграций"""
+
+    def test_repository_migrations_are_ordered_and_unique(self):
+        migrations = load_migrations(MIGRATIONS_DIR)
+
+        versions = [migration.version for migration in migrations]
+        assert versions == sorted(set(versions))
+        index_migration = next(migration for migration in migrations if migration.name == "hot_query_indexes")
+        assert not index_migration.transactional
+        assert all("CONCURRENTLY" in statement for statement in split_statements(index_migration.sql))
+
+    @pytest.mark.asyncio
+    async def test_upgrade_applies_pending_in_order(self, migrations_dir):
+        runner = MigrationRunner(migrations_dir)
+        conn = MigrationConnection()
+
+        applied = await runner.upgrade(conn)
+
+        assert [migration.version for migration in applied] == [1, 2]
+        assert set(conn.applied) == {1, 2}
+        # Транзакционная миграция и ее запись — в одной транзакции, CONCURRENTLY — по одному запросу вне нее
+        body = conn.log[conn.log.index("BEGIN") :]
+        assert body == [
+            "BEGIN",
+            "CREATE TABLE things (id INT);",
+            "INSERT INTO schema_migrations (version, name, checksum) VALUES ($1, $2, $3)",
+            "COMMIT",
+            "CREATE INDEX CONCURRENTLY IF NOT EXISTS idx_things ON things(id)",
+            "CREATE INDEX CONCURRENTLY IF NOT EXISTS idx_things_2 ON things(id)",
+            "INSERT INTO schema_migrations (version, name, checksum) VALUES ($1, $2, $3)",
+            "SELECT pg_advisory_unlock($1)",
+        ]
+        assert conn.log[0] == "SELECT pg_advisory_lock($1)"
+
+    @pytest.mark.asyncio
+    async def test_upgrade_skips_applied_and_reports_changed(self, migrations_dir):
+        runner = MigrationRunner(migrations_dir)
+        conn = MigrationConnection({1: "stale"})
+
+        applied = await runner.upgrade(conn)
+
+        assert [migration.version for migration in applied] == [2]
+        assert "BEGIN" not in conn.log
+        states = {row["version"]: row["state"] for row in await runner.status(conn)}
+        assert states == {1: "changed", 2: "applied"}
+
+    @pytest.mark.asyncio
+    async def test_failed_migration_is_not_recorded(self, migrations_dir):
+        runner = MigrationRunner(migrations_dir)
+        conn = MigrationConnection()
+        conn.fail_on = "CREATE TABLE things"
+
+        with pytest.raises(RuntimeError):
+            await runner.upgrade(conn)
+
+        assert conn.applied == {}
+        assert "ROLLBACK" in conn.log
+        # Блокировка снимается и при ошибке
+        assert conn.log[-1] == "SELECT pg_advisory_unlock($1)"
+
+
+def plan(node_type, relation=None, children=()):
+    node = {"Node Type": node_type, "Plans": list(children)}
+    if relation:
+        node["Relation Name"] = relation
+    return node
+
+
+class PlanConnection:
+    """Отвечает на EXPLAIN заданным планом по подстроке запроса"""
+
+    def __init__(self, plans):
+        self.plans = plans
+        self.log = []
+        self.explained = []
+
+    def transaction(self):
+        return FakeTransaction(self)
+
+    async def execute(self, query, *args):
+        self.log.append(query)
+
+    async def fetchrow(self, query, *args):
+        return None
+
+    async def fetchval(self, query, *args):
+        self.explained.append((query, args))
+        for fragment, node in self.plans.items():
+            if fragment in query:
+                return json.dumps([{"Plan": node}])
+        return json.dumps([{"Plan": plan("Index Scan", "users")}])
+
+
+class TestHotQueryPlans:
+    """EXPLAIN-проверка горячих запросов"""
+
+    def test_every_registered_statement_has_params(self):
+        assert set(orator_statements.names) <= set(STATEMENT_PARAMS)
+        names = [query.name for query in hot_queries()]
+        assert len(names) == len(set(names))
+
+    def test_find_seq_scans_walks_nested_plans(self):
+        node = plan(
+            "Nested Loop",
+            children=[plan("Seq Scan", "user_pairs"), plan("Hash", children=[plan("Seq Scan", "week_registrations")])],
+        )
+
+        assert find_seq_scans(node) == ["user_pairs", "week_registrations"]
+        assert find_seq_scans(plan("Index Scan", "users")) == []
+
+    @pytest.mark.asyncio
+    async def test_check_reports_seq_scans_with_seqscan_disabled(self):
+        conn = PlanConnection(
+            {
+                "WHERE sent = FALSE": plan("Limit", children=[plan("Seq Scan", "message_queue_default")]),
+                "FROM orator_settings": plan("Seq Scan", "orator_settings"),
+            }
+        )
+
+        failures = await check_hot_query_plans(conn)
+
+        assert failures == {"pending_messages": ["message_queue_default"]}
+        assert conn.log == ["BEGIN", "SET LOCAL enable_seqscan = off", "COMMIT"]
+        assert len(conn.explained) == len(hot_queries())
+        assert all(query.startswith("EXPLAIN (FORMAT JSON)") for query, _ in conn.explained)
@@ -0,0 +1,388 @@
+import re
+import pytest
+from datetime import date, datetime
+from uuid import uuid4
+
+from main import app
+from models.orator import PairCreationStatus, RegistrationCreationStatus
+from models.orator.message_queue import MessageQueue
+from services.orator_database import OratorDatabaseService, PairCreationResult, orator_db
+from services.security import security_service
+
+
+WEEK_START = date(2024, 1, 15)
+
+
+class FakeTransaction:
+    def __init__(self, conn):
+        self.conn = conn
+
+    async def __aenter__(self):
+        self.conn.transactions += 1
+        return self
+
+    async def __aexit__(self, exc_type, exc, tb):
+        return False
+
+
+class ScriptedConnection:
+    """Фейковое соединение asyncpg: отвечает на запросы по подстроке и записывает их"""
+
+    def __init__(self, pair):
+        self.pair = pair
+        self.create_result = "created"
+        self.eligible = True
+        # Пары, для которых запрос уменьшил счетчики открытых пар
+        self.released = []
+        self.executed = []
+        self.transactions = 0
+
+    def transaction(self):
+        return FakeTransaction(self)
+
+    async def fetchrow(self, query, *args):
+        if "WITH eligibility" in query:
+            self.executed.append((query, args))
+            if not self.eligible:
+                return {"eligible": False}
+            return {"eligible": True, "id": uuid4(), "user_id": args[0], "week_start_date": args[1], "status": "active"}
+        if "user_topics" in query:
+            self.executed.append((query, args))
+            return {"added": 1, "removed": 2}
+        if "create_user_pair_checked" in query:
+            self.executed.append((query, args))
+            pair_id = self.pair["id"] if self.create_result == "created" else None
+            return {"result": self.create_result, "pair_id": pair_id, "week_start_date": WEEK_START}
+        if "WITH updated AS" in query:
+            # Переход статуса: UPDATE срабатывает только из статусов в WHERE status IN (...)
+            self.executed.append((query, args))
+            from_statuses = re.findall(r"'(\w+)'", re.search(r"status IN \(([^)]*)\)", query).group(1))
+            changed = self.pair["status"] in from_statuses
+            if changed:
+                self.pair["status"] = re.search(r"SET status = '(\w+)'", query).group(1)
+                if "counters AS" in query:
+                    self.released.append((self.pair["user1_id"], self.pair["user2_id"]))
+            return dict(self.pair, changed=changed, week_start_date=WEEK_START)
+        return dict(self.pair, week_start_date=WEEK_START)
+
+    async def execute(self, query, *args):
+        self.executed.append((query, args))
+        return "UPDATE 1"
+
+
+class FakePool:
+    def __init__(self, conn):
+        self.conn = conn
+
+    def acquire(self):
+        return self
+
+    async def __aenter__(self):
+        return self.conn
+
+    async def __aexit__(self, exc_type, exc, tb):
+        return False
+
+
+def make_db(status: str = "pending") -> tuple:
+    pair = {"id": uuid4(), "user1_id": uuid4(), "user2_id": uuid4(), "status": status}
+    conn = ScriptedConnection(pair)
+    db = OratorDatabaseService()
+    db.pool = FakePool(conn)
+    return db, conn, pair
+
+
+class TestWeekUserPairStats:
+    """Счетчики открытых пар обновляются вместе с парой"""
+
+    @pytest.mark.asyncio
+    async def test_create_checks_capacity_in_database(self):
+        db, conn, pair = make_db()
+        registration_id = uuid4()
+
+        result = await db.create_user_pair(pair["user1_id"], pair["user2_id"], registration_id, max_pairs_per_user=3)
+
+        # Проверка лимита, вставка пары и счетчики — один вызов функции в базе
+        assert [args for query, args in conn.executed] == [(pair["user1_id"], pair["user2_id"], registration_id, 3)]
+        assert result.status == PairCreationStatus.CREATED
+        assert result.pair["id"] == pair["id"]
+
+    @pytest.mark.asyncio
+    async def test_create_reports_capacity_reached(self):
+        db, conn, pair = make_db()
+        conn.create_result = "capacity_reached"
+        created = []
+
+        class Listener:
+            async def on_pair_created(self, user_pair):
+                created.append(user_pair)
+
+        db.add_listener(Listener())
+        result = await db.create_user_pair(pair["user1_id"], pair["user2_id"], uuid4(), max_pairs_per_user=3)
+
+        assert result == (PairCreationStatus.CAPACITY_REACHED, None)
+        assert created == []
+
+    @pytest.mark.asyncio
+    async def test_cancel_decrements_once(self):
+        db, conn, pair = make_db("confirmed")
+        cancelled = []
+
+        class Listener:
+            async def on_pair_cancelled(self, user_pair):
+                cancelled.append(user_pair)
+
+        db.add_listener(Listener())
+        first = await db.cancel_user_pair(pair["id"], pair["user1_id"])
+        second = await db.cancel_user_pair(pair["id"], pair["user1_id"])
+
+        # Каждый переход — один запрос; счетчики уменьшаются только при реальной отмене
+        assert len(conn.executed) == 2
+        assert conn.released == [(pair["user1_id"], pair["user2_id"])]
+        assert first["changed"] and not second["changed"]
+        assert second["status"] == "cancelled"
+        assert len(cancelled) == 1
+
+    @pytest.mark.asyncio
+    async def test_reject_decrements_and_confirm_keeps_counter(self):
+        db, conn, pair = make_db()
+
+        confirmed = await db.confirm_user_pair(pair["id"], True, pair["user1_id"])
+        assert confirmed["status"] == "confirmed"
+        assert conn.released == []
+        # Повторное подтверждение возвращает пару без изменений, отклонение подтвержденной — None
+        assert (await db.confirm_user_pair(pair["id"], True, pair["user1_id"]))["changed"] is False
+        assert await db.confirm_user_pair(pair["id"], False, pair["user1_id"]) is None
+
+        pair["status"] = "pending"
+        await db.confirm_user_pair(pair["id"], False, pair["user1_id"])
+        assert conn.released == [(pair["user1_id"], pair["user2_id"])]
+
+    @pytest.mark.asyncio
+    async def test_batch_create_rechecks_capacity_under_locks(self):
+        db, conn, pair = make_db()
+        full, free, other = uuid4(), uuid4(), uuid4()
+
+        async def fetch(query, *args):
+            conn.executed.append((query, args))
+            if "FROM week_user_pair_stats" in query:
+                # Пока план считался, у full появилась еще одна пара
+                return [{"user_id": full, "open_pairs": 1}, {"user_id": free, "open_pairs": 0}]
+            return [
+                {"id": pair_id, "user1_id": user1, "user2_id": user2, "status": "pending"}
+                for pair_id, user1, user2, _ in zip(*args[:4])
+            ]
+
+        conn.fetch = fetch
+        pairs = [
+            {"id": uuid4(), "user1_id": full, "user2_id": free, "registration_id": uuid4()},
+            {"id": uuid4(), "user1_id": free, "user2_id": other, "registration_id": uuid4()},
+            {"id": uuid4(), "user1_id": other, "user2_id": free, "registration_id": uuid4()},
+        ]
+        messages = [(user_pair["id"], MessageQueue(user_id="100", message="pair")) for user_pair in pairs]
+
+        created = await db.create_pairs_with_messages(WEEK_START, pairs, messages, max_pairs_per_user=1)
+
+        # Блокировки берутся до чтения счетчиков; у full лимит исчерпан, free получает только одну пару
+        assert "pg_advisory_xact_lock" in conn.executed[0][0]
+        assert "FROM week_user_pair_stats" in conn.executed[1][0]
+        assert [user_pair["id"] for user_pair in created] == [pairs[1]["id"]]
+        message_insert = next(args for query, args in conn.executed if "INSERT INTO message_queue" in query)
+        assert message_insert[-1] == [pairs[1]["id"]]
+
+    @pytest.mark.asyncio
+    async def test_missing_pair_returns_none(self):
+        db, conn, pair = make_db()
+
+        async def no_row(query, *args):
+            return None
+
+        conn.fetchrow = no_row
+
+        assert await db.confirm_user_pair(pair["id"], True, pair["user1_id"]) is None
+        assert await db.cancel_user_pair(pair["id"], pair["user1_id"]) is None
+
+
+class TestPairMessagesOutbox:
+    """Сообщения о паре пишутся в очередь в транзакции перехода"""
+
+    @staticmethod
+    def render(user_pair):
+        return [
+            MessageQueue(user_id="100", message=f"pair {user_pair['id']}", keyboard={"inline_keyboard": []}),
+            MessageQueue(user_id="200", message="partner"),
+        ]
+
+    @staticmethod
+    def message_inserts(conn):
+        return [args for query, args in conn.executed if "INSERT INTO message_queue" in query]
+
+    @pytest.mark.asyncio
+    async def test_create_writes_messages_in_transaction(self):
+        db, conn, pair = make_db()
+
+        result = await db.create_user_pair(
+            pair["user1_id"], pair["user2_id"], uuid4(), max_pairs_per_user=3, messages=self.render
+        )
+
+        assert result.status == PairCreationStatus.CREATED
+        assert conn.transactions == 1
+        # Все сообщения — один многострочный INSERT
+        assert self.message_inserts(conn) == [
+            (["100", "200"], [f"pair {pair['id']}", "partner"], ['{"inline_keyboard": []}', None])
+        ]
+
+    @pytest.mark.asyncio
+    async def test_rejected_create_writes_no_messages(self):
+        db, conn, pair = make_db()
+        conn.create_result = "already_paired"
+
+        result = await db.create_user_pair(
+            pair["user1_id"], pair["user2_id"], uuid4(), max_pairs_per_user=3, messages=self.render
+        )
+
+        assert result.status == PairCreationStatus.ALREADY_PAIRED
+        assert self.message_inserts(conn) == []
+
+    @pytest.mark.asyncio
+    async def test_transition_writes_messages_only_when_changed(self):
+        db, conn, pair = make_db()
+
+        await db.confirm_user_pair(pair["id"], True, pair["user1_id"], messages=self.render)
+        await db.confirm_user_pair(pair["id"], True, pair["user1_id"], messages=self.render)
+        await db.cancel_user_pair(pair["id"], pair["user1_id"], messages=self.render)
+        await db.cancel_user_pair(pair["id"], pair["user1_id"], messages=self.render)
+
+        assert conn.transactions == 4
+        assert len(self.message_inserts(conn)) == 2
+
+
+class TestUserTopicsWrites:
+    """Темы регистрации пишутся одним запросом"""
+
+    @pytest.mark.asyncio
+    async def test_add_topics_single_statement(self):
+        db, conn, pair = make_db()
+        registration_id = uuid4()
+
+        await db.add_user_topics(pair["user1_id"], registration_id, ["01", "0101", "02"])
+
+        assert len(conn.executed) == 1
+        query, args = conn.executed[0]
+        assert "unnest" in query
+        assert args == (pair["user1_id"], registration_id, ["01", "0101", "02"])
+
+    @pytest.mark.asyncio
+    async def test_replace_and_diff_updates_single_statement(self):
+        db, conn, _ = make_db()
+        registration_id = uuid4()
+
+        await db.update_user_topics(registration_id, ["01", "02"])
+        await db.update_user_topics(registration_id, ("02", "03"), diff=True)
+
+        assert [args for _, args in conn.executed] == [(registration_id, ["01", "02"]), (registration_id, ["02", "03"])]
+        replace_query, diff_query = [query for query, _ in conn.executed]
+        assert "DELETE" in replace_query and "INSERT" in replace_query
+        assert "<> ALL($2::text[])" in diff_query and "NOT EXISTS" in diff_query
+
+
+class TestWeekRegistrationCreation:
+    """Регистрация на неделю — один запрос"""
+
+    @pytest.mark.asyncio
+    async def test_registration_with_topics_in_one_call(self):
+        db, conn, pair = make_db()
+        created = []
+
+        class Listener:
+            async def on_registration_created(self, registration):
+                created.append(registration)
+
+        db.add_listener(Listener())
+        result = await db.create_week_registration(
+            pair["user1_id"], WEEK_START, WEEK_START, "19:00", selected_topics=["01", "0101"]
+        )
+
+        assert len(conn.executed) == 1
+        assert conn.executed[0][1] == (pair["user1_id"], WEEK_START, WEEK_START, "19:00", ["01", "0101"])
+        assert result.status == RegistrationCreationStatus.CREATED
+        assert result.registration["selected_topics"] == ["01", "0101"]
+        assert "eligible" not in result.registration
+        assert created == [result.registration]
+
+    @pytest.mark.asyncio
+    async def test_missing_feedback_blocks_registration(self):
+        db, conn, pair = make_db()
+        conn.eligible = False
+
+        result = await db.create_week_registration(pair["user1_id"], WEEK_START, WEEK_START, "19:00")
+
+        assert result == (RegistrationCreationStatus.FEEDBACK_REQUIRED, None)
+        assert conn.executed[0][1][4] == []
+
+
+class TestPairEndpoints:
+    """Тесты эндпоинтов пар"""
+
+    def test_capacity_reached_returns_conflict(self, client, monkeypatch):
+        async def get_user_week_registration(user_id):
+            return {"id": uuid4()}
+
+        async def create_user_pair(user1_id, user2_id, registration_id, messages=None):
+            return PairCreationResult(PairCreationStatus.CAPACITY_REACHED)
+
+        monkeypatch.setattr(orator_db, "get_user_week_registration", get_user_week_registration)
+        monkeypatch.setattr(orator_db, "create_user_pair", create_user_pair)
+        app.dependency_overrides[security_service.get_current_user_id] = lambda: str(uuid4())
+        try:
+            response = client.post("/api/v1/orator/pairs/create", json={"candidate_id": str(uuid4())})
+        finally:
+            app.dependency_overrides.clear()
+
+        assert response.status_code == 409
+
+    def test_confirm_uses_profiles_from_pair_row(self, client, monkeypatch):
+        user_pair = {
+            "id": uuid4(),
+            "changed": True,
+            "status": "confirmed",
+            "created_at": datetime(2024, 1, 15, 10, 0),
+            "confirmed_at": None,
+            "cancelled_at": None,
+            "partner_id": uuid4(),
+            "partner_username": "",
+            "partner_telegram_id": "200",
+            "partner_name": "Partner P",
+            "partner_first_name": "Partner",
+            "user_username": "me",
+            "user_telegram_id": "100",
+            "user_first_name": "Me",
+            "week_start_date": WEEK_START,
+            "week_end_date": WEEK_START,
+            "is_initiator": False,
+        }
+        rendered = []
+
+        async def confirm_user_pair(pair_id, confirmed, user_id, messages=None):
+            rendered.extend(messages(user_pair))
+            return user_pair
+
+        async def get_user_profile(user_id):
+            raise AssertionError("profiles must come from the pair row")
+
+        async def add_message(message):
+            raise AssertionError("messages must be written with the pair transition")
+
+        monkeypatch.setattr(orator_db, "confirm_user_pair", confirm_user_pair)
+        monkeypatch.setattr(orator_db, "get_user_profile", get_user_profile)
+        monkeypatch.setattr(orator_db, "add_message", add_message)
+        app.dependency_overrides[security_service.get_current_user_id] = lambda: str(uuid4())
+        try:
+            response = client.post(f"/api/v1/orator/pairs/{user_pair['id']}/confirm")
+        finally:
+            app.dependency_overrides.clear()
+
+        assert response.status_code == 200
+        assert [message.user_id for message in rendered] == ["200", "100"]
+        assert "@me" in rendered[0].message
+        assert "tg://user?id=200" in rendered[1].keyboard["inline_keyboard"][0][0]["url"]
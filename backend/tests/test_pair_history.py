@@ -0,0 +1,189 @@
+import heapq
+import pickle
+import random
+import tracemalloc
+from operator import itemgetter
+from uuid import uuid4
+
+import numpy as np
+import pytest
+
+from config.settings import settings
+from services.match_scoring import ScoringBatch, past_partner_keys, score_batch, top_candidates
+from services.matching_service import MatchingService
+from services.pair_history import PairHistoryIndex, pair_history_index
+from tests.test_match_scoring import random_participant
+from tests.test_matching_service import WEEK_START, make_matching_service
+
+
+class FakeHistoryDb:
+    def __init__(self, pairs, history=None, confirmed_during_load=()):
+        self.pairs = pairs
+        self.history = history
+        self.confirmed_during_load = confirmed_during_load
+
+    async def get_confirmed_pair_history(self):
+        for pair in self.confirmed_during_load:
+            await self.history.on_pair_confirmed(pair)
+        return list(self.pairs)
+
+
+class TestPairHistoryIndex:
+    """Тесты индекса истории пар"""
+
+    @pytest.mark.asyncio
+    async def test_load_and_append(self):
+        history = PairHistoryIndex()
+        await history.load(FakeHistoryDb([("a", "b"), ("a", "c"), ("d", "b")]))
+
+        def partners(user_id):
+            user_ids = {key: user_id for user_id, key in history._user_keys.items()}
+            return sorted(user_ids[key] for key in history.partners(user_id).tolist())
+
+        assert partners("a") == ["b", "c"]
+        assert partners("b") == ["a", "d"]
+        assert partners("unknown") == []
+
+        await history.on_pair_confirmed({"user1_id": "c", "user2_id": "e"})
+        assert partners("c") == ["a", "e"]
+        assert partners("e") == ["c"]
+        assert history.pair_count == 4
+
+    @pytest.mark.asyncio
+    async def test_pairs_confirmed_during_load_are_kept(self):
+        history = PairHistoryIndex()
+        db = FakeHistoryDb([("a", "b")], history, [{"user1_id": "a", "user2_id": "c"}])
+
+        await history.load(db)
+
+        assert set(history.partners("a").tolist()) == {history.user_key("b"), history.user_key("c")}
+
+    def test_100k_users_fit_in_memory_budget(self):
+        """100k пользователей по 20 прошлых партнеров занимают заметно меньше 100 MB"""
+        rng = np.random.default_rng(0)
+        tracemalloc.start()
+        try:
+            history = PairHistoryIndex()
+            history.user_keys(f"00000000-0000-4000-8000-{index:012d}" for index in range(100_000))
+            user1_keys = rng.integers(0, 100_000, 1_000_000, dtype=np.int32)
+            user2_keys = rng.integers(0, 100_000, 1_000_000, dtype=np.int32)
+            history.load_edges(user1_keys, user2_keys)
+            del user1_keys, user2_keys
+            used = tracemalloc.get_traced_memory()[0]
+        finally:
+            tracemalloc.stop()
+
+        assert history.pair_count == 1_000_000
+        assert used < 50 * 1024 * 1024
+
+
+class TestNoveltyScoring:
+    """Понижение score прошлых партнеров"""
+
+    def test_top_candidates_match_full_scan_with_novelty(self):
+        rng = random.Random(11)
+        for _ in range(10):
+            user_info = random_participant(rng)
+            candidates = [random_participant(rng) for _ in range(300)]
+            batch = ScoringBatch.from_candidates(candidates)
+            past_partners = batch.features.history_ids[rng.sample(range(300), 40)]
+
+            scores = score_batch(user_info, batch, past_partners).tolist()
+            expected = heapq.nlargest(30, zip(scores, range(len(scores))), key=itemgetter(0))
+
+            assert top_candidates(user_info, batch, 30, past_partners=past_partners) == expected
+
+    def test_past_partner_is_demoted(self):
+        user_info = {"preferred_time_msk": "19:00", "topics": ["01"], "total_sessions": 3, "gender": None}
+        candidates = [
+            {"user_id": f"novelty-{index}", "preferred_time_msk": "19:00", "topics": ["01"], "total_sessions": 3}
+            for index in range(3)
+        ]
+        batch = ScoringBatch.from_candidates(candidates)
+        past_partners = batch.features.history_ids[:1]
+
+        scores = score_batch(user_info, batch, past_partners)
+
+        assert scores[0] == pytest.approx(scores[1] * settings.pair_history_repeat_factor)
+        assert [position for _, position in top_candidates(user_info, batch, 3, past_partners=past_partners)] == [
+            1,
+            2,
+            0,
+        ]
+
+
+class TestMatchingWithPairHistory:
+    """Подбор кандидатов с учетом истории пар"""
+
+    @pytest.mark.asyncio
+    async def test_history_demotes_without_extra_round_trips(self):
+        service, pool = make_matching_service(20)
+        user_id = str(uuid4())
+        plain = await service.find_candidates(user_id, WEEK_START, limit=20, max_pairs_per_user=3)
+        round_trips = pool.round_trips
+        past = {c.user_id for c in plain[:3]}
+
+        # Пары дописываются в индекс, переданный сервису
+        for partner_id in past:
+            pair_history_index.add_pair(user_id, partner_id)
+        with_history = MatchingService(service.orator_db, pair_history=pair_history_index)
+        candidates = await with_history.find_candidates(user_id, WEEK_START, limit=20, max_pairs_per_user=3)
+
+        # История не добавляет запросов к базе
+        assert pool.round_trips - round_trips == round_trips
+        plain_scores = {c.user_id: c.match_score for c in plain}
+        for candidate in candidates:
+            factor = settings.pair_history_repeat_factor if candidate.user_id in past else 1.0
+            assert candidate.match_score == pytest.approx(plain_scores[candidate.user_id] * factor, abs=1e-3)
+
+    @pytest.mark.asyncio
+    async def test_service_index_is_used_for_candidate_ids(self):
+        """Отдельный индекс сервиса: id кандидатов и партнеров берутся из него, а не из глобального"""
+        service, _ = make_matching_service(20)
+        user_id = str(uuid4())
+        plain = await service.find_candidates(user_id, WEEK_START, limit=20, max_pairs_per_user=3)
+        past = {c.user_id for c in plain[:3]}
+
+        history = PairHistoryIndex()
+        # Сдвигаем id, чтобы они не совпадали с id глобального индекса
+        history.user_keys(str(uuid4()) for _ in range(50))
+        for partner_id in past:
+            history.add_pair(user_id, partner_id)
+        candidates = await MatchingService(service.orator_db, pair_history=history).find_candidates(
+            user_id, WEEK_START, limit=20, max_pairs_per_user=3
+        )
+
+        plain_scores = {c.user_id: c.match_score for c in plain}
+        for candidate in candidates:
+            factor = settings.pair_history_repeat_factor if candidate.user_id in past else 1.0
+            assert candidate.match_score == pytest.approx(plain_scores[candidate.user_id] * factor, abs=1e-3)
+
+    def test_pair_confirmed_after_features_are_built(self):
+        """Первая подтвержденная пара после кодирования признаков учитывается без их пересборки"""
+        user_info = {"preferred_time_msk": "19:00", "topics": ["01"], "total_sessions": 3, "gender": None}
+        candidates = [
+            {"user_id": f"late-{index}", "preferred_time_msk": "19:00", "topics": ["01"], "total_sessions": 3}
+            for index in range(3)
+        ]
+        history = PairHistoryIndex()
+        batch = ScoringBatch.from_candidates(candidates, history)
+        history.add_pair("late-user", "late-1")
+
+        scores = score_batch(user_info, batch, past_partner_keys(history, "late-user", batch.features))
+        assert scores[1] == pytest.approx(scores[0] * settings.pair_history_repeat_factor)
+
+        # Признаки другого индекса: партнеры переводятся в его id через user_id
+        foreign = ScoringBatch.from_candidates(candidates, PairHistoryIndex())
+        scores = score_batch(user_info, foreign, past_partner_keys(history, "late-user", foreign.features))
+        assert scores[1] == pytest.approx(scores[0] * settings.pair_history_repeat_factor)
+
+    def test_history_index_is_not_pickled_with_features(self):
+        """Признаки уходят в процесс предрасчета без индекса истории пар"""
+        history = PairHistoryIndex()
+        batch = ScoringBatch.from_candidates([random_participant(random.Random(1)) for _ in range(5)], history)
+
+        restored = pickle.loads(pickle.dumps(batch.features))
+
+        assert batch.features.history is history
+        assert restored.history is None
+        assert (restored.history_ids == batch.features.history_ids).all()
@@ -0,0 +1,104 @@
+import gc
+import pytest
+from multiprocessing.shared_memory import SharedMemory
+
+import numpy as np
+
+from benchmarks.repository import InMemoryOratorRepository
+from benchmarks.synthetic import generate_dataset
+from services.candidate_pool import WeekCandidatePool
+from services.match_scoring import CandidateFeatures, ScoringBatch, top_candidates
+from services.matching_service import MatchingService
+from services.parallel_scoring import ParallelScorer, export_features, SHARED_FIELDS
+from services.topic_dictionary import topic_dictionary
+from tests.test_match_suggestions import WEEK_START, active_users
+
+
+@pytest.fixture(scope="module")
+def scorer():
+    scorer = ParallelScorer(workers=2, min_candidates=0)
+    yield scorer
+    scorer.shutdown()
+
+
+async def load_week(registrations: int = 600, seed: int = 5):
+    dataset = generate_dataset(registrations, seed=seed, week_start=WEEK_START)
+    repository = InMemoryOratorRepository(dataset)
+    await topic_dictionary.refresh(repository)
+    pool = WeekCandidatePool(repository, resync_seconds=60)
+    return dataset, repository, pool
+
+
+class TestSharedFeatures:
+    """Тесты передачи признаков через общую память"""
+
+    def test_export_round_trip(self):
+        candidates = [
+            {"user_id": str(i), "preferred_time_msk": f"{9 + i % 10}:00", "total_sessions": i, "topics": ["a - b"]}
+            for i in range(7)
+        ]
+        features = CandidateFeatures.from_candidates(candidates)
+        shm, handle = export_features(features)
+        try:
+            attached = SharedMemory(name=handle.name)
+            for field, dtype, shape, start in handle.layout:
+                view = np.ndarray(shape, dtype=dtype, buffer=attached.buf, offset=start)
+                assert np.array_equal(view, getattr(features, field))
+                del view
+            attached.close()
+            assert [field for field, *_ in handle.layout] == list(SHARED_FIELDS)
+        finally:
+            shm.close()
+            shm.unlink()
+
+
+class TestParallelScorer:
+    """Скоринг шардами в пуле процессов"""
+
+    @pytest.mark.parametrize(
+        "budget, web_concurrency, expected", [(0, 1, 0), (8, 1, 8), (8, 4, 2), (9, 4, 2), (2, 4, 0), (4, 0, 4)]
+    )
+    def test_budget_is_split_between_uvicorn_workers(self, budget, web_concurrency, expected):
+        assert ParallelScorer.workers_per_process(budget, web_concurrency) == expected
+
+    @pytest.mark.asyncio
+    async def test_matches_in_process_top_candidates(self, scorer):
+        dataset, _, pool = await load_week()
+
+        for user_id in active_users(dataset)[:10]:
+            user_info = await pool.get_user_info(user_id, WEEK_START)
+            batch = await pool.get_scoring_batch(WEEK_START, exclude_user_id=user_id, max_pairs_per_user=3)
+            for size in (1, 30, 1000):
+                expected = top_candidates(user_info, batch, size)
+                assert await scorer.top_candidates(user_info, batch, size) == expected
+
+    @pytest.mark.asyncio
+    async def test_shared_segment_released_with_features(self, scorer):
+        candidates = [
+            {"user_id": str(i), "preferred_time_msk": "10:00", "total_sessions": i, "topics": []} for i in range(5)
+        ]
+        batch = ScoringBatch.from_candidates(candidates)
+        await scorer.top_candidates(candidates[0], batch, 3)
+        name = scorer._handles[id(batch.features)].name
+
+        del batch
+        gc.collect()
+
+        with pytest.raises(FileNotFoundError):
+            SharedMemory(name=name)
+
+    @pytest.mark.asyncio
+    async def test_find_candidates_switches_above_threshold(self, scorer):
+        dataset, repository, pool = await load_week(200, seed=6)
+        user_id = active_users(dataset)[0]
+        in_process = MatchingService(repository, pool)
+        parallel = MatchingService(repository, pool, parallel_scorer=scorer)
+        small = MatchingService(repository, pool, parallel_scorer=ParallelScorer(workers=2, min_candidates=10**6))
+
+        expected = await in_process.find_candidates(user_id, WEEK_START, limit=3, max_pairs_per_user=3)
+
+        assert await parallel.find_candidates(user_id, WEEK_START, limit=3, max_pairs_per_user=3) == expected
+        week = await pool.get_week(WEEK_START)
+        assert id(week._features) in scorer._handles
+        assert await small.find_candidates(user_id, WEEK_START, limit=3, max_pairs_per_user=3) == expected
+        assert small.parallel_scorer._executor is None
@@ -0,0 +1,128 @@
+import pytest
+import asyncpg
+
+from services.orator_database import orator_statements, USER_PROFILE
+from services.prepared_statements import StatementRegistry
+
+
+class FakeStatement:
+    def __init__(self, conn, query):
+        self.conn = conn
+        self.query = query
+        self.fail_once = False
+
+    async def fetchrow(self, *args):
+        if self.fail_once:
+            self.fail_once = False
+            raise asyncpg.exceptions.InvalidCachedStatementError("cached plan must not change result type")
+        self.conn.calls.append(("prepared", self.query, args))
+        return {"query": self.query}
+
+
+class FakeConnection:
+    """Соединение с prepare и pid серверного процесса"""
+
+    def __init__(self, pid):
+        self.pid = pid
+        self.prepared = []
+        self.calls = []
+        self.termination_listeners = []
+
+    def get_server_pid(self):
+        return self.pid
+
+    async def prepare(self, query):
+        self.prepared.append(query)
+        return FakeStatement(self, query)
+
+    def add_termination_listener(self, callback):
+        self.termination_listeners.append(callback)
+
+    async def fetchrow(self, query, *args):
+        self.calls.append(("text", query, args))
+        return {"query": query}
+
+
+class TextOnlyConnection:
+    def __init__(self):
+        self.calls = []
+
+    async def fetchrow(self, query, *args):
+        self.calls.append(("text", query, args))
+        return {"query": query}
+
+
+@pytest.fixture
+def registry():
+    registry = StatementRegistry()
+    registry.register("one", "SELECT 1 WHERE $1::int > 0")
+    registry.register("two", "SELECT 2")
+    return registry
+
+
+class TestStatementRegistry:
+    """Тесты реестра prepared statements"""
+
+    @pytest.mark.asyncio
+    async def test_init_prepares_once_per_connection(self, registry):
+        conn = FakeConnection(pid=10)
+        await registry.prepare_connection(conn)
+
+        for _ in range(3):
+            await registry.fetchrow(conn, "one", 5)
+
+        assert conn.prepared == ["SELECT 1 WHERE $1::int > 0", "SELECT 2"]
+        assert conn.calls == [("prepared", "SELECT 1 WHERE $1::int > 0", (5,))] * 3
+
+    @pytest.mark.asyncio
+    async def test_connection_without_init_is_prepared_lazily(self, registry):
+        conn = FakeConnection(pid=11)
+
+        await registry.fetchrow(conn, "two")
+        await registry.fetchrow(conn, "two")
+
+        assert len(conn.prepared) == 2
+        assert [kind for kind, *_ in conn.calls] == ["prepared", "prepared"]
+
+    @pytest.mark.asyncio
+    async def test_terminated_connection_is_forgotten(self, registry):
+        conn = FakeConnection(pid=12)
+        await registry.prepare_connection(conn)
+
+        for callback in conn.termination_listeners:
+            callback(conn)
+
+        assert 12 not in registry._prepared
+
+    @pytest.mark.asyncio
+    async def test_outdated_statement_is_prepared_again(self, registry):
+        conn = FakeConnection(pid=13)
+        await registry.prepare_connection(conn)
+        registry._prepared[13]["one"].fail_once = True
+
+        assert await registry.fetchrow(conn, "one", 1) == {"query": "SELECT 1 WHERE $1::int > 0"}
+        assert len(conn.prepared) == 3
+
+    @pytest.mark.asyncio
+    async def test_connection_without_prepare_runs_text(self, registry):
+        conn = TextOnlyConnection()
+
+        await registry.fetchrow(conn, "one", 1)
+
+        assert conn.calls == [("text", "SELECT 1 WHERE $1::int > 0", (1,))]
+
+    def test_conflicting_registration_is_rejected(self, registry):
+        assert registry.register("one", "SELECT 1 WHERE $1::int > 0") == "one"
+        with pytest.raises(ValueError):
+            registry.register("one", "SELECT 3")
+
+    def test_hot_orator_queries_are_registered(self):
+        assert {
+            "current_registration",
+            "week_registration",
+            "user_topics",
+            USER_PROFILE,
+            "user_pairs",
+            "bot_content",
+            "active_settings",
+        } <= set(orator_statements.names)
@@ -0,0 +1,164 @@
+import asyncio
+import pytest
+
+from services.db_notifications import DatabaseNotificationListener
+from services.settings_cache import SETTINGS_CHANNEL, SettingsCache
+
+
+class FakeSettingsLoader:
+    """Загрузчик настроек, считающий обращения к базе"""
+
+    def __init__(self, values):
+        self.values = values
+        self.calls = 0
+
+    async def __call__(self):
+        self.calls += 1
+        return dict(self.values)
+
+
+class TestSettingsCache:
+    """Тесты кэша настроек"""
+
+    def setup_method(self):
+        self.loader = FakeSettingsLoader({"max_pairs_per_user": "5", "matching_enabled": "on", "broken": "x"})
+        self.cache = SettingsCache(self.loader, ttl_seconds=60)
+
+    @pytest.mark.asyncio
+    async def test_typed_accessors_use_one_snapshot(self):
+        assert await self.cache.get_int("max_pairs_per_user", 3) == 5
+        assert await self.cache.get_int("broken", 3) == 3
+        assert await self.cache.get_int("missing", 3) == 3
+        assert await self.cache.get_bool("matching_enabled") is True
+        assert await self.cache.get("missing", "default") == "default"
+        assert self.loader.calls == 1
+
+    @pytest.mark.asyncio
+    async def test_invalidate_reloads_on_next_read(self):
+        await self.cache.get_int("max_pairs_per_user")
+        self.loader.values["max_pairs_per_user"] = "7"
+
+        self.cache.invalidate()
+
+        assert await self.cache.get_int("max_pairs_per_user") == 7
+        assert self.loader.calls == 2
+
+    @pytest.mark.asyncio
+    async def test_ttl_expiry_reloads(self):
+        cache = SettingsCache(self.loader, ttl_seconds=0)
+
+        await cache.get("max_pairs_per_user")
+        await cache.get("max_pairs_per_user")
+
+        assert self.loader.calls == 2
+
+    @pytest.mark.asyncio
+    async def test_notification_invalidates(self):
+        await self.cache.get("max_pairs_per_user")
+
+        self.cache._on_notification("max_pairs_per_user")
+        await self.cache.get("max_pairs_per_user")
+
+        assert self.loader.calls == 2
+
+    @pytest.mark.asyncio
+    async def test_invalidation_during_load_is_not_lost(self):
+        cache = None
+
+        async def loader_with_concurrent_update():
+            cache.invalidate()
+            return {"max_pairs_per_user": "5"}
+
+        cache = SettingsCache(loader_with_concurrent_update, ttl_seconds=60)
+        await cache.get("max_pairs_per_user")
+
+        assert not cache._is_fresh()
+
+
+class FakeListenConnection:
+    """Фейковое выделенное соединение asyncpg для LISTEN"""
+
+    def __init__(self):
+        self.listeners = {}
+        self.termination_listeners = []
+        self.closed = False
+
+    async def add_listener(self, channel, callback):
+        self.listeners[channel] = callback
+
+    def add_termination_listener(self, callback):
+        self.termination_listeners.append(callback)
+
+    def remove_termination_listener(self, callback):
+        self.termination_listeners.remove(callback)
+
+    async def fetchval(self, query, timeout=None):
+        return 1
+
+    def is_closed(self):
+        return self.closed
+
+    async def close(self, timeout=None):
+        self.closed = True
+
+    def terminate(self):
+        self.closed = True
+
+    def drop(self):
+        """Обрыв соединения со стороны сервера"""
+        self.closed = True
+        for callback in list(self.termination_listeners):
+            callback(self)
+
+    def notify(self, channel, payload):
+        self.listeners[channel](self, 1, channel, payload)
+
+
+class TestSettingsNotifications:
+    """Уведомления об изменении настроек через выделенное соединение"""
+
+    def setup_method(self):
+        self.connections = []
+
+        async def connect():
+            connection = FakeListenConnection()
+            self.connections.append(connection)
+            return connection
+
+        self.notifications = DatabaseNotificationListener("postgresql://test", check_seconds=60, connect=connect)
+        self.loader = FakeSettingsLoader({"max_pairs_per_user": "5"})
+        self.cache = SettingsCache(self.loader, ttl_seconds=60)
+        self.cache.listen(self.notifications)
+
+    @pytest.mark.asyncio
+    async def test_notification_invalidates_cache(self):
+        await self.notifications.start()
+        try:
+            await self.cache.get("max_pairs_per_user")
+            self.connections[0].notify(SETTINGS_CHANNEL, "max_pairs_per_user")
+            await self.cache.get("max_pairs_per_user")
+        finally:
+            await self.notifications.stop()
+
+        assert self.loader.calls == 2
+        assert self.connections[0].closed
+
+    @pytest.mark.asyncio
+    async def test_reconnects_and_invalidates_after_drop(self):
+        await self.notifications.start()
+        try:
+            await self.cache.get("max_pairs_per_user")
+            self.connections[0].drop()
+            for _ in range(10):
+                await asyncio.sleep(0)
+            assert len(self.connections) == 2
+
+            # Изменения за время обрыва не пришли уведомлением — снимок сброшен
+            assert not self.cache._is_fresh()
+            await self.cache.get("max_pairs_per_user")
+            self.connections[1].notify(SETTINGS_CHANNEL, "max_pairs_per_user")
+            await self.cache.get("max_pairs_per_user")
+        finally:
+            await self.notifications.stop()
+
+        assert self.loader.calls == 3
@@ -0,0 +1,195 @@
+import random
+import pytest
+from datetime import date
+from itertools import combinations
+
+import numpy as np
+
+from services.match_scoring import CandidateFeatures, score_pairs
+from services.matching_service import MatchingService
+from services.pair_matching import max_weight_matching, max_weight_b_matching, greedy_b_matching
+from services.weekly_pairing import WeeklyPairingService, plan_week_pairs
+from tests.test_match_scoring import random_participant
+
+
+def brute_force_b_matching(n, edges, capacity) -> int:
+    """Максимальный вес b-паросочетания полным перебором подмножеств ребер"""
+    best = 0
+    for mask in range(1 << len(edges)):
+        degree = [0] * n
+        total = 0
+        for k, (u, v, w) in enumerate(edges):
+            if mask >> k & 1:
+                degree[u] += 1
+                degree[v] += 1
+                total += w
+        if all(degree[v] <= capacity[v] for v in range(n)):
+            best = max(best, total)
+    return best
+
+
+def random_graph(rng: random.Random):
+    n = rng.randint(2, 8)
+    pairs = list(combinations(range(n), 2))
+    rng.shuffle(pairs)
+    edges = [(u, v, rng.randint(0, 20)) for u, v in pairs[: rng.randint(1, min(12, len(pairs)))]]
+    return n, edges
+
+
+def check_selection(n, edges, capacity, selected) -> int:
+    degree = [0] * n
+    for k in selected:
+        u, v, _ = edges[k]
+        degree[u] += 1
+        degree[v] += 1
+    assert all(degree[v] <= capacity[v] for v in range(n))
+    return sum(edges[k][2] for k in selected)
+
+
+class TestPairMatching:
+    """Проверка алгоритмов паросочетания против полного перебора"""
+
+    @pytest.mark.parametrize("seed", range(5))
+    def test_blossom_is_optimal(self, seed):
+        rng = random.Random(seed)
+        for _ in range(100):
+            n, edges = random_graph(rng)
+            mate = max_weight_matching(edges)
+            mate += [-1] * (n - len(mate))
+
+            assert all(mate[mate[v]] == v for v in range(n) if mate[v] != -1)
+            total = sum(w for u, v, w in edges if mate[u] == v)
+            assert total == brute_force_b_matching(n, edges, [1] * n)
+
+    @pytest.mark.parametrize("seed", range(5))
+    def test_b_matching_is_optimal(self, seed):
+        rng = random.Random(seed)
+        for _ in range(100):
+            n, edges = random_graph(rng)
+            capacity = [rng.randint(0, 3) for _ in range(n)]
+
+            total = check_selection(n, edges, capacity, max_weight_b_matching(edges, capacity))
+            assert total == brute_force_b_matching(n, edges, capacity)
+
+    @pytest.mark.parametrize("seed", range(5))
+    def test_greedy_is_feasible_and_half_optimal(self, seed):
+        rng = random.Random(seed)
+        for _ in range(100):
+            n, edges = random_graph(rng)
+            capacity = [rng.randint(0, 3) for _ in range(n)]
+            left, right, weight = (np.array(column, dtype=np.int64) for column in zip(*edges))
+
+            selected = greedy_b_matching(n, left, right, weight, np.array(capacity))
+            total = check_selection(n, edges, capacity, selected)
+            assert 2 * total >= brute_force_b_matching(n, edges, capacity)
+
+
+class TestWeeklyPairingPlan:
+    """Проверка планирования пар недели"""
+
+    @pytest.mark.asyncio
+    async def test_pair_scores_match_scalar(self):
+        rng = random.Random(7)
+        service = MatchingService(orator_db=None)
+        participants = [random_participant(rng) for _ in range(200)]
+        features = CandidateFeatures.from_candidates(participants)
+        users = np.array([rng.randrange(200) for _ in range(500)])
+        candidates = np.array([rng.randrange(200) for _ in range(500)])
+
+        vectorized = score_pairs(features, users, candidates).tolist()
+        scalar = [
+            await service._calculate_match_score(participants[u], participants[c]) for u, c in zip(users, candidates)
+        ]
+        assert vectorized == scalar
+
+    @pytest.mark.parametrize("exact_max_nodes", [10**6, 0])
+    def test_plan_respects_capacity_and_existing_pairs(self, exact_max_nodes):
+        rng = random.Random(3)
+        candidates = [dict(random_participant(rng), user_id=f"u{index}") for index in range(12)]
+        open_pairs = [{"user1_id": "u0", "user2_id": "u1"}, {"user1_id": "u0", "user2_id": "u2"}]
+
+        plan = plan_week_pairs(candidates, open_pairs, 2, neighbours=4, exact_max_nodes=exact_max_nodes)
+
+        assert plan.exact == (exact_max_nodes > 0)
+        degree = [0] * len(candidates)
+        for u, v in plan.pairs:
+            degree[u] += 1
+            degree[v] += 1
+            assert {u, v} not in ({0, 1}, {0, 2})
+        # У u0 уже две открытые пары
+        assert degree[0] == 0
+        assert max(degree) <= 2
+        assert len(set(map(frozenset, plan.pairs))) == len(plan.pairs)
+
+    def test_exact_plan_is_not_worse_than_greedy(self):
+        rng = random.Random(11)
+        candidates = [dict(random_participant(rng), user_id=index) for index in range(20)]
+
+        exact = plan_week_pairs(candidates, [], 2, neighbours=4, exact_max_nodes=10**6)
+        greedy = plan_week_pairs(candidates, [], 2, neighbours=4, exact_max_nodes=0)
+
+        assert exact.total_weight >= greedy.total_weight
+
+    def test_approximate_plan_gap_is_small(self):
+        """Приближенный подбор уступает точному на синтетической неделе не больше нескольких процентов"""
+        rng = random.Random(13)
+        candidates = [dict(random_participant(rng), user_id=index) for index in range(30)]
+
+        exact = plan_week_pairs(candidates, [], 3, neighbours=8, exact_max_nodes=10**6)
+        approximate = plan_week_pairs(candidates, [], 3, neighbours=8, exact_max_nodes=0)
+
+        assert approximate.total_weight >= 0.95 * exact.total_weight
+
+
+class FakePairingDb:
+    """In-memory замена OratorDatabaseService для недельного подбора"""
+
+    def __init__(self, candidates):
+        self.candidates = candidates
+        self.created = None
+
+    async def get_setting_int(self, key, default_value=0):
+        return 1
+
+    async def get_week_candidates(self, week_start):
+        return self.candidates
+
+    async def get_week_open_pairs(self, week_start):
+        return []
+
+    async def create_pairs_with_messages(self, week_start, pairs, messages, max_pairs_per_user=None):
+        self.created = (pairs, messages)
+        return [dict(pair, week_start_date=week_start) for pair in pairs]
+
+
+class TestWeeklyPairingService:
+    """Проверка записи результатов недельного подбора"""
+
+    def setup_method(self):
+        rng = random.Random(5)
+        candidates = []
+        for index in range(6):
+            candidate = random_participant(rng)
+            candidate.update(user_id=f"u{index}", name=f"User {index}", telegram_id=index, registration_id=f"r{index}")
+            candidates.append(candidate)
+        self.db = FakePairingDb(candidates)
+        self.service = WeeklyPairingService(self.db)
+
+    @pytest.mark.asyncio
+    async def test_run_week_writes_pairs_and_messages_together(self):
+        result = await self.service.run_week(date(2024, 1, 15))
+
+        pairs, messages = self.db.created
+        assert result["created_pairs"] == len(pairs) == 3
+        # Каждый участник пары получает сообщение с кнопками подтверждения
+        assert len(messages) == 2 * len(pairs)
+        assert {pair_id for pair_id, _ in messages} == {pair["id"] for pair in pairs}
+        assert all(pair["registration_id"] == f"r{pair['user1_id'][1:]}" for pair in pairs)
+
+    @pytest.mark.asyncio
+    async def test_dry_run_does_not_write(self):
+        result = await self.service.run_week(date(2024, 1, 15), dry_run=True)
+
+        assert result["proposed_pairs"] == 3
+        assert result["created_pairs"] == 0
+        assert self.db.created is None
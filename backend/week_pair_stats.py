@@ -0,0 +1,57 @@
+"""
+Сверка и пересчет счетчиков открытых пар (таблица week_user_pair_stats).
+
+Запуск из каталога backend:
+    python week_pair_stats.py check [--week 2024-01-15]
+    python week_pair_stats.py rebuild [--week 2024-01-15]
+
+check завершается с кодом 1, если счетчики расходятся с user_pairs.
+"""
+
+import argparse
+import asyncio
+import sys
+from datetime import date
+
+from loguru import logger
+
+from services.orator_database import orator_db
+
+
+async def check(week_start: date = None) -> int:
+    """Вывести расхождения счетчиков с user_pairs"""
+    mismatches = await orator_db.check_week_user_pair_stats(week_start)
+    for row in mismatches:
+        logger.warning(
+            f"{row['week_start_date']} {row['user_id']}: "
+            f"stored {row['stored_open_pairs']}, actual {row['actual_open_pairs']}"
+        )
+    if mismatches:
+        logger.error(f"Found {len(mismatches)} inconsistent pair counters")
+        return 1
+    logger.success("Pair counters are consistent")
+    return 0
+
+
+async def rebuild(week_start: date = None) -> int:
+    """Пересчитать счетчики из user_pairs"""
+    written = await orator_db.rebuild_week_user_pair_stats(week_start)
+    logger.success(f"Rebuilt {written} pair counters" + (f" for week {week_start}" if week_start else ""))
+    return 0
+
+
+async def main(command: str, week_start: date = None) -> int:
+    """Главная функция"""
+    await orator_db.connect()
+    try:
+        return await (check(week_start) if command == "check" else rebuild(week_start))
+    finally:
+        await orator_db.disconnect()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("command", choices=["check", "rebuild"])
+    parser.add_argument("--week", type=date.fromisoformat, help="Начало недели (по умолчанию — все недели)")
+    args = parser.parse_args()
+    sys.exit(asyncio.run(main(args.command, args.week)))
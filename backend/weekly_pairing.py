@@ -0,0 +1,46 @@
+"""
+Глобальный подбор пар недели для всех активных регистраций.
+
+Запуск из каталога backend (вручную или по расписанию, например cron):
+    python weekly_pairing.py --week 2024-01-15 [--dry-run]
+
+--dry-run только считает план и ничего не записывает в базу. Подбор приближенный:
+точное паросочетание считается только для графов до WEEKLY_PAIRING_EXACT_MAX_NODES вершин,
+на больших неделях — жадный алгоритм с локальным улучшением (предупреждение в логе
+и пометка approximate вместо exact).
+"""
+
+import argparse
+import asyncio
+import sys
+from datetime import date
+
+from loguru import logger
+
+from services.orator_database import orator_db
+from services.weekly_pairing import weekly_pairing_service
+
+
+async def main(week_start: date, dry_run: bool = False) -> int:
+    """Главная функция"""
+    await orator_db.connect()
+    try:
+        result = await weekly_pairing_service.run_week(week_start, dry_run=dry_run)
+    finally:
+        await orator_db.disconnect()
+
+    logger.success(
+        f"Week {result['week_start_date']}: {result['registrations']} registrations, "
+        f"{result['proposed_pairs']} pairs proposed, {result['created_pairs']} created, "
+        f"total score {result['total_score']:.3f} ({'exact' if result['exact'] else 'approximate'})"
+        + (", dry run" if dry_run else "")
+    )
+    return 0
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--week", type=date.fromisoformat, required=True, help="Начало недели")
+    parser.add_argument("--dry-run", action="store_true", help="Не создавать пары")
+    args = parser.parse_args()
+    sys.exit(asyncio.run(main(args.week, args.dry_run)))
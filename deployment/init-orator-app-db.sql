@@ -35,6 +35,7 @@ CREATE TABLE IF NOT EXISTS week_registrations (
     week_start_date DATE NOT NULL,
     week_end_date DATE NOT NULL,
     preferred_time_msk VARCHAR(5) NOT NULL, -- формат HH:MM
+    preferred_minute_msk SMALLINT, -- то же время в минутах от начала дня, заполняется триггером
     status VARCHAR(20) DEFAULT 'active' CHECK (status IN ('active', 'cancelled')),
     cancelled_at TIMESTAMP,
     created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
@@ -71,6 +72,16 @@ CREATE TABLE IF NOT EXISTS user_pairs (
     updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
 );
 
+-- Счетчики открытых (pending и confirmed) пар пользователя на неделю,
+-- обновляются backend в одной транзакции с изменением пары
+CREATE TABLE IF NOT EXISTS week_user_pair_stats (
+    week_start_date DATE NOT NULL,
+    user_id UUID REFERENCES users(id) ON DELETE CASCADE,
+    open_pairs INTEGER NOT NULL DEFAULT 0,
+    updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+    PRIMARY KEY (week_start_date, user_id)
+);
+
 -- ============================================================================
 -- ОБРАТНАЯ СВЯЗЬ
 -- ============================================================================
@@ -116,6 +127,22 @@ CREATE TABLE IF NOT EXISTS orator_settings (
     updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
 );
 
+-- ============================================================================
+-- ОЧЕРЕДЬ СООБЩЕНИЙ
+-- ============================================================================
+
+-- Сообщения пользователям, отправляемые worker/send_worker.py.
+-- Помесячные партиции и архив создает миграция backend/migrations/0008_message_queue_partitions.sql
+CREATE TABLE IF NOT EXISTS message_queue (
+    id UUID PRIMARY KEY DEFAULT uuid_generate_v4(),
+    user_id VARCHAR(100) NOT NULL, -- telegram_id получателя
+    message TEXT NOT NULL,
+    keyboard JSONB,
+    sent BOOLEAN DEFAULT FALSE,
+    created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+    sent_at TIMESTAMP
+);
+
 -- ============================================================================
 -- ИНДЕКСЫ ДЛЯ ОПТИМИЗАЦИИ
 -- ============================================================================
@@ -130,6 +157,8 @@ CREATE INDEX IF NOT EXISTS idx_users_is_active ON users(is_active);
 CREATE INDEX IF NOT EXISTS idx_week_registrations_user_id ON week_registrations(user_id);
 CREATE INDEX IF NOT EXISTS idx_week_registrations_week_dates ON week_registrations(week_start_date, week_end_date);
 CREATE INDEX IF NOT EXISTS idx_week_registrations_status ON week_registrations(status);
+CREATE INDEX IF NOT EXISTS idx_week_registrations_week_status ON week_registrations(week_start_date, status);
+CREATE INDEX IF NOT EXISTS idx_week_registrations_week_minute ON week_registrations(week_start_date, preferred_minute_msk) WHERE status = 'active';
 
 -- Индексы для таблицы тем
 CREATE INDEX IF NOT EXISTS idx_user_topics_user_id ON user_topics(user_id);
@@ -140,6 +169,7 @@ CREATE INDEX IF NOT EXISTS idx_user_pairs_user1_id ON user_pairs(user1_id);
 CREATE INDEX IF NOT EXISTS idx_user_pairs_user2_id ON user_pairs(user2_id);
 CREATE INDEX IF NOT EXISTS idx_user_pairs_week_registration_id ON user_pairs(week_registration_id);
 CREATE INDEX IF NOT EXISTS idx_user_pairs_status ON user_pairs(status);
+CREATE INDEX IF NOT EXISTS idx_user_pairs_registration_status ON user_pairs(week_registration_id, status);
 
 -- Индексы для таблицы обратной связи
 CREATE INDEX IF NOT EXISTS idx_session_feedback_pair_id ON session_feedback(pair_id);
@@ -150,6 +180,10 @@ CREATE INDEX IF NOT EXISTS idx_session_feedback_to_user_id ON session_feedback(t
 CREATE INDEX IF NOT EXISTS idx_bot_content_key ON bot_content(content_key);
 CREATE INDEX IF NOT EXISTS idx_bot_content_language ON bot_content(language);
 CREATE INDEX IF NOT EXISTS idx_bot_content_is_active ON bot_content(is_active);
+CREATE INDEX IF NOT EXISTS idx_bot_content_key_language ON bot_content(content_key, language);
+
+-- Индексы для очереди сообщений
+CREATE INDEX IF NOT EXISTS idx_message_queue_sent_created_at ON message_queue(sent, created_at);
 
 -- Индексы для таблицы настроек
 CREATE INDEX IF NOT EXISTS idx_orator_settings_key ON orator_settings(key);
@@ -184,6 +218,90 @@ CREATE TRIGGER update_bot_content_updated_at BEFORE UPDATE ON bot_content
 CREATE TRIGGER update_orator_settings_updated_at BEFORE UPDATE ON orator_settings
     FOR EACH ROW EXECUTE FUNCTION update_updated_at_column();
 
+-- Время регистрации в минутах от начала дня для подбора пар по окну времени
+CREATE OR REPLACE FUNCTION week_registration_preferred_minute(time_msk TEXT) RETURNS SMALLINT AS $$
+    SELECT CASE
+        WHEN time_msk ~ '^[0-9]{1,2}:[0-9]{2}$'
+        THEN (split_part(time_msk, ':', 1)::int * 60 + split_part(time_msk, ':', 2)::int)::smallint
+    END
+$$ LANGUAGE sql IMMUTABLE;
+
+CREATE OR REPLACE FUNCTION set_week_registration_preferred_minute()
+RETURNS TRIGGER AS $$
+BEGIN
+    NEW.preferred_minute_msk := week_registration_preferred_minute(NEW.preferred_time_msk);
+    RETURN NEW;
+END;
+$$ language 'plpgsql';
+
+CREATE TRIGGER week_registrations_preferred_minute BEFORE INSERT OR UPDATE OF preferred_time_msk ON week_registrations
+    FOR EACH ROW EXECUTE FUNCTION set_week_registration_preferred_minute();
+
+-- Создание пары с проверкой лимита пар: advisory-блокировка на пользователя недели
+-- и проверка счетчиков week_user_pair_stats в одном вызове
+CREATE OR REPLACE FUNCTION create_user_pair_checked(
+    p_user1_id UUID, p_user2_id UUID, p_registration_id UUID, p_max_pairs INTEGER
+) RETURNS TABLE (result TEXT, pair_id UUID, week_start_date DATE) AS $$
+#variable_conflict use_column
+DECLARE
+    v_week DATE;
+    v_user UUID;
+    v_pair_id UUID;
+BEGIN
+    SELECT wr.week_start_date INTO v_week
+    FROM week_registrations wr
+    WHERE wr.id = p_registration_id AND wr.status = 'active';
+    IF v_week IS NULL THEN
+        RETURN QUERY SELECT 'not_registered'::text, NULL::uuid, NULL::date;
+        RETURN;
+    END IF;
+
+    -- Блокировка на пользователя недели (в порядке user_id, до конца транзакции):
+    -- параллельные создания пар с тем же пользователем проверяют счетчик по очереди
+    FOR v_user IN SELECT DISTINCT u FROM unnest(ARRAY[p_user1_id, p_user2_id]) AS u ORDER BY u LOOP
+        PERFORM pg_advisory_xact_lock(hashtextextended('user_pairs:' || v_week || ':' || v_user, 0));
+    END LOOP;
+
+    IF EXISTS (
+        SELECT 1
+        FROM user_pairs up
+        JOIN week_registrations wr ON up.week_registration_id = wr.id
+        WHERE wr.week_start_date = v_week
+        AND up.status IN ('pending', 'confirmed')
+        AND ((up.user1_id = p_user1_id AND up.user2_id = p_user2_id)
+            OR (up.user1_id = p_user2_id AND up.user2_id = p_user1_id))
+    ) THEN
+        RETURN QUERY SELECT 'already_paired'::text, NULL::uuid, v_week;
+        RETURN;
+    END IF;
+
+    IF EXISTS (
+        SELECT 1
+        FROM week_user_pair_stats ps
+        WHERE ps.week_start_date = v_week
+        AND ps.user_id IN (p_user1_id, p_user2_id)
+        AND ps.open_pairs >= p_max_pairs
+    ) THEN
+        RETURN QUERY SELECT 'capacity_reached'::text, NULL::uuid, v_week;
+        RETURN;
+    END IF;
+
+    INSERT INTO user_pairs (user1_id, user2_id, week_registration_id)
+    VALUES (p_user1_id, p_user2_id, p_registration_id)
+    RETURNING id INTO v_pair_id;
+
+    INSERT INTO week_user_pair_stats (week_start_date, user_id, open_pairs)
+    SELECT v_week, u, 1
+    FROM unnest(ARRAY[p_user1_id, p_user2_id]) AS u
+    ORDER BY u
+    ON CONFLICT (week_start_date, user_id) DO UPDATE
+    SET open_pairs = week_user_pair_stats.open_pairs + 1,
+        updated_at = CURRENT_TIMESTAMP;
+
+    RETURN QUERY SELECT 'created'::text, v_pair_id, v_week;
+END;
+$$ LANGUAGE plpgsql;
+
 -- ============================================================================
 -- ВСТАВКА БАЗОВОГО КОНТЕНТА
 -- ============================================================================
@@ -120,6 +120,9 @@ class CallbackHandler(OratorBaseHandler):
             # Остальные callback'ы
             elif callback_data == "find":
                 await self._handle_find_callback(query, language)
+            elif callback_data.startswith("find_next_"):
+                cursor = callback_data.replace("find_next_", "", 1)
+                await self.topics_handler.show_next_candidates(query, language, cursor)
             elif callback_data == "mytasks":
                 await self._handle_mytasks_callback(query, context)
             elif callback_data == "profile":
@@ -261,52 +261,70 @@ class TopicsHandler(OratorBaseHandler):
             # Ищем кандидатов
             match_request = {"week_start_date": registration["week_start_date"], "limit": 5}
             candidates_response = await self.api_client.find_candidates(match_request)
-            candidates = candidates_response.get("candidates", [])
-
-            if not candidates:
-                keyboard = [
-                    [InlineKeyboardButton("🔄 Попробовать снова", callback_data="find")],
-                    [InlineKeyboardButton(get_button_text("back", language), callback_data="main_menu")],
-                ]
-                reply_markup = InlineKeyboardMarkup(keyboard)
-                await query.edit_message_text(
-                    "❌ Кандидаты не найдены. Попробуйте позже или измените критерии поиска.", reply_markup=reply_markup
-                )
-                return
-
-            # Создаем кнопки для кандидатов
-            keyboard = []
-            for candidate in candidates[:5]:
-                name = candidate.get("name", "Пользователь")
-                score = candidate.get("match_score", 0)
-                preferred_time = candidate.get("preferred_time_msk", "Не указано")
-                selected_topics = candidate.get("selected_topics", [])
-
-                # Берем первую тему или показываем "Не выбрано"
-                topic_display = selected_topics[0] if selected_topics else "Не выбрано"
-
-                # Формируем текст кнопки
-                button_text = f"{name} [{topic_display}] {preferred_time} (совпадение: {score:.1%})"
-
-                keyboard.append([InlineKeyboardButton(button_text, callback_data=f"candidate_{candidate['user_id']}")])
-
-            keyboard.append([InlineKeyboardButton(get_button_text("back", language), callback_data="main_menu")])
+            await self._show_candidates(query, language, candidates_response)
 
+        except Exception as e:
+            logger.error(f"Error in candidate search: {e}")
+            keyboard = [
+                [InlineKeyboardButton("🔄 Попробовать снова", callback_data="find")],
+                [InlineKeyboardButton(get_button_text("back", language), callback_data="main_menu")],
+            ]
             reply_markup = InlineKeyboardMarkup(keyboard)
             await query.edit_message_text(
-                f"🎯 Найдено {len(candidates)} кандидатов для пары:\n\nВыберите кандидата:", reply_markup=reply_markup
+                "❌ Ошибка при поиске кандидатов. Попробуйте позже.", reply_markup=reply_markup
             )
 
+    async def show_next_candidates(self, query, language: str, cursor: str):
+        """Показать следующих кандидатов по курсору без нового поиска"""
+        try:
+            candidates_response = await self.api_client.next_candidates(cursor)
         except Exception as e:
-            logger.error(f"Error in candidate search: {e}")
+            # Курсор истек — запускаем новый поиск
+            logger.warning(f"SEARCH: Failed to get next candidates, starting new search: {e}")
+            await self.start_candidate_search(query, language)
+            return
+        await self._show_candidates(query, language, candidates_response)
+
+    async def _show_candidates(self, query, language: str, candidates_response: dict):
+        """Показать страницу кандидатов и кнопку следующей страницы"""
+        candidates = candidates_response.get("candidates", [])
+
+        if not candidates:
             keyboard = [
                 [InlineKeyboardButton("🔄 Попробовать снова", callback_data="find")],
                 [InlineKeyboardButton(get_button_text("back", language), callback_data="main_menu")],
             ]
             reply_markup = InlineKeyboardMarkup(keyboard)
             await query.edit_message_text(
-                "❌ Ошибка при поиске кандидатов. Попробуйте позже.", reply_markup=reply_markup
+                "❌ Кандидаты не найдены. Попробуйте позже или измените критерии поиска.", reply_markup=reply_markup
             )
+            return
+
+        # Создаем кнопки для кандидатов
+        keyboard = []
+        for candidate in candidates[:5]:
+            name = candidate.get("name", "Пользователь")
+            score = candidate.get("match_score", 0)
+            preferred_time = candidate.get("preferred_time_msk", "Не указано")
+            selected_topics = candidate.get("selected_topics", [])
+
+            # Берем первую тему или показываем "Не выбрано"
+            topic_display = selected_topics[0] if selected_topics else "Не выбрано"
+
+            # Формируем текст кнопки
+            button_text = f"{name} [{topic_display}] {preferred_time} (совпадение: {score:.1%})"
+
+            keyboard.append([InlineKeyboardButton(button_text, callback_data=f"candidate_{candidate['user_id']}")])
+
+        next_cursor = candidates_response.get("next_cursor")
+        if next_cursor:
+            keyboard.append([InlineKeyboardButton("➡️ Еще кандидаты", callback_data=f"find_next_{next_cursor}")])
+        keyboard.append([InlineKeyboardButton(get_button_text("back", language), callback_data="main_menu")])
+
+        reply_markup = InlineKeyboardMarkup(keyboard)
+        await query.edit_message_text(
+            f"🎯 Найдено {len(candidates)} кандидатов для пары:\n\nВыберите кандидата:", reply_markup=reply_markup
+        )
 
     def _find_topic_by_id(self, topic_tree: dict, topic_id: str) -> dict:
         """Найти полную информацию о теме по ID в дереве тем"""
@@ -161,6 +161,13 @@ class OratorAPIClient:
         """Найти кандидатов для пары"""
         return await self._make_request("POST", "/api/v1/orator/matching/find", json=match_request)
 
+    async def next_candidates(self, cursor: str) -> Dict[str, Any]:
+        """Следующая страница кандидатов по курсору из find_candidates"""
+        # Истекший курсор повтор не исправит, поэтому без retry
+        return await self._make_request_without_retry(
+            "POST", "/api/v1/orator/matching/next", json={"cursor": cursor}
+        )
+
     # ============================================================================
     # ПАРЫ
     # ============================================================================
@@ -27,30 +27,32 @@ async def fetch_batch(conn):
     rows = await conn.fetch(
         """
         WITH cte AS (
-            SELECT id
+            SELECT id, created_at
             FROM message_queue
             WHERE sent = FALSE
             ORDER BY created_at
             FOR UPDATE SKIP LOCKED
             LIMIT $1
         )
-        SELECT mq.id, mq.user_id, mq.message, mq.keyboard
+        SELECT mq.id, mq.created_at, mq.user_id, mq.message, mq.keyboard
         FROM message_queue mq
-        JOIN cte ON mq.id = cte.id;
+        JOIN cte ON mq.id = cte.id AND mq.created_at = cte.created_at;
         """,
         BATCH_SIZE,
     )
     return rows
 
 
-async def mark_sent(conn, msg_id):
+async def mark_sent(conn, msg_id, created_at):
+    # created_at — ключ партиции: обновление затрагивает только партицию месяца сообщения
     await conn.execute(
         """
         UPDATE message_queue
         SET sent = TRUE, sent_at = NOW()
-        WHERE id = $1
+        WHERE id = $1 AND created_at = $2
         """,
         msg_id,
+        created_at,
     )
 
 
@@ -90,7 +92,7 @@ async def send_one(bot: Bot, pool, row, sem: asyncio.Semaphore):
             else:
                 await bot.send_message(chat_id=row["user_id"], text=row["message"], parse_mode="HTML")
             async with pool.acquire() as conn:
-                await mark_sent(conn, row["id"])  # фиксируем доставку
+                await mark_sent(conn, row["id"], row["created_at"])  # фиксируем доставку
             print(f"✅ sent id={row['id']} user={row['user_id']}")
         except Exception as e:  # noqa: BLE001 — логируем и живём дальше
             # TODO: можно добавить retry/backoff + таблицу для ошибок